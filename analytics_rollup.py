@@ -0,0 +1,307 @@
+"""
+Daily analytics rollups
+
+The breakdowns pages read ``analytics_rollup``: for every admin, amenity and
+day, the count (and amount) of each metric value — registrations by status,
+language, trip and number of guests, guests by age category, document type,
+consent and trip, invoices by status and currency with their revenue, and
+trips created with the nights booked. A page therefore reads rows in
+proportion to the days it shows, not to the admin's history.
+
+Rows are keyed by the day the registration, guest, invoice or trip was
+created. ``refresh_rollups`` brings them up to date incrementally: it finds
+the (admin, day) pairs of rows whose ``updated_at`` is after the watermark
+(every write path sets it, bulk UPDATEs included) and of the days marked in
+``analytics_rollup_day``, then deletes and re-inserts the rollups of those
+days with ``INSERT ... SELECT ... GROUP BY``. Flush hooks mark the days of
+rows deleted through the ORM and, when a trip moves to another amenity, the
+days of its registrations, guests and invoices. Bulk deletes must call
+``mark_trip_days`` first; ``rebuild_rollups`` recomputes everything.
+"""
+
+from datetime import datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import String, case, cast, delete, event, func, insert, inspect, literal, literal_column, select, union
+from sqlalchemy.orm import Session
+
+from database import (
+    db, AnalyticsRollup, AnalyticsRollupDay, AnalyticsRollupState, Guest, Invoice, Registration, Trip
+)
+from breakdown_stats import day_key, day_span
+
+ROLLUP_COLUMNS = ('day', 'admin_id', 'amenity_id', 'metric', 'dimension', 'count', 'amount')
+ZERO = literal_column('0')
+
+def _text(expression):
+    """A dimension value as text, '' for NULL"""
+    return func.coalesce(cast(expression, String), literal_column("''"))
+
+def _grouped_rows(day, admin_id, amenity_id, metric, dimension, count, amount):
+    columns = (day, admin_id, amenity_id, literal(metric, String), dimension, count, amount)
+    return lambda query: query.add_columns(*columns).group_by(day, admin_id, amenity_id, dimension)
+
+def _registration_selects(restrict):
+    day = day_key(Registration.created_at)
+    guest_count = (
+        select(func.count(Guest.id))
+        .where(Guest.registration_id == Registration.id)
+        .correlate(Registration)
+        .scalar_subquery()
+    )
+    base = select().select_from(Registration).join(Trip, Registration.trip_id == Trip.id)
+    base = restrict(base, Registration.created_at, Trip.admin_id)
+    for metric, dimension in (
+        ('registration_status', Registration.status),
+        ('registration_language', Registration.language),
+        ('registration_trip', Trip.id),
+    ):
+        yield _grouped_rows(day, Trip.admin_id, Trip.amenity_id, metric, _text(dimension), func.count(), ZERO)(base)
+
+    # Registrations by number of guests, grouped over a derived table of per-registration counts
+    per_registration = base.add_columns(
+        day.label('day'), Trip.admin_id.label('admin_id'), Trip.amenity_id.label('amenity_id'),
+        guest_count.label('guests')
+    ).subquery()
+    yield _grouped_rows(
+        per_registration.c.day, per_registration.c.admin_id, per_registration.c.amenity_id,
+        'registration_guests', _text(per_registration.c.guests), func.count(), ZERO
+    )(select().select_from(per_registration))
+
+def _guest_selects(restrict):
+    day = day_key(Guest.created_at)
+    base = (
+        select()
+        .select_from(Guest)
+        .join(Registration, Guest.registration_id == Registration.id)
+        .join(Trip, Registration.trip_id == Trip.id)
+    )
+    base = restrict(base, Guest.created_at, Trip.admin_id)
+    consent = case((Guest.gdpr_consent.is_(True), literal_column("'yes'")), else_=literal_column("'no'"))
+    for metric, dimension in (
+        ('guest_age', _text(Guest.age_category)),
+        ('guest_document', _text(Guest.document_type)),
+        ('guest_consent', consent),
+        ('guest_trip', _text(Trip.id)),
+    ):
+        yield _grouped_rows(day, Trip.admin_id, Trip.amenity_id, metric, dimension, func.count(), ZERO)(base)
+
+def _invoice_selects(restrict):
+    day = day_key(Invoice.created_at)
+    base = (
+        select()
+        .select_from(Invoice)
+        .outerjoin(Registration, Invoice.registration_id == Registration.id)
+        .outerjoin(Trip, Registration.trip_id == Trip.id)
+    )
+    base = restrict(base, Invoice.created_at, Invoice.admin_id)
+    revenue = func.coalesce(func.sum(Invoice.total_amount), ZERO)
+    for metric, dimension in (('invoice_status', Invoice.status), ('invoice_currency', Invoice.currency)):
+        yield _grouped_rows(day, Invoice.admin_id, Trip.amenity_id, metric, _text(dimension), func.count(), revenue)(base)
+
+def _trip_selects(restrict):
+    day = day_key(Trip.created_at)
+    base = restrict(select().select_from(Trip), Trip.created_at, Trip.admin_id)
+    synced = case((Trip.is_externally_synced.is_(True), literal_column("'synced'")), else_=literal_column("'not_synced'"))
+    nights = func.coalesce(func.sum(day_span(Trip.start_date, Trip.end_date)), ZERO)
+    yield _grouped_rows(day, Trip.admin_id, Trip.amenity_id, 'trips', synced, func.count(), nights)(base)
+
+ROLLUP_SELECTS = (_registration_selects, _guest_selects, _invoice_selects, _trip_selects)
+
+def _day_start(day):
+    return datetime.combine(day, time.min)
+
+def _restriction(admin_ids=None, days=None, date_from=None, date_to=None):
+    """Filter applied to every rollup SELECT: ``restrict(query, created_at, admin_id_column)``"""
+    if days:
+        date_from, date_to = min(days), max(days)
+
+    def restrict(query, created_at, admin_column):
+        query = query.where(created_at.isnot(None))
+        if admin_ids is not None:
+            query = query.where(admin_column.in_(admin_ids))
+        if date_from is not None:
+            query = query.where(created_at >= _day_start(date_from))
+        if date_to is not None:
+            query = query.where(created_at < _day_start(date_to + timedelta(days=1)))
+        if days:
+            query = query.where(day_key(created_at).in_(days))
+        return query
+    return restrict
+
+def _recompute(admin_ids=None, days=None, date_from=None, date_to=None):
+    """Replace the rollup rows of the given admins and days with freshly grouped ones"""
+    stale = delete(AnalyticsRollup)
+    if admin_ids is not None:
+        stale = stale.where(AnalyticsRollup.admin_id.in_(admin_ids))
+    if days:
+        stale = stale.where(AnalyticsRollup.day.in_(days))
+    if date_from is not None:
+        stale = stale.where(AnalyticsRollup.day >= date_from)
+    if date_to is not None:
+        stale = stale.where(AnalyticsRollup.day <= date_to)
+    db.session.execute(stale, execution_options={'synchronize_session': False})
+
+    restrict = _restriction(admin_ids, days, date_from, date_to)
+    written = 0
+    for selects in ROLLUP_SELECTS:
+        for query in selects(restrict):
+            written += db.session.execute(insert(AnalyticsRollup).from_select(ROLLUP_COLUMNS, query)).rowcount
+    return written
+
+def _changed_days(since):
+    """(admin_id, day) pairs whose rollups are affected by rows updated after ``since``"""
+    queries = [
+        select(Trip.admin_id, day_key(Registration.created_at)).select_from(Registration)
+        .join(Trip, Registration.trip_id == Trip.id).where(Registration.updated_at > since),
+        select(Trip.admin_id, day_key(Guest.created_at)).select_from(Guest)
+        .join(Registration, Guest.registration_id == Registration.id).join(Trip, Registration.trip_id == Trip.id)
+        .where(Guest.updated_at > since),
+        # A guest also moves its registration to another guest count
+        select(Trip.admin_id, day_key(Registration.created_at)).select_from(Guest)
+        .join(Registration, Guest.registration_id == Registration.id).join(Trip, Registration.trip_id == Trip.id)
+        .where(Guest.updated_at > since),
+        select(Invoice.admin_id, day_key(Invoice.created_at)).where(Invoice.updated_at > since),
+        select(Trip.admin_id, day_key(Trip.created_at)).where(Trip.updated_at > since),
+    ]
+    return {(admin_id, day) for admin_id, day in db.session.execute(union(*queries)) if day is not None}
+
+def _rollup_state():
+    """The watermark row, locked so that concurrent refreshes run one after the other"""
+    state = db.session.execute(select(AnalyticsRollupState).order_by(AnalyticsRollupState.id).with_for_update()).scalars().first()
+    if state is None:
+        state = AnalyticsRollupState()
+        db.session.add(state)
+        db.session.flush()
+    return state
+
+def refresh_rollups(now=None):
+    """Recompute the rollups of days changed since the last refresh.
+
+    The first refresh builds every rollup and returns the number of rows
+    written; later ones return the number of (admin, day) pairs recomputed.
+    The caller commits.
+    """
+    now = now or datetime.utcnow()
+    settle = timedelta(seconds=current_app.config.get('ANALYTICS_ROLLUP_SETTLE_SECONDS', 300))
+    state = _rollup_state()
+    if state.refreshed_through is None:
+        return rebuild_rollups(now=now)
+
+    marks = db.session.execute(select(AnalyticsRollupDay.id, AnalyticsRollupDay.admin_id, AnalyticsRollupDay.day)).all()
+    pairs = _changed_days(state.refreshed_through) | {(mark.admin_id, mark.day) for mark in marks}
+    if pairs:
+        # One pass over every changed admin and day; recomputing an unchanged pair is harmless
+        _recompute(sorted({admin_id for admin_id, _ in pairs}), sorted({day for _, day in pairs}))
+    if marks:
+        db.session.execute(
+            delete(AnalyticsRollupDay).where(AnalyticsRollupDay.id <= max(mark.id for mark in marks)),
+            execution_options={'synchronize_session': False}
+        )
+    state.refreshed_through = max(state.refreshed_through, now - settle)
+    state.refreshed_at = now
+    return len(pairs)
+
+def rebuild_rollups(date_from=None, date_to=None, now=None):
+    """Recompute every rollup row, or those of days in ``[date_from, date_to]``.
+
+    A full rebuild also resets the refresh watermark. Returns the number of
+    rollup rows written; the caller commits.
+    """
+    now = now or datetime.utcnow()
+    written = _recompute(date_from=date_from, date_to=date_to)
+    if date_from is None and date_to is None:
+        state = _rollup_state()
+        settle = timedelta(seconds=current_app.config.get('ANALYTICS_ROLLUP_SETTLE_SECONDS', 300))
+        state.refreshed_through = now - settle
+        state.refreshed_at = now
+        db.session.execute(delete(AnalyticsRollupDay), execution_options={'synchronize_session': False})
+    return written
+
+def rollup_status():
+    """Watermark, rollup rows and pending deleted days, for ``manage.py analytics status``"""
+    state = db.session.execute(select(AnalyticsRollupState).order_by(AnalyticsRollupState.id)).scalars().first()
+    return {
+        'refreshed_through': state.refreshed_through if state else None,
+        'refreshed_at': state.refreshed_at if state else None,
+        'rows': db.session.scalar(select(func.count(AnalyticsRollup.id))),
+        'pending_days': db.session.scalar(select(func.count(AnalyticsRollupDay.id))),
+    }
+
+def _trip_days(trip_ids):
+    """SELECT of the (admin_id, day) pairs whose rollups count the trips or their registrations, guests and invoices"""
+    registrations = select(Registration.id).where(Registration.trip_id.in_(trip_ids))
+    return union(
+        select(Trip.admin_id, day_key(Trip.created_at)).where(Trip.id.in_(trip_ids), Trip.created_at.isnot(None)),
+        select(Trip.admin_id, day_key(Registration.created_at)).select_from(Registration)
+        .join(Trip, Registration.trip_id == Trip.id)
+        .where(Trip.id.in_(trip_ids), Registration.created_at.isnot(None)),
+        select(Trip.admin_id, day_key(Guest.created_at)).select_from(Guest)
+        .join(Registration, Guest.registration_id == Registration.id).join(Trip, Registration.trip_id == Trip.id)
+        .where(Trip.id.in_(trip_ids), Guest.created_at.isnot(None)),
+        select(Invoice.admin_id, day_key(Invoice.created_at))
+        .where(Invoice.registration_id.in_(registrations), Invoice.created_at.isnot(None)),
+    )
+
+def mark_trip_days(trip_ids, connection=None):
+    """Mark every day counting the trips' rows for the next refresh.
+
+    Call before bulk-deleting the trips' registrations or guests, which the
+    refresh cannot see afterwards. Runs one ``INSERT ... SELECT``; the caller
+    commits.
+    """
+    trip_ids = list(trip_ids)
+    if not trip_ids:
+        return
+    pairs = _trip_days(trip_ids).subquery()
+    statement = insert(AnalyticsRollupDay.__table__).from_select(['admin_id', 'day'], select(pairs))
+    (connection or db.session).execute(statement)
+
+def _deleted_days(session):
+    """(admin_id, created_at) of the rows about to be deleted whose rollups they are counted in"""
+    with session.no_autoflush:
+        for instance in session.deleted:
+            if isinstance(instance, (Trip, Invoice)):
+                yield instance.admin_id, instance.created_at
+            elif isinstance(instance, Registration):
+                trip = session.get(Trip, instance.trip_id)
+                if trip is not None:
+                    yield trip.admin_id, instance.created_at
+            elif isinstance(instance, Guest):
+                registration = session.get(Registration, instance.registration_id)
+                trip = session.get(Trip, registration.trip_id) if registration is not None else None
+                if trip is not None:
+                    yield trip.admin_id, instance.created_at
+                    yield trip.admin_id, registration.created_at
+
+def _moved_trips(session):
+    """Ids of flushed trips whose amenity changes"""
+    return {
+        instance.id for instance in session.dirty
+        if isinstance(instance, Trip) and instance.id is not None
+        and inspect(instance).attrs.amenity_id.history.has_changes()
+    }
+
+@event.listens_for(Session, 'before_flush')
+def _collect_deleted_days(session, flush_context, instances):
+    moved = _moved_trips(session)
+    if moved:
+        session.info.setdefault('analytics_rollup_trips', set()).update(moved)
+    if not session.deleted:
+        return
+    days = {(admin_id, created_at.date()) for admin_id, created_at in _deleted_days(session) if created_at}
+    if days:
+        session.info.setdefault('analytics_rollup_days', set()).update(days)
+
+@event.listens_for(Session, 'after_flush')
+def _record_deleted_days(session, flush_context):
+    days = session.info.pop('analytics_rollup_days', None)
+    if days:
+        session.connection().execute(
+            insert(AnalyticsRollupDay.__table__),
+            [{'admin_id': admin_id, 'day': day} for admin_id, day in sorted(days)]
+        )
+    # Rows of a moved trip now count for the new amenity on their own days
+    trip_ids = session.info.pop('analytics_rollup_trips', None)
+    if trip_ids:
+        mark_trip_days(sorted(trip_ids), session.connection())
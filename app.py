@@ -128,6 +128,10 @@ login_manager.login_view = 'auth.admin_login'
 babel = Babel(app, locale_selector=get_locale)
 mail = Mail(app)
 
+# Load the email translation catalogs once per process
+from email_templates import preload_catalogs
+preload_catalogs()
+
 # Test database connection and log status
 def test_database_connection():
     """Test database connection and log the result"""
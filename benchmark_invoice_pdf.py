@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Invoice PDF rendering benchmarks
+
+Cold vs warm: compares a cold render (new FontConfiguration and stylesheet
+per document, as the invoice routes used to do) with the warm, shared
+renderer from pdf_service.py.
+
+Suite: renders admin/invoice_pdf.html for invoices with 1, 50 and 500 items
+in several locales and records render latency, peak RSS and PDF size per
+case. Every case runs in a fresh process, so the peak RSS belongs to that
+case alone. Results can be written to a JSON baseline and later runs
+compared against it; a metric that grew by more than the threshold is a
+regression and makes the script exit with status 1.
+
+Needs the WeasyPrint system libraries.
+
+    python benchmark_invoice_pdf.py --runs 20
+    python benchmark_invoice_pdf.py --suite --output invoice_pdf_baseline.json
+    python benchmark_invoice_pdf.py --suite --compare invoice_pdf_baseline.json --threshold 20
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_babel import force_locale
+
+from test_config import TestConfig
+from database import db, User, Invoice, InvoiceItem
+from pdf_service import PDFRenderer, INVOICE_PDF_TEMPLATE
+
+SUITE_ITEM_COUNTS = (1, 50, 500)
+SUITE_LOCALES = ('en', 'cs', 'sk')
+# Metrics compared against the baseline; higher is worse for all of them
+METRICS = ('median_ms', 'p95_ms', 'peak_rss_kb', 'pdf_bytes')
+DEFAULT_THRESHOLD = 20.0
+
+# Client name and item description per locale, so the fonts have to shape the accented text
+LOCALE_SAMPLES = {
+    'en': ('Benchmark Client Ltd.', 'Night {n} - double room with breakfast'),
+    'cs': ('Příliš žluťoučký kůň, s.r.o.', 'Noc {n} – dvoulůžkový pokoj se snídaní'),
+    'sk': ('Ďatelinová chata Ľubovňa, s.r.o.', 'Noc {n} – dvojlôžková izba s raňajkami'),
+}
+
+def create_invoice(item_count=5, locale='en'):
+    client_name, description = LOCALE_SAMPLES.get(locale, LOCALE_SAMPLES['en'])
+    admin = User(username='bench_admin', email='bench_admin@example.com', password_hash='x',
+                 role='admin', company_name='Benchmark Lodge', contact_address='Main Street 1\n100 00 Prague')
+    db.session.add(admin)
+    db.session.flush()
+    invoice = Invoice(invoice_number='BENCH-1', admin_id=admin.id, client_name=client_name,
+                      client_address='Client Street 2', issue_date=date(2026, 10, 1), currency='EUR')
+    db.session.add(invoice)
+    db.session.flush()
+    for i in range(item_count):
+        db.session.add(InvoiceItem(invoice_id=invoice.id, description=description.format(n=i + 1), quantity=1,
+                                   unit_price=80, vat_rate=12, line_total=80, vat_amount=9.6,
+                                   total_with_vat=89.6))
+    db.session.commit()
+    return invoice
+
+def measure(render, runs):
+    """Latencies in milliseconds of ``runs`` calls to ``render``"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        render()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def report(label, timings):
+    print(f"  {label:<6} median {statistics.median(timings):8.1f} ms   "
+          f"mean {statistics.mean(timings):8.1f} ms   min {min(timings):8.1f} ms")
+
+def run_cold_vs_warm(runs):
+    app = TestConfig.create_test_app()
+    with app.app_context():
+        invoice = create_invoice()
+        cold = measure(lambda: PDFRenderer().render_template(INVOICE_PDF_TEMPLATE, invoice=invoice), runs)
+        warm_renderer = PDFRenderer().warm_up()
+        warm = measure(lambda: warm_renderer.render_template(INVOICE_PDF_TEMPLATE, invoice=invoice), runs)
+
+    print(f"🧾 Invoice PDF render latency ({runs} runs)")
+    report('cold', cold)
+    report('warm', warm)
+    print(f"  speed-up {statistics.median(cold) / statistics.median(warm):.2f}x (median)")
+    return cold, warm
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def percentile(timings, pct):
+    if len(timings) < 2:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[pct - 1]
+
+def run_case(item_count, locale, runs):
+    """Benchmark one invoice size and locale; meant to run in its own process"""
+    app = TestConfig.create_test_app()
+    with app.test_request_context(), force_locale(locale):
+        invoice = create_invoice(item_count, locale)
+        renderer = PDFRenderer().warm_up()
+        render = lambda: renderer.render_template(INVOICE_PDF_TEMPLATE, invoice=invoice)
+        pdf_bytes = render()  # Not timed: first render loads the template
+        timings = measure(render, runs)
+
+    return {
+        'items': item_count,
+        'locale': locale,
+        'runs': runs,
+        'median_ms': round(statistics.median(timings), 1),
+        'p95_ms': round(percentile(timings, 95), 1),
+        'min_ms': round(min(timings), 1),
+        'peak_rss_kb': peak_rss_kb(),
+        'pdf_bytes': len(pdf_bytes),
+    }
+
+def run_suite(runs, item_counts=SUITE_ITEM_COUNTS, locales=SUITE_LOCALES):
+    """Run every (item count, locale) case in a fresh process; returns the result dicts"""
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for item_count in item_counts:
+        for locale in locales:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_case, item_count, locale, runs).result()
+            results.append(result)
+            print(f"  {item_count:>4} items  {locale:<3} median {result['median_ms']:8.1f} ms   "
+                  f"p95 {result['p95_ms']:8.1f} ms   peak RSS {result['peak_rss_kb'] or 0:>8} KiB   "
+                  f"{result['pdf_bytes']:>8} bytes")
+    return results
+
+def environment():
+    try:
+        from importlib.metadata import version
+        weasyprint_version = version('weasyprint')
+    except Exception:
+        weasyprint_version = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'weasyprint': weasyprint_version,
+    }
+
+def write_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump({
+            'created': datetime.utcnow().isoformat(timespec='seconds'),
+            'environment': environment(),
+            'results': results,
+        }, baseline_file, indent=2)
+        baseline_file.write('\n')
+    return path
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)
+
+def compare_results(baseline_results, results, threshold=DEFAULT_THRESHOLD):
+    """Metrics that grew by more than ``threshold`` percent over the baseline.
+
+    Cases are matched by item count and locale; cases or metrics missing from
+    either side are not compared.
+    """
+    baseline = {(case['items'], case['locale']): case for case in baseline_results}
+    regressions = []
+    for case in results:
+        before = baseline.get((case['items'], case['locale']))
+        if before is None:
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), case.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            if change > threshold:
+                regressions.append({
+                    'items': case['items'],
+                    'locale': case['locale'],
+                    'metric': metric,
+                    'baseline': old,
+                    'current': new,
+                    'change_pct': round(change, 1),
+                })
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Invoice PDF rendering benchmarks')
+    parser.add_argument('--runs', type=int, default=10, help='Renders per variant or case (default: 10)')
+    parser.add_argument('--suite', action='store_true',
+                        help='Run the size/locale suite instead of cold vs warm')
+    parser.add_argument('--items', default=','.join(map(str, SUITE_ITEM_COUNTS)),
+                        help='Comma-separated invoice item counts for the suite (default: 1,50,500)')
+    parser.add_argument('--locales', default=','.join(SUITE_LOCALES),
+                        help='Comma-separated locales for the suite (default: en,cs,sk)')
+    parser.add_argument('--output', help='Write the suite results to this JSON baseline')
+    parser.add_argument('--compare', help='Compare the suite results with this JSON baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Percent increase over the baseline reported as a regression (default: 20)')
+    args = parser.parse_args()
+
+    if not args.suite:
+        run_cold_vs_warm(args.runs)
+        return 0
+
+    item_counts = [int(count) for count in args.items.split(',') if count.strip()]
+    locales = [locale.strip() for locale in args.locales.split(',') if locale.strip()]
+    print(f"🧾 Invoice PDF suite ({args.runs} runs per case)")
+    results = run_suite(args.runs, item_counts, locales)
+
+    if args.output:
+        write_baseline(args.output, results)
+        print(f"💾 Baseline written to {args.output}")
+
+    if args.compare:
+        regressions = compare_results(load_baseline(args.compare)['results'], results, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) above {args.threshold:g}%:")
+            for regression in regressions:
+                print(f"  {regression['items']:>4} items  {regression['locale']:<3} {regression['metric']:<12} "
+                      f"{regression['baseline']} → {regression['current']} (+{regression['change_pct']}%)")
+            return 1
+        print(f"✅ No regressions above {args.threshold:g}% against {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
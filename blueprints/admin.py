@@ -22,8 +22,10 @@ admin = Blueprint('admin', __name__)
 # Import database models and utilities
 from database import (
     db, User, Trip, Registration, Guest, Invoice, InvoiceItem, Amenity, Calendar,
-    sync_calendar_reservations, sync_all_calendars_for_admin, AmenityHousekeeper, Housekeeping, HousekeepingPhoto
+    sync_calendar_reservations, sync_all_calendars_for_admin, AmenityHousekeeper, Housekeeping, HousekeepingPhoto,
+    rebuild_trip_counters, AnalyticsRollup, AnalyticsRollupDay
 )
+from analytics_rollup import rebuild_rollups
 from version import version_manager, check_version_compatibility, get_version_changelog
 from config import Config
 from migrations import get_migration_manager
@@ -235,6 +237,10 @@ def reset_data():
         # 5. Delete trips last
         Trip.query.delete()
         
+        # 6. Drop the analytics rollups of the deleted rows (bulk deletes are not seen by the refresh)
+        AnalyticsRollup.query.delete()
+        AnalyticsRollupDay.query.delete()
+        
         db.session.commit()
         
         flash(_('All guest registration data has been reset successfully.'), 'success')
@@ -597,6 +603,7 @@ def seed_data():
                 )
                 db.session.add(invoice_item)
         
+        rebuild_trip_counters()
         db.session.commit()
         
         flash(_('Sample data has been seeded successfully! Created 5 trips, 7 registrations (including 1 single-person pending), 3 invoices with realistic data, and updated admin contact information.'), 'success')
@@ -633,6 +640,9 @@ def seed_reset():
         Guest.query.delete()
         Registration.query.delete()
         Trip.query.delete()
+        # Bulk deletes are invisible to the rollup refresh: rebuild from what is left,
+        # which also drops the pending day marks and resets the watermark
+        rebuild_rollups()
         
         # Commit the deletions
         db.session.commit()
@@ -841,6 +851,7 @@ def seed_reset():
                 )
                 db.session.add(guest)
         
+        rebuild_trip_counters()
         db.session.commit()
         print("Sample data seeded successfully")
         
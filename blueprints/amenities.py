@@ -5,7 +5,7 @@ from functools import wraps
 
 amenities = Blueprint('amenities', __name__)
 
-from database import db, User, Amenity, AmenityHousekeeper, sync_all_amenities_for_admin
+from database import db, User, Amenity, AmenityHousekeeper, sync_all_amenities_for_admin, to_decimal
 
 def role_required(role):
     def decorator(f):
@@ -39,6 +39,9 @@ def new_amenity():
             name=request.form.get('name'),
             description=request.form.get('description'),
             max_guests=int(request.form.get('max_guests', 1)),
+            nightly_rate=to_decimal(request.form.get('nightly_rate')) if request.form.get('nightly_rate') else None,
+            currency=(request.form.get('currency') or 'EUR').strip().upper(),
+            vat_rate=to_decimal(request.form.get('vat_rate')),
             admin_id=current_user.id,
             is_active=request.form.get('is_active') == 'on'
         )
@@ -63,6 +66,9 @@ def edit_amenity(amenity_id):
         amenity.name = request.form.get('name')
         amenity.description = request.form.get('description')
         amenity.max_guests = int(request.form.get('max_guests', 1))
+        amenity.nightly_rate = to_decimal(request.form.get('nightly_rate')) if request.form.get('nightly_rate') else None
+        amenity.currency = (request.form.get('currency') or 'EUR').strip().upper()
+        amenity.vat_rate = to_decimal(request.form.get('vat_rate'))
         amenity.is_active = request.form.get('is_active') == 'on'
         
         db.session.commit()
@@ -1,16 +1,21 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
 from functools import wraps
-from datetime import datetime
-from io import StringIO, BytesIO
-import csv
+from datetime import date
 
 api = Blueprint('api', __name__)
 
 from database import db, User, Guest, Registration, Trip, Invoice, InvoiceItem
 from version import version_manager, check_version_compatibility, get_version_changelog
 from migrations import get_migration_manager
+from occupancy import default_period, occupancy_report
+from breakdown_cache import cached_breakdown
+from changes_feed import DEFAULT_PAGE_SIZE, get_changes_page, iter_change_lines
+from guest_backup import (
+    BACKUP_FORMATS, BACKUP_PAGE_SIZE, BACKUP_WRITERS, get_guest_backup_page, guest_backup_rows,
+    guest_backup_snapshot, is_closed_month, month_bounds
+)
 
 def role_required(role):
     def decorator(f):
@@ -30,61 +35,85 @@ def role_required(role):
 @login_required
 @role_required('admin')
 def api_backup_guests():
-    """Export all registered guests for a given month (no photos, admin only)."""
+    """Export the admin's registered guests for a given month (no photos, admin only)."""
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
-    fmt = request.args.get('format', 'csv')
+    fmt = 'json' if request.args.get('format', 'csv') == 'json' else 'csv'
     if not year or not month:
         return jsonify({'error': 'Missing year or month parameter'}), 400
+    try:
+        start, end = month_bounds(year, month)
+    except ValueError:
+        return jsonify({'error': 'Invalid year or month parameter'}), 400
 
-    # Get guests for the given month
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1)
-    else:
-        end_date = datetime(year, month + 1, 1)
-    guests = Guest.query.join(Registration).filter(
-        Registration.created_at >= start_date,
-        Registration.created_at < end_date
-    ).all()
-
-    # Prepare data (no photos)
-    guest_data = []
-    for g in guests:
-        guest_data.append({
-            'id': g.id,
-            'registration_id': g.registration_id,
-            'first_name': g.first_name,
-            'last_name': g.last_name,
-            'age_category': g.age_category,
-            'document_type': g.document_type,
-            'document_number': g.document_number,
-            'gdpr_consent': g.gdpr_consent,
-            'created_at': g.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'trip_title': g.registration.trip.title if g.registration and g.registration.trip else '',
-            'registration_email': g.registration.email if g.registration else '',
-            'registration_language': g.registration.language if g.registration else '',
-        })
+    download_name = f'guests_{year}_{month:02d}{BACKUP_FORMATS[fmt][0]}'
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int)
 
-    if fmt == 'json':
-        return jsonify(guest_data)
-    else:
-        # CSV
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=guest_data[0].keys() if guest_data else [
-            'id','registration_id','first_name','last_name','age_category','document_type','document_number','gdpr_consent','created_at','trip_title','registration_email','registration_language'])
-        writer.writeheader()
-        for row in guest_data:
-            writer.writerow(row)
-        csv_data = output.getvalue().encode('utf-8')
-        output.close()
+    if after is None and limit is None and is_closed_month(year, month):
+        path, etag = guest_backup_snapshot(current_user.id, year, month, fmt)
         return send_file(
-            BytesIO(csv_data),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'guests_{year}_{month:02d}.csv'
+            path,
+            mimetype=BACKUP_FORMATS[fmt][1],
+            as_attachment=fmt == 'csv',
+            download_name=download_name,
+            etag=etag,
+            conditional=True
         )
 
+    if after is None and limit is None:
+        rows = guest_backup_rows(current_user.id, start, end)
+        next_cursor = None
+    else:
+        rows, next_cursor = get_guest_backup_page(current_user.id, start, end, after, limit or BACKUP_PAGE_SIZE)
+
+    response = Response(stream_with_context(BACKUP_WRITERS[fmt](rows)), mimetype=BACKUP_FORMATS[fmt][1])
+    if fmt == 'csv':
+        response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        response.headers['Link'] = '<{}>; rel="next"'.format(url_for(
+            'api.api_backup_guests', year=year, month=month, format=fmt, after=next_cursor, limit=limit))
+    return response
+
+@api.route('/api/v2/changes', methods=['GET'])
+@login_required
+@role_required('admin')
+def api_changes():
+    """Registrations, guests, invoices and trips changed after a cursor, as NDJSON (admin only)."""
+    since = request.args.get('since') or None
+    types = [t.strip() for t in request.args.get('types', '').split(',') if t.strip()] or None
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    try:
+        changes, next_cursor, has_more = get_changes_page(current_user.id, since, types, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = Response(iter_change_lines(changes), mimetype='application/x-ndjson')
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    response.headers['X-Has-More'] = 'true' if has_more else 'false'
+    if has_more:
+        next_url = url_for('api.api_changes', since=next_cursor, types=request.args.get('types'),
+                           limit=request.args.get('limit'))
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+@api.route('/api/v2/occupancy', methods=['GET'])
+@login_required
+@role_required('admin')
+def api_occupancy():
+    """Monthly occupancy, average stay, turnover days and double bookings per amenity, as JSON (admin only)."""
+    date_from, date_to = default_period()
+    try:
+        date_from = date.fromisoformat(request.args['date_from']) if request.args.get('date_from') else date_from
+        date_to = date.fromisoformat(request.args['date_to']) if request.args.get('date_to') else date_to
+        filters = {'date_from': date_from, 'date_to': date_to, 'amenity_id': request.args.get('amenity_id', type=int)}
+        report = cached_breakdown(current_user.id, 'occupancy', filters, lambda: occupancy_report(current_user.id, **filters))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report)
+
 @api.route('/api/version')
 def api_version():
     """Get application version information"""
@@ -2,12 +2,18 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
 from functools import wraps
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import date
 
 breakdowns = Blueprint('breakdowns', __name__)
 
-from database import db, User, Registration, Guest, Trip, Invoice
+from database import db, User, Registration, Guest, Trip, Invoice, Amenity
+from analytics_rollup import refresh_rollups
+from breakdown_cache import cached_breakdown
+from breakdown_stats import (
+    amenity_options, guest_stats, invoice_stats, overview_stats, recent_guests, recent_invoices,
+    recent_registrations, registration_stats, trip_rows, trip_stats
+)
+from occupancy import default_period, occupancy_report
 
 def role_required(role):
     def decorator(f):
@@ -23,235 +29,114 @@ def role_required(role):
         return decorated_function
     return decorator
 
+def breakdown_filters():
+    """The optional date range and amenity of the request, as keyword arguments for the breakdown functions"""
+    return {
+        'date_from': request.args.get('date_from', type=date.fromisoformat),
+        'date_to': request.args.get('date_to', type=date.fromisoformat),
+        'amenity_id': request.args.get('amenity_id', type=int),
+    }
+
+def cached_page(breakdown, filters, compute):
+    """``(compute(), amenities)`` for the current admin, cached until one of their rows changes.
+    
+    A miss refreshes the analytics rollups before computing.
+    """
+    def refreshed():
+        refresh_rollups()
+        db.session.commit()
+        return compute()
+    
+    result = cached_breakdown(current_user.id, breakdown, filters, refreshed)
+    amenities = cached_breakdown(current_user.id, 'amenities', {}, lambda: amenity_options(current_user.id))
+    return result, amenities
+
 @breakdowns.route('/admin/breakdowns')
 @login_required
 @role_required('admin')
 def admin_breakdowns():
     """Main breakdowns/analytics page."""
-    # Get summary statistics for the overview cards
-    registrations = Registration.query.join(Trip).filter(Trip.admin_id == current_user.id).all()
-    guests = Guest.query.join(Registration).join(Trip).filter(Trip.admin_id == current_user.id).all()
-    trips = Trip.query.filter_by(admin_id=current_user.id).all()
-    invoices = Invoice.query.filter_by(admin_id=current_user.id).all()
-    
-    # Calculate totals
-    total_amount = sum(float(invoice.total_amount) for invoice in invoices)
-    
-    stats = {
-        'total_registrations': len(registrations),
-        'total_guests': len(guests),
-        'total_trips': len(trips),
-        'total_revenue': total_amount
-    }
+    # Summary statistics for the overview cards, summed from the daily rollups
+    filters = breakdown_filters()
+    stats, amenities = cached_page('overview', filters, lambda: overview_stats(current_user.id, **filters))
     
-    return render_template('admin/breakdowns.html', stats=stats)
+    return render_template('admin/breakdowns.html', stats=stats, filters=filters, amenities=amenities)
 
 @breakdowns.route('/admin/breakdowns/registrations')
 @login_required
 @role_required('admin')
 def registration_breakdown():
     """Registration statistics and breakdowns."""
-    # Get all registrations for the current admin
-    registrations = Registration.query.join(Trip).filter(Trip.admin_id == current_user.id).all()
-    
-    # Status breakdown
-    status_counts = defaultdict(int)
-    for reg in registrations:
-        status_counts[reg.status] += 1
-    
-    # Monthly breakdown
-    monthly_counts = defaultdict(int)
-    for reg in registrations:
-        month_key = reg.created_at.strftime('%Y-%m')
-        monthly_counts[month_key] += 1
-    
-    # Trip breakdown
-    trip_counts = defaultdict(int)
-    for reg in registrations:
-        trip_counts[reg.trip.title] += 1
-    
-    # Language breakdown
-    language_counts = defaultdict(int)
-    for reg in registrations:
-        language_counts[reg.language] += 1
+    filters = breakdown_filters()
+    (stats, registrations), amenities = cached_page('registrations', filters, lambda: (
+        registration_stats(current_user.id, **filters), recent_registrations(current_user.id, **filters)
+    ))
     
-    # Guest count distribution
-    guest_count_distribution = defaultdict(int)
-    for reg in registrations:
-        guest_count_distribution[len(reg.guests)] += 1
-    
-    # Recent activity (last 30 days)
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    recent_registrations = [reg for reg in registrations if reg.created_at >= thirty_days_ago]
-    
-    stats = {
-        'total_registrations': len(registrations),
-        'pending_count': status_counts['pending'],
-        'approved_count': status_counts['approved'],
-        'rejected_count': status_counts['rejected'],
-        'recent_count': len(recent_registrations),
-        'status_breakdown': dict(status_counts),
-        'monthly_breakdown': dict(monthly_counts),
-        'trip_breakdown': dict(trip_counts),
-        'language_breakdown': dict(language_counts),
-        'guest_count_distribution': dict(guest_count_distribution)
-    }
-    
-    return render_template('admin/registration_breakdown.html', stats=stats, registrations=registrations)
+    return render_template('admin/registration_breakdown.html', stats=stats, registrations=registrations,
+                           filters=filters, amenities=amenities)
 
 @breakdowns.route('/admin/breakdowns/guests')
 @login_required
 @role_required('admin')
 def guest_breakdown():
     """Guest statistics and breakdowns."""
-    # Get all guests for registrations belonging to the current admin
-    guests = Guest.query.join(Registration).join(Trip).filter(Trip.admin_id == current_user.id).all()
-    
-    # Age category breakdown
-    age_category_counts = defaultdict(int)
-    for guest in guests:
-        age_category_counts[guest.age_category] += 1
-    
-    # Document type breakdown
-    document_type_counts = defaultdict(int)
-    for guest in guests:
-        document_type_counts[guest.document_type] += 1
-    
-    # GDPR consent breakdown
-    gdpr_consent_count = sum(1 for guest in guests if guest.gdpr_consent)
-    gdpr_no_consent_count = len(guests) - gdpr_consent_count
-    
-    # Monthly guest registration
-    monthly_guest_counts = defaultdict(int)
-    for guest in guests:
-        month_key = guest.created_at.strftime('%Y-%m')
-        monthly_guest_counts[month_key] += 1
-    
-    # Trip breakdown for guests
-    trip_guest_counts = defaultdict(int)
-    for guest in guests:
-        trip_guest_counts[guest.registration.trip.title] += 1
+    filters = breakdown_filters()
+    (stats, guests), amenities = cached_page('guests', filters, lambda: (
+        guest_stats(current_user.id, **filters), recent_guests(current_user.id, **filters)
+    ))
     
-    stats = {
-        'total_guests': len(guests),
-        'adult_count': age_category_counts['adult'],
-        'child_count': age_category_counts['child'],
-        'gdpr_consent_count': gdpr_consent_count,
-        'gdpr_no_consent_count': gdpr_no_consent_count,
-        'age_category_breakdown': dict(age_category_counts),
-        'document_type_breakdown': dict(document_type_counts),
-        'monthly_guest_counts': dict(monthly_guest_counts),
-        'trip_guest_counts': dict(trip_guest_counts)
-    }
-    
-    return render_template('admin/guest_breakdown.html', stats=stats, guests=guests)
+    return render_template('admin/guest_breakdown.html', stats=stats, guests=guests,
+                           filters=filters, amenities=amenities)
 
 @breakdowns.route('/admin/breakdowns/trips')
 @login_required
 @role_required('admin')
 def trip_breakdown():
     """Trip statistics and breakdowns."""
-    # Get all trips for the current admin
-    trips = Trip.query.filter_by(admin_id=current_user.id).all()
-    
-    # Registration count per trip
-    trip_registration_counts = {}
-    trip_guest_counts = {}
-    trip_status_breakdowns = {}
-    
-    for trip in trips:
-        registrations = trip.registrations
-        trip_registration_counts[trip.title] = len(registrations)
-        
-        # Count guests per trip
-        guest_count = sum(len(reg.guests) for reg in registrations)
-        trip_guest_counts[trip.title] = guest_count
-        
-        # Status breakdown per trip
-        status_counts = defaultdict(int)
-        for reg in registrations:
-            status_counts[reg.status] += 1
-        trip_status_breakdowns[trip.title] = dict(status_counts)
-    
-    # Monthly trip creation
-    monthly_trip_counts = defaultdict(int)
-    for trip in trips:
-        month_key = trip.created_at.strftime('%Y-%m')
-        monthly_trip_counts[month_key] += 1
+    filters = breakdown_filters()
     
-    # External sync statistics
-    externally_synced_count = sum(1 for trip in trips if trip.is_externally_synced)
-    externally_not_synced_count = len(trips) - externally_synced_count
+    def compute():
+        # One row of columns per trip, with the denormalised counters
+        trips = trip_rows(current_user.id, **filters)
+        return trip_stats(current_user.id, trips, **filters), trips
     
-    # Duration statistics
-    trip_durations = []
-    for trip in trips:
-        duration = (trip.end_date - trip.start_date).days
-        trip_durations.append(duration)
+    (stats, trips), amenities = cached_page('trips', filters, compute)
     
-    avg_duration = sum(trip_durations) / len(trip_durations) if trip_durations else 0
-    
-    stats = {
-        'total_trips': len(trips),
-        'externally_synced_count': externally_synced_count,
-        'externally_not_synced_count': externally_not_synced_count,
-        'avg_duration_days': round(avg_duration, 1),
-        'trip_registration_counts': trip_registration_counts,
-        'trip_guest_counts': trip_guest_counts,
-        'trip_status_breakdowns': trip_status_breakdowns,
-        'monthly_trip_counts': dict(monthly_trip_counts)
-    }
-    
-    return render_template('admin/trip_breakdown.html', stats=stats, trips=trips)
+    return render_template('admin/trip_breakdown.html', stats=stats, trips=trips,
+                           filters=filters, amenities=amenities)
 
 @breakdowns.route('/admin/breakdowns/invoices')
 @login_required
 @role_required('admin')
 def invoice_breakdown():
     """Invoice statistics and breakdowns."""
-    # Get all invoices for the current admin
-    invoices = Invoice.query.filter_by(admin_id=current_user.id).all()
-    
-    # Status breakdown
-    status_counts = defaultdict(int)
-    for invoice in invoices:
-        status_counts[invoice.status] += 1
+    filters = breakdown_filters()
+    (stats, invoices), amenities = cached_page('invoices', filters, lambda: (
+        invoice_stats(current_user.id, **filters), recent_invoices(current_user.id, **filters)
+    ))
     
-    # Monthly invoice creation
-    monthly_invoice_counts = defaultdict(int)
-    for invoice in invoices:
-        month_key = invoice.created_at.strftime('%Y-%m')
-        monthly_invoice_counts[month_key] += 1
-    
-    # Amount statistics
-    total_amount = sum(float(invoice.total_amount) for invoice in invoices)
-    avg_amount = total_amount / len(invoices) if invoices else 0
-    
-    # Status-based amounts
-    status_amounts = defaultdict(float)
-    for invoice in invoices:
-        status_amounts[invoice.status] += float(invoice.total_amount)
-    
-    # Currency breakdown
-    currency_counts = defaultdict(int)
-    for invoice in invoices:
-        currency_counts[invoice.currency] += 1
-    
-    # Monthly revenue
-    monthly_revenue = defaultdict(float)
-    for invoice in invoices:
-        month_key = invoice.created_at.strftime('%Y-%m')
-        monthly_revenue[month_key] += float(invoice.total_amount)
-    
-    stats = {
-        'total_invoices': len(invoices),
-        'total_amount': total_amount,
-        'avg_amount': round(avg_amount, 2),
-        'status_counts': dict(status_counts),
-        'status_amounts': dict(status_amounts),
-        'currency_counts': dict(currency_counts),
-        'monthly_invoice_counts': dict(monthly_invoice_counts),
-        'monthly_revenue': dict(monthly_revenue)
+    return render_template('admin/invoice_breakdown.html', stats=stats, invoices=invoices,
+                           filters=filters, amenities=amenities)
+
+@breakdowns.route('/admin/breakdowns/occupancy')
+@login_required
+@role_required('admin')
+def occupancy_breakdown():
+    """Occupancy heatmap per amenity and month, with turnover days and double bookings."""
+    date_from, date_to = default_period()
+    filters = {
+        'date_from': request.args.get('date_from', date_from, type=date.fromisoformat),
+        'date_to': request.args.get('date_to', date_to, type=date.fromisoformat),
+        'amenity_id': request.args.get('amenity_id', type=int),
     }
-    
-    return render_template('admin/invoice_breakdown.html', stats=stats, invoices=invoices) 
\ No newline at end of file
+    try:
+        report = cached_breakdown(current_user.id, 'occupancy', filters,
+                                  lambda: occupancy_report(current_user.id, **filters))
+    except ValueError as e:
+        flash(str(e), 'error')
+        filters['date_from'], filters['date_to'] = date_from, date_to
+        report = cached_breakdown(current_user.id, 'occupancy', filters,
+                                  lambda: occupancy_report(current_user.id, **filters))
+    amenities = cached_breakdown(current_user.id, 'amenities', {}, lambda: amenity_options(current_user.id))
+    
+    return render_template('admin/occupancy_breakdown.html', report=report, filters=filters, amenities=amenities)
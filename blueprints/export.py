@@ -1,14 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-from flask_babel import gettext as _
+from flask_babel import gettext as _, get_locale
 from functools import wraps
-from datetime import datetime
-from io import StringIO, BytesIO
-import csv
+from datetime import date, datetime
 
 export = Blueprint('export', __name__)
 
-from database import db, User, Registration, Guest, Trip, Invoice
+from database import db, User, ExportJob
+from exports import (
+    EXPORTS, GUEST_COLUMNS, INVOICE_COLUMNS, REGISTRATION_COLUMNS, TRIP_COLUMNS,
+    guest_rows, invoice_rows, iter_csv, registration_rows, trip_rows
+)
+from export_jobs import EXPORT_FORMATS, create_export_job, download_name, export_file_path, export_job_progress
+from police_report import REPORT_COLUMNS, REPORT_FORMATS, iter_police_report, police_report_rows
 
 def role_required(role):
     def decorator(f):
@@ -24,241 +28,123 @@ def role_required(role):
         return decorated_function
     return decorator
 
+def date_filters(values):
+    """Optional ``date_from``/``date_to`` (YYYY-MM-DD) of a request's args or form"""
+    return {
+        'date_from': values.get('date_from', type=date.fromisoformat),
+        'date_to': values.get('date_to', type=date.fromisoformat),
+    }
+
+def csv_response(name, header, rows):
+    """Streamed CSV download; ``rows`` is consumed while the response is sent"""
+    return Response(
+        stream_with_context(iter_csv(header, rows)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'}
+    )
+
 @export.route('/admin/export/registrations')
 @login_required
 @role_required('admin')
 def export_registrations_csv():
     """Export registrations to CSV."""
-    # Get all registrations for the current admin
-    registrations = Registration.query.join(Trip).filter(Trip.admin_id == current_user.id).all()
-    
-    # Create CSV data
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        _('Registration ID'),
-        _('Trip Title'),
-        _('Email'),
-        _('Status'),
-        _('Language'),
-        _('Created Date'),
-        _('Updated Date'),
-        _('Guest Count'),
-        _('Admin Comment')
-    ])
-    
-    # Write data
-    for reg in registrations:
-        writer.writerow([
-            reg.id,
-            reg.trip.title,
-            reg.email,
-            reg.status,
-            reg.language,
-            reg.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            reg.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-            len(reg.guests),
-            reg.admin_comment or ''
-        ])
-    
-    # Convert to bytes and create BytesIO
-    csv_data = output.getvalue().encode('utf-8')
-    output.close()
-    
-    return send_file(
-        BytesIO(csv_data),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'registrations_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    )
+    header = [_(column) for column in REGISTRATION_COLUMNS]
+    return csv_response('registrations', header, registration_rows(current_user.id, **date_filters(request.args)))
 
 @export.route('/admin/export/guests')
 @login_required
 @role_required('admin')
 def export_guests_csv():
     """Export guests to CSV."""
-    # Get all guests for registrations belonging to the current admin
-    guests = Guest.query.join(Registration).join(Trip).filter(Trip.admin_id == current_user.id).all()
-    
-    # Create CSV data
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        _('Guest ID'),
-        _('Registration ID'),
-        _('Trip Title'),
-        _('First Name'),
-        _('Last Name'),
-        _('Age Category'),
-        _('Document Type'),
-        _('Document Number'),
-        _('GDPR Consent'),
-        _('Created Date')
-    ])
-    
-    # Write data
-    for guest in guests:
-        writer.writerow([
-            guest.id,
-            guest.registration_id,
-            guest.registration.trip.title,
-            guest.first_name,
-            guest.last_name,
-            guest.age_category,
-            guest.document_type,
-            guest.document_number,
-            'Yes' if guest.gdpr_consent else 'No',
-            guest.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    # Convert to bytes and create BytesIO
-    csv_data = output.getvalue().encode('utf-8')
-    output.close()
-    
-    return send_file(
-        BytesIO(csv_data),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'guests_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    )
+    header = [_(column) for column in GUEST_COLUMNS]
+    return csv_response('guests', header, guest_rows(current_user.id, **date_filters(request.args)))
 
 @export.route('/admin/export/trips')
 @login_required
 @role_required('admin')
 def export_trips_csv():
     """Export trips to CSV."""
-    # Get all trips for the current admin
-    trips = Trip.query.filter_by(admin_id=current_user.id).all()
-    
-    # Create CSV data
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        _('Trip ID'),
-        _('Title'),
-        _('Start Date'),
-        _('End Date'),
-        _('Max Guests'),
-        _('Created Date'),
-        _('Amenity'),
-        _('Calendar'),
-        _('Externally Synced'),
-        _('External Guest Name'),
-        _('External Guest Email'),
-        _('External Guest Count'),
-        _('External Confirmation Code'),
-        _('Registration Count'),
-        _('Pending Count'),
-        _('Approved Count'),
-        _('Rejected Count')
-    ])
-    
-    # Write data
-    for trip in trips:
-        registrations = trip.registrations
-        pending_count = len([r for r in registrations if r.status == 'pending'])
-        approved_count = len([r for r in registrations if r.status == 'approved'])
-        rejected_count = len([r for r in registrations if r.status == 'rejected'])
-        
-        writer.writerow([
-            trip.id,
-            trip.title,
-            trip.start_date.strftime('%Y-%m-%d'),
-            trip.end_date.strftime('%Y-%m-%d'),
-            trip.max_guests,
-            trip.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            trip.amenity.name if trip.amenity else '',
-            trip.calendar.name if trip.calendar else '',
-            'Yes' if trip.is_externally_synced else 'No',
-            trip.external_guest_name or '',
-            trip.external_guest_email or '',
-            trip.external_guest_count or '',
-            trip.external_confirm_code or '',
-            len(registrations),
-            pending_count,
-            approved_count,
-            rejected_count
-        ])
-    
-    # Convert to bytes and create BytesIO
-    csv_data = output.getvalue().encode('utf-8')
-    output.close()
-    
-    return send_file(
-        BytesIO(csv_data),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'trips_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    )
+    header = [_(column) for column in TRIP_COLUMNS]
+    return csv_response('trips', header, trip_rows(current_user.id, **date_filters(request.args)))
 
 @export.route('/admin/export/invoices')
 @login_required
 @role_required('admin')
 def export_invoices_csv():
     """Export invoices to CSV."""
-    # Get all invoices for the current admin
-    invoices = Invoice.query.filter_by(admin_id=current_user.id).all()
-    
-    # Create CSV data
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        _('Invoice ID'),
-        _('Invoice Number'),
-        _('Client Name'),
-        _('Client Email'),
-        _('Client VAT Number'),
-        _('Issue Date'),
-        _('Due Date'),
-        _('Subtotal'),
-        _('VAT Total'),
-        _('Total Amount'),
-        _('Currency'),
-        _('Status'),
-        _('Created Date'),
-        _('Updated Date'),
-        _('Registration ID'),
-        _('Trip Title')
-    ])
-    
-    # Write data
-    for invoice in invoices:
-        trip_title = invoice.registration.trip.title if invoice.registration else ''
-        writer.writerow([
-            invoice.id,
-            invoice.invoice_number,
-            invoice.client_name,
-            invoice.client_email or '',
-            invoice.client_vat_number or '',
-            invoice.issue_date.strftime('%Y-%m-%d'),
-            invoice.due_date.strftime('%Y-%m-%d') if invoice.due_date else '',
-            float(invoice.subtotal),
-            float(invoice.vat_total),
-            float(invoice.total_amount),
-            invoice.currency,
-            invoice.status,
-            invoice.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            invoice.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-            invoice.registration_id or '',
-            trip_title
-        ])
-    
-    output.seek(0)
-    # Convert to bytes and create BytesIO
-    csv_data = output.getvalue().encode('utf-8')
-    output.close()
-    
+    header = [_(column) for column in INVOICE_COLUMNS]
+    return csv_response('invoices', header, invoice_rows(current_user.id, **date_filters(request.args)))
+
+@export.route('/admin/export/police-report')
+@login_required
+@role_required('admin')
+def export_police_report():
+    """Export guests staying in a period for the police report and accommodation book."""
+    filters = date_filters(request.args)
+    date_from, date_to = filters['date_from'], filters['date_to']
+    report_format = request.args.get('format', 'csv')
+    if not date_from or not date_to or date_to < date_from or report_format not in REPORT_FORMATS:
+        flash(_('Choose the first and last night of the report period.'), 'error')
+        return redirect(url_for('breakdowns.admin_breakdowns'))
+    amenity_id = request.args.get('amenity_id', type=int)
+    rows = police_report_rows(current_user.id, date_from, date_to, [amenity_id] if amenity_id else None)
+    header = [_(column) for column in REPORT_COLUMNS]
+    extension, mimetype = REPORT_FORMATS[report_format]
+    return Response(
+        stream_with_context(iter_police_report(rows, report_format, header)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=police_report_{date_from}_{date_to}{extension}'}
+    )
+
+@export.route('/admin/exports')
+@login_required
+@role_required('admin')
+def export_jobs():
+    """Background exports of the current admin, newest first."""
+    jobs = ExportJob.query.filter_by(admin_id=current_user.id).order_by(ExportJob.id.desc()).limit(20).all()
+    return render_template('admin/export_jobs.html', jobs=jobs, kinds=list(EXPORTS), formats=list(EXPORT_FORMATS),
+                           progress={job.id: export_job_progress(job) for job in jobs})
+
+@export.route('/admin/exports', methods=['POST'])
+@login_required
+@role_required('admin')
+def request_export_job():
+    """Queue a background export."""
+    try:
+        create_export_job(
+            current_user.id,
+            request.form.get('kind'),
+            request.form.get('format', 'csv'),
+            locale=str(get_locale()),
+            **date_filters(request.form)
+        )
+    except ValueError:
+        flash(_('Unknown export type or format.'), 'error')
+        return redirect(url_for('export.export_jobs'))
+    db.session.commit()
+    flash(_('Export queued. It will be ready for download shortly.'), 'success')
+    return redirect(url_for('export.export_jobs'))
+
+@export.route('/admin/exports/<int:job_id>/progress')
+@login_required
+@role_required('admin')
+def export_job_status(job_id):
+    """Progress of one background export, polled by the exports page."""
+    job = ExportJob.query.filter_by(id=job_id, admin_id=current_user.id).first_or_404()
+    return jsonify(export_job_progress(job))
+
+@export.route('/admin/exports/download/<token>')
+@login_required
+@role_required('admin')
+def download_export_job(token):
+    """Download a finished background export by its token."""
+    job = ExportJob.query.filter_by(token=token, admin_id=current_user.id).first_or_404()
+    if job.status != 'done' or not job.file_name or job.expires_at < datetime.utcnow():
+        flash(_('This export is no longer available for download.'), 'warning')
+        return redirect(url_for('export.export_jobs'))
     return send_file(
-        BytesIO(csv_data),
-        mimetype='text/csv',
+        export_file_path(job),
+        mimetype=EXPORT_FORMATS[job.format][1],
         as_attachment=True,
-        download_name=f'invoices_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    ) 
\ No newline at end of file
+        download_name=download_name(job)
+    )
@@ -13,6 +13,7 @@ import zipfile
 health = Blueprint('health', __name__)
 
 from database import db, User, Trip, Registration, Guest, Invoice, Housekeeping
+from breakdown_cache import breakdown_cache_stats
 from version import version_manager
 from migrations import MigrationManager
 from sqlalchemy import text
@@ -256,6 +257,8 @@ def health_metrics():
                     'housekeeping': Housekeeping.query.count(),
                 }
             },
+            # Counters of this worker process only
+            'breakdown_cache': breakdown_cache_stats(),
             'system': {
                 'uptime': 'unknown',  # Could be enhanced with process start time
                 'memory_usage': 'unknown',  # Could be enhanced with psutil
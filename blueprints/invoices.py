@@ -1,19 +1,27 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-from flask_babel import gettext as _
-from flask_mail import Mail, Message
+from flask_babel import gettext as _, get_locale
 from functools import wraps
-from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import date, datetime
 from decimal import Decimal
 from io import BytesIO
-import tempfile
 import os
 
 invoices = Blueprint('invoices', __name__)
 
-from database import db, User, Invoice, InvoiceItem, Registration, Trip
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
+from sqlalchemy.orm import selectinload
+from database import (
+    db, User, Invoice, InvoiceItem, Registration, Trip,
+    INVOICE_SORTS, allocate_invoice_numbers, calculate_invoice_item_amounts, get_invoice_totals,
+    get_invoices_page, recalculate_invoice_totals as recalculate_totals, to_decimal
+)
+from outbox import enqueue_message
+from email_templates import build_email, translate
+from pdf_cache import cached_invoice_pdf, invalidate_invoice_pdf, template_hash
+from invoice_archive import stream_invoice_archive
+from invoice_batch import create_batch_invoices, plan_batch_invoices, plan_totals
+from pdf_service import INVOICE_PDF_CSS, INVOICE_PDF_TEMPLATE, PDFRenderBusy, render_invoice_pdf
 
 def role_required(role):
     def decorator(f):
@@ -29,13 +37,53 @@ def role_required(role):
         return decorated_function
     return decorator
 
+def invoice_pdf_path(invoice):
+    """Path of the invoice PDF in the render cache, rendering it only on a miss."""
+    return cached_invoice_pdf(
+        invoice,
+        lambda: render_invoice_pdf(invoice),
+        locale=str(get_locale()),
+        template_digest=template_hash(INVOICE_PDF_TEMPLATE, INVOICE_PDF_CSS)
+    )
+
+def pdf_busy_response():
+    """503 asking the browser to retry once the render service has room"""
+    return Response(
+        _('PDF generation is busy right now, please try again in a moment.'),
+        status=503,
+        mimetype='text/plain',
+        headers={'Retry-After': str(current_app.config.get('PDF_RENDER_RETRY_AFTER_SECONDS', 5))}
+    )
+
 @invoices.route('/admin/invoices')
 @login_required
 @role_required('admin')
 def admin_invoices():
     """Admin invoices list page."""
-    invoices_list = Invoice.query.filter_by(admin_id=current_user.id).order_by(Invoice.created_at.desc()).all()
-    return render_template('admin/invoices.html', invoices=invoices_list)
+    status = request.args.get('status')
+    filters = {
+        'status': status if status in ['draft', 'sent', 'paid', 'overdue'] else None,
+        'date_from': request.args.get('date_from', type=date.fromisoformat),
+        'date_to': request.args.get('date_to', type=date.fromisoformat),
+        'currency': (request.args.get('currency') or '').strip().upper() or None,
+        'client': (request.args.get('client') or '').strip() or None,
+        'sort': request.args.get('sort') if request.args.get('sort') in INVOICE_SORTS else 'created',
+        'direction': 'asc' if request.args.get('direction') == 'asc' else 'desc',
+    }
+    after = request.args.get('after')
+    
+    invoices_list, next_cursor = get_invoices_page(current_user.id, after=after, **filters)
+    page_totals = get_invoice_totals(invoice.id for invoice in invoices_list)
+    currencies = [row[0] for row in db.session.execute(
+        db.select(Invoice.currency).where(Invoice.admin_id == current_user.id).distinct().order_by(Invoice.currency)
+    ) if row[0]]
+    
+    filters['date_from'] = filters['date_from'].isoformat() if filters['date_from'] else None
+    filters['date_to'] = filters['date_to'].isoformat() if filters['date_to'] else None
+    filter_args = {key: value for key, value in filters.items() if value}
+    return render_template('admin/invoices.html', invoices=invoices_list, page_totals=page_totals,
+                           currencies=currencies, filters=filters, filter_args=filter_args,
+                           next_cursor=next_cursor, is_first_page=not after)
 
 @invoices.route('/admin/invoices/new', methods=['GET', 'POST'])
 @login_required
@@ -43,12 +91,9 @@ def admin_invoices():
 def new_invoice():
     """Create a new invoice."""
     if request.method == 'POST':
-        # Generate invoice number
-        invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{Invoice.query.filter_by(admin_id=current_user.id).count() + 1:03d}"
-        
         # Create invoice
         invoice = Invoice(
-            invoice_number=invoice_number,
+            invoice_number=allocate_invoice_numbers()[0],
             admin_id=current_user.id,
             registration_id=request.form.get('registration_id'),
             client_name=request.form.get('client_name'),
@@ -68,14 +113,12 @@ def new_invoice():
         item_count = int(request.form.get('item_count', 0))
         for i in range(item_count):
             description = request.form.get(f'item_description_{i}')
-            quantity = float(request.form.get(f'item_quantity_{i}', 1))
-            unit_price = float(request.form.get(f'item_unit_price_{i}', 0))
-            vat_rate = float(request.form.get(f'item_vat_rate_{i}', 0))
+            quantity = to_decimal(request.form.get(f'item_quantity_{i}'), '1')
+            unit_price = to_decimal(request.form.get(f'item_unit_price_{i}'))
+            vat_rate = to_decimal(request.form.get(f'item_vat_rate_{i}'))
             
             if description and unit_price > 0:
-                line_total = quantity * unit_price
-                vat_amount = line_total * (vat_rate / 100)
-                total_with_vat = line_total + vat_amount
+                line_total, vat_amount, total_with_vat = calculate_invoice_item_amounts(quantity, unit_price, vat_rate)
                 
                 item = InvoiceItem(
                     invoice_id=invoice.id,
@@ -89,13 +132,9 @@ def new_invoice():
                 )
                 db.session.add(item)
         
-        # Commit items first to ensure they are in the database
-        db.session.commit()
-        
-        # Now calculate totals from the committed items
-        invoice.subtotal = sum(item.line_total for item in invoice.items)
-        invoice.vat_total = sum(item.vat_amount for item in invoice.items)
-        invoice.total_amount = invoice.subtotal + invoice.vat_total
+        # Totals come from the items in SQL, in the same transaction
+        db.session.flush()
+        recalculate_totals([invoice.id], current_user.id)
         
         db.session.commit()
         flash(_('Invoice created successfully!'), 'success')
@@ -104,6 +143,33 @@ def new_invoice():
     today = datetime.now().strftime('%Y-%m-%d')
     return render_template('admin/new_invoice.html', today=today)
 
+@invoices.route('/admin/invoices/batch', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def batch_invoices():
+    """Preview and create invoices for all approved stays arriving in a period."""
+    today = date.today()
+    date_from = request.values.get('date_from', type=date.fromisoformat) or today.replace(day=1)
+    date_to = request.values.get('date_to', type=date.fromisoformat) or today
+    issue_date = request.values.get('issue_date', type=date.fromisoformat) or today
+    
+    plan = plan_batch_invoices(current_user.id, date_from, date_to)
+    if request.method == 'POST':
+        summary = create_batch_invoices(plan, current_user.id, issue_date)
+        db.session.commit()
+        for invoice_id in summary['repriced']:
+            invalidate_invoice_pdf(invoice_id)
+        
+        count = len(summary['created']) + len(summary['repriced'])
+        if count:
+            flash(_('%(count)d invoices created.', count=count), 'success')
+        else:
+            flash(_('No approved stays to invoice in this period.'), 'warning')
+        return redirect(url_for('invoices.admin_invoices', status='draft'))
+    
+    return render_template('admin/batch_invoices.html', plan=plan, totals=plan_totals(plan),
+                           date_from=date_from, date_to=date_to, issue_date=issue_date)
+
 @invoices.route('/admin/invoices/<int:invoice_id>')
 @login_required
 @role_required('admin')
@@ -137,14 +203,12 @@ def edit_invoice(invoice_id):
         item_count = int(request.form.get('item_count', 0))
         for i in range(item_count):
             description = request.form.get(f'item_description_{i}')
-            quantity = float(request.form.get(f'item_quantity_{i}', 1))
-            unit_price = float(request.form.get(f'item_unit_price_{i}', 0))
-            vat_rate = float(request.form.get(f'item_vat_rate_{i}', 0))
+            quantity = to_decimal(request.form.get(f'item_quantity_{i}'), '1')
+            unit_price = to_decimal(request.form.get(f'item_unit_price_{i}'))
+            vat_rate = to_decimal(request.form.get(f'item_vat_rate_{i}'))
             
             if description and unit_price > 0:
-                line_total = quantity * unit_price
-                vat_amount = line_total * (vat_rate / 100)
-                total_with_vat = line_total + vat_amount
+                line_total, vat_amount, total_with_vat = calculate_invoice_item_amounts(quantity, unit_price, vat_rate)
                 
                 item = InvoiceItem(
                     invoice_id=invoice.id,
@@ -158,15 +222,12 @@ def edit_invoice(invoice_id):
                 )
                 db.session.add(item)
         
-        # Commit items first to ensure they are in the database
-        db.session.commit()
-        
-        # Recalculate totals from the committed items
-        invoice.subtotal = sum(item.line_total for item in invoice.items)
-        invoice.vat_total = sum(item.vat_amount for item in invoice.items)
-        invoice.total_amount = invoice.subtotal + invoice.vat_total
+        # Totals come from the items in SQL, in the same transaction
+        db.session.flush()
+        recalculate_totals([invoice.id], current_user.id)
         
         db.session.commit()
+        invalidate_invoice_pdf(invoice.id)
         flash(_('Invoice updated successfully!'), 'success')
         return redirect(url_for('invoices.view_invoice', invoice_id=invoice.id))
     
@@ -189,6 +250,7 @@ def delete_invoice(invoice_id):
     invoice = Invoice.query.filter_by(id=invoice_id, admin_id=current_user.id).first_or_404()
     db.session.delete(invoice)
     db.session.commit()
+    invalidate_invoice_pdf(invoice_id)
     flash(_('Invoice deleted successfully!'), 'success')
     return redirect(url_for('invoices.admin_invoices'))
 
@@ -204,6 +266,7 @@ def change_invoice_status(invoice_id):
         invoice.status = new_status
         invoice.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_invoice_pdf(invoice.id)
         
         flash(_('Invoice status changed from %(old_status)s to %(new_status)s successfully!', old_status=old_status.title(), new_status=new_status.title()), 'success')
     else:
@@ -217,102 +280,53 @@ def generate_invoice_pdf(invoice_id):
     """Generate PDF for an invoice."""
     invoice = Invoice.query.filter_by(id=invoice_id, admin_id=current_user.id).first_or_404()
     
-    # Generate HTML content for the invoice
-    html_content = render_template('admin/invoice_pdf.html', invoice=invoice)
+    try:
+        path = invoice_pdf_path(invoice)
+    except (PDFRenderBusy, FutureTimeoutError):
+        return pdf_busy_response()
     
-    # Create PDF
-    font_config = FontConfiguration()
-    css = CSS(string='''
-        @page { 
-            size: A4; 
-            margin: 1.5cm;
-        }
-        body { 
-            font-family: Arial, sans-serif; 
-            font-size: 10px;
-            line-height: 1.2;
-        }
-        .header { 
-            text-align: center; 
-            margin-bottom: 20px;
-            border-bottom: 2px solid #333;
-            padding-bottom: 15px;
-        }
-        .invoice-details {
-            margin-top: 10px;
-            font-size: 9px;
-            color: #666;
-        }
-        .invoice-details span {
-            margin: 0 15px;
-        }
-        .row {
-            display: flex;
-            justify-content: space-between;
-            margin-bottom: 20px;
-        }
-        .company-info {
-            text-align: left;
-            width: 48%;
-        }
-        .client-info {
-            text-align: right;
-            width: 48%;
-        }
-        .invoice-table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-bottom: 20px;
-        }
-        .invoice-table th,
-        .invoice-table td {
-            border: 1px solid #ddd;
-            padding: 6px;
-            text-align: left;
-            font-size: 9px;
-        }
-        .invoice-table th {
-            background-color: #f8f9fa;
-            font-weight: bold;
-        }
-        .text-right { text-align: right; }
-        .text-center { text-align: center; }
-        .total-row {
-            font-weight: bold;
-            background-color: #f8f9fa;
-        }
-        .notes {
-            margin-top: 20px;
-            padding: 10px;
-            background-color: #f8f9fa;
-            border-left: 4px solid #007bff;
-            font-size: 9px;
-        }
-    ''', font_config=font_config)
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=f'invoice_{invoice.invoice_number}.pdf',
+        mimetype='application/pdf',
+        etag=os.path.basename(path),
+        conditional=True
+    )
+
+@invoices.route('/admin/invoices/export-pdfs')
+@login_required
+@role_required('admin')
+def export_invoice_pdfs():
+    """Download the PDFs of all invoices in a period as one streamed ZIP with a CSV index."""
+    date_from = request.args.get('date_from', type=date.fromisoformat)
+    date_to = request.args.get('date_to', type=date.fromisoformat)
+    statuses = [status for status in request.args.getlist('status') if status in ['draft', 'sent', 'paid', 'overdue']]
     
-    # Generate PDF
-    html_doc = HTML(string=html_content)
-    pdf = html_doc.write_pdf(stylesheets=[css], font_config=font_config)
+    query = Invoice.query.filter_by(admin_id=current_user.id).options(selectinload(Invoice.items))
+    if date_from:
+        query = query.filter(Invoice.issue_date >= date_from)
+    if date_to:
+        query = query.filter(Invoice.issue_date <= date_to)
+    if statuses:
+        query = query.filter(Invoice.status.in_(statuses))
+    invoices_list = query.order_by(Invoice.issue_date, Invoice.id).all()
     
-    # Create temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        tmp_file.write(pdf)
-        tmp_path = tmp_file.name
+    if not invoices_list:
+        flash(_('No invoices match the selected filters.'), 'warning')
+        return redirect(url_for('invoices.admin_invoices'))
     
-    # Send file and clean up
-    try:
-        return send_file(
-            tmp_path,
-            as_attachment=True,
-            download_name=f'invoice_{invoice.invoice_number}.pdf',
-            mimetype='application/pdf'
-        )
-    finally:
-        # Clean up temporary file after sending
-        try:
-            os.unlink(tmp_path)
-        except:
-            pass
+    archive = stream_invoice_archive(
+        invoices_list,
+        locale=str(get_locale()),
+        template_digest=template_hash(INVOICE_PDF_TEMPLATE, INVOICE_PDF_CSS)
+    )
+    filename = f"invoices_{date_from or 'all'}_{date_to or 'all'}.zip"
+    return Response(
+        stream_with_context(archive),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @invoices.route('/admin/invoices/<int:invoice_id>/recalculate', methods=['POST'])
 @login_required
@@ -321,11 +335,10 @@ def recalculate_invoice_totals(invoice_id):
     invoice = Invoice.query.filter_by(id=invoice_id, admin_id=current_user.id).first_or_404()
     
     # Recalculate totals from the items
-    invoice.subtotal = sum(item.line_total for item in invoice.items)
-    invoice.vat_total = sum(item.vat_amount for item in invoice.items)
-    invoice.total_amount = invoice.subtotal + invoice.vat_total
+    recalculate_totals([invoice.id], current_user.id)
     
     db.session.commit()
+    invalidate_invoice_pdf(invoice.id)
     flash(_('Invoice totals recalculated successfully!'), 'success')
     return redirect(url_for('invoices.view_invoice', invoice_id=invoice.id))
 
@@ -342,72 +355,35 @@ def send_invoice_pdf(invoice_id):
         flash(_('No recipient email found for this invoice.'), 'error')
         return redirect(url_for('invoices.view_invoice', invoice_id=invoice.id))
     
-    # Set language based on registration
-    if invoice.registration and invoice.registration.language:
-        # Temporarily set the language for this request
-        from flask_babel import get_locale
-        original_locale = get_locale()
-        from flask import session
-        session['lang'] = invoice.registration.language
+    # Email language follows the registration; the PDF keeps the admin's UI language
+    language = invoice.registration.language if invoice.registration else None
     
-    # Generate HTML content for the invoice
-    html_content = render_template('admin/invoice_pdf.html', invoice=invoice)
-    font_config = FontConfiguration()
-    css = CSS(string='''
-        @page { size: A4; margin: 1.5cm; }
-        body { font-family: Arial, sans-serif; font-size: 10px; line-height: 1.2; }
-        .header { text-align: center; margin-bottom: 20px; border-bottom: 2px solid #333; padding-bottom: 15px; }
-        .invoice-details { margin-top: 10px; font-size: 9px; color: #666; }
-        .invoice-details span { margin: 0 15px; }
-        .row { display: flex; justify-content: space-between; margin-bottom: 20px; }
-        .company-info { text-align: left; width: 48%; }
-        .client-info { text-align: right; width: 48%; }
-        .invoice-table { width: 100%; border-collapse: collapse; margin-bottom: 20px; }
-        .invoice-table th, .invoice-table td { border: 1px solid #ddd; padding: 6px; text-align: left; font-size: 9px; }
-        .invoice-table th { background-color: #f8f9fa; font-weight: bold; }
-        .text-right { text-align: right; }
-        .text-center { text-align: center; }
-        .total-row { font-weight: bold; background-color: #f8f9fa; }
-        .notes { margin-top: 20px; padding: 10px; background-color: #f8f9fa; border-left: 4px solid #007bff; font-size: 9px; }
-    ''', font_config=font_config)
-    html_doc = HTML(string=html_content)
-    pdf_bytes = html_doc.write_pdf(stylesheets=[css], font_config=font_config)
+    # Reuse the cached PDF if the invoice has been rendered already
+    try:
+        with open(invoice_pdf_path(invoice), 'rb') as pdf_file:
+            pdf_bytes = pdf_file.read()
+    except (PDFRenderBusy, FutureTimeoutError):
+        return pdf_busy_response()
     
-    # Send email with PDF attachment
+    # Queue email with PDF attachment; the outbox worker delivers it
     try:
-        msg = Message(
-            subject=_('Your Invoice from %(company)s', company=invoice.admin.company_name or _('Our Company')),
-            sender=current_app.config['MAIL_USERNAME'],
-            recipients=[recipient]
-        )
-        msg.body = _(
-            """Dear %(client_name)s,
-
-Please find attached your invoice %(invoice_number)s.
-
-Thank you for your business!
-
-Best regards,
-%(company)s""",
+        msg = build_email(
+            'invoice', language, [recipient],
             client_name=invoice.client_name,
             invoice_number=invoice.invoice_number,
-            company=invoice.admin.company_name or _('Our Company')
+            company=invoice.admin.company_name or translate('Our Company', language)
         )
         msg.attach(
             filename=f"invoice_{invoice.invoice_number}.pdf",
             content_type="application/pdf",
             data=pdf_bytes
         )
-        mail = Mail(current_app)
-        mail.send(msg)
-        flash(_('Invoice PDF sent to %(email)s', email=recipient), 'success')
+        enqueue_message(msg, kind='invoice')
+        db.session.commit()
+        flash(_('Invoice PDF queued for sending to %(email)s', email=recipient), 'success')
     except Exception as e:
-        print(f"Error sending invoice PDF: {e}")
-        flash(_('Failed to send invoice PDF: %(error)s', error=str(e)), 'error')
-    finally:
-        # Restore original language if it was changed
-        if invoice.registration and invoice.registration.language:
-            from flask import session
-            session['lang'] = original_locale.language if original_locale else 'en'
+        db.session.rollback()
+        print(f"Error queueing invoice PDF: {e}")
+        flash(_('Failed to queue invoice PDF: %(error)s', error=str(e)), 'error')
     
     return redirect(url_for('invoices.view_invoice', invoice_id=invoice.id)) 
\ No newline at end of file
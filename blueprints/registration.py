@@ -9,7 +9,7 @@ from utils import get_server_url
 registration = Blueprint('registration', __name__)
 
 # Import database models from database.py
-from database import db, User, Trip, Registration, Guest, Invoice, InvoiceItem
+from database import db, User, Trip, Registration, Guest, Invoice, InvoiceItem, adjust_trip_counters, allocate_invoice_numbers
 
 @registration.route('/register')
 def register_landing():
@@ -180,10 +180,18 @@ def submit_for_approval():
         )
         db.session.add(guest)
     
+    # Keep the trip's denormalised counters in the same transaction
+    adjust_trip_counters(
+        trip.id,
+        trip.admin_id,
+        registration_count=1,
+        pending_count=1,
+        guest_count=len(data['guests'])
+    )
+    
     # Create draft invoice if requested
     if data.get('invoice_request') and data.get('invoice_data'):
-        # Generate invoice number
-        invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{Invoice.query.filter_by(admin_id=trip.admin_id).count() + 1:03d}"
+        invoice_number = allocate_invoice_numbers()[0]
         
         # Determine client name
         client_name = data['invoice_data']['client_name'] if data['invoice_data']['client_name'] else f"{data['guests'][0]['first_name']} {data['guests'][0]['last_name']}"
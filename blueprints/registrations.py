@@ -2,12 +2,16 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from flask_babel import gettext as _
 from functools import wraps
-from datetime import datetime
-import os
+from datetime import date, datetime
+from sqlalchemy.orm import joinedload
 
 registrations = Blueprint('registrations', __name__)
 
-from database import db, User, Registration, Trip
+from database import (
+    db, User, Registration, Trip, record_registration_status_change, bulk_update_registration_status,
+    get_pending_registrations_page
+)
+from gdpr import enqueue_registration_documents
 
 def role_required(role):
     def decorator(f):
@@ -27,8 +31,24 @@ def role_required(role):
 @login_required
 @role_required('admin')
 def admin_registrations():
-    registrations_list = Registration.query.filter_by(status='pending').all()
-    return render_template('admin/registrations.html', registrations=registrations_list)
+    trip_id = request.args.get('trip_id', type=int)
+    date_from = request.args.get('date_from', type=date.fromisoformat)
+    date_to = request.args.get('date_to', type=date.fromisoformat)
+    after = request.args.get('after')
+    
+    page, next_cursor = get_pending_registrations_page(
+        current_user.id, trip_id=trip_id, date_from=date_from, date_to=date_to, after=after
+    )
+    trips_list = Trip.query.filter_by(admin_id=current_user.id).order_by(Trip.start_date.desc()).all()
+    filters = {
+        'trip_id': trip_id,
+        'date_from': date_from.isoformat() if date_from else None,
+        'date_to': date_to.isoformat() if date_to else None,
+    }
+    filter_args = {key: value for key, value in filters.items() if value}
+    return render_template('admin/registrations.html', registrations=page, trips=trips_list,
+                           filters=filters, filter_args=filter_args,
+                           next_cursor=next_cursor, is_first_page=not after)
 
 @registrations.route('/admin/registration/<int:registration_id>')
 @login_required
@@ -42,26 +62,19 @@ def view_registration(registration_id):
 @role_required('admin')
 def approve_registration(registration_id):
     registration = Registration.query.get_or_404(registration_id)
+    record_registration_status_change(registration.trip_id, registration.status, 'approved', registration.trip.admin_id)
     registration.status = 'approved'
     registration.updated_at = datetime.utcnow()
     
-    # Delete document images after approval (GDPR compliance)
-    for guest in registration.guests:
-        if guest.document_image:
-            try:
-                os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], guest.document_image))
-                guest.document_image = None
-            except:
-                pass  # File might already be deleted
+    # Queue document images for deletion (GDPR compliance); the sweeper removes the files
+    enqueue_registration_documents([registration.id])
     
-    db.session.commit()
+    # Queue approval email; the outbox worker delivers it after commit
+    from email_utils import queue_approval_email
+    queue_approval_email(registration)
     
-    # Send approval email
-    from email_utils import send_approval_email
-    if send_approval_email(registration):
-        flash(_('Registration approved and email sent to user'), 'success')
-    else:
-        flash(_('Registration approved but email failed to send'), 'warning')
+    db.session.commit()
+    flash(_('Registration approved and email queued for the user'), 'success')
     return redirect(url_for('registrations.admin_registrations'))
 
 @registrations.route('/admin/registration/<int:registration_id>/reject', methods=['POST'])
@@ -69,16 +82,71 @@ def approve_registration(registration_id):
 @role_required('admin')
 def reject_registration(registration_id):
     registration = Registration.query.get_or_404(registration_id)
+    record_registration_status_change(registration.trip_id, registration.status, 'rejected', registration.trip.admin_id)
     registration.status = 'rejected'
     registration.admin_comment = request.form.get('comment')
     registration.updated_at = datetime.utcnow()
     
+    # Queue rejection email; the outbox worker delivers it after commit
+    from email_utils import queue_rejection_email
+    queue_rejection_email(registration)
+    
     db.session.commit()
+    flash(_('Registration rejected and email queued for the user'), 'success')
+    return redirect(url_for('registrations.admin_registrations'))
+
+@registrations.route('/admin/registrations/bulk', methods=['POST'])
+@login_required
+@role_required('admin')
+def bulk_update_registrations():
+    statuses = {'approve': 'approved', 'reject': 'rejected'}
+    status = statuses.get(request.form.get('action'))
+    if not status:
+        flash(_('Invalid bulk action'), 'error')
+        return redirect(url_for('registrations.admin_registrations'))
+    
+    try:
+        registration_ids = {int(value) for value in request.form.getlist('registration_ids')}
+    except ValueError:
+        flash(_('Invalid registration selection'), 'error')
+        return redirect(url_for('registrations.admin_registrations'))
+    if not registration_ids:
+        flash(_('No registrations selected'), 'warning')
+        return redirect(url_for('registrations.admin_registrations'))
+    
+    comment = request.form.get('comment', '').strip()
+    if status == 'rejected' and not comment:
+        flash(_('A rejection reason is required'), 'error')
+        return redirect(url_for('registrations.admin_registrations'))
+    
+    changed_ids = bulk_update_registration_status(
+        registration_ids, status, current_user.id, admin_comment=comment if status == 'rejected' else None
+    )
+    if not changed_ids:
+        db.session.rollback()
+        flash(_('No registrations were updated'), 'warning')
+        return redirect(url_for('registrations.admin_registrations'))
+    if status == 'approved':
+        # Queue document images for deletion (GDPR compliance)
+        enqueue_registration_documents(changed_ids)
     
-    # Send rejection email
-    from email_utils import send_rejection_email
-    if send_rejection_email(registration):
-        flash(_('Registration rejected and email sent to user'), 'success')
+    # Queue every notification in the same transaction; the outbox worker
+    # delivers them over one SMTP connection
+    from email_utils import queue_approval_email, queue_rejection_email
+    queue_email = queue_approval_email if status == 'approved' else queue_rejection_email
+    changed = (
+        Registration.query
+        .options(joinedload(Registration.trip))
+        .filter(Registration.id.in_(changed_ids))
+        .execution_options(populate_existing=True)
+        .all()
+    )
+    for registration in changed:
+        queue_email(registration)
+    db.session.commit()
+    
+    if status == 'approved':
+        flash(_('%(count)s registrations approved; notification emails queued', count=len(changed_ids)), 'success')
     else:
-        flash(_('Registration rejected but email failed to send'), 'warning')
-    return redirect(url_for('registrations.admin_registrations')) 
\ No newline at end of file
+        flash(_('%(count)s registrations rejected; notification emails queued', count=len(changed_ids)), 'success')
+    return redirect(url_for('registrations.admin_registrations'))
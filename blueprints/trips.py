@@ -8,7 +8,8 @@ from utils import get_server_url
 trips = Blueprint('trips', __name__)
 
 # Import database models from database.py
-from database import db, User, Trip, Amenity, Registration, Guest
+from database import db, User, Trip, Amenity, Registration, Guest, bulk_options, rebuild_trip_counters
+from analytics_rollup import mark_trip_days
 
 def role_required(role):
     def decorator(f):
@@ -157,10 +158,13 @@ def delete_trip_registrations(trip_id):
     registrations = Registration.query.filter_by(trip_id=trip_id).all()
     reg_ids = [reg.id for reg in registrations]
 
+    # Bulk deletes are invisible to the rollup refresh, so mark their days first
+    mark_trip_days([trip_id])
     # Delete all guests for these registrations
-    Guest.query.filter(Guest.registration_id.in_(reg_ids)).delete(synchronize_session=False)
+    Guest.query.filter(Guest.registration_id.in_(reg_ids)).execution_options(**bulk_options(trip.admin_id)).delete(synchronize_session=False)
     # Delete all registrations
-    Registration.query.filter(Registration.id.in_(reg_ids)).delete(synchronize_session=False)
+    Registration.query.filter(Registration.id.in_(reg_ids)).execution_options(**bulk_options(trip.admin_id)).delete(synchronize_session=False)
+    rebuild_trip_counters([trip_id], trip.admin_id)
     db.session.commit()
 
     flash(_('All registrations for this trip have been deleted.'), 'success')
@@ -0,0 +1,263 @@
+"""
+Breakdown result cache
+
+The breakdowns pages and the occupancy report only change when a
+registration, guest, trip, invoice or amenity of the admin changes, yet they
+are reloaded many times a day. Their results are kept in a per-process LRU,
+keyed by admin, breakdown type and filters, and recomputed only after a write
+or once ``BREAKDOWN_CACHE_TTL_SECONDS`` have passed.
+
+Writes are noticed by SQLAlchemy session hooks: a flush records the admins
+whose tracked rows were added, changed or deleted, and ``after_commit``
+invalidates their entries (a rolled back transaction invalidates nothing).
+Bulk INSERT/UPDATE/DELETE statements on the tracked tables run through the
+session name the admins they touch in the ``admin_ids`` execution option
+(see ``database.bulk_options``); untagged ones invalidate everyone.
+
+Each admin has a generation token that is part of every entry; invalidating
+replaces the token. With ``BREAKDOWN_CACHE_FOLDER`` set, the tokens and the
+results (pickled) are also kept in that folder, so gunicorn workers on the
+host share results and see each other's invalidations; the folder must only
+be writable by the application. Without it, other workers can serve a result
+for up to ``BREAKDOWN_CACHE_TTL_SECONDS`` after a write they did not make,
+which also bounds writes made outside the session (raw SQL, other hosts).
+"""
+
+import glob
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database import Amenity, Guest, Invoice, Registration, Trip
+
+TRACKED_MODELS = (Registration, Guest, Trip, Invoice, Amenity)
+TRACKED_TABLES = frozenset(model.__table__.name for model in TRACKED_MODELS)
+ALL_ADMINS = 'all'
+
+class BreakdownCache:
+    """LRU of breakdown results with generation-checked entries and an optional shared folder"""
+
+    def __init__(self, max_entries=256, ttl=300, folder=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.folder = folder or None
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def _generation_path(self, admin_id):
+        return os.path.join(self.folder, f'generation_{admin_id}')
+
+    def _entry_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.folder, f'breakdown_{key[0]}_{digest}.pickle')
+
+    def _write(self, path, data):
+        """Replace ``path`` atomically, so readers never see a partial file"""
+        handle, temporary = tempfile.mkstemp(dir=self.folder, prefix='.tmp_')
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temporary, path)
+        except Exception:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def generation(self, admin_id):
+        """Current (everyone's, the admin's) generation tokens"""
+        if self.folder:
+            tokens = []
+            for owner in (ALL_ADMINS, admin_id):
+                try:
+                    with open(self._generation_path(owner), encoding='utf-8') as generation_file:
+                        tokens.append(generation_file.read())
+                except FileNotFoundError:
+                    tokens.append('')
+            return tuple(tokens)
+        with self.lock:
+            return self.generations.get(ALL_ADMINS, 0), self.generations.get(admin_id, 0)
+
+    def get(self, key, generation):
+        """``(True, value)`` for a current entry, ``(False, None)`` otherwise"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == generation and now - entry[1] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[2]
+        if self.folder:
+            try:
+                with open(self._entry_path(key), 'rb') as entry_file:
+                    stored_key, entry = pickle.load(entry_file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                stored_key, entry = None, None
+            if stored_key == key and entry[0] == generation and now - entry[1] < self.ttl:
+                with self.lock:
+                    self._remember(key, entry)
+                    self.shared_hits += 1
+                return True, entry[2]
+        with self.lock:
+            self.misses += 1
+        return False, None
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def put(self, key, generation, value):
+        entry = (generation, time.time(), value)
+        with self.lock:
+            self._remember(key, entry)
+        if self.folder:
+            self._write(self._entry_path(key), pickle.dumps((key, entry), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def invalidate(self, admin_ids):
+        """Drop the entries of the given admins (``ALL_ADMINS`` for everyone)"""
+        admin_ids = set(admin_ids)
+        with self.lock:
+            for key in [key for key in self.entries if ALL_ADMINS in admin_ids or key[0] in admin_ids]:
+                del self.entries[key]
+            for admin_id in admin_ids:
+                self.generations[admin_id] = self.generations.get(admin_id, 0) + 1
+            self.invalidations += len(admin_ids)
+        if self.folder:
+            for admin_id in admin_ids:
+                self._write(self._generation_path(admin_id), uuid.uuid4().hex.encode('utf-8'))
+                pattern = '*' if admin_id == ALL_ADMINS else str(admin_id)
+                for path in glob.glob(os.path.join(self.folder, f'breakdown_{pattern}_*.pickle')):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'shared': bool(self.folder),
+            }
+
+_cache_lock = threading.Lock()
+
+def get_breakdown_cache():
+    """The app's cache in this process, created on first use from its config (None when disabled)"""
+    if not current_app.config.get('BREAKDOWN_CACHE_SIZE', 256):
+        return None
+    with _cache_lock:
+        cache = current_app.extensions.get('breakdown_cache')
+        if cache is None:
+            cache = current_app.extensions['breakdown_cache'] = BreakdownCache(
+                current_app.config.get('BREAKDOWN_CACHE_SIZE', 256),
+                current_app.config.get('BREAKDOWN_CACHE_TTL_SECONDS', 300),
+                current_app.config.get('BREAKDOWN_CACHE_FOLDER')
+            )
+        return cache
+
+def cached_breakdown(admin_id, breakdown, filters, compute):
+    """The result of ``compute()`` for the admin's breakdown and filters, from the cache when current"""
+    cache = get_breakdown_cache()
+    if cache is None:
+        return compute()
+    key = (admin_id, breakdown, tuple(sorted((filters or {}).items())))
+    generation = cache.generation(admin_id)
+    found, value = cache.get(key, generation)
+    if not found:
+        value = compute()
+        cache.put(key, generation, value)
+    return value
+
+def breakdown_cache_stats():
+    """Hit/miss counters of this process's cache"""
+    cache = get_breakdown_cache()
+    return cache.stats() if cache is not None else {'enabled': False}
+
+def _owner(instance):
+    """``(kind, id)`` telling whose a tracked row is: its admin, or the trip or registration to look up"""
+    if isinstance(instance, (Trip, Invoice, Amenity)):
+        return 'admin', instance.admin_id
+    if isinstance(instance, Guest):
+        # A new guest may only be linked to its (new) registration object so far
+        registration = instance.__dict__.get('registration')
+        if registration is None:
+            return 'registration', instance.registration_id
+        instance = registration
+    trip = instance.__dict__.get('trip')
+    if trip is not None:
+        return 'admin', trip.admin_id
+    return 'trip', instance.trip_id
+
+def _changed_admins(session, owners):
+    """Admins of the owners, with at most one query per kind; ``ALL_ADMINS`` when one is unknown"""
+    admin_ids = {owner_id for kind, owner_id in owners if kind == 'admin'}
+    lookups = (
+        ('trip', select(Trip.id, Trip.admin_id)),
+        ('registration', select(Registration.id, Trip.admin_id).join(Trip, Registration.trip_id == Trip.id)),
+    )
+    for kind, query in lookups:
+        ids = {owner_id for owner_kind, owner_id in owners if owner_kind == kind}
+        if ids:
+            found = dict(session.execute(query.where(query.selected_columns[0].in_(ids - {None}))).all())
+            admin_ids.update(found.values())
+            if len(found) < len(ids):
+                admin_ids.add(ALL_ADMINS)
+    if None in admin_ids:
+        admin_ids.discard(None)
+        admin_ids.add(ALL_ADMINS)
+    return admin_ids
+
+def _mark(session, admin_ids):
+    session.info.setdefault('breakdown_cache_admins', set()).update(admin_ids)
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_admins(session, flush_context, instances):
+    owners = {
+        _owner(instance) for instance in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(instance, TRACKED_MODELS)
+    }
+    if owners:
+        with session.no_autoflush:
+            _mark(session, _changed_admins(session, owners))
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_statements(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and table.name in TRACKED_TABLES:
+            admin_ids = orm_execute_state.execution_options.get('admin_ids')
+            _mark(orm_execute_state.session, set(admin_ids) if admin_ids is not None else {ALL_ADMINS})
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    admin_ids = session.info.pop('breakdown_cache_admins', None)
+    if admin_ids and has_app_context():
+        cache = get_breakdown_cache()
+        if cache is not None:
+            cache.invalidate(admin_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('breakdown_cache_admins', None)
@@ -0,0 +1,282 @@
+"""
+Aggregates for the breakdowns (analytics) pages
+
+The figures on the pages are read from the daily rollups kept by
+``analytics_rollup.py``: each page sums the rollup rows of the admin for the
+days shown (optionally one amenity) with one GROUP BY query per page, so its
+cost follows the date range, not the number of registrations, guests and
+invoices behind it. Months are grouped with ``strftime`` on SQLite and
+``date_trunc``/``to_char`` on PostgreSQL. Days are the days the rows were
+created, as in the rollups.
+
+The tables of recent rows read at most ``RECENT_ROWS`` rows; the trip page
+lists each trip created in the range, so it reads one row of columns
+(counters included) per trip.
+"""
+
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import Date, cast, func, literal_column, select
+
+from database import db, AnalyticsRollup, Amenity, Guest, Invoice, Registration, Trip, TRIP_COUNTER_STATUSES
+
+RECENT_ROWS = 10
+REGISTRATION_METRICS = ('registration_status', 'registration_language', 'registration_trip', 'registration_guests')
+GUEST_METRICS = ('guest_age', 'guest_document', 'guest_consent', 'guest_trip')
+INVOICE_METRICS = ('invoice_status', 'invoice_currency')
+TRIP_METRICS = ('trips',)
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+# Constants are inlined rather than bound, so the same expression in SELECT and
+# GROUP BY compiles to identical SQL on every driver.
+def month_key(column):
+    """``YYYY-MM`` of a date/datetime column, computed in SQL"""
+    if _dialect() == 'postgresql':
+        return func.to_char(func.date_trunc(literal_column("'month'"), column), literal_column("'YYYY-MM'"))
+    return func.strftime(literal_column("'%Y-%m'"), column)
+
+def day_key(column):
+    """Date of a datetime column, computed in SQL"""
+    if _dialect() == 'postgresql':
+        return cast(column, Date)
+    return func.date(column, type_=Date)
+
+def day_span(start, end):
+    """Days between two date columns, computed in SQL"""
+    if _dialect() == 'postgresql':
+        return end - start
+    return func.julianday(end) - func.julianday(start)
+
+def _rollup_scope(query, admin_id, metrics, date_from=None, date_to=None, amenity_id=None):
+    query = query.where(AnalyticsRollup.admin_id == admin_id, AnalyticsRollup.metric.in_(metrics))
+    if date_from is not None:
+        query = query.where(AnalyticsRollup.day >= date_from)
+    if date_to is not None:
+        query = query.where(AnalyticsRollup.day <= date_to)
+    if amenity_id is not None:
+        query = query.where(AnalyticsRollup.amenity_id == amenity_id)
+    return query
+
+def rollup_summary(admin_id, metrics, date_from=None, date_to=None, amenity_id=None):
+    """Count and amount per dimension and per month of each metric, from one query.
+
+    Returns ``(dimensions, months)``, both ``{metric: {key: (count, amount)}}``;
+    dimensions are sorted, months in calendar order.
+    """
+    month = month_key(AnalyticsRollup.day).label('month')
+    rows = db.session.execute(
+        _rollup_scope(
+            select(AnalyticsRollup.metric, AnalyticsRollup.dimension, month,
+                   func.sum(AnalyticsRollup.count), func.sum(AnalyticsRollup.amount)),
+            admin_id, metrics, date_from, date_to, amenity_id
+        )
+        .group_by(AnalyticsRollup.metric, AnalyticsRollup.dimension, month)
+        .order_by(month)
+    )
+    dimensions = {metric: {} for metric in metrics}
+    months = {metric: {} for metric in metrics}
+    for metric, dimension, month, count, amount in rows:
+        for totals, key in ((dimensions[metric], dimension), (months[metric], month)):
+            total_count, total_amount = totals.get(key, (0, 0.0))
+            totals[key] = (total_count + count, total_amount + float(amount or 0))
+    return {metric: dict(sorted(values.items())) for metric, values in dimensions.items()}, months
+
+def _counts(totals):
+    return {key: count for key, (count, _) in totals.items()}
+
+def _amounts(totals):
+    return {key: amount for key, (_, amount) in totals.items()}
+
+def _trip_titles(trip_totals):
+    """``{trip title: count}`` from rollup counts keyed by trip id"""
+    trip_ids = [int(trip_id) for trip_id in trip_totals if trip_id]
+    titles = dict(db.session.execute(select(Trip.id, Trip.title).where(Trip.id.in_(trip_ids))).all()) if trip_ids else {}
+    counts = {}
+    for trip_id, (count, _) in trip_totals.items():
+        title = titles.get(int(trip_id)) if trip_id else None
+        if title is not None:
+            counts[title] = counts.get(title, 0) + count
+    return dict(sorted(counts.items()))
+
+def _created_in(query, created_at, date_from=None, date_to=None):
+    """Rows created on the days ``[date_from, date_to]``"""
+    if date_from is not None:
+        query = query.where(created_at >= datetime.combine(date_from, time.min))
+    if date_to is not None:
+        query = query.where(created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+    return query
+
+def amenity_options(admin_id):
+    """``(id, name)`` of the admin's amenities for the filter forms"""
+    return db.session.execute(
+        select(Amenity.id, Amenity.name).where(Amenity.admin_id == admin_id).order_by(Amenity.name, Amenity.id)
+    ).all()
+
+def overview_stats(admin_id, date_from=None, date_to=None, amenity_id=None):
+    """Totals for the overview cards, in one statement"""
+    totals = dict.fromkeys(('registration_status', 'guest_age', 'trips', 'invoice_status'), (0, 0))
+    totals.update({
+        metric: (count, amount) for metric, count, amount in db.session.execute(
+            _rollup_scope(
+                select(AnalyticsRollup.metric, func.sum(AnalyticsRollup.count), func.sum(AnalyticsRollup.amount)),
+                admin_id, tuple(totals), date_from, date_to, amenity_id
+            ).group_by(AnalyticsRollup.metric)
+        )
+    })
+    return {
+        'total_registrations': totals['registration_status'][0],
+        'total_guests': totals['guest_age'][0],
+        'total_trips': totals['trips'][0],
+        'total_revenue': float(totals['invoice_status'][1] or 0)
+    }
+
+def registration_stats(admin_id, date_from=None, date_to=None, amenity_id=None):
+    dimensions, months = rollup_summary(admin_id, REGISTRATION_METRICS, date_from, date_to, amenity_id)
+    status_counts = _counts(dimensions['registration_status'])
+    recent_since = datetime.utcnow().date() - timedelta(days=30)
+    recent_count = db.session.scalar(_rollup_scope(
+        select(func.sum(AnalyticsRollup.count)), admin_id, ('registration_status',), recent_since, None, amenity_id
+    ))
+
+    return {
+        'total_registrations': sum(status_counts.values()),
+        'pending_count': status_counts.get('pending', 0),
+        'approved_count': status_counts.get('approved', 0),
+        'rejected_count': status_counts.get('rejected', 0),
+        'recent_count': recent_count or 0,
+        'status_breakdown': status_counts,
+        'monthly_breakdown': _counts(months['registration_status']),
+        'trip_breakdown': _trip_titles(dimensions['registration_trip']),
+        'language_breakdown': _counts(dimensions['registration_language']),
+        'guest_count_distribution': dict(sorted(
+            (int(guests), count) for guests, count in _counts(dimensions['registration_guests']).items()
+        ))
+    }
+
+def recent_registrations(admin_id, date_from=None, date_to=None, amenity_id=None, limit=RECENT_ROWS):
+    """The newest registrations with their trip title and guest count"""
+    guest_count = (
+        select(func.count(Guest.id))
+        .where(Guest.registration_id == Registration.id)
+        .correlate(Registration)
+        .scalar_subquery()
+    )
+    query = (
+        select(
+            Registration.id, Registration.email, Registration.status, Registration.language,
+            Registration.created_at, Trip.title.label('trip_title'), guest_count.label('guest_count')
+        )
+        .join(Trip, Registration.trip_id == Trip.id)
+        .where(Trip.admin_id == admin_id)
+    )
+    if amenity_id is not None:
+        query = query.where(Trip.amenity_id == amenity_id)
+    query = _created_in(query, Registration.created_at, date_from, date_to)
+    return db.session.execute(query.order_by(Registration.created_at.desc(), Registration.id.desc()).limit(limit)).all()
+
+def guest_stats(admin_id, date_from=None, date_to=None, amenity_id=None):
+    dimensions, months = rollup_summary(admin_id, GUEST_METRICS, date_from, date_to, amenity_id)
+    age_counts = _counts(dimensions['guest_age'])
+    total_guests = sum(age_counts.values())
+    gdpr_consent_count = _counts(dimensions['guest_consent']).get('yes', 0)
+
+    return {
+        'total_guests': total_guests,
+        'adult_count': age_counts.get('adult', 0),
+        'child_count': age_counts.get('child', 0),
+        'gdpr_consent_count': gdpr_consent_count,
+        'gdpr_no_consent_count': total_guests - gdpr_consent_count,
+        'age_category_breakdown': age_counts,
+        'document_type_breakdown': _counts(dimensions['guest_document']),
+        'monthly_guest_counts': _counts(months['guest_age']),
+        'trip_guest_counts': _trip_titles(dimensions['guest_trip'])
+    }
+
+def recent_guests(admin_id, date_from=None, date_to=None, amenity_id=None, limit=RECENT_ROWS):
+    """The newest guests with their trip title"""
+    query = (
+        select(
+            Guest.id, Guest.first_name, Guest.last_name, Guest.age_category, Guest.document_type,
+            Guest.gdpr_consent, Guest.created_at, Trip.title.label('trip_title')
+        )
+        .join(Registration, Guest.registration_id == Registration.id)
+        .join(Trip, Registration.trip_id == Trip.id)
+        .where(Trip.admin_id == admin_id)
+    )
+    if amenity_id is not None:
+        query = query.where(Trip.amenity_id == amenity_id)
+    query = _created_in(query, Guest.created_at, date_from, date_to)
+    return db.session.execute(query.order_by(Guest.created_at.desc(), Guest.id.desc()).limit(limit)).all()
+
+def trip_rows(admin_id, date_from=None, date_to=None, amenity_id=None):
+    """Columns of each trip created in the range shown on the trip page, counters included"""
+    query = (
+        select(
+            Trip.id, Trip.title, Trip.start_date, Trip.end_date, Trip.max_guests, Trip.is_externally_synced,
+            Trip.registration_count, Trip.guest_count,
+            *(getattr(Trip, f'{status}_count') for status in TRIP_COUNTER_STATUSES)
+        )
+        .where(Trip.admin_id == admin_id)
+    )
+    if amenity_id is not None:
+        query = query.where(Trip.amenity_id == amenity_id)
+    query = _created_in(query, Trip.created_at, date_from, date_to)
+    return db.session.execute(query.order_by(Trip.start_date, Trip.id)).all()
+
+def trip_stats(admin_id, trips, date_from=None, date_to=None, amenity_id=None):
+    """Trip page figures; per-trip figures come from the ``trip_rows`` already read"""
+    dimensions, months = rollup_summary(admin_id, TRIP_METRICS, date_from, date_to, amenity_id)
+    trips_by_sync = dimensions['trips']
+    total_trips = sum(count for count, _ in trips_by_sync.values())
+    nights = sum(amount for _, amount in trips_by_sync.values())
+
+    return {
+        'total_trips': total_trips,
+        'externally_synced_count': trips_by_sync.get('synced', (0, 0))[0],
+        'externally_not_synced_count': trips_by_sync.get('not_synced', (0, 0))[0],
+        'avg_duration_days': round(nights / total_trips, 1) if total_trips else 0,
+        'trip_registration_counts': {trip.title: trip.registration_count for trip in trips},
+        'trip_guest_counts': {trip.title: trip.guest_count for trip in trips},
+        'trip_status_breakdowns': {
+            trip.title: {
+                status: getattr(trip, f'{status}_count')
+                for status in TRIP_COUNTER_STATUSES
+                if getattr(trip, f'{status}_count')
+            }
+            for trip in trips
+        },
+        'monthly_trip_counts': _counts(months['trips'])
+    }
+
+def invoice_stats(admin_id, date_from=None, date_to=None, amenity_id=None):
+    dimensions, months = rollup_summary(admin_id, INVOICE_METRICS, date_from, date_to, amenity_id)
+    by_status = dimensions['invoice_status']
+    total_invoices = sum(count for count, _ in by_status.values())
+    total_amount = sum(amount for _, amount in by_status.values())
+
+    return {
+        'total_invoices': total_invoices,
+        'total_amount': total_amount,
+        'avg_amount': round(total_amount / total_invoices, 2) if total_invoices else 0,
+        'status_counts': _counts(by_status),
+        'status_amounts': _amounts(by_status),
+        'currency_counts': _counts(dimensions['invoice_currency']),
+        'monthly_invoice_counts': _counts(months['invoice_status']),
+        'monthly_revenue': _amounts(months['invoice_status'])
+    }
+
+def recent_invoices(admin_id, date_from=None, date_to=None, amenity_id=None, limit=RECENT_ROWS):
+    query = select(
+        Invoice.id, Invoice.invoice_number, Invoice.client_name, Invoice.issue_date, Invoice.status,
+        Invoice.total_amount, Invoice.currency, Invoice.created_at
+    ).where(Invoice.admin_id == admin_id)
+    if amenity_id is not None:
+        query = (
+            query.join(Registration, Invoice.registration_id == Registration.id)
+            .join(Trip, Registration.trip_id == Trip.id)
+            .where(Trip.amenity_id == amenity_id)
+        )
+    query = _created_in(query, Invoice.created_at, date_from, date_to)
+    return db.session.execute(query.order_by(Invoice.created_at.desc(), Invoice.id.desc()).limit(limit)).all()
@@ -0,0 +1,101 @@
+"""
+Pre-arrival reminder campaign
+
+Emails every externally synced guest arriving within the next N days whose
+trip has no registration yet, with a localized message containing the
+registration link. Messages go through the outbox, so delivery happens over
+the worker's single, rate-limited SMTP connection. Every queued reminder is
+recorded in ReminderSend in the same transaction, which makes reruns
+idempotent.
+"""
+
+from datetime import date, timedelta
+
+from babel.dates import format_date
+from flask import current_app, url_for
+from sqlalchemy import exists, func, select
+
+from database import db, Trip, User, Registration, ReminderSend
+from email_templates import build_email, normalize_locale, translate
+from outbox import enqueue_message
+from utils import get_server_url
+
+PRE_ARRIVAL_CAMPAIGN = 'pre_arrival'
+
+def select_reminder_targets(days_ahead, today=None, campaign=PRE_ARRIVAL_CAMPAIGN):
+    """One query for every trip that should get a reminder, soonest arrival first.
+
+    Upcoming start date within ``days_ahead``, a guest email from the external
+    calendar, no registration, and no reminder recorded for this campaign.
+    """
+    today = today or date.today()
+    return db.session.execute(
+        select(
+            Trip.id, Trip.title, Trip.start_date, Trip.external_guest_name,
+            Trip.external_guest_email, User.company_name
+        )
+        .join(User, Trip.admin_id == User.id)
+        .where(
+            Trip.start_date >= today,
+            Trip.start_date <= today + timedelta(days=days_ahead),
+            Trip.external_guest_email.isnot(None),
+            func.trim(Trip.external_guest_email) != '',
+            ~exists().where(Registration.trip_id == Trip.id),
+            ~exists().where(ReminderSend.trip_id == Trip.id, ReminderSend.campaign == campaign)
+        )
+        .order_by(Trip.start_date, Trip.id)
+    ).all()
+
+def build_reminder(target, locale, server_url):
+    """Render the reminder for one target row"""
+    registration_link = f"{server_url}{url_for('registration.register', trip_id=target.id)}"
+    return build_email(
+        'pre_arrival_reminder', locale, [target.external_guest_email.strip()],
+        guest_name=target.external_guest_name or translate('Guest', locale),
+        trip_title=target.title,
+        start_date=format_date(target.start_date, 'long', locale=locale),
+        registration_link=registration_link,
+        company=target.company_name or translate('Our Company', locale)
+    )
+
+def run_reminder_campaign(days_ahead=None, locale=None, batch_size=None, dry_run=False,
+                          today=None, campaign=PRE_ARRIVAL_CAMPAIGN):
+    """Queue reminders for all current targets; returns a summary dict.
+
+    Targets are processed in batches; each batch's outbox messages and
+    ReminderSend rows are committed together, so an interrupted run can
+    simply be started again.
+    """
+    days_ahead = current_app.config.get('REMINDER_DAYS_AHEAD', 7) if days_ahead is None else days_ahead
+    locale = normalize_locale(locale or current_app.config.get('REMINDER_LOCALE'))
+    batch_size = batch_size or current_app.config.get('REMINDER_BATCH_SIZE', 500)
+
+    targets = select_reminder_targets(days_ahead, today=today, campaign=campaign)
+    summary = {'targets': len(targets), 'queued': 0, 'failed': 0, 'batches': 0}
+    if dry_run or not targets:
+        return summary
+
+    server_url = get_server_url()
+    # url_for needs a request context; one is enough for the whole run
+    with current_app.test_request_context():
+        for start in range(0, len(targets), batch_size):
+            batch = targets[start:start + batch_size]
+            queued = []
+            for target in batch:
+                try:
+                    message = enqueue_message(build_reminder(target, locale, server_url), kind='reminder')
+                except Exception as e:
+                    print(f"Skipping reminder for trip {target.id}: {e}")
+                    summary['failed'] += 1
+                    continue
+                queued.append((target, message))
+            db.session.flush()
+            db.session.add_all([
+                ReminderSend(campaign=campaign, trip_id=target.id, email=target.external_guest_email.strip(),
+                             locale=locale, outbox_message_id=message.id)
+                for target, message in queued
+            ])
+            db.session.commit()
+            summary['queued'] += len(queued)
+            summary['batches'] += 1
+    return summary
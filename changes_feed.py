@@ -0,0 +1,149 @@
+"""
+Incremental changes feed
+
+Accounting and PMS integrations poll ``/api/v2/changes?since=<cursor>`` for the
+registrations, guests, invoices and trips of an admin that were created or
+updated after the cursor, instead of re-reading whole months.
+
+Changes are ordered by ``(updated_at, type, id)``; ids repeat across tables,
+so the type name breaks ties between rows updated at the same instant. The
+cursor is that key as text (``<updated_at>,<type>,<id>``). Every type is read
+with one keyset query on its ``(updated_at, id)`` index and the four ordered
+results are merged, so a page costs one statement per type whatever the size
+of the tables.
+
+Changes younger than CHANGES_FEED_SETTLE_SECONDS are held back: a
+transaction that stamped ``updated_at`` earlier but committed later would
+otherwise land behind a cursor the client has already moved past.
+Deletions are not part of the feed.
+"""
+
+import heapq
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, tuple_
+
+from database import db, Guest, Invoice, Registration, Trip
+from exports import json_value
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+def _registration_changes(admin_id):
+    return (
+        select(
+            Registration.id, Registration.trip_id, Registration.email, Registration.status,
+            Registration.language, Registration.admin_comment, Registration.created_at, Registration.updated_at
+        )
+        .join(Trip, Registration.trip_id == Trip.id)
+        .where(Trip.admin_id == admin_id)
+    )
+
+def _guest_changes(admin_id):
+    return (
+        select(
+            Guest.id, Guest.registration_id, Registration.trip_id, Guest.first_name, Guest.last_name,
+            Guest.age_category, Guest.document_type, Guest.document_number, Guest.gdpr_consent,
+            Guest.created_at, Guest.updated_at
+        )
+        .join(Registration, Guest.registration_id == Registration.id)
+        .join(Trip, Registration.trip_id == Trip.id)
+        .where(Trip.admin_id == admin_id)
+    )
+
+def _invoice_changes(admin_id):
+    return (
+        select(
+            Invoice.id, Invoice.invoice_number, Invoice.registration_id, Invoice.client_name,
+            Invoice.client_email, Invoice.client_vat_number, Invoice.client_address, Invoice.issue_date,
+            Invoice.due_date, Invoice.subtotal, Invoice.vat_total, Invoice.total_amount, Invoice.currency,
+            Invoice.status, Invoice.created_at, Invoice.updated_at
+        )
+        .where(Invoice.admin_id == admin_id)
+    )
+
+def _trip_changes(admin_id):
+    return (
+        select(
+            Trip.id, Trip.title, Trip.start_date, Trip.end_date, Trip.max_guests, Trip.amenity_id,
+            Trip.calendar_id, Trip.external_reservation_id, Trip.external_guest_name,
+            Trip.external_guest_email, Trip.external_guest_count, Trip.external_confirm_code,
+            Trip.registration_count, Trip.pending_count, Trip.approved_count, Trip.rejected_count,
+            Trip.guest_count, Trip.created_at, Trip.updated_at
+        )
+        .where(Trip.admin_id == admin_id)
+    )
+
+# type -> (model, payload query); keys are in cursor tie-break order
+CHANGE_TYPES = {
+    'guest': (Guest, _guest_changes),
+    'invoice': (Invoice, _invoice_changes),
+    'registration': (Registration, _registration_changes),
+    'trip': (Trip, _trip_changes),
+}
+
+def format_cursor(updated_at, change_type, row_id):
+    return f"{updated_at.isoformat()},{change_type},{row_id}"
+
+def parse_cursor(cursor):
+    """``(updated_at, type, id)`` of a cursor; raises ValueError for a malformed one"""
+    updated_at, change_type, row_id = cursor.rsplit(',', 2)
+    if change_type not in CHANGE_TYPES:
+        raise ValueError(f"Unknown change type in cursor: {change_type}")
+    return datetime.fromisoformat(updated_at), change_type, int(row_id)
+
+def _after_cursor(model, change_type, cursor):
+    """Keyset condition for rows of one type that sort after ``cursor``"""
+    updated_at, cursor_type, cursor_id = cursor
+    if change_type < cursor_type:
+        return model.updated_at > updated_at
+    if change_type > cursor_type:
+        return model.updated_at >= updated_at
+    return tuple_(model.updated_at, model.id) > tuple_(updated_at, cursor_id)
+
+def get_changes_page(admin_id, since=None, types=None, limit=DEFAULT_PAGE_SIZE, now=None):
+    """One page of an admin's changes after the cursor ``since`` (None: from the start).
+
+    Returns ``(changes, next_cursor, has_more)`` where ``changes`` is a list of
+    ``(type, row)`` in feed order and ``next_cursor`` is the cursor of the last
+    change (``since`` itself when the page is empty). Raises ValueError for a
+    malformed cursor or an unknown type.
+    """
+    types = list(types or CHANGE_TYPES)
+    unknown = [change_type for change_type in types if change_type not in CHANGE_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown change type: {', '.join(unknown)}")
+    cursor = parse_cursor(since) if since else None
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    now = now or datetime.utcnow()
+    settled = now - timedelta(seconds=current_app.config.get('CHANGES_FEED_SETTLE_SECONDS', 5))
+
+    ordered = []
+    for change_type in sorted(types):
+        model, changes_query = CHANGE_TYPES[change_type]
+        query = changes_query(admin_id).where(model.updated_at <= settled)
+        if cursor:
+            query = query.where(_after_cursor(model, change_type, cursor))
+        rows = db.session.execute(query.order_by(model.updated_at, model.id).limit(limit + 1)).all()
+        ordered.append([(row.updated_at, change_type, row.id, row) for row in rows])
+
+    merged = list(heapq.merge(*ordered, key=lambda change: change[:3]))
+    has_more = len(merged) > limit
+    changes = [(change_type, row) for _, change_type, _, row in merged[:limit]]
+    if changes:
+        last_type, last_row = changes[-1]
+        return changes, format_cursor(last_row.updated_at, last_type, last_row.id), has_more
+    return changes, since, False
+
+def iter_change_lines(changes):
+    """NDJSON lines of a page; every line carries the cursor to resume after it"""
+    for change_type, row in changes:
+        yield json.dumps({
+            'type': change_type,
+            'id': row.id,
+            'updated_at': row.updated_at.isoformat(),
+            'cursor': format_cursor(row.updated_at, change_type, row.id),
+            'data': dict(row._mapping),
+        }, default=json_value, ensure_ascii=False) + '\n'
@@ -6,6 +6,12 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # GDPR document retention
+    DOCUMENT_RETENTION_DAYS = int(os.environ.get('DOCUMENT_RETENTION_DAYS', 30))
+    ORPHAN_UPLOAD_GRACE_HOURS = int(os.environ.get('ORPHAN_UPLOAD_GRACE_HOURS', 24))
+    DOCUMENT_PURGE_BATCH_SIZE = int(os.environ.get('DOCUMENT_PURGE_BATCH_SIZE', 500))
+    DOCUMENT_PURGE_POLL_SECONDS = int(os.environ.get('DOCUMENT_PURGE_POLL_SECONDS', 60))
+    DOCUMENT_RETENTION_INTERVAL_SECONDS = int(os.environ.get('DOCUMENT_RETENTION_INTERVAL_SECONDS', 3600))
     TABLE_PREFIX = os.environ.get('TABLE_PREFIX', 'guest_reg_')
     VERSION = os.environ.get('VERSION', '1.0.0')
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -13,6 +19,46 @@ class Config:
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME', '')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD', '')
+    # Outbound email queue worker
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 6))
+    OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get('OUTBOX_RETRY_BASE_SECONDS', 60))
+    OUTBOX_RETRY_MAX_SECONDS = int(os.environ.get('OUTBOX_RETRY_MAX_SECONDS', 3600))
+    OUTBOX_POLL_SECONDS = int(os.environ.get('OUTBOX_POLL_SECONDS', 5))
+    OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 600))
+    OUTBOX_SMTP_TIMEOUT_SECONDS = int(os.environ.get('OUTBOX_SMTP_TIMEOUT_SECONDS', 30))
+    OUTBOX_SMTP_KEEPALIVE_SECONDS = int(os.environ.get('OUTBOX_SMTP_KEEPALIVE_SECONDS', 60))
+    OUTBOX_RATE_LIMIT_PER_MINUTE = int(os.environ.get('OUTBOX_RATE_LIMIT_PER_MINUTE', 0))  # 0 = unlimited
+    # Pre-arrival reminder campaign
+    REMINDER_DAYS_AHEAD = int(os.environ.get('REMINDER_DAYS_AHEAD', 7))
+    REMINDER_LOCALE = os.environ.get('REMINDER_LOCALE', os.environ.get('BABEL_DEFAULT_LOCALE', 'en'))
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 500))
+    # Rendered invoice PDFs
+    INVOICE_PDF_CACHE_FOLDER = os.environ.get('INVOICE_PDF_CACHE_FOLDER', 'pdf_cache')
+    # Out-of-process PDF rendering in one service per host (no address = render inside the web worker)
+    PDF_RENDER_SERVICE_ADDRESS = os.environ.get('PDF_RENDER_SERVICE_ADDRESS', '')
+    PDF_RENDER_SERVICE_BIND = os.environ.get('PDF_RENDER_SERVICE_BIND', '')
+    PDF_RENDER_POOL_SIZE = int(os.environ.get('PDF_RENDER_POOL_SIZE', 2))
+    PDF_RENDER_QUEUE_DEPTH = int(os.environ.get('PDF_RENDER_QUEUE_DEPTH', 8))
+    PDF_RENDER_TIMEOUT_SECONDS = int(os.environ.get('PDF_RENDER_TIMEOUT_SECONDS', 60))
+    PDF_RENDER_RETRY_AFTER_SECONDS = int(os.environ.get('PDF_RENDER_RETRY_AFTER_SECONDS', 5))
+    # Batch invoicing of approved stays
+    INVOICE_BATCH_DUE_DAYS = int(os.environ.get('INVOICE_BATCH_DUE_DAYS', 14))
+    # Background exports: files are written to EXPORT_FOLDER and kept for EXPORT_RETENTION_HOURS
+    EXPORT_FOLDER = os.environ.get('EXPORT_FOLDER', 'exports')
+    EXPORT_RETENTION_HOURS = int(os.environ.get('EXPORT_RETENTION_HOURS', 24))
+    EXPORT_POLL_SECONDS = int(os.environ.get('EXPORT_POLL_SECONDS', 5))
+    EXPORT_LEASE_SECONDS = int(os.environ.get('EXPORT_LEASE_SECONDS', 3600))
+    # Changes feed (/api/v2/changes): changes younger than this are held back until their transactions settle
+    CHANGES_FEED_SETTLE_SECONDS = int(os.environ.get('CHANGES_FEED_SETTLE_SECONDS', 5))
+    # Snapshots of closed months served by /api/backup/guests
+    BACKUP_SNAPSHOT_FOLDER = os.environ.get('BACKUP_SNAPSHOT_FOLDER', 'backup_snapshots')
+    # Analytics rollups: rows updated this recently are rolled up again on the next refresh
+    ANALYTICS_ROLLUP_SETTLE_SECONDS = int(os.environ.get('ANALYTICS_ROLLUP_SETTLE_SECONDS', 300))
+    # Breakdown result cache: entries per worker (0 disables), maximum age, optional folder shared by workers
+    BREAKDOWN_CACHE_SIZE = int(os.environ.get('BREAKDOWN_CACHE_SIZE', 256))
+    BREAKDOWN_CACHE_TTL_SECONDS = int(os.environ.get('BREAKDOWN_CACHE_TTL_SECONDS', 300))
+    BREAKDOWN_CACHE_FOLDER = os.environ.get('BREAKDOWN_CACHE_FOLDER') or None
     
     # Server URL configuration for Docker and external access
     @property
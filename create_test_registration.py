@@ -8,6 +8,7 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import app, db, Trip, Registration, Guest, User
+from database import rebuild_trip_counters
 from datetime import datetime, timedelta
 from config import Config
 
@@ -58,6 +59,7 @@ def create_test_registration():
         db.session.add(guest)
         
         # Commit everything
+        rebuild_trip_counters()
         db.session.commit()
         
         print(f"Created test registration {registration.id} with guest {guest.id}")
@@ -1,7 +1,7 @@
 import os
 import uuid
-from datetime import datetime, timedelta
-from decimal import Decimal
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 import tempfile
 import shutil
 import subprocess
@@ -12,7 +12,9 @@ from flask import Flask, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import text
+from sqlalchemy import text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import contains_eager, selectinload
 import requests
 from icalendar import Calendar as iCalCalendar
 import pytz
@@ -103,6 +105,10 @@ class Amenity(db.Model):
     admin_id = db.Column(db.Integer, db.ForeignKey(f'{get_table_prefix()}user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Pricing for batch invoicing (per guest and night)
+    nightly_rate = db.Column(db.Numeric(10, 2))
+    currency = db.Column(db.String(3), default='EUR')
+    vat_rate = db.Column(db.Numeric(5, 2), default=0)
     # Status
     is_active = db.Column(db.Boolean, default=True)
     # Backward compatibility
@@ -167,6 +173,7 @@ class Trip(db.Model):
     end_date = db.Column(db.Date, nullable=False)
     max_guests = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     admin_id = db.Column(db.Integer, db.ForeignKey(f'{get_table_prefix()}user.id'), nullable=False)
     amenity_id = db.Column(db.Integer, db.ForeignKey(f'{get_table_prefix()}amenity.id'), nullable=False)
     calendar_id = db.Column(db.Integer, db.ForeignKey(f'{get_table_prefix()}calendar.id'))
@@ -180,6 +187,12 @@ class Trip(db.Model):
     is_externally_synced = db.Column(db.Boolean, default=False)
     # External confirmation code
     external_confirm_code = db.Column(db.String(50), unique=True)
+    # Denormalised registration counters (kept in sync by the registration write paths)
+    registration_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    pending_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    approved_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rejected_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    guest_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     __table_args__ = {'schema': None, 'extend_existing': True}
 
@@ -211,6 +224,120 @@ class Guest(db.Model):
     document_image = db.Column(db.String(255))  # File path to uploaded image
     gdpr_consent = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = {'schema': None, 'extend_existing': True}
+
+class DocumentPurge(db.Model):
+    """Queued deletion of an uploaded guest document (GDPR)."""
+    __tablename__ = f"{get_table_prefix()}document_purge"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    guest_id = db.Column(db.Integer)  # No FK: guests may be deleted before the sweep runs
+    file_name = db.Column(db.String(255), nullable=False)
+    reason = db.Column(db.String(20), nullable=False, default='approved')  # approved, retention, orphan
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    purged_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    
+    __table_args__ = {'schema': None, 'extend_existing': True}
+
+class OutboxMessage(db.Model):
+    """Outbound email waiting for (or done with) delivery by the outbox worker."""
+    __tablename__ = f"{get_table_prefix()}outbox_message"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # Comma-separated envelope recipients
+    subject = db.Column(db.String(255))
+    raw_message = db.Column(db.LargeBinary, nullable=False)  # Serialised MIME message incl. attachments
+    kind = db.Column(db.String(30))  # approval, rejection, invoice, ...
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = {'schema': None, 'extend_existing': True}
+
+class ReminderSend(db.Model):
+    """One campaign email per trip; the unique key makes campaign reruns idempotent."""
+    __tablename__ = f"{get_table_prefix()}reminder_send"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    campaign = db.Column(db.String(50), nullable=False)  # e.g. pre_arrival
+    trip_id = db.Column(db.Integer, db.ForeignKey(f'{get_table_prefix()}trip.id', ondelete='CASCADE'), nullable=False)
+    email = db.Column(db.String(200), nullable=False)
+    locale = db.Column(db.String(10))
+    outbox_message_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('campaign', 'trip_id', name='uq_reminder_send_campaign_trip'),
+        {'schema': None, 'extend_existing': True}
+    )
+
+class ExportJob(db.Model):
+    """Export written to a file by the export worker and downloaded later by token."""
+    __tablename__ = f"{get_table_prefix()}export_job"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    admin_id = db.Column(db.Integer, db.ForeignKey(f'{get_table_prefix()}user.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # registrations, guests, trips, invoices
+    format = db.Column(db.String(10), nullable=False, default='csv')  # csv, csv.gz, ndjson
+    date_from = db.Column(db.Date)
+    date_to = db.Column(db.Date)
+    locale = db.Column(db.String(10))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed, expired
+    token = db.Column(db.String(64), unique=True, nullable=False)
+    total_rows = db.Column(db.Integer)
+    rows_written = db.Column(db.Integer, nullable=False, default=0)
+    file_name = db.Column(db.String(255))
+    file_size = db.Column(db.BigInteger)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    
+    __table_args__ = {'schema': None, 'extend_existing': True}
+
+class AnalyticsRollup(db.Model):
+    """Count and amount of one metric value for an admin, amenity and day (see analytics_rollup.py)."""
+    __tablename__ = f"{get_table_prefix()}analytics_rollup"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    admin_id = db.Column(db.Integer, db.ForeignKey(f'{get_table_prefix()}user.id', ondelete='CASCADE'), nullable=False)
+    amenity_id = db.Column(db.Integer)  # None for invoices without a registration
+    metric = db.Column(db.String(40), nullable=False)  # e.g. registration_status, invoice_currency
+    dimension = db.Column(db.String(60), nullable=False, default='')  # e.g. approved, EUR, a trip id
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    __table_args__ = {'schema': None, 'extend_existing': True}
+
+class AnalyticsRollupDay(db.Model):
+    """Admin day whose rollup rows must be recomputed because rows of that day were deleted."""
+    __tablename__ = f"{get_table_prefix()}analytics_rollup_day"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    admin_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = {'schema': None, 'extend_existing': True}
+
+class AnalyticsRollupState(db.Model):
+    """Single row holding the rollup refresh watermark."""
+    __tablename__ = f"{get_table_prefix()}analytics_rollup_state"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    refreshed_through = db.Column(db.DateTime)  # rows updated after this are not rolled up yet
+    refreshed_at = db.Column(db.DateTime)
     
     __table_args__ = {'schema': None, 'extend_existing': True}
 
@@ -243,6 +370,15 @@ class Invoice(db.Model):
     
     __table_args__ = {'schema': None, 'extend_existing': True}
 
+class InvoiceNumberSequence(db.Model):
+    """Last number handed out per sequence; invoice numbers are unique across admins."""
+    __tablename__ = f"{get_table_prefix()}invoice_number_sequence"
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = {'schema': None, 'extend_existing': True}
+
 class InvoiceItem(db.Model):
     __tablename__ = f"{get_table_prefix()}invoice_item"
     
@@ -292,7 +428,431 @@ class HousekeepingPhoto(db.Model):
     
     __table_args__ = {'schema': None, 'extend_existing': True}
 
+# Registration statuses that have their own counter column on Trip
+TRIP_COUNTER_STATUSES = ('pending', 'approved', 'rejected')
+
 # Business logic functions
+def bulk_options(admin_id=None):
+    """Execution options of a bulk statement that changes rows of ``admin_id`` only.
+    
+    The admin lets the breakdown cache drop only that admin's results; bulk
+    statements without one invalidate every admin.
+    """
+    options = {'synchronize_session': False}
+    if admin_id is not None:
+        options['admin_ids'] = (admin_id,)
+    return options
+
+def adjust_trip_counters(trip_id, admin_id=None, **deltas):
+    """Apply counter deltas to a trip with a single UPDATE in the caller's transaction.
+    
+    Keyword names are Trip counter columns, e.g. ``pending_count=-1, approved_count=1``;
+    ``admin_id`` is the trip's admin when the caller knows it.
+    """
+    values = {name: getattr(Trip, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    db.session.execute(
+        db.update(Trip).where(Trip.id == trip_id).values(**values),
+        execution_options=bulk_options(admin_id)
+    )
+
+def record_registration_status_change(trip_id, old_status, new_status, admin_id=None):
+    """Move one registration between the per-status counters of its trip."""
+    if old_status == new_status:
+        return
+    deltas = {}
+    if old_status in TRIP_COUNTER_STATUSES:
+        deltas[f'{old_status}_count'] = -1
+    if new_status in TRIP_COUNTER_STATUSES:
+        deltas[f'{new_status}_count'] = 1
+    adjust_trip_counters(trip_id, admin_id, **deltas)
+
+def rebuild_trip_counters(trip_ids=None, admin_id=None):
+    """Recompute the denormalised trip counters from registrations and guests.
+    
+    Runs as one set-based UPDATE with correlated subqueries, either for all trips
+    or for the given trip ids (all of ``admin_id`` when given). Returns the number
+    of trips updated; the caller commits.
+    """
+    def registration_total(status=None):
+        query = db.select(db.func.count(Registration.id)).where(Registration.trip_id == Trip.id)
+        if status:
+            query = query.where(Registration.status == status)
+        return query.scalar_subquery()
+    
+    guest_total = (
+        db.select(db.func.count(Guest.id))
+        .join(Registration, Guest.registration_id == Registration.id)
+        .where(Registration.trip_id == Trip.id)
+        .scalar_subquery()
+    )
+    
+    stmt = db.update(Trip).values(
+        registration_count=registration_total(),
+        pending_count=registration_total('pending'),
+        approved_count=registration_total('approved'),
+        rejected_count=registration_total('rejected'),
+        guest_count=guest_total
+    )
+    if trip_ids is not None:
+        trip_ids = list(trip_ids)
+        if not trip_ids:
+            return 0
+        stmt = stmt.where(Trip.id.in_(trip_ids))
+    
+    result = db.session.execute(stmt, execution_options=bulk_options(admin_id))
+    return result.rowcount
+
+def bulk_update_registration_status(registration_ids, status, admin_id, admin_comment=None):
+    """Move a set of the admin's registrations to ``status`` with a single UPDATE.
+    
+    Ids of registrations on other admins' trips are ignored, as are
+    registrations already in the target status. Trip counters
+    of the affected trips are rebuilt in the same transaction. Returns the ids
+    that changed; the caller commits.
+    """
+    registration_ids = list(registration_ids)
+    if not registration_ids:
+        return []
+    
+    rows = db.session.execute(
+        db.select(Registration.id, Registration.trip_id)
+        .join(Trip, Registration.trip_id == Trip.id)
+        .where(Registration.id.in_(registration_ids), Registration.status != status, Trip.admin_id == admin_id)
+        .with_for_update(of=Registration)
+    ).all()
+    if not rows:
+        return []
+    
+    changed_ids = [row.id for row in rows]
+    values = {'status': status, 'updated_at': datetime.utcnow()}
+    if admin_comment is not None:
+        values['admin_comment'] = admin_comment
+    db.session.execute(
+        db.update(Registration).where(Registration.id.in_(changed_ids)).values(**values),
+        execution_options=bulk_options(admin_id)
+    )
+    rebuild_trip_counters({row.trip_id for row in rows}, admin_id)
+    return changed_ids
+
+def get_pending_registrations_page(admin_id, trip_id=None, date_from=None, date_to=None,
+                                   after=None, page_size=20):
+    """Return one page of an admin's pending registrations, oldest first.
+    
+    Keyset-paginated on ``(created_at, id)`` and backed by the
+    (status, created_at, id) index. ``after`` is the cursor returned for the
+    previous page; an unparseable cursor starts from the beginning. Trips are
+    loaded in the same query and guests in one extra query, so the query count
+    does not grow with the page. Returns ``(registrations, next_cursor)``.
+    """
+    query = (
+        Registration.query
+        .join(Trip, Registration.trip_id == Trip.id)
+        .filter(Trip.admin_id == admin_id, Registration.status == 'pending')
+        .options(contains_eager(Registration.trip), selectinload(Registration.guests))
+    )
+    if trip_id:
+        query = query.filter(Registration.trip_id == trip_id)
+    if date_from:
+        query = query.filter(Registration.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.filter(Registration.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if after:
+        try:
+            created_at, registration_id = after.rsplit(',', 1)
+            cursor = (datetime.fromisoformat(created_at), int(registration_id))
+        except ValueError:
+            cursor = None
+        if cursor:
+            query = query.filter(tuple_(Registration.created_at, Registration.id) > tuple_(*cursor))
+    
+    rows = query.order_by(Registration.created_at, Registration.id).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = f"{rows[-1].created_at.isoformat()},{rows[-1].id}"
+    return rows, next_cursor
+
+INVOICE_SORTS = ('created', 'issue_date', 'total')
+
+def _invoice_sort_column(sort):
+    """Sort expression and cursor parser for one of INVOICE_SORTS"""
+    if sort == 'issue_date':
+        return Invoice.issue_date, date.fromisoformat
+    if sort == 'total':
+        return db.func.coalesce(Invoice.total_amount, 0), Decimal
+    return Invoice.created_at, datetime.fromisoformat
+
+def get_invoices_page(admin_id, status=None, date_from=None, date_to=None, currency=None,
+                      client=None, sort='created', direction='desc', after=None, page_size=25):
+    """Return one page of an admin's invoices with server-side filters and sorting.
+    
+    Keyset-paginated on ``(sort value, id)``; ``after`` is the cursor returned
+    for the previous page and an unparseable cursor starts from the beginning.
+    The date range applies to the issue date and ``client`` is a
+    case-insensitive name prefix. Backed by the (admin_id, created_at) and
+    (admin_id, status, issue_date) indexes. Returns ``(invoices, next_cursor)``.
+    """
+    sort = sort if sort in INVOICE_SORTS else 'created'
+    descending = direction != 'asc'
+    column, parse = _invoice_sort_column(sort)
+    
+    query = Invoice.query.filter(Invoice.admin_id == admin_id)
+    if status:
+        query = query.filter(Invoice.status == status)
+    if date_from:
+        query = query.filter(Invoice.issue_date >= date_from)
+    if date_to:
+        query = query.filter(Invoice.issue_date <= date_to)
+    if currency:
+        query = query.filter(Invoice.currency == currency)
+    if client:
+        query = query.filter(Invoice.client_name.istartswith(client, autoescape=True))
+    if after:
+        try:
+            value, invoice_id = after.rsplit(',', 1)
+            cursor = (parse(value), int(invoice_id))
+        except (ValueError, ArithmeticError):
+            cursor = None
+        if cursor:
+            key = tuple_(column, Invoice.id)
+            query = query.filter(key < tuple_(*cursor) if descending else key > tuple_(*cursor))
+    
+    order = (column.desc(), Invoice.id.desc()) if descending else (column.asc(), Invoice.id.asc())
+    rows = query.order_by(*order).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        value = {'issue_date': last.issue_date, 'total': last.total_amount or 0}.get(sort, last.created_at)
+        next_cursor = f"{value.isoformat() if hasattr(value, 'isoformat') else value},{last.id}"
+    return rows, next_cursor
+
+def get_invoice_totals(invoice_ids):
+    """Invoice count and summed amounts per currency for the given invoices, in one aggregate query."""
+    invoice_ids = list(invoice_ids)
+    if not invoice_ids:
+        return []
+    return db.session.execute(
+        db.select(
+            Invoice.currency,
+            db.func.count(Invoice.id).label('count'),
+            db.func.coalesce(db.func.sum(Invoice.subtotal), 0).label('subtotal'),
+            db.func.coalesce(db.func.sum(Invoice.vat_total), 0).label('vat_total'),
+            db.func.coalesce(db.func.sum(Invoice.total_amount), 0).label('total_amount')
+        )
+        .where(Invoice.id.in_(invoice_ids))
+        .group_by(Invoice.currency)
+        .order_by(Invoice.currency)
+    ).all()
+
+def _in_date_range(query, column, date_from=None, date_to=None):
+    if date_from:
+        query = query.where(column >= date_from)
+    if date_to:
+        query = query.where(column <= date_to)
+    return query
+
+def registration_export_query(admin_id, date_from=None, date_to=None):
+    """Registrations of the admin's trips with trip title and guest count, as CSV columns.
+    
+    Guests are counted in a grouped subquery joined once, so the export is a
+    single SELECT whatever the number of registrations. The optional date
+    range applies to the trip start date, as for guests and trips.
+    """
+    guest_counts = (
+        db.select(Guest.registration_id, db.func.count(Guest.id).label('guest_count'))
+        .group_by(Guest.registration_id)
+        .subquery()
+    )
+    query = (
+        db.select(
+            Registration.id, Trip.title.label('trip_title'), Registration.email, Registration.status,
+            Registration.language, Registration.created_at, Registration.updated_at,
+            db.func.coalesce(guest_counts.c.guest_count, 0).label('guest_count'), Registration.admin_comment
+        )
+        .join(Trip, Registration.trip_id == Trip.id)
+        .outerjoin(guest_counts, guest_counts.c.registration_id == Registration.id)
+        .where(Trip.admin_id == admin_id)
+        .order_by(Registration.id)
+    )
+    return _in_date_range(query, Trip.start_date, date_from, date_to)
+
+def guest_export_query(admin_id, date_from=None, date_to=None):
+    """Guests registered for the admin's trips with their trip title, as CSV columns"""
+    query = (
+        db.select(
+            Guest.id, Guest.registration_id, Trip.title.label('trip_title'), Guest.first_name, Guest.last_name,
+            Guest.age_category, Guest.document_type, Guest.document_number, Guest.gdpr_consent, Guest.created_at
+        )
+        .join(Registration, Guest.registration_id == Registration.id)
+        .join(Trip, Registration.trip_id == Trip.id)
+        .where(Trip.admin_id == admin_id)
+        .order_by(Guest.id)
+    )
+    return _in_date_range(query, Trip.start_date, date_from, date_to)
+
+def trip_export_query(admin_id, date_from=None, date_to=None):
+    """The admin's trips with amenity and calendar names and registration counters, as CSV columns"""
+    query = (
+        db.select(
+            Trip.id, Trip.title, Trip.start_date, Trip.end_date, Trip.max_guests, Trip.created_at,
+            Amenity.name.label('amenity_name'), Calendar.name.label('calendar_name'), Trip.is_externally_synced,
+            Trip.external_guest_name, Trip.external_guest_email, Trip.external_guest_count,
+            Trip.external_confirm_code, Trip.registration_count, Trip.pending_count, Trip.approved_count,
+            Trip.rejected_count
+        )
+        .outerjoin(Amenity, Trip.amenity_id == Amenity.id)
+        .outerjoin(Calendar, Trip.calendar_id == Calendar.id)
+        .where(Trip.admin_id == admin_id)
+        .order_by(Trip.id)
+    )
+    return _in_date_range(query, Trip.start_date, date_from, date_to)
+
+def invoice_export_query(admin_id, date_from=None, date_to=None):
+    """The admin's invoices with the title of the registration's trip, as CSV columns (dated by issue date)"""
+    query = (
+        db.select(
+            Invoice.id, Invoice.invoice_number, Invoice.client_name, Invoice.client_email,
+            Invoice.client_vat_number, Invoice.issue_date, Invoice.due_date, Invoice.subtotal, Invoice.vat_total,
+            Invoice.total_amount, Invoice.currency, Invoice.status, Invoice.created_at, Invoice.updated_at,
+            Invoice.registration_id, Trip.title.label('trip_title')
+        )
+        .outerjoin(Registration, Invoice.registration_id == Registration.id)
+        .outerjoin(Trip, Registration.trip_id == Trip.id)
+        .where(Invoice.admin_id == admin_id)
+        .order_by(Invoice.id)
+    )
+    return _in_date_range(query, Invoice.issue_date, date_from, date_to)
+
+CENT = Decimal('0.01')
+
+def to_decimal(value, default='0'):
+    """Parse a form or column value as Decimal without going through float."""
+    if value is None or value == '':
+        return Decimal(default)
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+def calculate_invoice_item_amounts(quantity, unit_price, vat_rate):
+    """Return ``(line_total, vat_amount, total_with_vat)`` of one item, rounded to cents."""
+    line_total = (to_decimal(quantity, '1') * to_decimal(unit_price)).quantize(CENT, rounding=ROUND_HALF_UP)
+    vat_amount = (line_total * to_decimal(vat_rate) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    return line_total, vat_amount, line_total + vat_amount
+
+def allocate_invoice_numbers(count=1, issue_date=None, sequence='invoice'):
+    """Reserve ``count`` consecutive invoice numbers (``INV-YYYYMMDD-NNN``).
+    
+    One ``UPDATE ... RETURNING`` bumps the sequence row, so concurrent callers
+    never get the same numbers; the row lock is held until the caller commits.
+    """
+    if count < 1:
+        return []
+    bump = (
+        db.update(InvoiceNumberSequence)
+        .where(InvoiceNumberSequence.name == sequence)
+        .values(last_value=InvoiceNumberSequence.last_value + count)
+        .returning(InvoiceNumberSequence.last_value)
+    )
+    last_value = db.session.execute(bump).scalar()
+    if last_value is None:
+        # First use (e.g. a database created by db.create_all()): create the row starting above
+        # existing invoices. Concurrent first uses both get here; ON CONFLICT DO NOTHING lets
+        # the loser fall through to the UPDATE, which waits for the winner's row lock.
+        dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+        db.session.execute(
+            dialect.insert(InvoiceNumberSequence)
+            .values(name=sequence,
+                    last_value=db.select(db.func.coalesce(db.func.max(Invoice.id), 0)).scalar_subquery())
+            .on_conflict_do_nothing(index_elements=[InvoiceNumberSequence.name])
+        )
+        last_value = db.session.execute(bump).scalar()
+    
+    prefix = f"INV-{(issue_date or datetime.now().date()).strftime('%Y%m%d')}"
+    return [f"{prefix}-{number:03d}" for number in range(last_value - count + 1, last_value + 1)]
+
+def _invoice_item_sums(invoice_ids=None):
+    """Per-invoice SUM of item line totals and VAT amounts"""
+    query = db.select(
+        InvoiceItem.invoice_id.label('invoice_id'),
+        db.func.sum(InvoiceItem.line_total).label('subtotal'),
+        db.func.sum(InvoiceItem.vat_amount).label('vat_total')
+    ).group_by(InvoiceItem.invoice_id)
+    if invoice_ids is not None:
+        query = query.where(InvoiceItem.invoice_id.in_(invoice_ids))
+    return query.subquery()
+
+def find_invoice_total_mismatches(invoice_ids=None):
+    """Invoices whose stored totals differ from the sum of their items.
+    
+    Returns rows with the stored (``subtotal``, ``vat_total``, ``total_amount``)
+    and computed (``new_subtotal``, ``new_vat_total``, ``new_total_amount``) values.
+    """
+    sums = _invoice_item_sums(invoice_ids)
+    new_subtotal = db.func.coalesce(sums.c.subtotal, 0)
+    new_vat_total = db.func.coalesce(sums.c.vat_total, 0)
+    query = (
+        db.select(
+            Invoice.id, Invoice.invoice_number, Invoice.subtotal, Invoice.vat_total, Invoice.total_amount,
+            new_subtotal.label('new_subtotal'), new_vat_total.label('new_vat_total'),
+            (new_subtotal + new_vat_total).label('new_total_amount')
+        )
+        .outerjoin(sums, sums.c.invoice_id == Invoice.id)
+        .where(db.or_(
+            Invoice.subtotal.is_distinct_from(new_subtotal),
+            Invoice.vat_total.is_distinct_from(new_vat_total),
+            Invoice.total_amount.is_distinct_from(new_subtotal + new_vat_total)
+        ))
+        .order_by(Invoice.id)
+    )
+    if invoice_ids is not None:
+        query = query.where(Invoice.id.in_(invoice_ids))
+    return db.session.execute(query).all()
+
+def recalculate_invoice_totals(invoice_ids=None, admin_id=None):
+    """Set invoice totals from their items with set-based UPDATEs, in Decimal.
+    
+    One ``UPDATE ... FROM (SELECT invoice_id, SUM(...) ... GROUP BY invoice_id)``
+    fixes invoices with items and one more zeroes invoices without items; only
+    rows whose totals actually differ are written (and get a new ``updated_at``).
+    Works on every invoice or on the given ids (all of ``admin_id`` when given).
+    Returns the mismatches that were repaired (see ``find_invoice_total_mismatches``);
+    the caller commits.
+    """
+    if invoice_ids is not None:
+        invoice_ids = list(invoice_ids)
+        if not invoice_ids:
+            return []
+    changed = find_invoice_total_mismatches(invoice_ids)
+    if not changed:
+        return []
+    
+    now = datetime.utcnow()
+    sums = _invoice_item_sums(invoice_ids)
+    with_items = (
+        db.update(Invoice)
+        .where(Invoice.id == sums.c.invoice_id)
+        .where(db.or_(
+            Invoice.subtotal.is_distinct_from(sums.c.subtotal),
+            Invoice.vat_total.is_distinct_from(sums.c.vat_total),
+            Invoice.total_amount.is_distinct_from(sums.c.subtotal + sums.c.vat_total)
+        ))
+        .values(subtotal=sums.c.subtotal, vat_total=sums.c.vat_total,
+                total_amount=sums.c.subtotal + sums.c.vat_total, updated_at=now)
+    )
+    without_items = (
+        db.update(Invoice)
+        .where(~db.exists().where(InvoiceItem.invoice_id == Invoice.id))
+        .where(db.or_(Invoice.subtotal != 0, Invoice.vat_total != 0, Invoice.total_amount != 0,
+                      Invoice.subtotal.is_(None), Invoice.vat_total.is_(None), Invoice.total_amount.is_(None)))
+        .values(subtotal=0, vat_total=0, total_amount=0, updated_at=now)
+    )
+    if invoice_ids is not None:
+        without_items = without_items.where(Invoice.id.in_(invoice_ids))
+    for stmt in (with_items, without_items):
+        db.session.execute(stmt, execution_options=bulk_options(admin_id))
+    return changed
+
 def parse_airbnb_guest_info(summary, description):
     """Parse guest information from Airbnb calendar event."""
     guest_info = {}
@@ -0,0 +1,162 @@
+"""
+Email rendering layer
+
+Subjects and bodies of outgoing emails are rendered for an explicit locale
+from catalogs that are loaded once per process, so messages can be built
+without a request context or session locale swapping (e.g. from workers,
+or for a batch of guests with mixed languages).
+"""
+
+import os
+import threading
+from io import BytesIO
+
+from babel.messages.mofile import write_mo
+from babel.messages.pofile import read_po
+from babel.support import NullTranslations, Translations
+from flask import current_app
+from flask_mail import Message
+
+def N_(message):
+    """Mark a string for extraction (pybabel's default keywords include N_)."""
+    return message
+
+SUPPORTED_LOCALES = ('en', 'cs', 'sk')
+DEFAULT_LOCALE = 'en'
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'translations')
+
+# Message ids must match the catalogs exactly
+EMAIL_TEMPLATES = {
+    'approval': {
+        'subject': N_('Your registration has been approved!'),
+        'body': N_("""
+Dear Guest,
+
+Your registration for %(trip_title)s has been approved!
+
+Your personal data has been processed and all uploaded documents have been securely deleted in compliance with GDPR regulations.
+
+Thank you for choosing our service.
+
+Best regards,
+The Admin Team
+"""),
+    },
+    'rejection': {
+        'subject': N_('Registration Update Required'),
+        'body': N_("""
+Dear Guest,
+
+Your registration for %(trip_title)s requires updates.
+
+Admin Comment: %(admin_comment)s
+
+Please update your information using this link: %(update_link)s
+
+Thank you for your understanding.
+
+Best regards,
+The Admin Team
+"""),
+    },
+    'invoice': {
+        'subject': N_('Your Invoice from %(company)s'),
+        'body': N_("""Dear %(client_name)s,
+
+Please find attached your invoice %(invoice_number)s.
+
+Thank you for your business!
+
+Best regards,
+%(company)s"""),
+    },
+    'pre_arrival_reminder': {
+        'subject': N_('Please register before your stay: %(trip_title)s'),
+        'body': N_("""Dear %(guest_name)s,
+
+Your stay %(trip_title)s starts on %(start_date)s.
+
+Please complete the guest registration before you arrive using this link: %(registration_link)s
+
+Thank you!
+
+Best regards,
+%(company)s"""),
+    },
+}
+
+_catalogs = {}
+_compiled = {}
+_lock = threading.Lock()
+
+def load_catalog(locale, directory=TRANSLATIONS_DIR):
+    """Load one locale's catalog: the compiled .mo if present, else the .po source.
+
+    Only .po files are kept in git, so without a ``pybabel compile`` step the
+    source catalog is compiled in memory. Fuzzy entries are skipped, as
+    ``pybabel compile`` does by default.
+    """
+    base = os.path.join(directory, locale, 'LC_MESSAGES', 'messages')
+    if os.path.exists(base + '.mo'):
+        with open(base + '.mo', 'rb') as f:
+            return Translations(f)
+    if os.path.exists(base + '.po'):
+        with open(base + '.po', 'rb') as f:
+            catalog = read_po(f, locale=locale)
+        buffer = BytesIO()
+        write_mo(buffer, catalog, use_fuzzy=False)
+        buffer.seek(0)
+        return Translations(buffer)
+    return NullTranslations()
+
+def preload_catalogs(directory=TRANSLATIONS_DIR):
+    """Load every supported catalog once; later calls are no-ops"""
+    with _lock:
+        for locale in SUPPORTED_LOCALES:
+            if locale not in _catalogs:
+                _catalogs[locale] = load_catalog(locale, directory)
+    return _catalogs
+
+def normalize_locale(locale):
+    """Map 'cs_CZ', 'SK', None, ... onto a supported locale"""
+    locale = (locale or DEFAULT_LOCALE).replace('-', '_').split('_')[0].lower()
+    return locale if locale in SUPPORTED_LOCALES else DEFAULT_LOCALE
+
+def translate(message, locale):
+    """Translate one message id for an explicit locale"""
+    locale = normalize_locale(locale)
+    catalog = _catalogs.get(locale)
+    if catalog is None:
+        # Not loaded yet, or another thread is still loading: wait for it under the lock
+        catalog = preload_catalogs()[locale]
+    return catalog.gettext(message)
+
+def compiled_template(name, locale):
+    """Translated (subject, body) format strings, cached per template and locale"""
+    locale = normalize_locale(locale)
+    key = (name, locale)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        template = EMAIL_TEMPLATES[name]
+        compiled = (translate(template['subject'], locale), translate(template['body'], locale))
+        _compiled[key] = compiled
+    return compiled
+
+def render_email(name, locale, **params):
+    """Render subject and body of an email template for ``locale``"""
+    subject, body = compiled_template(name, locale)
+    return subject % params, body % params
+
+def build_email(name, locale, recipients, sender=None, **params):
+    """Build a ``flask_mail.Message`` from a template for an explicit locale.
+
+    Needs an application context only for the default sender.
+    """
+    subject, body = render_email(name, locale, **params)
+    msg = Message(
+        subject,
+        sender=sender or current_app.config['MAIL_USERNAME'],
+        recipients=list(recipients)
+    )
+    msg.body = body
+    return msg
@@ -48,6 +48,24 @@ print('All critical modules available')
 
 success "All dependencies verified"
 
+# Background workers: "entrypoint.sh worker outbox" runs "manage.py outbox work",
+# "entrypoint.sh worker gdpr" runs "manage.py gdpr work",
+# "entrypoint.sh worker exports" runs "manage.py exports work",
+# "entrypoint.sh worker pdf" runs "manage.py pdf work" (the PDF render service).
+# The app container runs the migrations, so workers start right away.
+if [ "$1" = "worker" ]; then
+    case "$2" in
+        outbox|gdpr|exports|pdf)
+            log "Starting $2 worker..."
+            exec python manage.py "$2" work
+            ;;
+        *)
+            error "Unknown worker: $2 (expected: outbox, gdpr, exports, pdf)"
+            exit 1
+            ;;
+    esac
+fi
+
 # Run database setup and migrations
 log "Running database setup and migrations..."
 if [ -f "scripts/check_and_run_migrations.sh" ]; then
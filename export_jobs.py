@@ -0,0 +1,217 @@
+"""
+Background export jobs
+
+Large exports (all guests of a year, every trip across amenities) do not fit
+in a request. An admin queues an ExportJob with a kind, a format (CSV,
+gzip-compressed CSV or NDJSON) and an optional date range; a worker
+(``python manage.py exports work``) claims it, writes the file page by page
+under EXPORT_FOLDER while recording progress, and marks it done. The file is
+then downloaded by the job's random token until it expires, after which the
+cleanup sweep deletes it.
+"""
+
+import csv
+import gzip
+import os
+import secrets
+import signal
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+
+from database import db, ExportJob
+from email_templates import normalize_locale, translate
+from exports import EXPORTS, count_export_rows, export_pages, ndjson_line
+
+# format -> (file extension, mimetype)
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'ndjson': ('.ndjson', 'application/x-ndjson'),
+}
+
+def _config(key, default):
+    return current_app.config.get(key, default)
+
+def export_folder():
+    folder = _config('EXPORT_FOLDER', 'exports')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def export_file_path(job):
+    return os.path.join(export_folder(), job.file_name)
+
+def download_name(job):
+    """File name offered to the browser, e.g. ``guests_2026-01-01_2026-12-31.csv.gz``"""
+    period = f"_{job.date_from or 'all'}_{job.date_to or 'all'}" if job.date_from or job.date_to else ''
+    return f"{job.kind}{period}{EXPORT_FORMATS[job.format][0]}"
+
+def create_export_job(admin_id, kind, export_format='csv', date_from=None, date_to=None, locale=None):
+    """Queue an export; the caller commits. Raises ValueError for an unknown kind or format."""
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export: {kind}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    job = ExportJob(
+        admin_id=admin_id,
+        kind=kind,
+        format=export_format,
+        date_from=date_from,
+        date_to=date_to,
+        locale=normalize_locale(locale),
+        token=secrets.token_urlsafe(32)
+    )
+    db.session.add(job)
+    return job
+
+def claim_next_job(now=None):
+    """Mark the oldest queued job as running and return its id (None when idle).
+
+    Jobs left running longer than the lease (a worker died) are claimed again.
+    SKIP LOCKED lets several workers share the queue on PostgreSQL.
+    """
+    now = now or datetime.utcnow()
+    lease_expired = now - timedelta(seconds=_config('EXPORT_LEASE_SECONDS', 3600))
+    job_id = db.session.execute(
+        select(ExportJob.id)
+        .where(or_(
+            ExportJob.status == 'queued',
+            and_(ExportJob.status == 'running', ExportJob.started_at < lease_expired)
+        ))
+        .order_by(ExportJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).scalar()
+    if job_id is not None:
+        db.session.execute(
+            update(ExportJob).where(ExportJob.id == job_id).values(
+                status='running', started_at=now, rows_written=0, error=None
+            ),
+            execution_options={'synchronize_session': False}
+        )
+    db.session.commit()
+    return job_id
+
+def _open_export_file(path, export_format):
+    if export_format == 'csv.gz':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+def run_export_job(job_id):
+    """Write the file of a claimed job; returns the job's final status.
+
+    Each page of rows is written and then the progress is committed, so the
+    status page can follow along. The file is written under a temporary name
+    and renamed when complete.
+    """
+    job = db.session.get(ExportJob, job_id)
+    filters = {'date_from': job.date_from, 'date_to': job.date_to}
+    job.total_rows = count_export_rows(job.kind, job.admin_id, **filters)
+    job.file_name = f"export_{job.id}_{job.token[:8]}{EXPORT_FORMATS[job.format][0]}"
+    db.session.commit()
+
+    path = export_file_path(job)
+    tmp_path = f"{path}.tmp"
+    try:
+        with _open_export_file(tmp_path, job.format) as export_file:
+            columns, format_row = EXPORTS[job.kind][1:]
+            writer = csv.writer(export_file)
+            if job.format != 'ndjson':
+                writer.writerow([translate(column, job.locale) for column in columns])
+            for rows in export_pages(job.kind, job.admin_id, **filters):
+                if job.format == 'ndjson':
+                    export_file.write(''.join(ndjson_line(row) for row in rows))
+                else:
+                    writer.writerows(format_row(row) for row in rows)
+                job.rows_written += len(rows)
+                db.session.commit()
+        os.replace(tmp_path, path)
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        job.status = 'failed'
+        job.error = f"{type(e).__name__}: {e}"[:1000]
+        job.file_name = None
+        job.finished_at = datetime.utcnow()
+        job.expires_at = job.finished_at + timedelta(hours=_config('EXPORT_RETENTION_HOURS', 24))
+        db.session.commit()
+        return job.status
+
+    job.status = 'done'
+    job.file_size = os.path.getsize(path)
+    job.finished_at = datetime.utcnow()
+    job.expires_at = job.finished_at + timedelta(hours=_config('EXPORT_RETENTION_HOURS', 24))
+    db.session.commit()
+    return job.status
+
+def cleanup_expired_exports(now=None):
+    """Delete the files of expired jobs and mark them expired; returns the number of jobs"""
+    now = now or datetime.utcnow()
+    jobs = db.session.scalars(
+        select(ExportJob).where(ExportJob.status.in_(['done', 'failed']), ExportJob.expires_at < now)
+    ).all()
+    for job in jobs:
+        if job.file_name:
+            try:
+                os.unlink(export_file_path(job))
+            except FileNotFoundError:
+                pass
+        job.status = 'expired'
+        job.file_name = None
+    db.session.commit()
+    return len(jobs)
+
+def export_job_progress(job):
+    """Status dict for the progress poller"""
+    percent = 100 if job.status == 'done' else 0
+    if job.status == 'running' and job.total_rows:
+        percent = min(99, job.rows_written * 100 // job.total_rows)
+    return {
+        'id': job.id,
+        'status': job.status,
+        'rows_written': job.rows_written,
+        'total_rows': job.total_rows,
+        'percent': percent,
+    }
+
+def export_job_status():
+    """Job counts per status"""
+    rows = db.session.execute(
+        select(ExportJob.status, db.func.count(ExportJob.id)).group_by(ExportJob.status)
+    ).all()
+    return {status: count for status, count in rows}
+
+class ExportWorker:
+    """Runs queued export jobs one at a time and sweeps expired files"""
+
+    def __init__(self, app):
+        self.app = app
+        self.poll_interval = app.config.get('EXPORT_POLL_SECONDS', 5)
+        self.running = False
+
+    def drain(self):
+        """Run jobs until none is queued; returns counts per final status"""
+        stats = {'done': 0, 'failed': 0}
+        while True:
+            job_id = claim_next_job()
+            if job_id is None:
+                return stats
+            stats[run_export_job(job_id)] += 1
+
+    def stop(self, *args):
+        self.running = False
+
+    def run_forever(self):
+        """Poll for jobs until SIGTERM/SIGINT"""
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.running:
+            stats = self.drain()
+            expired = cleanup_expired_exports()
+            if any(stats.values()) or expired:
+                print(f"[exports] done={stats['done']} failed={stats['failed']} expired={expired}")
+            time.sleep(self.poll_interval)
@@ -0,0 +1,199 @@
+"""
+Registration, guest, trip and invoice exports
+
+Each export is one projection query from database.py plus its translatable
+column titles and a row formatter. The same definitions back the streamed
+CSV downloads in the export blueprint and the background export jobs
+(export_jobs.py), which can also write gzip-compressed CSV and NDJSON.
+Rows are read ``EXPORT_YIELD_PER`` at a time (streamed, or in keyset pages
+for jobs), so memory use does not grow with the size of the export.
+"""
+
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from database import (
+    db, guest_export_query, invoice_export_query, registration_export_query, trip_export_query
+)
+from email_templates import N_
+
+# Rows fetched per round trip (server-side cursor where the driver has one)
+EXPORT_YIELD_PER = 500
+
+REGISTRATION_COLUMNS = (
+    N_('Registration ID'), N_('Trip Title'), N_('Email'), N_('Status'), N_('Language'), N_('Created Date'),
+    N_('Updated Date'), N_('Guest Count'), N_('Admin Comment')
+)
+GUEST_COLUMNS = (
+    N_('Guest ID'), N_('Registration ID'), N_('Trip Title'), N_('First Name'), N_('Last Name'),
+    N_('Age Category'), N_('Document Type'), N_('Document Number'), N_('GDPR Consent'), N_('Created Date')
+)
+TRIP_COLUMNS = (
+    N_('Trip ID'), N_('Title'), N_('Start Date'), N_('End Date'), N_('Max Guests'), N_('Created Date'),
+    N_('Amenity'), N_('Calendar'), N_('Externally Synced'), N_('External Guest Name'),
+    N_('External Guest Email'), N_('External Guest Count'), N_('External Confirmation Code'),
+    N_('Registration Count'), N_('Pending Count'), N_('Approved Count'), N_('Rejected Count')
+)
+INVOICE_COLUMNS = (
+    N_('Invoice ID'), N_('Invoice Number'), N_('Client Name'), N_('Client Email'), N_('Client VAT Number'),
+    N_('Issue Date'), N_('Due Date'), N_('Subtotal'), N_('VAT Total'), N_('Total Amount'), N_('Currency'),
+    N_('Status'), N_('Created Date'), N_('Updated Date'), N_('Registration ID'), N_('Trip Title')
+)
+
+class _LineWriter:
+    """File object for csv.writer that hands each formatted line back instead of storing it"""
+
+    def write(self, line):
+        return line
+
+def iter_csv(header, rows, chunk_rows=EXPORT_YIELD_PER):
+    """Yield CSV text in chunks of ``chunk_rows`` lines; only one chunk is held at a time"""
+    writer = csv.writer(_LineWriter())
+    chunk = [writer.writerow(header)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+def json_value(value):
+    """``json.dumps`` default for the dates and decimals of result rows"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def ndjson_line(row):
+    """One result row as a JSON object line keyed by column name"""
+    return json.dumps(dict(row._mapping), default=json_value, ensure_ascii=False) + '\n'
+
+def stream_query(query):
+    """Result rows of ``query`` fetched ``EXPORT_YIELD_PER`` at a time"""
+    return db.session.execute(query.execution_options(yield_per=EXPORT_YIELD_PER))
+
+def format_registration(reg):
+    return [
+        reg.id,
+        reg.trip_title,
+        reg.email,
+        reg.status,
+        reg.language,
+        reg.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        reg.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+        reg.guest_count,
+        reg.admin_comment or ''
+    ]
+
+def format_guest(guest):
+    return [
+        guest.id,
+        guest.registration_id,
+        guest.trip_title,
+        guest.first_name,
+        guest.last_name,
+        guest.age_category,
+        guest.document_type,
+        guest.document_number,
+        'Yes' if guest.gdpr_consent else 'No',
+        guest.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    ]
+
+def format_trip(trip):
+    return [
+        trip.id,
+        trip.title,
+        trip.start_date.strftime('%Y-%m-%d'),
+        trip.end_date.strftime('%Y-%m-%d'),
+        trip.max_guests,
+        trip.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        trip.amenity_name or '',
+        trip.calendar_name or '',
+        'Yes' if trip.is_externally_synced else 'No',
+        trip.external_guest_name or '',
+        trip.external_guest_email or '',
+        trip.external_guest_count or '',
+        trip.external_confirm_code or '',
+        trip.registration_count,
+        trip.pending_count,
+        trip.approved_count,
+        trip.rejected_count
+    ]
+
+def format_invoice(invoice):
+    return [
+        invoice.id,
+        invoice.invoice_number,
+        invoice.client_name,
+        invoice.client_email or '',
+        invoice.client_vat_number or '',
+        invoice.issue_date.strftime('%Y-%m-%d'),
+        invoice.due_date.strftime('%Y-%m-%d') if invoice.due_date else '',
+        float(invoice.subtotal),
+        float(invoice.vat_total),
+        float(invoice.total_amount),
+        invoice.currency,
+        invoice.status,
+        invoice.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        invoice.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+        invoice.registration_id or '',
+        invoice.trip_title or ''
+    ]
+
+# kind -> (projection query, column titles, CSV row formatter)
+EXPORTS = {
+    'registrations': (registration_export_query, REGISTRATION_COLUMNS, format_registration),
+    'guests': (guest_export_query, GUEST_COLUMNS, format_guest),
+    'trips': (trip_export_query, TRIP_COLUMNS, format_trip),
+    'invoices': (invoice_export_query, INVOICE_COLUMNS, format_invoice),
+}
+
+def export_rows(kind, admin_id, date_from=None, date_to=None):
+    """Formatted CSV rows of one export"""
+    query, _columns, format_row = EXPORTS[kind]
+    for row in stream_query(query(admin_id, date_from=date_from, date_to=date_to)):
+        yield format_row(row)
+
+def export_pages(kind, admin_id, date_from=None, date_to=None, page_size=EXPORT_YIELD_PER):
+    """Result rows of one export, a page at a time, each page a separate keyset query.
+
+    Every export query is ordered by its leading id column, so a page starts
+    after the last id of the previous one. No cursor stays open between
+    pages, which lets a background job commit its progress in between.
+    """
+    query = EXPORTS[kind][0](admin_id, date_from=date_from, date_to=date_to)
+    id_column = query.selected_columns[0]
+    last_id = None
+    while True:
+        page_query = query if last_id is None else query.where(id_column > last_id)
+        rows = db.session.execute(page_query.limit(page_size)).all()
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1][0]
+
+def count_export_rows(kind, admin_id, date_from=None, date_to=None):
+    """Number of rows the export will contain, from one COUNT over the same query"""
+    query = EXPORTS[kind][0](admin_id, date_from=date_from, date_to=date_to).order_by(None)
+    return db.session.execute(db.select(db.func.count()).select_from(query.subquery())).scalar()
+
+def registration_rows(admin_id, date_from=None, date_to=None):
+    """CSV rows of every registration on the admin's trips"""
+    return export_rows('registrations', admin_id, date_from, date_to)
+
+def guest_rows(admin_id, date_from=None, date_to=None):
+    """CSV rows of every guest registered for the admin's trips"""
+    return export_rows('guests', admin_id, date_from, date_to)
+
+def trip_rows(admin_id, date_from=None, date_to=None):
+    """CSV rows of every trip of the admin"""
+    return export_rows('trips', admin_id, date_from, date_to)
+
+def invoice_rows(admin_id, date_from=None, date_to=None):
+    """CSV rows of every invoice of the admin"""
+    return export_rows('invoices', admin_id, date_from, date_to)
@@ -0,0 +1,263 @@
+"""
+GDPR document purge queue and retention sweeper
+
+Approving a registration only enqueues its guest documents; the files are
+removed later by the sweeper in batches.  The sweeper also enforces the
+document retention period for every registration regardless of status and
+detects upload files that no guest row references any more.
+
+GDPRWorker (``manage.py gdpr work``) runs both in the deployed services:
+queued purges every DOCUMENT_PURGE_POLL_SECONDS and the full retention
+sweep every DOCUMENT_RETENTION_INTERVAL_SECONDS.
+"""
+
+import os
+import re
+import signal
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, exists, insert, literal, select, update
+
+from database import db, DocumentPurge, Guest, Registration
+
+# Guest documents are stored as "<uuid4>_<original name>" (see registration blueprint)
+GUEST_DOCUMENT_PATTERN = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}_')
+
+# Rows that keep failing are left for manual inspection instead of being retried forever
+MAX_PURGE_ATTEMPTS = 5
+
+# Upper bound for IN (...) lists sent to the database
+LOOKUP_CHUNK_SIZE = 500
+
+def _config(key, default):
+    return current_app.config.get(key, default)
+
+def _not_already_queued(file_column):
+    """Correlated NOT EXISTS guard against queueing the same file twice"""
+    return ~exists().where(and_(
+        DocumentPurge.file_name == file_column,
+        DocumentPurge.purged_at.is_(None)
+    ))
+
+def _enqueue_guest_documents(condition, reason):
+    """INSERT ... SELECT purge rows for every guest document matching condition"""
+    source = (
+        select(Guest.id, Guest.document_image, literal(reason), literal(datetime.utcnow()))
+        .join(Registration, Registration.id == Guest.registration_id)
+        .where(Guest.document_image.isnot(None), condition, _not_already_queued(Guest.document_image))
+    )
+    result = db.session.execute(
+        insert(DocumentPurge).from_select(
+            ['guest_id', 'file_name', 'reason', 'enqueued_at'], source
+        )
+    )
+    return result.rowcount or 0
+
+def enqueue_registration_documents(registration_ids, reason='approved'):
+    """Queue the documents of the given registrations for deletion.
+
+    The caller commits, so the purge rows land in the same transaction as
+    the status change that triggered them.
+    """
+    registration_ids = list(registration_ids)
+    if not registration_ids:
+        return 0
+    return _enqueue_guest_documents(Registration.id.in_(registration_ids), reason)
+
+def enqueue_expired_documents(retention_days=None, now=None):
+    """Queue documents of registrations untouched for longer than the retention period"""
+    if retention_days is None:
+        retention_days = _config('DOCUMENT_RETENTION_DAYS', 30)
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    return _enqueue_guest_documents(Registration.updated_at < cutoff, 'retention')
+
+def find_orphaned_uploads(upload_folder=None, grace_hours=None, now=None):
+    """Return guest document files in the upload folder that no guest references.
+
+    The directory is listed once; the database is then asked which of the
+    candidate names are referenced, in chunks, using the document_image index.
+    Files younger than the grace period are skipped so uploads from
+    registrations still being submitted are never touched.
+    """
+    upload_folder = upload_folder or _config('UPLOAD_FOLDER', 'uploads')
+    if grace_hours is None:
+        grace_hours = _config('ORPHAN_UPLOAD_GRACE_HOURS', 24)
+    cutoff = ((now or datetime.utcnow()) - timedelta(hours=grace_hours)).timestamp()
+
+    if not os.path.isdir(upload_folder):
+        return []
+
+    candidates = []
+    with os.scandir(upload_folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or not GUEST_DOCUMENT_PATTERN.match(entry.name):
+                continue
+            if entry.stat().st_mtime > cutoff:
+                continue
+            candidates.append(entry.name)
+
+    referenced = set()
+    for start in range(0, len(candidates), LOOKUP_CHUNK_SIZE):
+        chunk = candidates[start:start + LOOKUP_CHUNK_SIZE]
+        referenced.update(db.session.execute(
+            select(Guest.document_image).where(Guest.document_image.in_(chunk))
+        ).scalars())
+
+    return sorted(name for name in candidates if name not in referenced)
+
+def enqueue_orphaned_uploads(upload_folder=None, grace_hours=None, now=None):
+    """Queue orphaned upload files for deletion"""
+    orphans = find_orphaned_uploads(upload_folder, grace_hours, now)
+
+    queued = set()
+    for start in range(0, len(orphans), LOOKUP_CHUNK_SIZE):
+        chunk = orphans[start:start + LOOKUP_CHUNK_SIZE]
+        queued.update(db.session.execute(
+            select(DocumentPurge.file_name).where(
+                DocumentPurge.file_name.in_(chunk),
+                DocumentPurge.purged_at.is_(None)
+            )
+        ).scalars())
+
+    rows = [
+        {'guest_id': None, 'file_name': name, 'reason': 'orphan', 'enqueued_at': datetime.utcnow()}
+        for name in orphans if name not in queued
+    ]
+    if rows:
+        db.session.execute(insert(DocumentPurge), rows)
+    return len(rows)
+
+def sweep_document_purges(batch_size=None, upload_folder=None):
+    """Delete queued files in batches and clear the guest references.
+
+    Each batch is one SELECT, the file removals, one bulk UPDATE of the
+    guest rows, one bulk UPDATE of the queue and a commit. Missing files
+    count as purged. Failures are recorded on the queue row and retried on
+    later sweeps up to MAX_PURGE_ATTEMPTS.
+    """
+    batch_size = batch_size or _config('DOCUMENT_PURGE_BATCH_SIZE', 500)
+    upload_folder = upload_folder or _config('UPLOAD_FOLDER', 'uploads')
+    stats = {'purged': 0, 'missing': 0, 'failed': 0, 'batches': 0}
+    last_id = 0
+
+    while True:
+        batch = db.session.execute(
+            select(DocumentPurge.id, DocumentPurge.guest_id, DocumentPurge.file_name)
+            .where(
+                DocumentPurge.purged_at.is_(None),
+                DocumentPurge.attempts < MAX_PURGE_ATTEMPTS,
+                DocumentPurge.id > last_id
+            )
+            .order_by(DocumentPurge.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        done_ids, guest_ids, failures = [], [], []
+        for row in batch:
+            # Never follow path components stored in the database
+            path = os.path.join(upload_folder, os.path.basename(row.file_name))
+            try:
+                os.remove(path)
+                stats['purged'] += 1
+            except FileNotFoundError:
+                stats['missing'] += 1
+            except OSError as e:
+                failures.append((row.id, str(e)))
+                continue
+            done_ids.append(row.id)
+            if row.guest_id is not None:
+                guest_ids.append(row.guest_id)
+
+        now = datetime.utcnow()
+        if guest_ids:
+            db.session.execute(
+                update(Guest).where(Guest.id.in_(guest_ids)).values(document_image=None),
+                execution_options={'synchronize_session': False}
+            )
+        if done_ids:
+            db.session.execute(
+                update(DocumentPurge).where(DocumentPurge.id.in_(done_ids)).values(purged_at=now),
+                execution_options={'synchronize_session': False}
+            )
+        for purge_id, error in failures:
+            db.session.execute(
+                update(DocumentPurge).where(DocumentPurge.id == purge_id).values(
+                    attempts=DocumentPurge.attempts + 1, last_error=error
+                ),
+                execution_options={'synchronize_session': False}
+            )
+        stats['failed'] += len(failures)
+        stats['batches'] += 1
+        db.session.commit()
+
+    return stats
+
+def run_retention_sweep(retention_days=None, grace_hours=None, batch_size=None):
+    """Queue expired and orphaned documents, then sweep the whole queue"""
+    expired = enqueue_expired_documents(retention_days)
+    orphaned = enqueue_orphaned_uploads(grace_hours=grace_hours)
+    db.session.commit()
+    stats = sweep_document_purges(batch_size)
+    stats.update({'expired_queued': expired, 'orphans_queued': orphaned})
+    return stats
+
+def purge_queue_status():
+    """Summary counts for the purge queue"""
+    pending = db.session.scalar(
+        select(db.func.count(DocumentPurge.id)).where(
+            DocumentPurge.purged_at.is_(None), DocumentPurge.attempts < MAX_PURGE_ATTEMPTS
+        )
+    )
+    stuck = db.session.scalar(
+        select(db.func.count(DocumentPurge.id)).where(
+            DocumentPurge.purged_at.is_(None), DocumentPurge.attempts >= MAX_PURGE_ATTEMPTS
+        )
+    )
+    purged = db.session.scalar(
+        select(db.func.count(DocumentPurge.id)).where(DocumentPurge.purged_at.isnot(None))
+    )
+    return {'pending': pending, 'stuck': stuck, 'purged': purged}
+
+class GDPRWorker:
+    """Sweeps the purge queue on every poll and runs the retention sweep on its own interval"""
+
+    def __init__(self, app, clock=time.monotonic):
+        self.app = app
+        self.poll_interval = app.config.get('DOCUMENT_PURGE_POLL_SECONDS', 60)
+        self.retention_interval = app.config.get('DOCUMENT_RETENTION_INTERVAL_SECONDS', 3600)
+        self.clock = clock
+        self.next_retention = None
+        self.running = False
+
+    def run_once(self):
+        """One poll: the retention sweep when it is due, otherwise only the queued purges"""
+        now = self.clock()
+        if self.next_retention is None or now >= self.next_retention:
+            self.next_retention = now + self.retention_interval
+            return run_retention_sweep()
+        return sweep_document_purges()
+
+    def stop(self, *args):
+        self.running = False
+
+    def _sleep(self):
+        # Short steps, so SIGTERM is honoured well within docker's stop timeout
+        deadline = time.monotonic() + self.poll_interval
+        while self.running and time.monotonic() < deadline:
+            time.sleep(min(1, max(deadline - time.monotonic(), 0)))
+
+    def run_forever(self):
+        """Poll until SIGTERM/SIGINT"""
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.running:
+            stats = self.run_once()
+            if stats['purged'] or stats['missing'] or stats['failed']:
+                print(f"[gdpr] purged={stats['purged']} missing={stats['missing']} failed={stats['failed']}")
+            self._sleep()
@@ -0,0 +1,170 @@
+"""
+Monthly guest backup
+
+``/api/backup/guests`` returns the guests of the registrations an admin
+received in one month, without document photos, as CSV or a JSON array. The
+rows come from one joined column query scoped by ``Trip.admin_id`` and read in
+keyset pages on the guest id, and the output is streamed as it is produced.
+Clients can also page through a month themselves with ``after``/``limit``.
+
+A month that has ended is served from a snapshot file. The snapshot is named
+after a fingerprint of the month (guest count and latest ``updated_at`` of
+the guests, registrations and trips involved) which is also its strong ETag,
+so a repeat pull costs one aggregate query and returns 304 Not Modified, while
+a late edit to the month produces a new snapshot instead of a stale one.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from database import db, Guest, Registration, Trip
+from exports import iter_csv
+
+BACKUP_FIELDS = (
+    'id', 'registration_id', 'first_name', 'last_name', 'age_category', 'document_type', 'document_number',
+    'gdpr_consent', 'created_at', 'trip_title', 'registration_email', 'registration_language'
+)
+# format -> (file extension, mimetype)
+BACKUP_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'json': ('.json', 'application/json'),
+}
+BACKUP_PAGE_SIZE = 500
+MAX_BACKUP_LIMIT = 5000
+
+def month_bounds(year, month):
+    """``[start, end)`` datetimes of a month; raises ValueError for an invalid month"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+def is_closed_month(year, month, today=None):
+    """Whether the month has ended, so new registrations can no longer fall into it"""
+    return month_bounds(year, month)[1].date() <= (today or date.today())
+
+def _month_guests(query, admin_id, start, end):
+    return (
+        query
+        .join(Registration, Guest.registration_id == Registration.id)
+        .join(Trip, Registration.trip_id == Trip.id)
+        .where(Trip.admin_id == admin_id, Registration.created_at >= start, Registration.created_at < end)
+    )
+
+def guest_backup_query(admin_id, start, end):
+    """Backup columns of the admin's guests registered in ``[start, end)``, ordered by guest id"""
+    return _month_guests(
+        select(
+            Guest.id, Guest.registration_id, Guest.first_name, Guest.last_name, Guest.age_category,
+            Guest.document_type, Guest.document_number, Guest.gdpr_consent, Guest.created_at,
+            Trip.title.label('trip_title'), Registration.email.label('registration_email'),
+            Registration.language.label('registration_language')
+        ),
+        admin_id, start, end
+    ).order_by(Guest.id)
+
+def get_guest_backup_page(admin_id, start, end, after=None, limit=BACKUP_PAGE_SIZE):
+    """One keyset page of backup rows after guest id ``after``; returns ``(rows, next_cursor)``"""
+    limit = max(1, min(limit, MAX_BACKUP_LIMIT))
+    query = guest_backup_query(admin_id, start, end)
+    if after is not None:
+        query = query.where(Guest.id > after)
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return rows, next_cursor
+
+def guest_backup_rows(admin_id, start, end):
+    """Every backup row of the month, fetched ``BACKUP_PAGE_SIZE`` at a time"""
+    after = None
+    while True:
+        rows, after = get_guest_backup_page(admin_id, start, end, after)
+        yield from rows
+        if after is None:
+            return
+
+def backup_record(row):
+    """Backup dict of one row, in the layout the endpoint has always returned"""
+    record = dict(row._mapping)
+    record['created_at'] = row.created_at.strftime('%Y-%m-%d %H:%M:%S') if row.created_at else ''
+    return record
+
+def iter_backup_csv(rows):
+    return iter_csv(BACKUP_FIELDS, ([record[field] for field in BACKUP_FIELDS]
+                                    for record in map(backup_record, rows)))
+
+def iter_backup_json(rows, chunk_rows=BACKUP_PAGE_SIZE):
+    """A JSON array of backup records, yielded ``chunk_rows`` records at a time"""
+    chunk, separator = ['['], ''
+    for row in rows:
+        chunk.append(separator + json.dumps(backup_record(row), ensure_ascii=False))
+        separator = ','
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append(']')
+    yield ''.join(chunk)
+
+BACKUP_WRITERS = {'csv': iter_backup_csv, 'json': iter_backup_json}
+
+def month_fingerprint(admin_id, start, end):
+    """Digest of what a month's backup contains, from one aggregate query"""
+    summary = db.session.execute(_month_guests(
+        select(
+            db.func.count(Guest.id), db.func.max(Guest.id), db.func.max(Guest.updated_at),
+            db.func.max(Registration.updated_at), db.func.max(Trip.updated_at)
+        ),
+        admin_id, start, end
+    )).one()
+    parts = [str(admin_id), start.isoformat()] + [str(value) for value in summary]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+def snapshot_folder():
+    folder = current_app.config.get('BACKUP_SNAPSHOT_FOLDER', 'backup_snapshots')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def _snapshot_prefix(admin_id, year, month):
+    return os.path.join(snapshot_folder(), f'guests_{int(admin_id)}_{int(year)}_{int(month):02d}_')
+
+def guest_backup_snapshot(admin_id, year, month, backup_format):
+    """``(path, etag)`` of the snapshot of a closed month, written on the first request.
+
+    Snapshots of an older state of the same month are removed when a new one
+    is written.
+    """
+    start, end = month_bounds(year, month)
+    fingerprint = month_fingerprint(admin_id, start, end)
+    etag = f'{fingerprint}-{backup_format}'
+    prefix = _snapshot_prefix(admin_id, year, month)
+    extension = BACKUP_FORMATS[backup_format][0]
+    path = f'{prefix}{fingerprint}{extension}'
+    if os.path.exists(path):
+        return path, etag
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as snapshot_file:
+            for chunk in BACKUP_WRITERS[backup_format](guest_backup_rows(admin_id, start, end)):
+                snapshot_file.write(chunk)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    for stale in glob.glob(f'{prefix}*{extension}'):
+        if stale != path:
+            try:
+                os.unlink(stale)
+            except OSError:
+                pass
+    return path, etag
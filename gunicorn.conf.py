@@ -37,6 +37,16 @@ limit_request_field_size = 8190
 sendfile = True
 reuse_port = True
 
+# Warm the in-process PDF renderer (unused with a render service) in each worker,
+# not in the preloaded master: fontconfig/pango state is not shared across fork
+def post_worker_init(worker):
+    try:
+        import pdf_service
+        with worker.wsgi.app_context():
+            pdf_service.prepare_worker()
+    except Exception as e:
+        worker.log.warning(f"PDF renderer warm-up skipped: {e}")
+
 # SSL (uncomment and configure for HTTPS)
 # keyfile = '/path/to/keyfile'
 # certfile = '/path/to/certfile'
@@ -0,0 +1,121 @@
+"""
+Bulk invoice PDF export
+
+Builds a ZIP of invoice PDFs plus a CSV index while it is being downloaded.
+Cached PDFs go into the archive first; the rest are rendered in parallel by
+the host's PDF render service and added as each one finishes (and stored in the cache
+for later downloads). Only the PDF currently being added is held in memory,
+never the archive.
+"""
+
+import csv
+import os
+import zipfile
+from io import StringIO
+
+from flask import render_template
+from flask_babel import gettext as _
+from werkzeug.utils import secure_filename
+
+from pdf_cache import invoice_pdf_cache_path, store_invoice_pdf
+from pdf_service import INVOICE_PDF_TEMPLATE, render_many
+
+class ZipStream:
+    """Write-only file object that collects ZipFile output until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def invoice_pdf_filename(invoice):
+    return secure_filename(f'invoice_{invoice.invoice_number}.pdf') or f'invoice_{invoice.id}.pdf'
+
+def _read_cached(path):
+    try:
+        with open(path, 'rb') as pdf_file:
+            return pdf_file.read()
+    except FileNotFoundError:
+        # Invalidated since we looked; render it instead
+        return None
+
+def iter_invoice_pdfs(invoices, locale, template_digest):
+    """Yield ``(invoice, pdf_bytes)``: cache hits first, then renders as they complete"""
+    misses = []
+    for invoice in invoices:
+        path = invoice_pdf_cache_path(invoice, locale, template_digest)
+        pdf_bytes = _read_cached(path) if os.path.exists(path) else None
+        if pdf_bytes is None:
+            misses.append((invoice, path))
+        else:
+            yield invoice, pdf_bytes
+
+    jobs = (
+        (index, lambda invoice=invoice: render_template(INVOICE_PDF_TEMPLATE, invoice=invoice))
+        for index, (invoice, _path) in enumerate(misses)
+    )
+    for index, pdf_bytes in render_many(jobs):
+        invoice, path = misses[index]
+        store_invoice_pdf(invoice.id, path, pdf_bytes)
+        yield invoice, pdf_bytes
+
+def index_csv(rows):
+    """CSV index of the archive: one row per PDF"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow([
+        _('File'),
+        _('Invoice Number'),
+        _('Client Name'),
+        _('Issue Date'),
+        _('Due Date'),
+        _('Subtotal'),
+        _('VAT Total'),
+        _('Total Amount'),
+        _('Currency'),
+        _('Status')
+    ])
+    writer.writerows(rows)
+    return output.getvalue().encode('utf-8')
+
+def index_row(invoice, filename):
+    return [
+        filename,
+        invoice.invoice_number,
+        invoice.client_name,
+        invoice.issue_date.strftime('%Y-%m-%d'),
+        invoice.due_date.strftime('%Y-%m-%d') if invoice.due_date else '',
+        invoice.subtotal,
+        invoice.vat_total,
+        invoice.total_amount,
+        invoice.currency,
+        invoice.status
+    ]
+
+def stream_invoice_archive(invoices, locale, template_digest):
+    """Generate the ZIP archive chunk by chunk (one chunk per PDF, then the index).
+
+    Needs the request context for the whole iteration (``stream_with_context``).
+    """
+    stream = ZipStream()
+    rows = []
+    with zipfile.ZipFile(stream, 'w') as archive:
+        for invoice, pdf_bytes in iter_invoice_pdfs(invoices, locale, template_digest):
+            filename = invoice_pdf_filename(invoice)
+            # PDFs are already compressed
+            archive.writestr(filename, pdf_bytes, compress_type=zipfile.ZIP_STORED)
+            rows.append(index_row(invoice, filename))
+            yield stream.drain()
+        rows.sort(key=lambda row: row[0])
+        archive.writestr('index.csv', index_csv(rows), compress_type=zipfile.ZIP_DEFLATED)
+    yield stream.drain()
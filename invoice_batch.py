@@ -0,0 +1,193 @@
+"""
+Batch invoicing of approved stays
+
+Finds approved registrations whose trip starts in a date range and that have
+no invoice yet (or only the zero-priced draft created at registration time)
+and prices each stay from its amenity: nightly rate x nights x guests, with
+the amenity's VAT rate and currency. ``plan_batch_invoices`` only reads, so
+its result can be shown as a preview; ``create_batch_invoices`` writes the
+whole plan with a handful of bulk statements in the caller's transaction.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, exists, insert, select, update
+from sqlalchemy.orm import contains_eager, selectinload
+
+from database import (
+    db, Invoice, InvoiceItem, Registration, Trip,
+    allocate_invoice_numbers, bulk_options, calculate_invoice_item_amounts
+)
+
+def _needs_invoice():
+    """No invoice other than a zero-priced draft for the registration"""
+    return ~exists().where(
+        Invoice.registration_id == Registration.id,
+        db.or_(Invoice.status != 'draft', Invoice.total_amount != 0)
+    )
+
+def _client_name(registration, trip, draft):
+    if draft is not None and draft.client_name:
+        return draft.client_name
+    if registration.guests:
+        guest = min(registration.guests, key=lambda g: g.id)
+        return f"{guest.first_name} {guest.last_name}"
+    return trip.external_guest_name or registration.email
+
+def plan_batch_invoices(admin_id, date_from, date_to):
+    """Priced invoice plan for every approved stay starting between the dates.
+
+    Returns one dict per registration, in arrival order. Entries with a
+    ``skip_reason`` (trip without an amenity, amenity without a nightly rate)
+    are listed but not invoiced;
+    ``draft_id`` is set when an existing zero-priced draft will be repriced
+    instead of creating a new invoice.
+    """
+    registrations = db.session.scalars(
+        select(Registration)
+        .join(Registration.trip)
+        .outerjoin(Trip.amenity)
+        .options(
+            contains_eager(Registration.trip).contains_eager(Trip.amenity),
+            selectinload(Registration.guests)
+        )
+        .where(
+            Trip.admin_id == admin_id,
+            Trip.start_date >= date_from,
+            Trip.start_date <= date_to,
+            Registration.status == 'approved',
+            _needs_invoice()
+        )
+        .order_by(Trip.start_date, Registration.id)
+    ).all()
+    if not registrations:
+        return []
+
+    drafts = {}
+    for draft in db.session.scalars(
+        select(Invoice)
+        .where(Invoice.registration_id.in_([r.id for r in registrations]), Invoice.status == 'draft')
+        .order_by(Invoice.id.desc())
+    ):
+        drafts[draft.registration_id] = draft  # Oldest draft wins
+
+    plan = []
+    for registration in registrations:
+        trip = registration.trip
+        amenity = trip.amenity
+        draft = drafts.get(registration.id)
+        nights = max(1, (trip.end_date - trip.start_date).days)
+        guests = max(1, len(registration.guests))
+        entry = {
+            'registration': registration,
+            'trip': trip,
+            'amenity': amenity,
+            'draft_id': draft.id if draft is not None else None,
+            'client_name': _client_name(registration, trip, draft),
+            'client_email': registration.email,
+            'nights': nights,
+            'guests': guests,
+            'quantity': nights * guests,
+            'unit_price': amenity.nightly_rate if amenity is not None else None,
+            'vat_rate': (amenity.vat_rate if amenity is not None else None) or 0,
+            'currency': (amenity.currency if amenity is not None else None) or 'EUR',
+            'skip_reason': None,
+        }
+        if amenity is None:
+            entry['skip_reason'] = 'no_amenity'
+        elif amenity.nightly_rate is None:
+            entry['skip_reason'] = 'no_rate'
+        else:
+            entry['line_total'], entry['vat_amount'], entry['total_amount'] = calculate_invoice_item_amounts(
+                entry['quantity'], entry['unit_price'], entry['vat_rate']
+            )
+        plan.append(entry)
+    return plan
+
+def plan_totals(plan):
+    """Total amount of the priced entries per currency"""
+    totals = defaultdict(int)
+    for entry in plan:
+        if not entry['skip_reason']:
+            totals[entry['currency']] += entry['total_amount']
+    return dict(sorted(totals.items()))
+
+def _invoice_values(entry, issue_date, due_date):
+    return {
+        'issue_date': issue_date,
+        'due_date': due_date,
+        'currency': entry['currency'],
+        'subtotal': entry['line_total'],
+        'vat_total': entry['vat_amount'],
+        'total_amount': entry['total_amount'],
+    }
+
+def _item_row(invoice_id, entry):
+    trip = entry['trip']
+    return {
+        'invoice_id': invoice_id,
+        'description': (f"Accommodation: {trip.title} ({trip.start_date:%Y-%m-%d} - {trip.end_date:%Y-%m-%d}), "
+                        f"{entry['nights']} x {entry['guests']}"),
+        'quantity': entry['quantity'],
+        'unit_price': entry['unit_price'],
+        'vat_rate': entry['vat_rate'],
+        'line_total': entry['line_total'],
+        'vat_amount': entry['vat_amount'],
+        'total_with_vat': entry['total_amount'],
+    }
+
+def create_batch_invoices(plan, admin_id, issue_date):
+    """Write the priced entries of ``plan`` as draft invoices; the caller commits.
+
+    New invoices take consecutive numbers from the invoice number sequence and
+    are inserted with one multi-row INSERT, their items with another;
+    repriced drafts keep their number and get their placeholder items
+    replaced. Returns ``{'created': [...ids], 'repriced': [...ids], 'skipped': n}``.
+    """
+    priced = [entry for entry in plan if not entry['skip_reason']]
+    new_entries = [entry for entry in priced if entry['draft_id'] is None]
+    draft_entries = [entry for entry in priced if entry['draft_id'] is not None]
+    due_date = issue_date + timedelta(days=current_app.config.get('INVOICE_BATCH_DUE_DAYS', 14))
+    summary = {'created': [], 'repriced': [], 'skipped': len(plan) - len(priced)}
+
+    invoice_ids = {}
+    if new_entries:
+        numbers = allocate_invoice_numbers(len(new_entries), issue_date)
+        # Matched back by registration rather than row order, so every backend batches the INSERT
+        invoice_ids = dict(db.session.execute(
+            insert(Invoice).returning(Invoice.registration_id, Invoice.id),
+            [
+                dict(_invoice_values(entry, issue_date, due_date),
+                     invoice_number=number,
+                     admin_id=admin_id,
+                     registration_id=entry['registration'].id,
+                     client_name=entry['client_name'],
+                     client_email=entry['client_email'],
+                     notes=f"Registration: {entry['trip'].title}",
+                     status='draft')
+                for number, entry in zip(numbers, new_entries)
+            ],
+            execution_options=bulk_options(admin_id)
+        ).all())
+        summary['created'] = sorted(invoice_ids.values())
+
+    if draft_entries:
+        summary['repriced'] = [entry['draft_id'] for entry in draft_entries]
+        db.session.execute(
+            delete(InvoiceItem).where(InvoiceItem.invoice_id.in_(summary['repriced'])),
+            execution_options={'synchronize_session': False}
+        )
+        # Bulk UPDATE by primary key, one statement for all drafts
+        now = datetime.utcnow()
+        db.session.execute(update(Invoice), [
+            dict(_invoice_values(entry, issue_date, due_date), id=entry['draft_id'], updated_at=now)
+            for entry in draft_entries
+        ], execution_options=bulk_options(admin_id))
+
+    items = [_item_row(invoice_ids[entry['registration'].id], entry) for entry in new_entries]
+    items += [_item_row(entry['draft_id'], entry) for entry in draft_entries]
+    if items:
+        db.session.execute(insert(InvoiceItem), items)
+    return summary
@@ -78,6 +78,15 @@ class SystemManager:
             'clean': self.cleanup,
             'setup': self.setup_system,
             'docker': self.docker_operations,
+            'trips': self.trip_operations,
+            'gdpr': self.gdpr_operations,
+            'outbox': self.outbox_operations,
+            'campaigns': self.campaign_operations,
+            'invoices': self.invoice_operations,
+            'exports': self.export_operations,
+            'pdf': self.pdf_operations,
+            'reports': self.report_operations,
+            'analytics': self.analytics_operations,
             'all': self.run_all
         }
     
@@ -469,6 +478,440 @@ class SystemManager:
         print(f"\nOverall Success: {success_count}/{total_count}")
         return success_count == total_count
 
+    def _app_context(self):
+        """Return an application context for commands that work on the database directly"""
+        sys.path.insert(0, str(self.project_root))
+        from app import app
+        return app.app_context()
+    
+    def trip_operations(self, args=None):
+        """Handle trip maintenance operations"""
+        print("🧳 Trip Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available trip operations:")
+            print("  rebuild-counters [trip_id ...]              - Recompute registration/guest counters on trips")
+            return True
+        
+        operation = args[0]
+        
+        if operation == 'rebuild-counters':
+            return self._trips_rebuild_counters(args[1:])
+        else:
+            print(f"❌ Unknown trip operation: {operation}")
+            return False
+    
+    def _trips_rebuild_counters(self, args):
+        """Recompute the denormalised trip counters in one set-based UPDATE"""
+        try:
+            trip_ids = [int(arg) for arg in args] or None
+        except ValueError:
+            print("❌ Trip ids must be integers")
+            return False
+        
+        try:
+            with self._app_context():
+                from database import db, rebuild_trip_counters
+                updated = rebuild_trip_counters(trip_ids)
+                db.session.commit()
+            self.log_action("SUCCESS", f"Rebuilt counters for {updated} trips")
+            return True
+        except Exception as e:
+            self.log_action("ERROR", f"Failed to rebuild trip counters: {e}")
+            return False
+    
+    def gdpr_operations(self, args=None):
+        """Handle GDPR document purge operations"""
+        print("🔒 GDPR Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available GDPR operations:")
+            print("  work                                        - Run the purge and retention worker until stopped")
+            print("  sweep                                       - Delete queued documents in batches")
+            print("  retention [days]                            - Queue expired and orphaned documents, then sweep")
+            print("  orphans                                     - List upload files no guest references")
+            print("  status                                      - Show purge queue counts")
+            return True
+        
+        operation = args[0]
+        
+        try:
+            with self._app_context():
+                from flask import current_app
+                import gdpr
+                if operation == 'work':
+                    self.log_action("START", "GDPR worker running (Ctrl+C to stop)")
+                    gdpr.GDPRWorker(current_app._get_current_object()).run_forever()
+                    self.log_action("STOP", "GDPR worker stopped")
+                    return True
+                elif operation == 'sweep':
+                    stats = gdpr.sweep_document_purges()
+                    self.log_action("SUCCESS", f"Purged {stats['purged']} files ({stats['missing']} already missing, {stats['failed']} failed)")
+                    return stats['failed'] == 0
+                elif operation == 'retention':
+                    retention_days = int(args[1]) if len(args) > 1 else None
+                    stats = gdpr.run_retention_sweep(retention_days=retention_days)
+                    self.log_action("SUCCESS", f"Queued {stats['expired_queued']} expired and {stats['orphans_queued']} orphaned documents; "
+                                               f"purged {stats['purged']} files ({stats['failed']} failed)")
+                    return stats['failed'] == 0
+                elif operation == 'orphans':
+                    orphans = gdpr.find_orphaned_uploads()
+                    for name in orphans:
+                        print(f"  {name}")
+                    self.log_action("SUCCESS", f"Found {len(orphans)} orphaned upload files")
+                    return True
+                elif operation == 'status':
+                    status = gdpr.purge_queue_status()
+                    print(f"  Pending: {status['pending']}")
+                    print(f"  Stuck (max attempts reached): {status['stuck']}")
+                    print(f"  Purged: {status['purged']}")
+                    return True
+                else:
+                    print(f"❌ Unknown GDPR operation: {operation}")
+                    return False
+        except ValueError:
+            print("❌ Retention days must be an integer")
+            return False
+        except Exception as e:
+            self.log_action("ERROR", f"GDPR operation failed: {e}")
+            return False
+    
+    def outbox_operations(self, args=None):
+        """Handle outbound email queue operations"""
+        print("📮 Outbox Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available outbox operations:")
+            print("  work                                        - Run the outbox worker until stopped")
+            print("  process                                     - Send everything that is due, then exit")
+            print("  status                                      - Show message counts per delivery status")
+            print("  retry [message_id ...]                      - Requeue failed messages")
+            return True
+        
+        operation = args[0]
+        
+        try:
+            with self._app_context():
+                from flask import current_app
+                from database import db
+                import outbox
+                if operation == 'work':
+                    self.log_action("START", "Outbox worker running (Ctrl+C to stop)")
+                    outbox.OutboxWorker(current_app._get_current_object()).run_forever()
+                    self.log_action("STOP", "Outbox worker stopped")
+                    return True
+                elif operation == 'process':
+                    worker = outbox.OutboxWorker(current_app._get_current_object())
+                    try:
+                        stats = worker.drain()
+                    finally:
+                        worker.connection.close()
+                    self.log_action("SUCCESS", f"Sent {stats['sent']}, rescheduled {stats['retry']}, failed {stats['failed']}")
+                    return True
+                elif operation == 'status':
+                    status = outbox.outbox_status()
+                    for name in ('queued', 'sending', 'sent', 'failed'):
+                        print(f"  {name.title()}: {status.get(name, 0)}")
+                    return True
+                elif operation == 'retry':
+                    message_ids = [int(arg) for arg in args[1:]] or None
+                    requeued = outbox.requeue_failed(message_ids)
+                    db.session.commit()
+                    self.log_action("SUCCESS", f"Requeued {requeued} failed messages")
+                    return True
+                else:
+                    print(f"❌ Unknown outbox operation: {operation}")
+                    return False
+        except ValueError:
+            print("❌ Message ids must be integers")
+            return False
+        except Exception as e:
+            self.log_action("ERROR", f"Outbox operation failed: {e}")
+            return False
+    
+    def campaign_operations(self, args=None):
+        """Handle guest email campaigns"""
+        print("📣 Campaign Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available campaign operations:")
+            print("  reminders [days] [--locale xx] [--dry-run] [--send]")
+            print("                                              - Queue pre-arrival reminders for unregistered trips")
+            return True
+        
+        operation = args[0]
+        
+        try:
+            with self._app_context():
+                from flask import current_app
+                import campaigns
+                import outbox
+                if operation == 'reminders':
+                    options = args[1:]
+                    dry_run = '--dry-run' in options
+                    send = '--send' in options
+                    locale = None
+                    if '--locale' in options:
+                        locale = options[options.index('--locale') + 1]
+                        options = [o for o in options if o != locale]
+                    positional = [o for o in options if not o.startswith('--')]
+                    days = int(positional[0]) if positional else None
+                    
+                    summary = campaigns.run_reminder_campaign(days_ahead=days, locale=locale, dry_run=dry_run)
+                    if dry_run:
+                        self.log_action("SUCCESS", f"{summary['targets']} trips would receive a reminder")
+                        return True
+                    self.log_action("SUCCESS", f"Queued {summary['queued']} of {summary['targets']} reminders in {summary['batches']} batches ({summary['failed']} failed)")
+                    if send and summary['queued']:
+                        worker = outbox.OutboxWorker(current_app._get_current_object())
+                        try:
+                            stats = worker.drain()
+                        finally:
+                            worker.connection.close()
+                        self.log_action("SUCCESS", f"Sent {stats['sent']}, rescheduled {stats['retry']}, failed {stats['failed']}")
+                    return summary['failed'] == 0
+                else:
+                    print(f"❌ Unknown campaign operation: {operation}")
+                    return False
+        except (ValueError, IndexError):
+            print("❌ Usage: reminders [days] [--locale xx] [--dry-run] [--send]")
+            return False
+        except Exception as e:
+            self.log_action("ERROR", f"Campaign operation failed: {e}")
+            return False
+    
+    def invoice_operations(self, args=None):
+        """Handle invoice maintenance operations"""
+        print("🧾 Invoice Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available invoice operations:")
+            print("  recalc [--dry-run]                          - Recompute invoice totals from their items")
+            return True
+        
+        operation = args[0]
+        
+        try:
+            with self._app_context():
+                from database import db, find_invoice_total_mismatches, recalculate_invoice_totals
+                if operation == 'recalc':
+                    dry_run = '--dry-run' in args[1:]
+                    changed = find_invoice_total_mismatches() if dry_run else recalculate_invoice_totals()
+                    for row in changed:
+                        print(f"  {row.invoice_number} (ID: {row.id}): "
+                              f"subtotal {row.subtotal} → {row.new_subtotal}, "
+                              f"VAT {row.vat_total} → {row.new_vat_total}, "
+                              f"total {row.total_amount} → {row.new_total_amount}")
+                    if dry_run:
+                        self.log_action("SUCCESS", f"{len(changed)} invoices have incorrect totals (dry run, nothing changed)")
+                        return True
+                    db.session.commit()
+                    if changed:
+                        from pdf_cache import invalidate_invoice_pdf
+                        for row in changed:
+                            invalidate_invoice_pdf(row.id)
+                    self.log_action("SUCCESS", f"Repaired totals of {len(changed)} invoices")
+                    return True
+                else:
+                    print(f"❌ Unknown invoice operation: {operation}")
+                    return False
+        except Exception as e:
+            self.log_action("ERROR", f"Invoice operation failed: {e}")
+            return False
+    
+    def export_operations(self, args=None):
+        """Handle background export jobs"""
+        print("📦 Export Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available export operations:")
+            print("  work                                        - Run the export worker until stopped")
+            print("  process                                     - Run every queued export, then exit")
+            print("  cleanup                                     - Delete expired export files")
+            print("  status                                      - Show export job counts per status")
+            return True
+        
+        operation = args[0]
+        
+        try:
+            with self._app_context():
+                from flask import current_app
+                import export_jobs
+                if operation == 'work':
+                    self.log_action("START", "Export worker running (Ctrl+C to stop)")
+                    export_jobs.ExportWorker(current_app._get_current_object()).run_forever()
+                    self.log_action("STOP", "Export worker stopped")
+                    return True
+                elif operation == 'process':
+                    stats = export_jobs.ExportWorker(current_app._get_current_object()).drain()
+                    self.log_action("SUCCESS", f"Finished {stats['done']} exports, {stats['failed']} failed")
+                    return True
+                elif operation == 'cleanup':
+                    expired = export_jobs.cleanup_expired_exports()
+                    self.log_action("SUCCESS", f"Removed {expired} expired exports")
+                    return True
+                elif operation == 'status':
+                    status = export_jobs.export_job_status()
+                    for name in ('queued', 'running', 'done', 'failed', 'expired'):
+                        print(f"  {name.title()}: {status.get(name, 0)}")
+                    return True
+                else:
+                    print(f"❌ Unknown export operation: {operation}")
+                    return False
+        except Exception as e:
+            self.log_action("ERROR", f"Export operation failed: {e}")
+            return False
+    
+    def pdf_operations(self, args=None):
+        """Handle the host's PDF render service"""
+        print("📄 PDF Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available PDF operations:")
+            print("  work                                        - Run the PDF render service until stopped")
+            print("  status                                      - Show the render service's load and counters")
+            return True
+        
+        operation = args[0]
+        
+        try:
+            with self._app_context():
+                import pdf_service
+                if operation == 'work':
+                    service = pdf_service.create_render_service()
+                    self.log_action("START", f"PDF render service listening on {service.address} (Ctrl+C to stop)")
+                    service.run_forever()
+                    self.log_action("STOP", "PDF render service stopped")
+                    return True
+                elif operation == 'status':
+                    client = pdf_service.get_render_client()
+                    if client is None:
+                        print("  PDF_RENDER_SERVICE_ADDRESS is not set; PDFs are rendered in the web workers")
+                        return True
+                    status = client.status()
+                    for name in ('size', 'queue_depth', 'in_flight', 'rendered', 'failed', 'refused'):
+                        print(f"  {name.replace('_', ' ').title()}: {status[name]}")
+                    return True
+                else:
+                    print(f"❌ Unknown PDF operation: {operation}")
+                    return False
+        except Exception as e:
+            self.log_action("ERROR", f"PDF operation failed: {e}")
+            return False
+    
+    def report_operations(self, args=None):
+        """Handle guest reports"""
+        print("🛂 Report Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available report operations:")
+            print("  police <from> <to> [--format csv|fixed] [--folder dir] [--workers n] [--admin username] [--locale xx]")
+            print("                                              - Write the police report / accommodation book per amenity")
+            return True
+        
+        operation = args[0]
+        
+        try:
+            with self._app_context():
+                from datetime import date
+                from database import User
+                import police_report
+                if operation == 'police':
+                    options = list(args[1:])
+                    values = {'--format': 'csv', '--folder': 'reports', '--workers': '4', '--admin': None, '--locale': None}
+                    for flag in values:
+                        if flag in options:
+                            position = options.index(flag)
+                            values[flag] = options[position + 1]
+                            del options[position:position + 2]
+                    date_from, date_to = date.fromisoformat(options[0]), date.fromisoformat(options[1])
+                    admin_id = None
+                    if values['--admin']:
+                        admin = User.query.filter_by(username=values['--admin']).first()
+                        if not admin:
+                            print(f"❌ Unknown admin: {values['--admin']}")
+                            return False
+                        admin_id = admin.id
+                    
+                    started = time.time()
+                    summaries = police_report.write_police_reports(
+                        admin_id, date_from, date_to, values['--folder'], values['--format'],
+                        workers=int(values['--workers']), locale=values['--locale']
+                    )
+                    for summary in summaries:
+                        print(f"  {summary['amenity_name']}: {summary['guests']} guests, "
+                              f"{summary['guest_nights']} guest-nights → {summary['path']}")
+                    self.log_action("SUCCESS", f"Wrote {len(summaries)} police reports with "
+                                               f"{sum(s['guest_nights'] for s in summaries)} guest-nights "
+                                               f"in {time.time() - started:.1f}s")
+                    return True
+                else:
+                    print(f"❌ Unknown report operation: {operation}")
+                    return False
+        except (ValueError, IndexError):
+            print("❌ Usage: police <YYYY-MM-DD> <YYYY-MM-DD> [--format csv|fixed] [--folder dir] [--workers n] [--admin username] [--locale xx]")
+            return False
+        except Exception as e:
+            self.log_action("ERROR", f"Report operation failed: {e}")
+            return False
+    
+    def analytics_operations(self, args=None):
+        """Handle the analytics rollups behind the breakdowns pages"""
+        print("📈 Analytics Operations")
+        print("=" * 50)
+        
+        if not args:
+            print("Available analytics operations:")
+            print("  refresh                                     - Roll up the days changed since the last refresh")
+            print("  rebuild [from] [to]                         - Recompute every rollup, or those of a date range")
+            print("  status                                      - Show the rollup watermark and row counts")
+            return True
+        
+        operation = args[0]
+        
+        try:
+            with self._app_context():
+                from datetime import date
+                from database import db
+                import analytics_rollup
+                if operation == 'refresh':
+                    days = analytics_rollup.refresh_rollups()
+                    db.session.commit()
+                    self.log_action("SUCCESS", f"Refreshed analytics rollups ({days} recomputed)")
+                    return True
+                elif operation == 'rebuild':
+                    date_from = date.fromisoformat(args[1]) if len(args) > 1 else None
+                    date_to = date.fromisoformat(args[2]) if len(args) > 2 else None
+                    started = time.time()
+                    rows = analytics_rollup.rebuild_rollups(date_from, date_to)
+                    db.session.commit()
+                    self.log_action("SUCCESS", f"Rebuilt {rows} analytics rollup rows in {time.time() - started:.1f}s")
+                    return True
+                elif operation == 'status':
+                    status = analytics_rollup.rollup_status()
+                    print(f"  Refreshed through: {status['refreshed_through'] or 'never'}")
+                    print(f"  Last refresh: {status['refreshed_at'] or 'never'}")
+                    print(f"  Rollup rows: {status['rows']}")
+                    print(f"  Days waiting after deletes: {status['pending_days']}")
+                    return True
+                else:
+                    print(f"❌ Unknown analytics operation: {operation}")
+                    return False
+        except ValueError:
+            print("❌ Usage: rebuild [YYYY-MM-DD] [YYYY-MM-DD]")
+            return False
+        except Exception as e:
+            self.log_action("ERROR", f"Analytics operation failed: {e}")
+            return False
+    
     def docker_operations(self, args=None):
         """Handle Docker operations"""
         print("🐳 Docker Operations")
@@ -1276,6 +1719,20 @@ Examples:
   python manage.py setup                   # Setup system from scratch
   python manage.py all                     # Run all operations
 
+  # Maintenance
+  python manage.py trips rebuild-counters  # Recompute trip registration/guest counters
+  python manage.py gdpr work               # Run the document purge and retention worker
+  python manage.py gdpr sweep              # Delete queued guest documents
+  python manage.py gdpr retention          # Enforce document retention and purge orphaned uploads
+  python manage.py outbox work             # Run the outbound email worker
+  python manage.py outbox status           # Show queued/sent/failed email counts
+  python manage.py campaigns reminders 7   # Queue pre-arrival reminders for the next 7 days
+  python manage.py invoices recalc         # Recompute invoice totals from their items
+  python manage.py exports work            # Run the background export worker
+  python manage.py pdf work                # Run the host's PDF render service
+  python manage.py reports police 2026-07-01 2026-07-31  # Police report / accommodation book per amenity
+  python manage.py analytics refresh       # Bring the analytics rollups up to date (cron-friendly)
+
   # Test Suite Operations (Isolated Testing)
   python manage.py test-suite              # Run complete test suite (setup + seed + server + tests)
   python manage.py test-setup              # Set up test environment only
@@ -1323,7 +1780,7 @@ Examples:
     )
     
     parser.add_argument('command', 
-                       choices=['test', 'test-suite', 'test-setup', 'test-seed', 'test-server', 'test-cleanup', 'migrate', 'seed', 'backup', 'utility', 'status', 'health', 'clean', 'setup', 'docker', 'all'],
+                       choices=['test', 'test-suite', 'test-setup', 'test-seed', 'test-server', 'test-cleanup', 'migrate', 'seed', 'backup', 'utility', 'status', 'health', 'clean', 'setup', 'docker', 'trips', 'gdpr', 'outbox', 'campaigns', 'invoices', 'exports', 'pdf', 'reports', 'analytics', 'all'],
                        help='Command to execute')
     
     parser.add_argument('args', nargs='*', 
@@ -0,0 +1,24 @@
+-- Migration: 1.9.0 - Add Trip Registration Counters
+-- Created: 2026-10-19T00:00:09
+-- Description: Denormalised per-trip registration and guest counters, backfilled from existing rows
+
+-- Up Migration
+ALTER TABLE guest_reg_trip ADD COLUMN IF NOT EXISTS registration_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE guest_reg_trip ADD COLUMN IF NOT EXISTS pending_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE guest_reg_trip ADD COLUMN IF NOT EXISTS approved_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE guest_reg_trip ADD COLUMN IF NOT EXISTS rejected_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE guest_reg_trip ADD COLUMN IF NOT EXISTS guest_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE guest_reg_trip SET
+    registration_count = (SELECT COUNT(*) FROM guest_reg_registration r WHERE r.trip_id = guest_reg_trip.id),
+    pending_count = (SELECT COUNT(*) FROM guest_reg_registration r WHERE r.trip_id = guest_reg_trip.id AND r.status = 'pending'),
+    approved_count = (SELECT COUNT(*) FROM guest_reg_registration r WHERE r.trip_id = guest_reg_trip.id AND r.status = 'approved'),
+    rejected_count = (SELECT COUNT(*) FROM guest_reg_registration r WHERE r.trip_id = guest_reg_trip.id AND r.status = 'rejected'),
+    guest_count = (SELECT COUNT(*) FROM guest_reg_guest g JOIN guest_reg_registration r ON g.registration_id = r.id WHERE r.trip_id = guest_reg_trip.id);
+
+-- Down Migration (Rollback)
+ALTER TABLE guest_reg_trip DROP COLUMN IF EXISTS registration_count;
+ALTER TABLE guest_reg_trip DROP COLUMN IF EXISTS pending_count;
+ALTER TABLE guest_reg_trip DROP COLUMN IF EXISTS approved_count;
+ALTER TABLE guest_reg_trip DROP COLUMN IF EXISTS rejected_count;
+ALTER TABLE guest_reg_trip DROP COLUMN IF EXISTS guest_count;
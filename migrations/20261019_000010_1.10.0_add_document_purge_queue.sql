@@ -0,0 +1,25 @@
+-- Migration: 1.10.0 - Add Document Purge Queue
+-- Created: 2026-10-19T00:00:10
+-- Description: Queue for batched GDPR deletion of guest document uploads
+
+-- Up Migration
+CREATE TABLE IF NOT EXISTS guest_reg_document_purge (
+    id SERIAL PRIMARY KEY,
+    guest_id INTEGER,
+    file_name VARCHAR(255) NOT NULL,
+    reason VARCHAR(20) NOT NULL DEFAULT 'approved',
+    enqueued_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    purged_at TIMESTAMP WITHOUT TIME ZONE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_document_purge_guest_id ON guest_reg_document_purge(guest_id);
+CREATE INDEX IF NOT EXISTS idx_document_purge_file_name ON guest_reg_document_purge(file_name);
+CREATE INDEX IF NOT EXISTS idx_guest_document_image ON guest_reg_guest(document_image);
+
+-- Down Migration (Rollback)
+DROP INDEX IF EXISTS idx_guest_document_image;
+DROP INDEX IF EXISTS idx_document_purge_file_name;
+DROP INDEX IF EXISTS idx_document_purge_guest_id;
+DROP TABLE IF EXISTS guest_reg_document_purge;
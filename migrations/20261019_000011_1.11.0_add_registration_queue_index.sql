@@ -0,0 +1,9 @@
+-- Migration: 1.11.0 - Add Registration Queue Index
+-- Created: 2026-10-19T00:00:11
+-- Description: Composite index backing the keyset-paginated pending registrations queue
+
+-- Up Migration
+CREATE INDEX IF NOT EXISTS idx_registration_status_created_at ON guest_reg_registration(status, created_at, id);
+
+-- Down Migration (Rollback)
+DROP INDEX IF EXISTS idx_registration_status_created_at;
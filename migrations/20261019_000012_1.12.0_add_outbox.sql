@@ -0,0 +1,26 @@
+-- Migration: 1.12.0 - Add Outbox
+-- Created: 2026-10-19T00:00:12
+-- Description: Persistent outbound email queue processed by the outbox worker
+
+-- Up Migration
+CREATE TABLE IF NOT EXISTS guest_reg_outbox_message (
+    id SERIAL PRIMARY KEY,
+    sender VARCHAR(255) NOT NULL,
+    recipients TEXT NOT NULL,
+    subject VARCHAR(255),
+    raw_message BYTEA NOT NULL,
+    kind VARCHAR(30),
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP WITHOUT TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP WITHOUT TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_message_status_next_attempt ON guest_reg_outbox_message(status, next_attempt_at);
+
+-- Down Migration (Rollback)
+DROP INDEX IF EXISTS idx_outbox_message_status_next_attempt;
+DROP TABLE IF EXISTS guest_reg_outbox_message;
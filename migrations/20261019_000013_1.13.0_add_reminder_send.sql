@@ -0,0 +1,21 @@
+-- Migration: 1.13.0 - Add Reminder Send
+-- Created: 2026-10-19T00:00:13
+-- Description: Send log for email campaigns so reminder runs are idempotent
+
+-- Up Migration
+CREATE TABLE IF NOT EXISTS guest_reg_reminder_send (
+    id SERIAL PRIMARY KEY,
+    campaign VARCHAR(50) NOT NULL,
+    trip_id INTEGER NOT NULL REFERENCES guest_reg_trip(id) ON DELETE CASCADE,
+    email VARCHAR(200) NOT NULL,
+    locale VARCHAR(10),
+    outbox_message_id INTEGER,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_reminder_send_campaign_trip UNIQUE (campaign, trip_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reminder_send_trip_id ON guest_reg_reminder_send(trip_id);
+
+-- Down Migration (Rollback)
+DROP INDEX IF EXISTS idx_reminder_send_trip_id;
+DROP TABLE IF EXISTS guest_reg_reminder_send;
@@ -0,0 +1,15 @@
+-- Migration: 1.14.0 - Add Invoice List Indexes
+-- Created: 2026-10-19T00:00:14
+-- Description: Composite indexes for the paginated, filterable invoice list
+
+-- Up Migration
+CREATE INDEX IF NOT EXISTS idx_invoice_admin_created ON guest_reg_invoice(admin_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_invoice_admin_status_issue_date ON guest_reg_invoice(admin_id, status, issue_date);
+
+-- Covered by idx_invoice_admin_created
+DROP INDEX IF EXISTS idx_invoice_admin_id;
+
+-- Down Migration (Rollback)
+CREATE INDEX IF NOT EXISTS idx_invoice_admin_id ON guest_reg_invoice(admin_id);
+DROP INDEX IF EXISTS idx_invoice_admin_status_issue_date;
+DROP INDEX IF EXISTS idx_invoice_admin_created;
@@ -0,0 +1,24 @@
+-- Migration: 1.15.0 - Add Amenity Pricing And Invoice Sequence
+-- Created: 2026-10-19T00:00:15
+-- Description: Nightly rate per amenity for batch invoicing and a shared invoice number sequence
+
+-- Up Migration
+ALTER TABLE guest_reg_amenity ADD COLUMN IF NOT EXISTS nightly_rate NUMERIC(10, 2);
+ALTER TABLE guest_reg_amenity ADD COLUMN IF NOT EXISTS currency VARCHAR(3) DEFAULT 'EUR';
+ALTER TABLE guest_reg_amenity ADD COLUMN IF NOT EXISTS vat_rate NUMERIC(5, 2) DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS guest_reg_invoice_number_sequence (
+    name VARCHAR(50) PRIMARY KEY,
+    last_value INTEGER NOT NULL DEFAULT 0
+);
+
+-- Start above every per-admin count used for numbers so far
+INSERT INTO guest_reg_invoice_number_sequence (name, last_value)
+SELECT 'invoice', COALESCE(MAX(id), 0) FROM guest_reg_invoice
+WHERE NOT EXISTS (SELECT 1 FROM guest_reg_invoice_number_sequence WHERE name = 'invoice');
+
+-- Down Migration (Rollback)
+DROP TABLE IF EXISTS guest_reg_invoice_number_sequence;
+ALTER TABLE guest_reg_amenity DROP COLUMN IF EXISTS vat_rate;
+ALTER TABLE guest_reg_amenity DROP COLUMN IF EXISTS currency;
+ALTER TABLE guest_reg_amenity DROP COLUMN IF EXISTS nightly_rate;
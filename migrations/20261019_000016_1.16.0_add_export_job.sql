@@ -0,0 +1,33 @@
+-- Migration: 1.16.0 - Add Export Job
+-- Created: 2026-10-19T00:00:16
+-- Description: Background export jobs written to files and downloaded later by token
+
+-- Up Migration
+CREATE TABLE IF NOT EXISTS guest_reg_export_job (
+    id SERIAL PRIMARY KEY,
+    admin_id INTEGER NOT NULL REFERENCES guest_reg_user(id) ON DELETE CASCADE,
+    kind VARCHAR(20) NOT NULL,
+    format VARCHAR(10) NOT NULL DEFAULT 'csv',
+    date_from DATE,
+    date_to DATE,
+    locale VARCHAR(10),
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    token VARCHAR(64) NOT NULL UNIQUE,
+    total_rows INTEGER,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    file_name VARCHAR(255),
+    file_size BIGINT,
+    error TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITHOUT TIME ZONE,
+    finished_at TIMESTAMP WITHOUT TIME ZONE,
+    expires_at TIMESTAMP WITHOUT TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_export_job_admin_id ON guest_reg_export_job(admin_id, id);
+CREATE INDEX IF NOT EXISTS idx_export_job_status ON guest_reg_export_job(status, id);
+
+-- Down Migration (Rollback)
+DROP INDEX IF EXISTS idx_export_job_status;
+DROP INDEX IF EXISTS idx_export_job_admin_id;
+DROP TABLE IF EXISTS guest_reg_export_job;
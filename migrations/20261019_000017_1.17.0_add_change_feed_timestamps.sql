@@ -0,0 +1,25 @@
+-- Migration: 1.17.0 - Add Change Feed Timestamps
+-- Created: 2026-10-19T00:00:17
+-- Description: updated_at on trips and guests, and (updated_at, id) indexes for the changes feed
+
+-- Up Migration
+ALTER TABLE guest_reg_trip ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+ALTER TABLE guest_reg_guest ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+
+UPDATE guest_reg_trip SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+UPDATE guest_reg_guest SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+UPDATE guest_reg_registration SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+UPDATE guest_reg_invoice SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_trip_updated_at ON guest_reg_trip(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_registration_updated_at ON guest_reg_registration(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_guest_updated_at ON guest_reg_guest(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_invoice_updated_at ON guest_reg_invoice(updated_at, id);
+
+-- Down Migration (Rollback)
+DROP INDEX IF EXISTS idx_invoice_updated_at;
+DROP INDEX IF EXISTS idx_guest_updated_at;
+DROP INDEX IF EXISTS idx_registration_updated_at;
+DROP INDEX IF EXISTS idx_trip_updated_at;
+ALTER TABLE guest_reg_guest DROP COLUMN IF EXISTS updated_at;
+ALTER TABLE guest_reg_trip DROP COLUMN IF EXISTS updated_at;
@@ -0,0 +1,43 @@
+-- Migration: 1.18.0 - Add Analytics Rollup
+-- Created: 2026-10-19T00:00:18
+-- Description: Daily analytics rollups per admin and amenity read by the breakdowns pages, with the days to recompute and the refresh watermark
+
+-- Up Migration
+CREATE TABLE IF NOT EXISTS guest_reg_analytics_rollup (
+    id SERIAL PRIMARY KEY,
+    day DATE NOT NULL,
+    admin_id INTEGER NOT NULL REFERENCES guest_reg_user(id) ON DELETE CASCADE,
+    amenity_id INTEGER,
+    metric VARCHAR(40) NOT NULL,
+    dimension VARCHAR(60) NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 0,
+    amount NUMERIC(12, 2) NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_analytics_rollup_admin_metric_day ON guest_reg_analytics_rollup(admin_id, metric, day);
+CREATE INDEX IF NOT EXISTS idx_analytics_rollup_admin_day ON guest_reg_analytics_rollup(admin_id, day);
+
+CREATE TABLE IF NOT EXISTS guest_reg_analytics_rollup_day (
+    id SERIAL PRIMARY KEY,
+    admin_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS guest_reg_analytics_rollup_state (
+    id SERIAL PRIMARY KEY,
+    refreshed_through TIMESTAMP WITHOUT TIME ZONE,
+    refreshed_at TIMESTAMP WITHOUT TIME ZONE
+);
+
+-- An empty watermark makes the first refresh build every rollup
+INSERT INTO guest_reg_analytics_rollup_state (refreshed_through, refreshed_at)
+SELECT NULL, NULL
+WHERE NOT EXISTS (SELECT 1 FROM guest_reg_analytics_rollup_state);
+
+-- Down Migration (Rollback)
+DROP TABLE IF EXISTS guest_reg_analytics_rollup_state;
+DROP TABLE IF EXISTS guest_reg_analytics_rollup_day;
+DROP INDEX IF EXISTS idx_analytics_rollup_admin_day;
+DROP INDEX IF EXISTS idx_analytics_rollup_admin_metric_day;
+DROP TABLE IF EXISTS guest_reg_analytics_rollup;
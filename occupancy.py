@@ -0,0 +1,200 @@
+"""
+Occupancy and turnover analytics per amenity
+
+Every trip books the nights from its ``start_date`` up to, but not including,
+its ``end_date`` at one amenity. The trips of the admin overlapping the
+period are read with one query and turned into a nights × amenities grid
+with NumPy: each stay adds +1 at its first night and -1 after its last one
+in a difference array, and a cumulative sum along the days gives the number
+of stays on every night. Monthly figures are then reduced from the grid with
+``np.add.reduceat``, so the cost follows amenities × days, not the length of
+the stays.
+
+Per amenity and month:
+
+- ``occupancy`` — booked nights as a percentage of the nights in the month
+- ``average_stay`` — average length in nights of the stays arriving that month
+- ``turnover_days`` — days on which one stay departs and another arrives
+- ``double_booked_nights`` — nights booked by more than one stay
+
+Double bookings are also listed as runs of consecutive nights with the trips
+involved.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from database import db, Amenity, Trip
+
+# Ten years of nights per amenity
+MAX_PERIOD_DAYS = 3660
+
+def _days(value):
+    return np.datetime64(value, 'D')
+
+def stay_arrays(admin_id, date_from, date_to, amenity_id=None):
+    """Trips of the admin booking at least one night in ``[date_from, date_to]``.
+
+    Returns the trip ids, amenity ids, first nights and departure days as
+    NumPy arrays, read with one query.
+    """
+    query = (
+        select(Trip.id, Trip.amenity_id, Trip.start_date, Trip.end_date)
+        .where(
+            Trip.admin_id == admin_id,
+            Trip.start_date <= date_to,
+            Trip.end_date > date_from,
+            Trip.end_date > Trip.start_date,
+        )
+        .order_by(Trip.amenity_id, Trip.start_date, Trip.id)
+    )
+    if amenity_id is not None:
+        query = query.where(Trip.amenity_id == amenity_id)
+    rows = db.session.execute(query).all()
+    return (
+        np.array([row.id for row in rows], dtype=np.int64),
+        np.array([row.amenity_id for row in rows], dtype=np.int64),
+        np.array([row.start_date for row in rows], dtype='datetime64[D]'),
+        np.array([row.end_date for row in rows], dtype='datetime64[D]'),
+    )
+
+def _month_starts(first_day, nights):
+    """Offsets of the first day of every month in the period, and the month labels"""
+    months = (first_day + np.arange(nights)).astype('datetime64[M]')
+    labels, offsets = np.unique(months, return_index=True)
+    return offsets, [str(label) for label in labels]
+
+def _runs(mask):
+    """``(start, stop)`` offsets of the runs of True in each row of a 2-D mask"""
+    edges = np.diff(np.pad(mask.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, stops = np.nonzero(edges == -1)
+    return rows, starts, stops
+
+def _figures(nights, booked, arrivals, arrival_nights, turnover_days, double_booked):
+    """Figures of one cell (amenity and month), row or the whole report, as plain numbers"""
+    nights, booked, arrivals = int(nights), int(booked), int(arrivals)
+    return {
+        'nights': nights,
+        'booked_nights': booked,
+        'occupancy': round(100.0 * booked / nights, 1) if nights else 0,
+        'arrivals': arrivals,
+        'average_stay': round(int(arrival_nights) / arrivals, 1) if arrivals else 0,
+        'turnover_days': int(turnover_days),
+        'double_booked_nights': int(double_booked),
+    }
+
+def occupancy_report(admin_id, date_from, date_to, amenity_id=None):
+    """Monthly occupancy, average stay, turnover days and double bookings per amenity.
+
+    ``date_from`` and ``date_to`` are the first and last night counted.
+    Reads the admin's amenities and the overlapping trips with one query each.
+    Raises ``ValueError`` for an empty period or one longer than
+    ``MAX_PERIOD_DAYS``.
+    """
+    if date_to < date_from:
+        raise ValueError('date_to is before date_from')
+    if (date_to - date_from).days >= MAX_PERIOD_DAYS:
+        raise ValueError(f'The period is limited to {MAX_PERIOD_DAYS} days')
+    amenity_query = Amenity.query.filter_by(admin_id=admin_id).order_by(Amenity.name, Amenity.id)
+    if amenity_id is not None:
+        amenity_query = amenity_query.filter(Amenity.id == amenity_id)
+    amenities = amenity_query.with_entities(Amenity.id, Amenity.name).all()
+    trip_ids, trip_amenities, starts, ends = stay_arrays(admin_id, date_from, date_to, amenity_id)
+
+    first_day = _days(date_from)
+    nights = (_days(date_to) - first_day).astype(int) + 1
+    month_offsets, month_labels = _month_starts(first_day, nights)
+    month_nights = np.diff(np.append(month_offsets, nights))
+
+    # Grid row of every trip; trips of amenities outside the list are dropped
+    amenity_ids = np.array([amenity.id for amenity in amenities], dtype=np.int64)
+    known = np.isin(trip_amenities, amenity_ids)
+    trip_ids, starts, ends = trip_ids[known], starts[known], ends[known]
+    order = np.argsort(amenity_ids)
+    rows = order[np.searchsorted(amenity_ids[order], trip_amenities[known])]
+
+    # Offsets of the first night and the departure day, clipped to the period
+    start_offsets = (starts - first_day).astype(int)
+    end_offsets = (ends - first_day).astype(int)
+    first_nights = np.clip(start_offsets, 0, nights)
+    departures = np.clip(end_offsets, 0, nights)
+
+    shape = (len(amenities), nights + 1)
+    difference = np.zeros(shape, dtype=np.int32)
+    np.add.at(difference, (rows, first_nights), 1)
+    np.add.at(difference, (rows, departures), -1)
+    stays = np.cumsum(difference, axis=1)[:, :nights]
+
+    arrived = start_offsets >= 0
+    arrivals = np.zeros(shape, dtype=np.int32)
+    np.add.at(arrivals, (rows[arrived], start_offsets[arrived]), 1)
+    departed = end_offsets < nights
+    leaving = np.zeros(shape, dtype=np.int32)
+    np.add.at(leaving, (rows[departed], end_offsets[departed]), 1)
+    turnover = (arrivals[:, :nights] > 0) & (leaving[:, :nights] > 0)
+
+    # Length of each stay is credited to the month of its arrival
+    stay_nights = np.zeros(shape, dtype=np.int64)
+    np.add.at(stay_nights, (rows[arrived], start_offsets[arrived]), (end_offsets - start_offsets)[arrived])
+
+    def monthly(grid):
+        if not len(amenities):
+            return np.zeros((0, len(month_offsets)), dtype=np.int64)
+        return np.add.reduceat(grid[:, :nights].astype(np.int64), month_offsets, axis=1)
+
+    booked = monthly(stays > 0)
+    double = monthly(stays > 1)
+    arriving = monthly(arrivals)
+    arriving_nights = monthly(stay_nights)
+    turnovers = monthly(turnover)
+
+    report = []
+    for index, amenity in enumerate(amenities):
+        months = [
+            dict(month=label, **_figures(month_nights[month], booked[index, month], arriving[index, month],
+                                         arriving_nights[index, month], turnovers[index, month], double[index, month]))
+            for month, label in enumerate(month_labels)
+        ]
+        report.append({
+            'id': amenity.id,
+            'name': amenity.name,
+            'months': months,
+            'totals': _figures(nights, booked[index].sum(), arriving[index].sum(), arriving_nights[index].sum(),
+                               turnovers[index].sum(), double[index].sum()),
+        })
+
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'months': month_labels,
+        'amenities': report,
+        'totals': _figures(nights * len(amenities), booked.sum(), arriving.sum(), arriving_nights.sum(),
+                           turnovers.sum(), double.sum()),
+        'double_bookings': _double_bookings(amenities, stays, rows, trip_ids, first_nights, departures, first_day),
+    }
+
+def _double_bookings(amenities, stays, rows, trip_ids, first_nights, departures, first_day):
+    """Runs of consecutive nights booked more than once, with the overlapping trips"""
+    conflicts = []
+    for row, start, stop in zip(*_runs(stays > 1)):
+        overlapping = (rows == row) & (first_nights < stop) & (departures > start)
+        conflicts.append({
+            'amenity_id': amenities[row].id,
+            'amenity_name': amenities[row].name,
+            'first_night': str(first_day + start),
+            'last_night': str(first_day + stop - 1),
+            'nights': int(stop - start),
+            'max_stays': int(stays[row, start:stop].max()),
+            'trip_ids': sorted(int(trip_id) for trip_id in trip_ids[overlapping]),
+        })
+    return conflicts
+
+def default_period(today=None):
+    """The twelve months ending with the current one"""
+    today = today or date.today()
+    year, month = divmod(today.year * 12 + today.month - 1 - 11, 12)
+    next_year, next_month = divmod(today.year * 12 + today.month, 12)
+    return date(year, month + 1, 1), date(next_year, next_month + 1, 1) - timedelta(days=1)
@@ -0,0 +1,299 @@
+"""
+Persistent outbound email queue
+
+Request handlers call enqueue_message() inside their own transaction; nothing
+talks to the mail server during a request. A worker process
+(``python manage.py outbox work``) claims due messages in batches and sends
+them over one long-lived SMTP connection, retrying transient failures with
+exponential backoff and recording the delivery status of every message.
+"""
+
+import signal
+import smtplib
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import BadHeaderError, sanitize_address, sanitize_addresses
+from sqlalchemy import and_, or_, select, update
+
+from database import db, OutboxMessage
+
+def _config(key, default):
+    return current_app.config.get(key, default)
+
+def enqueue_message(msg, kind=None):
+    """Queue a fully built ``flask_mail.Message``; the caller commits.
+
+    The MIME message is serialised now, so translations, rendered templates
+    and attachments are frozen at enqueue time and the worker needs no
+    request context.
+    """
+    if not msg.send_to:
+        raise ValueError('Message has no recipients')
+    if msg.has_bad_headers():
+        raise BadHeaderError
+    sender = msg.sender or current_app.config.get('MAIL_DEFAULT_SENDER') or current_app.config.get('MAIL_USERNAME')
+    if not msg.sender:
+        msg.sender = sender
+
+    row = OutboxMessage(
+        sender=sanitize_address(sender),
+        recipients=','.join(sorted(sanitize_addresses(msg.send_to))),
+        subject=(msg.subject or '')[:255],
+        raw_message=msg.as_bytes(),
+        kind=kind,
+        status='queued',
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(row)
+    return row
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: base * 2^(attempts-1), capped"""
+    base = _config('OUTBOX_RETRY_BASE_SECONDS', 60)
+    cap = _config('OUTBOX_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)))
+
+class SMTPSessionError(Exception):
+    """Connecting, STARTTLS or login failed: the server or our settings are at fault, not the message"""
+
+def is_permanent_failure(error):
+    """5xx replies will not succeed on retry; everything else is transient"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+def is_connection_failure(error):
+    """Socket-level errors and dropped sessions, as opposed to SMTP replies"""
+    if isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+        return isinstance(error, smtplib.SMTPConnectError)
+    return isinstance(error, OSError)
+
+class SMTPConnection:
+    """One SMTP session kept open across messages and batches.
+
+    The session is opened lazily, checked with NOOP when it has been idle,
+    and re-opened once if the server dropped it mid-send.
+    """
+
+    def __init__(self, config):
+        self.server = config.get('MAIL_SERVER', 'localhost')
+        self.port = config.get('MAIL_PORT', 25)
+        self.use_ssl = config.get('MAIL_USE_SSL', False)
+        self.use_tls = config.get('MAIL_USE_TLS', False)
+        self.username = config.get('MAIL_USERNAME')
+        self.password = config.get('MAIL_PASSWORD')
+        self.timeout = config.get('OUTBOX_SMTP_TIMEOUT_SECONDS', 30)
+        self.keepalive = config.get('OUTBOX_SMTP_KEEPALIVE_SECONDS', 60)
+        self.host = None
+        self.last_used = 0.0
+        self.connections_opened = 0
+
+    def _open(self):
+        host = None
+        try:
+            if self.use_ssl:
+                host = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout)
+            else:
+                host = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            if self.use_tls:
+                host.starttls()
+            if self.username and self.password:
+                host.login(self.username, self.password)
+        except OSError as e:  # smtplib errors are OSError subclasses
+            if host is not None:
+                host.close()
+            raise SMTPSessionError(f"{type(e).__name__}: {e}") from e
+        self.host = host
+        self.connections_opened += 1
+
+    def _ensure_open(self):
+        if self.host is not None and time.monotonic() - self.last_used > self.keepalive:
+            try:
+                if self.host.noop()[0] != 250:
+                    self.close()
+            except OSError:  # smtplib errors are OSError subclasses
+                self.close()
+        if self.host is None:
+            self._open()
+
+    def send(self, sender, recipients, raw_message):
+        self._ensure_open()
+        try:
+            self.host.sendmail(sender, recipients, raw_message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self._open()
+            self.host.sendmail(sender, recipients, raw_message)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.host is None:
+            return
+        try:
+            self.host.quit()
+        except OSError:
+            pass
+        self.host = None
+
+def claim_due_messages(limit, now=None):
+    """Mark up to ``limit`` due messages as sending and return their ids.
+
+    Messages stuck in 'sending' longer than the lease (a worker died) are
+    claimed again. SKIP LOCKED lets several workers share the queue on
+    PostgreSQL.
+    """
+    now = now or datetime.utcnow()
+    lease_expired = now - timedelta(seconds=_config('OUTBOX_LEASE_SECONDS', 600))
+    ids = db.session.execute(
+        select(OutboxMessage.id)
+        .where(or_(
+            and_(OutboxMessage.status == 'queued', OutboxMessage.next_attempt_at <= now),
+            and_(OutboxMessage.status == 'sending', OutboxMessage.claimed_at < lease_expired)
+        ))
+        .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if ids:
+        db.session.execute(
+            update(OutboxMessage).where(OutboxMessage.id.in_(ids)).values(status='sending', claimed_at=now),
+            execution_options={'synchronize_session': False}
+        )
+    db.session.commit()
+    return ids
+
+class OutboxWorker:
+    """Sends queued messages in batches over a reused SMTP connection"""
+
+    def __init__(self, app, connection=None):
+        self.app = app
+        self.connection = connection or SMTPConnection(app.config)
+        self.batch_size = app.config.get('OUTBOX_BATCH_SIZE', 50)
+        self.max_attempts = app.config.get('OUTBOX_MAX_ATTEMPTS', 6)
+        self.poll_interval = app.config.get('OUTBOX_POLL_SECONDS', 5)
+        rate = app.config.get('OUTBOX_RATE_LIMIT_PER_MINUTE', 0)
+        self.min_interval = 60.0 / rate if rate else 0.0
+        self.next_send_at = 0.0
+        self.running = False
+
+    def throttle(self):
+        """Space sends out to honour OUTBOX_RATE_LIMIT_PER_MINUTE"""
+        if not self.min_interval:
+            return
+        now = time.monotonic()
+        if now < self.next_send_at:
+            time.sleep(self.next_send_at - now)
+            now = self.next_send_at
+        self.next_send_at = now + self.min_interval
+
+    def process_batch(self):
+        """Send one batch of due messages; returns per-status counts"""
+        stats = {'sent': 0, 'retry': 0, 'failed': 0}
+        ids = claim_due_messages(self.batch_size)
+        if not ids:
+            return stats
+
+        rows = db.session.execute(
+            select(OutboxMessage.id, OutboxMessage.sender, OutboxMessage.recipients,
+                   OutboxMessage.raw_message, OutboxMessage.attempts)
+            .where(OutboxMessage.id.in_(ids))
+            .order_by(OutboxMessage.id)
+        ).all()
+
+        sent_ids, outcomes = [], []
+        for index, row in enumerate(rows):
+            try:
+                self.throttle()
+                self.connection.send(row.sender, row.recipients.split(','), row.raw_message)
+                sent_ids.append(row.id)
+                stats['sent'] += 1
+            except SMTPSessionError as e:
+                # No session (server down, TLS or login refused): defer the batch without spending attempts
+                self.connection.close()
+                retry_at = datetime.utcnow() + retry_delay(1)
+                outcomes.append((row.id, {'status': 'queued', 'next_attempt_at': retry_at,
+                                          'last_error': str(e)[:1000]}))
+                for pending in rows[index + 1:]:
+                    outcomes.append((pending.id, {'status': 'queued', 'next_attempt_at': retry_at}))
+                stats['retry'] += len(rows) - index
+                break
+            except Exception as e:
+                attempts = row.attempts + 1
+                if is_permanent_failure(e) or attempts >= self.max_attempts:
+                    values = {'status': 'failed'}
+                    stats['failed'] += 1
+                else:
+                    values = {'status': 'queued', 'next_attempt_at': datetime.utcnow() + retry_delay(attempts)}
+                    stats['retry'] += 1
+                values.update(attempts=attempts, last_error=f"{type(e).__name__}: {e}"[:1000])
+                outcomes.append((row.id, values))
+                if is_connection_failure(e):
+                    # Server unreachable: defer the rest of the batch without spending their attempts
+                    self.connection.close()
+                    retry_at = datetime.utcnow() + retry_delay(1)
+                    for pending in rows[index + 1:]:
+                        outcomes.append((pending.id, {'status': 'queued', 'next_attempt_at': retry_at}))
+                        stats['retry'] += 1
+                    break
+
+        if sent_ids:
+            db.session.execute(
+                update(OutboxMessage).where(OutboxMessage.id.in_(sent_ids)).values(
+                    status='sent', sent_at=datetime.utcnow(), attempts=OutboxMessage.attempts + 1, last_error=None
+                ),
+                execution_options={'synchronize_session': False}
+            )
+        for message_id, values in outcomes:
+            db.session.execute(
+                update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values),
+                execution_options={'synchronize_session': False}
+            )
+        db.session.commit()
+        return stats
+
+    def drain(self):
+        """Process batches until nothing is due; returns accumulated counts"""
+        totals = {'sent': 0, 'retry': 0, 'failed': 0}
+        while True:
+            stats = self.process_batch()
+            for key, value in stats.items():
+                totals[key] += value
+            if not any(stats.values()):
+                return totals
+
+    def stop(self, *args):
+        self.running = False
+
+    def run_forever(self):
+        """Poll the queue until SIGTERM/SIGINT, keeping the SMTP session open"""
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        try:
+            while self.running:
+                stats = self.drain()
+                if any(stats.values()):
+                    print(f"[outbox] sent={stats['sent']} retry={stats['retry']} failed={stats['failed']}")
+                time.sleep(self.poll_interval)
+        finally:
+            self.connection.close()
+
+def outbox_status():
+    """Message counts per delivery status"""
+    rows = db.session.execute(
+        select(OutboxMessage.status, db.func.count(OutboxMessage.id)).group_by(OutboxMessage.status)
+    ).all()
+    return {status: count for status, count in rows}
+
+def requeue_failed(message_ids=None):
+    """Put failed messages back in the queue with a fresh attempt budget; the caller commits"""
+    stmt = update(OutboxMessage).where(OutboxMessage.status == 'failed').values(
+        status='queued', attempts=0, next_attempt_at=datetime.utcnow()
+    )
+    if message_ids:
+        stmt = stmt.where(OutboxMessage.id.in_(message_ids))
+    return db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount
@@ -0,0 +1,129 @@
+"""
+Invoice PDF render cache
+
+Rendered invoice PDFs are stored on disk under a key derived from everything
+that ends up in the document: the invoice id and ``updated_at``, a checksum of
+its items and of the issuer details, the UI locale and a hash of the template
+and stylesheet. A download whose key is already on disk is served straight
+from the file without rendering. Each invoice keeps at most one cached file
+per locale, so downloads in different languages do not evict each other;
+editing, changing the status or deleting an invoice removes them all.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import current_app
+
+# Issuer fields printed on the invoice (templates/admin/invoice_pdf.html)
+ISSUER_FIELDS = (
+    'company_name', 'company_ico', 'company_vat', 'contact_name', 'contact_email',
+    'contact_phone', 'contact_address', 'contact_website'
+)
+ITEM_FIELDS = ('id', 'description', 'quantity', 'unit_price', 'vat_rate', 'line_total', 'vat_amount', 'total_with_vat')
+
+_template_hashes = {}
+
+def cache_folder():
+    folder = current_app.config.get('INVOICE_PDF_CACHE_FOLDER', 'pdf_cache')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def template_hash(template_name, *extra):
+    """Hash of the template source plus any extra render inputs (e.g. the stylesheet).
+
+    Computed once per process; deploying a template change restarts the workers.
+    """
+    key = (template_name,) + extra
+    digest = _template_hashes.get(key)
+    if digest is None:
+        source, _, _ = current_app.jinja_env.loader.get_source(current_app.jinja_env, template_name)
+        sha = hashlib.sha256(source.encode('utf-8'))
+        for part in extra:
+            sha.update(b'\0' + part.encode('utf-8'))
+        digest = _template_hashes[key] = sha.hexdigest()
+    return digest
+
+def items_checksum(items):
+    """Checksum of the invoice items in id order"""
+    sha = hashlib.sha256()
+    for item in sorted(items, key=lambda i: i.id or 0):
+        sha.update(repr(tuple(str(getattr(item, field)) for field in ITEM_FIELDS)).encode('utf-8'))
+    return sha.hexdigest()
+
+def invoice_cache_key(invoice, locale, template_digest):
+    """Cache key for one invoice rendered with one template version and locale"""
+    admin = invoice.admin
+    issuer = tuple(str(getattr(admin, field, None)) for field in ISSUER_FIELDS) if admin else ()
+    parts = (
+        str(invoice.id),
+        invoice.updated_at.isoformat() if invoice.updated_at else '',
+        items_checksum(invoice.items),
+        repr(issuer),
+        str(locale or ''),
+        template_digest,
+    )
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+def _locale_tag(locale):
+    """Filename-safe form of the locale"""
+    return re.sub(r'[^A-Za-z0-9]', '', str(locale or '')) or 'default'
+
+def _cache_path(invoice_id, locale, key):
+    return os.path.join(cache_folder(), f'invoice_{invoice_id}_{_locale_tag(locale)}_{key}.pdf')
+
+def _cached_files(invoice_id):
+    return glob.glob(os.path.join(cache_folder(), f'invoice_{int(invoice_id)}_*.pdf'))
+
+def invoice_pdf_cache_path(invoice, locale, template_digest):
+    """Where the PDF for the current state of ``invoice`` in ``locale`` is (or would be) cached"""
+    return _cache_path(invoice.id, locale, invoice_cache_key(invoice, locale, template_digest))
+
+def store_invoice_pdf(invoice_id, path, pdf_bytes):
+    """Write a rendered PDF to its cache path and drop older versions in the same locale.
+
+    The file is written atomically, so concurrent downloads never see a
+    partial PDF.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # Same invoice and locale, any key: invoice_<id>_<locale>_*.pdf
+    for stale in glob.glob(path.rsplit('_', 1)[0] + '_*.pdf'):
+        if stale != path:
+            try:
+                os.unlink(stale)
+            except OSError:
+                pass
+    return path
+
+def cached_invoice_pdf(invoice, render, locale, template_digest):
+    """Path of the cached PDF for ``invoice``, rendering it with ``render()`` on a miss.
+
+    ``render`` returns the PDF bytes.
+    """
+    path = invoice_pdf_cache_path(invoice, locale, template_digest)
+    if os.path.exists(path):
+        return path
+    return store_invoice_pdf(invoice.id, path, render())
+
+def invalidate_invoice_pdf(invoice_id):
+    """Drop every cached PDF of an invoice; returns the number of files removed"""
+    removed = 0
+    for path in _cached_files(invoice_id):
+        try:
+            os.unlink(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,474 @@
+"""
+PDF rendering service
+
+WeasyPrint spends a large part of each render discovering fonts and parsing
+the stylesheet. A PDFRenderer builds its FontConfiguration and CSS objects
+once and reuses them for every document; one renderer is kept per thread (a
+gunicorn sync worker has exactly one). Documents are returned as bytes.
+
+Rendering is CPU-bound, so in production it runs out of process in one render
+service per host (``manage.py pdf work``): the web workers render the Jinja
+template to HTML and send it to the service at PDF_RENDER_SERVICE_ADDRESS,
+whose PDF_RENDER_POOL_SIZE processes each keep a warm renderer. The service
+bounds the renders in flight for the whole host, however many web workers
+there are; when it is full PDFRenderBusy is raised right away and the caller
+answers "try again later" instead of queueing without limit. Without an
+address the web worker renders itself.
+"""
+
+import hashlib
+import hmac
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+from flask import current_app, render_template
+
+INVOICE_PDF_TEMPLATE = 'admin/invoice_pdf.html'
+INVOICE_PDF_CSS = '''
+    @page {
+        size: A4;
+        margin: 1.5cm;
+    }
+    body {
+        font-family: Arial, sans-serif;
+        font-size: 10px;
+        line-height: 1.2;
+    }
+    .header {
+        text-align: center;
+        margin-bottom: 20px;
+        border-bottom: 2px solid #333;
+        padding-bottom: 15px;
+    }
+    .invoice-details {
+        margin-top: 10px;
+        font-size: 9px;
+        color: #666;
+    }
+    .invoice-details span {
+        margin: 0 15px;
+    }
+    .row {
+        display: flex;
+        justify-content: space-between;
+        margin-bottom: 20px;
+    }
+    .company-info {
+        text-align: left;
+        width: 48%;
+    }
+    .client-info {
+        text-align: right;
+        width: 48%;
+    }
+    .invoice-table {
+        width: 100%;
+        border-collapse: collapse;
+        margin-bottom: 20px;
+    }
+    .invoice-table th,
+    .invoice-table td {
+        border: 1px solid #ddd;
+        padding: 6px;
+        text-align: left;
+        font-size: 9px;
+    }
+    .invoice-table th {
+        background-color: #f8f9fa;
+        font-weight: bold;
+    }
+    .text-right { text-align: right; }
+    .text-center { text-align: center; }
+    .total-row {
+        font-weight: bold;
+        background-color: #f8f9fa;
+    }
+    .notes {
+        margin-top: 20px;
+        padding: 10px;
+        background-color: #f8f9fa;
+        border-left: 4px solid #007bff;
+        font-size: 9px;
+    }
+'''
+
+class PDFRenderer:
+    """Renders HTML to PDF with fonts and stylesheets prepared once"""
+
+    def __init__(self, stylesheets=(INVOICE_PDF_CSS,)):
+        self.stylesheet_sources = tuple(stylesheets)
+        self.font_config = None
+        self.stylesheets = None
+
+    def warm_up(self):
+        """Discover fonts and parse the stylesheets; later calls are no-ops"""
+        if self.font_config is None:
+            # Imported here so web workers that only feed the render pool never load WeasyPrint
+            from weasyprint import CSS
+            from weasyprint.text.fonts import FontConfiguration
+            font_config = FontConfiguration()
+            self.stylesheets = [CSS(string=source, font_config=font_config) for source in self.stylesheet_sources]
+            self.font_config = font_config
+        return self
+
+    def render_html(self, html_content, base_url=None):
+        """Render an HTML string and return the PDF bytes"""
+        from weasyprint import HTML
+        self.warm_up()
+        return HTML(string=html_content, base_url=base_url).write_pdf(
+            stylesheets=self.stylesheets, font_config=self.font_config
+        )
+
+    def render_template(self, template_name, **context):
+        """Render a Jinja template (needs an app/request context) to PDF bytes"""
+        return self.render_html(render_template(template_name, **context))
+
+    def render_invoice(self, invoice):
+        return self.render_template(INVOICE_PDF_TEMPLATE, invoice=invoice)
+
+_local = threading.local()
+
+def get_renderer():
+    """The warm invoice renderer of the current thread"""
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None:
+        renderer = _local.renderer = PDFRenderer()
+    return renderer
+
+def warm_up():
+    """Prepare the current thread's renderer"""
+    return get_renderer().warm_up()
+
+def render_html(html_content):
+    """Render HTML with the current process's warm renderer (pool task)"""
+    return get_renderer().render_html(html_content)
+
+class PDFRenderBusy(Exception):
+    """All render slots are taken; the caller should ask the user to retry."""
+
+class PDFRenderUnavailable(PDFRenderBusy):
+    """The render service cannot be reached."""
+
+class PDFRenderPool:
+    """Process pool for PDF rendering with a bounded number of renders in flight"""
+
+    def __init__(self, size, queue_depth, timeout, task=render_html, initializer=warm_up):
+        self.size = size
+        self.queue_depth = max(queue_depth, size)
+        self.timeout = timeout
+        self.task = task
+        self.slots = threading.BoundedSemaphore(self.queue_depth)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        # spawn: children start clean instead of inheriting the parent's state
+        self.executor = ProcessPoolExecutor(
+            max_workers=size, mp_context=multiprocessing.get_context('spawn'), initializer=initializer
+        )
+        self.pid = os.getpid()
+
+    def _release(self, future):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def submit(self, html_content):
+        """Queue one render and return its future; raises PDFRenderBusy when full"""
+        if not self.slots.acquire(blocking=False):
+            raise PDFRenderBusy(f"{self.size} PDF render processes are busy, try again later")
+        try:
+            future = self.executor.submit(self.task, html_content)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.in_flight += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def render(self, html_content):
+        """Render in the pool and wait for the PDF bytes"""
+        return self.submit(html_content).result(timeout=self.timeout)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def parse_address(address):
+    """``host:port`` is a TCP address, anything else the path of a Unix socket"""
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit() and '/' not in address:
+        return host or '127.0.0.1', int(port)
+    return address
+
+def service_authkey():
+    """Key the render service and its clients authenticate each other with"""
+    return hmac.new(current_app.config['SECRET_KEY'].encode('utf-8'), b'pdf-render-service', hashlib.sha256).digest()
+
+class PDFRenderService:
+    """The host's render pool, shared by every web worker over a socket.
+
+    One connection carries one request: ``('render', html)`` is answered with
+    ``('busy', message)`` right away when the pool is full, otherwise with
+    ``('queued', None)`` followed by ``('ok', pdf_bytes)`` or
+    ``('error', message)``. ``('status', None)`` is answered with
+    ``('ok', counters)``.
+    """
+
+    def __init__(self, address, authkey, size, queue_depth, timeout, task=render_html, initializer=warm_up):
+        if isinstance(address, str) and os.path.exists(address):
+            # Socket left behind by a previous run
+            os.unlink(address)
+        self.pool_args = (size, queue_depth, timeout, task, initializer)
+        self.pool = PDFRenderPool(*self.pool_args)
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.lock = threading.Lock()
+        self.running = False
+        self.rendered = 0
+        self.failed = 0
+        self.refused = 0
+
+    def status(self):
+        with self.lock:
+            return {
+                'size': self.pool.size,
+                'queue_depth': self.pool.queue_depth,
+                'in_flight': self.pool.in_flight,
+                'rendered': self.rendered,
+                'failed': self.failed,
+                'refused': self.refused,
+            }
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _restart_pool(self, broken):
+        # A render process died (e.g. OOM); later renders get a fresh pool
+        with self.lock:
+            if self.pool is broken:
+                broken.shutdown()
+                self.pool = PDFRenderPool(*self.pool_args)
+
+    def _handle(self, connection):
+        with connection:
+            try:
+                request, payload = connection.recv()
+            except (EOFError, OSError, ValueError, TypeError):
+                return
+            if request == 'status':
+                connection.send(('ok', self.status()))
+                return
+            pool = self.pool
+            try:
+                future = pool.submit(payload)
+            except PDFRenderBusy as e:
+                self._count('refused')
+                connection.send(('busy', str(e)))
+                return
+            connection.send(('queued', None))
+            try:
+                reply = ('ok', future.result(timeout=pool.timeout))
+                self._count('rendered')
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._restart_pool(pool)
+                self._count('failed')
+                reply = ('error', f"{type(e).__name__}: {e}")
+            try:
+                connection.send(reply)
+            except OSError:
+                # The web worker gave up waiting
+                pass
+
+    def serve(self):
+        """Accept connections until ``stop()``, one thread per connection"""
+        self.running = True
+        while self.running:
+            try:
+                connection = self.listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError:
+                if not self.running:
+                    break
+                raise
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+        self.pool.shutdown()
+
+    def stop(self, *_):
+        self.running = False
+        self.listener.close()
+
+    def run_forever(self):
+        """Serve until SIGTERM/SIGINT"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.serve()
+
+def create_render_service():
+    """Render service listening on PDF_RENDER_SERVICE_BIND (or the address clients use)"""
+    address = current_app.config.get('PDF_RENDER_SERVICE_BIND') or current_app.config.get('PDF_RENDER_SERVICE_ADDRESS')
+    if not address:
+        raise ValueError("Set PDF_RENDER_SERVICE_ADDRESS or PDF_RENDER_SERVICE_BIND")
+    return PDFRenderService(
+        parse_address(address),
+        service_authkey(),
+        max(current_app.config.get('PDF_RENDER_POOL_SIZE', 2), 1),
+        current_app.config.get('PDF_RENDER_QUEUE_DEPTH', 8),
+        current_app.config.get('PDF_RENDER_TIMEOUT_SECONDS', 60)
+    )
+
+class PDFRenderClient:
+    """Web worker side of the render service, used like a PDFRenderPool"""
+
+    def __init__(self, address, authkey, timeout):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self.pid = os.getpid()
+
+    def _request(self, request, payload):
+        """Send one request and return the connection and the first reply"""
+        try:
+            connection = Client(self.address, authkey=self.authkey)
+        except (OSError, AuthenticationError) as e:
+            raise PDFRenderUnavailable(f"PDF render service at {self.address} is unavailable: {e}")
+        try:
+            connection.send((request, payload))
+            if not connection.poll(self.timeout):
+                raise TimeoutError(f"PDF render service did not answer within {self.timeout} seconds")
+            return connection, connection.recv()
+        except (EOFError, OSError) as e:
+            connection.close()
+            raise PDFRenderUnavailable(f"PDF render service at {self.address} closed the connection: {e}")
+        except BaseException:
+            connection.close()
+            raise
+
+    def _wait(self, connection, future):
+        with connection:
+            try:
+                if not connection.poll(self.timeout):
+                    raise TimeoutError(f"PDF was not rendered within {self.timeout} seconds")
+                status, payload = connection.recv()
+            except (EOFError, OSError) as e:
+                future.set_exception(PDFRenderUnavailable(f"PDF render service closed the connection: {e}"))
+                return
+            except BaseException as e:
+                future.set_exception(e)
+                return
+        if status == 'ok':
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(payload))
+
+    def submit(self, html_content):
+        """Queue one render in the service and return its future; raises PDFRenderBusy when full"""
+        connection, (status, payload) = self._request('render', html_content)
+        if status == 'busy':
+            connection.close()
+            raise PDFRenderBusy(payload)
+        future = Future()
+        threading.Thread(target=self._wait, args=(connection, future), daemon=True).start()
+        return future
+
+    def render(self, html_content):
+        """Render in the service and wait for the PDF bytes"""
+        return self.submit(html_content).result(timeout=self.timeout)
+
+    def status(self):
+        connection, (_, counters) = self._request('status', None)
+        connection.close()
+        return counters
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_render_client():
+    """Client of the host's render service, or None when rendering in-process.
+
+    Created on first use from the app config; a forked process builds its own.
+    """
+    global _client
+    address = current_app.config.get('PDF_RENDER_SERVICE_ADDRESS')
+    if not address:
+        return None
+    with _client_lock:
+        if _client is None or _client.pid != os.getpid():
+            _client = PDFRenderClient(
+                parse_address(address),
+                service_authkey(),
+                current_app.config.get('PDF_RENDER_TIMEOUT_SECONDS', 60)
+            )
+        return _client
+
+def reset_render_client():
+    global _client
+    with _client_lock:
+        _client = None
+
+def prepare_worker():
+    """Warm the in-process renderer unless PDFs go to the render service (gunicorn post_worker_init)"""
+    if get_render_client() is None:
+        warm_up()
+
+def render_pdf_html(html_content):
+    """Render HTML to PDF bytes in the render service, or in-process when none is configured"""
+    client = get_render_client()
+    if client is None:
+        return render_html(html_content)
+    return client.render(html_content)
+
+def render_many(jobs, busy_wait=0.2):
+    """Render ``(key, html_factory)`` jobs in parallel, yielding ``(key, pdf_bytes)`` as each finishes.
+
+    HTML is produced lazily, once per job, just before it is first submitted,
+    and kept until the service accepts it. No more jobs are in flight than
+    the render service's queue depth allows. Without a service the jobs are
+    rendered one by one in this process.
+    """
+    pool = get_render_client()
+    if pool is None:
+        for key, html_factory in jobs:
+            yield key, render_html(html_factory())
+        return
+
+    def prepare(job):
+        return None if job is None else (job[0], job[1]())
+
+    pending = {}
+    jobs = iter(jobs)
+    next_job = prepare(next(jobs, None))
+    deadline = None
+    while next_job is not None or pending:
+        while next_job is not None:
+            key, html_content = next_job
+            try:
+                pending[pool.submit(html_content)] = key
+            except PDFRenderBusy:
+                if pending:
+                    break
+                # Other requests hold every slot; wait for one to free up
+                deadline = deadline or time.monotonic() + pool.timeout
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(busy_wait)
+                continue
+            deadline = None
+            next_job = prepare(next(jobs, None))
+        if pending:
+            done, _ = wait(pending, timeout=pool.timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"No PDF finished rendering within {pool.timeout} seconds")
+            for future in done:
+                yield pending.pop(future), future.result()
+
+def render_invoice_pdf(invoice):
+    """Render the invoice PDF and return the bytes."""
+    return render_pdf_html(render_template(INVOICE_PDF_TEMPLATE, invoice=invoice))
@@ -0,0 +1,183 @@
+"""
+Guest report for the police and the accommodation book
+
+Accommodation providers in CZ/SK keep a book of their guests and report
+foreign guests to the police (UBYPORT). This module lists every guest of an
+approved registration whose stay overlaps a period: amenity, arrival,
+departure, nights within the period, name, age category and identity
+document. The rows come from one joined query read ``EXPORT_YIELD_PER`` at a
+time and are written as CSV or as a fixed-width text layout.
+
+The registration form does not collect citizenship, date of birth or home
+address, so the report cannot pick out the foreign guests and those
+particulars have to be completed before it is submitted.
+
+``write_police_reports`` writes one file per amenity. Amenities are split
+between worker threads, each with its own database connection, running the
+same query restricted to its amenities.
+"""
+
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from database import db, Amenity, Guest, Registration, Trip
+from email_templates import N_, translate
+from exports import EXPORT_YIELD_PER, iter_csv
+
+REPORT_COLUMNS = (
+    N_('Amenity'), N_('Arrival'), N_('Departure'), N_('Nights'), N_('Last Name'), N_('First Name'),
+    N_('Age Category'), N_('Document Type'), N_('Document Number'), N_('Registration ID'), N_('Guest ID')
+)
+# Fixed-width layout: (field index in a report row, width, right-aligned)
+FIXED_WIDTH_LAYOUT = (
+    (1, 10, False),   # arrival, DD.MM.YYYY
+    (2, 10, False),   # departure
+    (3, 3, True),     # nights within the period
+    (4, 30, False),   # last name
+    (5, 24, False),   # first name
+    (6, 1, False),    # age category code
+    (7, 2, False),    # document type code
+    (8, 20, False),   # document number
+    (0, 30, False),   # amenity
+)
+DOCUMENT_CODES = {'passport': 'P', 'citizen_id': 'ID', 'driving_license': 'DL'}
+AGE_CODES = {'adult': 'A', 'child': 'C'}
+REPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'fixed': ('.txt', 'text/plain'),
+}
+
+def police_report_query(admin_id, date_from, date_to, amenity_ids=None):
+    """Guests of approved stays with at least one night in ``[date_from, date_to]``.
+
+    Ordered by amenity, arrival and guest, so per-amenity files can be
+    written from one pass. ``admin_id`` None covers every admin.
+    """
+    query = (
+        select(
+            Amenity.id.label('amenity_id'), Amenity.name.label('amenity_name'),
+            Trip.start_date, Trip.end_date, Guest.last_name, Guest.first_name, Guest.age_category,
+            Guest.document_type, Guest.document_number, Guest.registration_id, Guest.id
+        )
+        .join(Registration, Guest.registration_id == Registration.id)
+        .join(Trip, Registration.trip_id == Trip.id)
+        .join(Amenity, Trip.amenity_id == Amenity.id)
+        .where(Registration.status == 'approved', Trip.start_date <= date_to, Trip.end_date > date_from)
+        .order_by(Amenity.id, Trip.start_date, Trip.id, Guest.id)
+    )
+    if admin_id is not None:
+        query = query.where(Trip.admin_id == admin_id)
+    if amenity_ids is not None:
+        query = query.where(Amenity.id.in_(amenity_ids))
+    return query
+
+def police_report_rows(admin_id, date_from, date_to, amenity_ids=None):
+    """Report rows (see REPORT_COLUMNS) paired with their amenity id"""
+    query = police_report_query(admin_id, date_from, date_to, amenity_ids)
+    period_end = date_to + timedelta(days=1)
+    for row in db.session.execute(query.execution_options(yield_per=EXPORT_YIELD_PER)):
+        nights = (min(row.end_date, period_end) - max(row.start_date, date_from)).days
+        yield row.amenity_id, [
+            row.amenity_name,
+            row.start_date.strftime('%d.%m.%Y'),
+            row.end_date.strftime('%d.%m.%Y'),
+            nights,
+            row.last_name,
+            row.first_name,
+            row.age_category,
+            row.document_type,
+            row.document_number,
+            row.registration_id,
+            row.id
+        ]
+
+def fixed_width_line(values):
+    """One report row in FIXED_WIDTH_LAYOUT; longer values are cut to their width"""
+    fields = []
+    for index, width, right in FIXED_WIDTH_LAYOUT:
+        value = values[index]
+        if index == 6:
+            value = AGE_CODES.get(value, str(value or '')[:1].upper())
+        elif index == 7:
+            value = DOCUMENT_CODES.get(value, str(value or '')[:2].upper())
+        text = str(value if value is not None else '')[:width]
+        fields.append(text.rjust(width) if right else text.ljust(width))
+    return ''.join(fields) + '\r\n'
+
+def iter_fixed_width(rows, chunk_rows=EXPORT_YIELD_PER):
+    chunk = []
+    for values in rows:
+        chunk.append(fixed_width_line(values))
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+def iter_police_report(rows, report_format, header):
+    """Report text in chunks; ``header`` is used by the CSV format only"""
+    values = (row for _, row in rows)
+    if report_format == 'fixed':
+        return iter_fixed_width(values)
+    return iter_csv(header, values)
+
+def _write_amenity_files(app, admin_id, date_from, date_to, amenity_ids, folder, report_format, header):
+    """Write the files of some amenities from one query; runs in a worker thread"""
+    extension = REPORT_FORMATS[report_format][0]
+    written = {}
+    report_file = None
+    with app.app_context():
+        try:
+            for amenity_id, row in police_report_rows(admin_id, date_from, date_to, amenity_ids):
+                summary = written.get(amenity_id)
+                if summary is None:
+                    if report_file:
+                        report_file.close()
+                    path = os.path.join(folder, f'police_report_{date_from}_{date_to}_amenity_{amenity_id}{extension}')
+                    report_file = open(path, 'w', encoding='utf-8', newline='')
+                    writer = csv.writer(report_file)
+                    if report_format == 'csv':
+                        writer.writerow(header)
+                    summary = written[amenity_id] = {'amenity_id': amenity_id, 'amenity_name': row[0], 'path': path,
+                                                     'guests': 0, 'guest_nights': 0}
+                if report_format == 'fixed':
+                    report_file.write(fixed_width_line(row))
+                else:
+                    writer.writerow(row)
+                summary['guests'] += 1
+                summary['guest_nights'] += row[3]
+        finally:
+            if report_file:
+                report_file.close()
+    return list(written.values())
+
+def write_police_reports(admin_id, date_from, date_to, folder, report_format='csv', workers=1, locale=None):
+    """Write one report file per amenity with guests in the period; returns a summary per file.
+
+    With ``workers`` > 1 the amenities are split between that many threads.
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format: {report_format}")
+    os.makedirs(folder, exist_ok=True)
+    query = select(Amenity.id).order_by(Amenity.id)
+    if admin_id is not None:
+        query = query.where(Amenity.admin_id == admin_id)
+    amenity_ids = db.session.scalars(query).all()
+    if not amenity_ids:
+        return []
+
+    header = [translate(column, locale) for column in REPORT_COLUMNS]
+    app = current_app._get_current_object()
+    workers = max(1, min(workers, len(amenity_ids)))
+    groups = [amenity_ids[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda group: _write_amenity_files(app, admin_id, date_from, date_to, group, folder, report_format, header),
+            groups
+        )
+        return sorted((summary for result in results for summary in result), key=lambda summary: summary['amenity_id'])
@@ -9,6 +9,7 @@ import sys
 import argparse
 import shutil
 from app import app, db, User, Trip, Registration, Guest, Invoice, InvoiceItem
+from database import rebuild_trip_counters
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
 from utils import check_production_lock
@@ -283,6 +284,7 @@ def quick_seed():
                     )
                     db.session.add(guest)
             
+            rebuild_trip_counters()
             db.session.commit()
             print(f"📝 Created {len(registrations_data)} sample registrations")
             print("✅ Database seeding completed successfully!")
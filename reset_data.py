@@ -10,6 +10,7 @@ import shutil
 from datetime import datetime, timedelta, date
 from werkzeug.security import generate_password_hash
 from app import app, db, User, Trip, Registration, Guest
+from database import rebuild_trip_counters
 from config import Config
 from utils import check_production_lock
 
@@ -276,6 +277,7 @@ def create_sample_registrations():
             )
             db.session.add(guest3_1)
             
+            rebuild_trip_counters()
             db.session.commit()
             print("✅ Sample registrations created successfully!")
             print(f"   - Approved registration: {reg1.email} ({len(reg1.guests)} guests)")
@@ -760,6 +762,7 @@ def seed_data():
                     )
                     db.session.add(invoice_item)
             
+            rebuild_trip_counters()
             db.session.commit()
             
             print("✅ Sample data has been seeded successfully!")
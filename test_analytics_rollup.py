@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test script for the incrementally maintained analytics rollups
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+
+from test_config import TestConfig
+from database import (
+    db, Amenity, Registration, Guest, Trip, Invoice, AnalyticsRollup, AnalyticsRollupDay,
+    bulk_update_registration_status
+)
+from analytics_rollup import mark_trip_days, rebuild_rollups, refresh_rollups
+from breakdown_stats import invoice_stats, overview_stats, registration_stats
+from test_breakdown_stats import seed_history
+
+def rollup_snapshot():
+    """Every rollup row without its id, for comparing two ways of building them"""
+    return sorted(
+        (row.day, row.admin_id, row.amenity_id or 0, row.metric, row.dimension, row.count, row.amount)
+        for row in AnalyticsRollup.query.all()
+    )
+
+def count_statements(function, *args):
+    statements = []
+    listener = lambda *event_args: statements.append(event_args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = function(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, statements
+
+def test_refresh_follows_writes():
+    """Updates, Core bulk updates, inserts and ORM deletes are rolled up by the next refresh"""
+    print("🧪 Testing incremental rollup refresh")
+    app = TestConfig.create_test_app(ANALYTICS_ROLLUP_SETTLE_SECONDS=0)
+    with app.app_context():
+        admin_id = seed_history()
+        assert refresh_rollups() == 0
+        print("   ✅ Nothing to recompute right after a refresh")
+
+        pending = (
+            Registration.query.join(Trip).filter(Trip.admin_id == admin_id, Registration.status == 'pending')
+            .order_by(Registration.id).all()
+        )
+        bulk_update_registration_status([pending[1].id], 'approved', admin_id)
+        guest = Guest.query.join(Registration).join(Trip).filter(Trip.admin_id == admin_id).order_by(Guest.id).first()
+        db.session.delete(guest)
+        invoice = Invoice(invoice_number='ROLLUP-1', admin_id=admin_id, client_name='Late client',
+                          issue_date=date(2026, 3, 1), subtotal=50, vat_total=0, total_amount=50, currency='USD')
+        db.session.add(invoice)
+        db.session.commit()
+        assert AnalyticsRollupDay.query.count() == 2
+        print("   ✅ Deleting a guest records its day and its registration's day")
+
+        recomputed = refresh_rollups()
+        db.session.commit()
+        assert 0 < recomputed <= 4 and AnalyticsRollupDay.query.count() == 0
+        incremental = rollup_snapshot()
+        rebuild_rollups()
+        db.session.commit()
+        assert incremental == rollup_snapshot()
+        print(f"   ✅ Refresh recomputed {recomputed} admin days and matches a full rebuild")
+
+        stats = registration_stats(admin_id)
+        assert stats['pending_count'] == 3 and stats['approved_count'] == 5
+        assert invoice_stats(admin_id)['currency_counts']['USD'] == 1
+        print("   ✅ Pages see the approval and the new invoice")
+
+def test_range_and_amenity_filters():
+    """Figures cover only the days and amenity asked for"""
+    print("🧪 Testing rollup date range and amenity filters")
+    app = TestConfig.create_test_app()
+    with app.app_context():
+        admin_id = seed_history()
+        march = {'date_from': date(2026, 3, 1), 'date_to': date(2026, 3, 31)}
+        registrations = Registration.query.join(Trip).filter(
+            Trip.admin_id == admin_id, Registration.created_at >= datetime(2026, 3, 1),
+            Registration.created_at < datetime(2026, 4, 1)).count()
+        stats = registration_stats(admin_id, **march)
+        assert stats['total_registrations'] == registrations and list(stats['monthly_breakdown']) == ['2026-03']
+        print(f"   ✅ March holds {registrations} registrations")
+
+        amenity_id = Trip.query.filter_by(admin_id=admin_id).first().amenity_id
+        other_amenity = Amenity(name='Second Cabin', admin_id=admin_id)
+        db.session.add(other_amenity)
+        db.session.flush()
+        trip = Trip(title='Elsewhere', start_date=date(2026, 8, 1), end_date=date(2026, 8, 8), max_guests=2,
+                    admin_id=admin_id, amenity_id=other_amenity.id)
+        db.session.add(trip)
+        db.session.commit()
+        refresh_rollups()
+        db.session.commit()
+        assert overview_stats(admin_id)['total_trips'] == 5
+        assert overview_stats(admin_id, amenity_id=amenity_id)['total_trips'] == 4
+        assert overview_stats(admin_id, amenity_id=other_amenity.id)['total_trips'] == 1
+        print("   ✅ Amenity filter splits the trips")
+
+        today = datetime.utcnow().date()
+        stats, statements = count_statements(overview_stats, admin_id, today - timedelta(days=7), today)
+        assert len(statements) == 1 and 'guest_reg_analytics_rollup' in statements[0]
+        assert 'guest_reg_registration' not in statements[0] and stats['total_registrations'] == 0
+        print("   ✅ Overview reads only rollup rows")
+
+def test_amenity_moves_and_bulk_deletes():
+    """Moving a trip and bulk-deleting its registrations are rolled up by the next refresh"""
+    print("🧪 Testing rollup refresh after amenity moves and bulk deletes")
+    app = TestConfig.create_test_app(ANALYTICS_ROLLUP_SETTLE_SECONDS=0)
+    with app.app_context():
+        admin_id = seed_history()
+        refresh_rollups()
+        db.session.commit()
+        trip = (
+            Trip.query.join(Registration).filter(Trip.admin_id == admin_id)
+            .order_by(Trip.id).first()
+        )
+        other_amenity = Amenity(name='Moved Cabin', admin_id=admin_id)
+        db.session.add(other_amenity)
+        db.session.flush()
+        trip.amenity_id = other_amenity.id
+        db.session.commit()
+        assert AnalyticsRollupDay.query.count() > 0
+        refresh_rollups()
+        db.session.commit()
+        incremental = rollup_snapshot()
+        rebuild_rollups()
+        db.session.commit()
+        assert incremental == rollup_snapshot()
+        assert overview_stats(admin_id, amenity_id=other_amenity.id)['total_registrations'] == Registration.query.filter_by(trip_id=trip.id).count()
+        print("   ✅ Registrations and guests follow their trip to the new amenity")
+
+        registration_ids = [registration.id for registration in Registration.query.filter_by(trip_id=trip.id)]
+        mark_trip_days([trip.id])
+        Guest.query.filter(Guest.registration_id.in_(registration_ids)).delete(synchronize_session=False)
+        Registration.query.filter(Registration.id.in_(registration_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        refresh_rollups()
+        db.session.commit()
+        incremental = rollup_snapshot()
+        rebuild_rollups()
+        db.session.commit()
+        assert incremental == rollup_snapshot()
+        assert overview_stats(admin_id, amenity_id=other_amenity.id)['total_registrations'] == 0
+        print("   ✅ Days marked before a bulk delete are recomputed")
+
+if __name__ == "__main__":
+    test_refresh_follows_writes()
+    test_range_and_amenity_filters()
+    test_amenity_moves_and_bulk_deletes()
+    print("\n✅ All analytics rollup tests passed!")
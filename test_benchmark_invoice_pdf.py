@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test script for the invoice PDF benchmark baseline comparison
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_invoice_pdf import compare_results, load_baseline, percentile, write_baseline
+
+def case(items, locale, median_ms, peak_rss_kb=100000, pdf_bytes=20000):
+    return {'items': items, 'locale': locale, 'runs': 5, 'median_ms': median_ms, 'p95_ms': median_ms,
+            'min_ms': median_ms, 'peak_rss_kb': peak_rss_kb, 'pdf_bytes': pdf_bytes}
+
+def test_compare_flags_regressions_above_threshold():
+    """Only metrics that grew by more than the threshold are reported"""
+    print("🧪 Testing benchmark regression detection")
+    baseline = [case(1, 'en', 100.0), case(500, 'cs', 2000.0), case(50, 'sk', 300.0)]
+    current = [
+        case(1, 'en', 115.0),                          # +15%: within threshold
+        case(500, 'cs', 2600.0, peak_rss_kb=90000),    # +30% latency, less memory
+        case(50, 'sk', 200.0, pdf_bytes=30000),        # faster, but a bigger PDF
+        case(500, 'en', 9999.0),                       # not in the baseline
+    ]
+
+    regressions = compare_results(baseline, current, threshold=20)
+    found = {(r['items'], r['locale'], r['metric']) for r in regressions}
+    assert found == {(500, 'cs', 'median_ms'), (500, 'cs', 'p95_ms'), (50, 'sk', 'pdf_bytes')}, found
+    latency = next(r for r in regressions if r['metric'] == 'median_ms')
+    assert latency['baseline'] == 2000.0 and latency['current'] == 2600.0 and latency['change_pct'] == 30.0
+    assert compare_results(baseline, current, threshold=60) == []
+    print("   ✅ Latency, memory and size regressions are flagged per case")
+
+    current = [dict(case(1, 'en', 100.0), peak_rss_kb=None)]
+    assert compare_results(baseline, current) == []
+    print("   ✅ Metrics missing on either side are skipped")
+
+def test_baseline_round_trip():
+    """Suite results are written to and read back from a JSON baseline"""
+    print("🧪 Testing benchmark baseline file")
+    results = [case(1, 'en', 100.0), case(50, 'cs', 300.0)]
+    with tempfile.TemporaryDirectory() as folder:
+        path = write_baseline(os.path.join(folder, 'baseline.json'), results)
+        baseline = load_baseline(path)
+    assert baseline['results'] == results
+    assert baseline['environment']['python'] and baseline['created']
+    assert percentile([5.0], 95) == 5.0 and percentile([float(n) for n in range(1, 101)], 95) == 95.05
+    print("   ✅ Baseline keeps the results and the environment they were measured in")
+
+if __name__ == "__main__":
+    test_compare_flags_regressions_above_threshold()
+    test_baseline_round_trip()
+    print("\n✅ All benchmark comparison tests passed!")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Test script for the breakdown result cache and its write-driven invalidation
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, update
+
+from test_config import TestConfig
+from database import db, Registration, Guest, Trip, bulk_update_registration_status
+from breakdown_cache import ALL_ADMINS, BreakdownCache, breakdown_cache_stats, cached_breakdown, get_breakdown_cache
+from breakdown_stats import registration_stats
+from analytics_rollup import refresh_rollups
+from test_breakdown_stats import seed_history
+from test_occupancy import create_occupancy_app, seed_bookings
+from blueprints.registration import registration as registration_blueprint
+
+def cached_registrations(admin_id, calls):
+    def compute():
+        calls.append(admin_id)
+        refresh_rollups()
+        db.session.commit()
+        return registration_stats(admin_id)
+    return cached_breakdown(admin_id, 'registrations', {'date_from': None}, compute)
+
+def test_commits_invalidate_their_admin():
+    """Committed changes drop the admin's entries; rollbacks and other admins' writes do not"""
+    print("🧪 Testing breakdown cache invalidation")
+    app = TestConfig.create_test_app(ANALYTICS_ROLLUP_SETTLE_SECONDS=0)
+    with app.app_context():
+        admin_id = seed_history()
+        other_id = Trip.query.filter(Trip.admin_id != admin_id).first().admin_id
+        calls = []
+        first = cached_registrations(admin_id, calls)
+        assert cached_registrations(admin_id, calls) is first and calls == [admin_id]
+        cached_registrations(other_id, calls)
+        print("   ✅ Second read served from the cache")
+
+        registration = Registration.query.join(Trip).filter(
+            Trip.admin_id == admin_id, Registration.status == 'pending').first()
+        registration.status = 'approved'
+        db.session.rollback()
+        cached_registrations(admin_id, calls)
+        assert calls == [admin_id, other_id]
+        print("   ✅ Rolled back change keeps the entries")
+
+        registration = Registration.query.join(Trip).filter(
+            Trip.admin_id == admin_id, Registration.status == 'pending').first()
+        registration.status = 'approved'
+        db.session.commit()
+        stats = cached_registrations(admin_id, calls)
+        cached_registrations(other_id, calls)
+        assert calls == [admin_id, other_id, admin_id] and stats['pending_count'] == first['pending_count'] - 1
+        print("   ✅ Committed approval recomputes only that admin's figures")
+
+        # A guest linked by id to a registration that is not loaded is looked up to find its admin
+        registration_id = registration.id
+        db.session.expunge_all()
+        db.session.add(Guest(registration_id=registration_id, first_name='Late', last_name='Guest',
+                             age_category='adult', document_type='passport', document_number='L1'))
+        db.session.commit()
+        cached_registrations(admin_id, calls)
+        cached_registrations(other_id, calls)
+        assert calls == [admin_id, other_id, admin_id, admin_id]
+        print("   ✅ New guest resolved to its admin with one lookup")
+
+        invalidations = breakdown_cache_stats()['invalidations']
+        bulk_update_registration_status([registration_id], 'rejected', admin_id)
+        db.session.commit()
+        cached_registrations(admin_id, calls)
+        cached_registrations(other_id, calls)
+        assert calls[-1] == admin_id
+        print("   ✅ Tagged bulk update recomputes only its admin's figures")
+
+        db.session.execute(update(Trip).where(Trip.id == -1).values(max_guests=Trip.max_guests),
+                           execution_options={'synchronize_session': False})
+        db.session.commit()
+        cached_registrations(admin_id, calls)
+        cached_registrations(other_id, calls)
+        assert calls[-2:] == [admin_id, other_id]
+        stats = breakdown_cache_stats()
+        assert stats['misses'] == 7 and stats['hits'] == 5 and stats['invalidations'] == invalidations + 2
+        print(f"   ✅ Untagged bulk update invalidates every admin; counters {stats}")
+
+def test_submission_leaves_other_admins_alone():
+    """A guest submitting a registration drops only the trip admin's entries"""
+    print("🧪 Testing registration submission invalidation")
+    app = TestConfig.create_test_app(ANALYTICS_ROLLUP_SETTLE_SECONDS=0)
+    app.register_blueprint(registration_blueprint)
+    with app.app_context():
+        admin_id = seed_history()
+        trip_id = Trip.query.filter_by(admin_id=admin_id).first().id
+        other_id = Trip.query.filter(Trip.admin_id != admin_id).first().admin_id
+        calls = []
+        cached_registrations(admin_id, calls)
+        cached_registrations(other_id, calls)
+        invalidations = breakdown_cache_stats()['invalidations']
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['registration_data'] = {
+            'trip_id': trip_id, 'email': 'late@example.com', 'language': 'en', 'uploaded_files': [None],
+            'guests': [{'first_name': 'Late', 'last_name': 'Guest', 'age_category': 'adult',
+                        'document_type': 'passport', 'document_number': 'S1', 'gdpr_consent': True}],
+            'invoice_request': False, 'invoice_data': None,
+        }
+    assert client.post('/submit').status_code == 302
+
+    with app.app_context():
+        assert Registration.query.filter_by(email='late@example.com').count() == 1
+        cached_registrations(admin_id, calls)
+        cached_registrations(other_id, calls)
+        assert calls == [admin_id, other_id, admin_id]
+        assert breakdown_cache_stats()['invalidations'] == invalidations + 1
+        print("   ✅ Submission and its counter update leave the other admin's entries cached")
+
+def test_shared_folder():
+    """Workers sharing a folder reuse results and see each other's invalidations"""
+    print("🧪 Testing shared breakdown cache folder")
+    folder = tempfile.mkdtemp(prefix='test_breakdown_cache_')
+    try:
+        first, second = BreakdownCache(folder=folder), BreakdownCache(folder=folder)
+        key = (7, 'overview', ())
+        first.put(key, first.generation(7), {'total_trips': 3, 'since': date(2026, 1, 1)})
+        assert second.get(key, second.generation(7)) == (True, {'total_trips': 3, 'since': date(2026, 1, 1)})
+        assert second.get(key, second.generation(7))[0] and second.stats()['shared_hits'] == 1
+        print("   ✅ Result written by one worker is read by the other")
+
+        second.invalidate({7})
+        assert first.get(key, first.generation(7)) == (False, None)
+        first.put((8, 'overview', ()), first.generation(8), 1)
+        first.invalidate({ALL_ADMINS})
+        assert second.get((8, 'overview', ()), second.generation(8)) == (False, None)
+        print("   ✅ Invalidations of one worker reach the other")
+
+        small = BreakdownCache(max_entries=2, ttl=0)
+        small.put((1, 'a', ()), small.generation(1), 1)
+        assert small.get((1, 'a', ()), small.generation(1)) == (False, None)
+        small = BreakdownCache(max_entries=2)
+        for admin_id in (1, 2, 3):
+            small.put((admin_id, 'a', ()), small.generation(admin_id), admin_id)
+        assert list(small.entries) == [(2, 'a', ()), (3, 'a', ())]
+        print("   ✅ Expired and least recently used entries are dropped")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def test_cached_occupancy_api():
+    """A repeated API call is answered without reading trips again"""
+    print("🧪 Testing cached occupancy API")
+    app = create_occupancy_app()
+    with app.app_context():
+        admin_id, lake_id, _, _ = seed_bookings()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+
+    url = '/api/v2/occupancy?date_from=2026-07-01&date_to=2026-07-31'
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        first = client.get(url).get_json()
+        before = len(statements)
+        assert client.get(url).get_json() == first
+        assert not any('guest_reg_trip' in statement for statement in statements[before:])
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    print("   ✅ Second call reads no trips")
+
+    with app.app_context():
+        trip = Trip.query.filter_by(amenity_id=lake_id).order_by(Trip.start_date).first()
+        trip.end_date = date(2026, 7, 31)
+        db.session.commit()
+        assert get_breakdown_cache().stats()['entries'] == 0
+    assert client.get(url).get_json()['amenities'][1]['totals']['booked_nights'] > first['amenities'][1]['totals']['booked_nights']
+    print("   ✅ Moving a departure recomputes the report")
+
+if __name__ == "__main__":
+    test_commits_invalidate_their_admin()
+    test_submission_leaves_other_admins_alone()
+    test_shared_folder()
+    test_cached_occupancy_api()
+    print("\n✅ All breakdown cache tests passed!")
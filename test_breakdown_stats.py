@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test script for the breakdowns (analytics) aggregates read from the daily rollups
+"""
+
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+
+from test_config import TestConfig
+from database import db, User, Registration, Guest, Trip, Invoice
+from breakdown_stats import (
+    guest_stats, invoice_stats, overview_stats, recent_guests, recent_registrations, registration_stats,
+    trip_rows, trip_stats
+)
+from test_export_streaming import seed
+from analytics_rollup import refresh_rollups
+
+def seed_history():
+    """Two admins; the first with varied statuses, languages, months, currencies and a guest-less registration"""
+    admin = User(username='stats_admin', email='stats_admin@example.com', password_hash='x', role='admin')
+    other = User(username='stats_other', email='stats_other@example.com', password_hash='x', role='admin')
+    db.session.add_all([admin, other])
+    db.session.commit()
+    seed(admin.id, trips=4, registrations_per_trip=3)
+    seed(other.id, trips=2)
+
+    registrations = Registration.query.join(Trip).filter(Trip.admin_id == admin.id).order_by(Registration.id).all()
+    for index, registration in enumerate(registrations):
+        registration.status = ('pending', 'approved', 'rejected')[index % 3]
+        registration.language = ('en', 'cs', 'sk', 'cs')[index % 4]
+        registration.created_at = datetime(2026, 1 + index % 5, 10, 12, 0)
+    Guest.query.filter(Guest.registration_id == registrations[0].id).delete()
+    for index, guest in enumerate(Guest.query.join(Registration).join(Trip).filter(Trip.admin_id == admin.id)):
+        guest.age_category = 'child' if index % 3 == 0 else 'adult'
+        guest.document_type = ('passport', 'citizen_id')[index % 2]
+        guest.gdpr_consent = index % 4 != 0
+        guest.created_at = datetime(2026, 2 + index % 3, 1, 8, 0)
+    for index, invoice in enumerate(Invoice.query.filter_by(admin_id=admin.id)):
+        invoice.status = ('draft', 'sent', 'paid')[index % 3]
+        invoice.currency = ('EUR', 'CZK')[index % 2]
+        invoice.total_amount = 100 + index
+        invoice.created_at = datetime(2026, 3 + index % 2, 5, 9, 0)
+    trip = Trip.query.filter_by(admin_id=admin.id).first()
+    trip.is_externally_synced = True
+    trip.end_date = trip.start_date.replace(day=trip.start_date.day + 6)
+    db.session.commit()
+    refresh_rollups()
+    db.session.commit()
+    return admin.id
+
+def count_statements(function, *args):
+    statements = []
+    listener = lambda *event_args: statements.append(event_args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = function(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, len(statements)
+
+def python_counts(items, key):
+    counts = defaultdict(int)
+    for item in items:
+        counts[key(item)] += 1
+    return dict(counts)
+
+def test_aggregates_match_row_by_row_counts():
+    """Rollup sums equal the counts computed from every loaded row"""
+    print("🧪 Testing breakdown aggregates")
+    app = TestConfig.create_test_app()
+    with app.app_context():
+        admin_id = seed_history()
+        registrations = Registration.query.join(Trip).filter(Trip.admin_id == admin_id).all()
+        guests = Guest.query.join(Registration).join(Trip).filter(Trip.admin_id == admin_id).all()
+        invoices = Invoice.query.filter_by(admin_id=admin_id).all()
+        trips = Trip.query.filter_by(admin_id=admin_id).all()
+
+        stats, statements = count_statements(registration_stats, admin_id)
+        # Rollup sums, recent count, trip titles
+        assert statements == 3
+        assert stats['total_registrations'] == 12 and stats['pending_count'] == 4
+        assert stats['status_breakdown'] == python_counts(registrations, lambda r: r.status)
+        assert stats['monthly_breakdown'] == python_counts(registrations, lambda r: r.created_at.strftime('%Y-%m'))
+        assert list(stats['monthly_breakdown']) == sorted(stats['monthly_breakdown'])
+        assert stats['trip_breakdown'] == python_counts(registrations, lambda r: r.trip.title)
+        assert stats['language_breakdown'] == python_counts(registrations, lambda r: r.language)
+        assert stats['guest_count_distribution'] == python_counts(registrations, lambda r: len(r.guests)) == {0: 1, 2: 11}
+        assert stats['recent_count'] == 0
+        print("   ✅ Registration breakdowns in 3 statements, guest-less registration counted")
+
+        stats, statements = count_statements(guest_stats, admin_id)
+        assert statements == 2 and stats['total_guests'] == len(guests) == 22
+        assert stats['age_category_breakdown'] == python_counts(guests, lambda g: g.age_category)
+        assert stats['document_type_breakdown'] == python_counts(guests, lambda g: g.document_type)
+        assert stats['monthly_guest_counts'] == python_counts(guests, lambda g: g.created_at.strftime('%Y-%m'))
+        assert stats['trip_guest_counts'] == python_counts(guests, lambda g: g.registration.trip.title)
+        assert stats['gdpr_consent_count'] == sum(1 for g in guests if g.gdpr_consent)
+        print("   ✅ Guest breakdowns match")
+
+        stats, statements = count_statements(invoice_stats, admin_id)
+        assert statements == 1 and stats['total_invoices'] == len(invoices)
+        assert stats['total_amount'] == sum(float(i.total_amount) for i in invoices)
+        assert stats['status_counts'] == python_counts(invoices, lambda i: i.status)
+        assert stats['currency_counts'] == python_counts(invoices, lambda i: i.currency)
+        revenue = defaultdict(float)
+        for invoice in invoices:
+            revenue[invoice.created_at.strftime('%Y-%m')] += float(invoice.total_amount)
+        assert stats['monthly_revenue'] == dict(revenue)
+        print("   ✅ Invoice counts and amounts match")
+
+        rows, statements = count_statements(trip_rows, admin_id)
+        stats = trip_stats(admin_id, rows)
+        assert statements == 1 and len(rows) == stats['total_trips'] == 4
+        assert stats['externally_synced_count'] == 1 and stats['avg_duration_days'] == round((6 + 3 * 3) / 4, 1)
+        assert stats['monthly_trip_counts'] == python_counts(trips, lambda t: t.created_at.strftime('%Y-%m'))
+        print("   ✅ Trip summary and average duration from the rollups")
+
+        stats, statements = count_statements(overview_stats, admin_id)
+        assert statements == 1
+        assert stats == {'total_registrations': 12, 'total_guests': 22, 'total_trips': 4,
+                         'total_revenue': sum(float(i.total_amount) for i in invoices)}
+        print("   ✅ Overview totals in one statement")
+
+def test_recent_rows_are_limited():
+    """Recent tables read ten rows with their trip title and guest count"""
+    print("🧪 Testing recent rows")
+    app = TestConfig.create_test_app()
+    with app.app_context():
+        admin_id = seed_history()
+        rows, statements = count_statements(recent_registrations, admin_id)
+        assert statements == 1 and len(rows) == 10
+        assert [row.created_at for row in rows] == sorted((row.created_at for row in rows), reverse=True)
+        assert {row.guest_count for row in rows} <= {0, 2} and rows[0].trip_title.startswith('Trip ')
+        guests, statements = count_statements(recent_guests, admin_id)
+        assert statements == 1 and len(guests) == 10 and guests[0].trip_title.startswith('Trip ')
+        print("   ✅ Newest registrations and guests, one statement each")
+
+if __name__ == "__main__":
+    test_aggregates_match_row_by_row_counts()
+    test_recent_rows_are_limited()
+    print("\n✅ All breakdown aggregate tests passed!")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk approve/reject of registrations and batched notifications
+"""
+
+import os
+import sys
+import threading
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+from test_outbox import SMTPStandIn
+from database import (
+    db, User, Amenity, Trip, Registration, Guest, DocumentPurge, OutboxMessage,
+    bulk_update_registration_status, rebuild_trip_counters
+)
+from gdpr import enqueue_registration_documents
+from email_utils import queue_approval_email
+from outbox import OutboxWorker
+
+def create_pending_registrations(count, username='bulk_admin'):
+    """Create a trip with ``count`` pending registrations, one guest each"""
+    admin = User(username=username, email=f'{username}@example.com', password_hash='x', role='admin')
+    db.session.add(admin)
+    db.session.flush()
+    amenity = Amenity(name='Bulk Flat', max_guests=4, admin_id=admin.id)
+    db.session.add(amenity)
+    db.session.flush()
+    trip = Trip(title='Bulk Trip', start_date=date(2026, 8, 1), end_date=date(2026, 8, 3),
+                max_guests=4, admin_id=admin.id, amenity_id=amenity.id)
+    db.session.add(trip)
+    db.session.flush()
+
+    ids = []
+    for i in range(count):
+        registration = Registration(trip_id=trip.id, email=f'{username}{i}@example.com')
+        db.session.add(registration)
+        db.session.flush()
+        db.session.add(Guest(registration_id=registration.id, first_name=f'Bulk{i}', last_name='Guest',
+                             document_type='passport', document_number=f'{username}{i}',
+                             document_image=f'00000000-0000-0000-0000-00000000000{i}_doc.jpg'))
+        ids.append(registration.id)
+    rebuild_trip_counters([trip.id])
+    db.session.commit()
+    return trip, ids
+
+def test_bulk_status_update():
+    """Selected registrations change in one UPDATE and counters follow"""
+    print("🧪 Testing bulk registration status update")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        trip, ids = create_pending_registrations(4)
+
+        approved = bulk_update_registration_status(ids[:3], 'approved', trip.admin_id)
+        enqueue_registration_documents(approved)
+        db.session.commit()
+        assert sorted(approved) == sorted(ids[:3])
+        assert DocumentPurge.query.count() == 3
+        print("   ✅ Three registrations approved and their documents queued")
+
+        # Re-approving is a no-op
+        assert bulk_update_registration_status(ids[:3], 'approved', trip.admin_id) == []
+        assert bulk_update_registration_status([], 'approved', trip.admin_id) == []
+        print("   ✅ Already-matching registrations are skipped")
+
+        rejected = bulk_update_registration_status(ids[3:], 'rejected', trip.admin_id, admin_comment='Blurry photo')
+        db.session.commit()
+        assert rejected == ids[3:]
+
+        db.session.refresh(trip)
+        assert (trip.pending_count, trip.approved_count, trip.rejected_count) == (0, 3, 1)
+        assert Registration.query.get(ids[3]).admin_comment == 'Blurry photo'
+        assert Registration.query.get(ids[0]).admin_comment is None
+        print("   ✅ Trip counters and rejection comments are consistent")
+
+def test_bulk_update_ignores_foreign_ids():
+    """Ids of another admin's registrations are left alone"""
+    print("🧪 Testing bulk update scoped to the admin")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        trip, ids = create_pending_registrations(2)
+        other_trip, other_ids = create_pending_registrations(2, username='other_bulk_admin')
+
+        changed = bulk_update_registration_status(ids + other_ids, 'approved', trip.admin_id)
+        db.session.commit()
+        assert sorted(changed) == sorted(ids)
+        assert {registration.status for registration in Registration.query.filter(Registration.id.in_(other_ids))} == {'pending'}
+        assert bulk_update_registration_status(other_ids, 'rejected', trip.admin_id) == []
+
+        db.session.refresh(other_trip)
+        assert (other_trip.pending_count, other_trip.approved_count) == (2, 0)
+        print("   ✅ Foreign ids ignored and their trip counters untouched")
+
+def test_bulk_notifications_share_connection():
+    """Bulk notifications are queued with the update and delivered over one SMTP connection"""
+    print("🧪 Testing batched notification delivery")
+    server = SMTPStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        app = TestConfig.create_test_app(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.server_address[1],
+                                         MAIL_USE_TLS=False, MAIL_PASSWORD='')
+
+        with app.app_context():
+            trip, ids = create_pending_registrations(5)
+            changed = bulk_update_registration_status(ids, 'approved', trip.admin_id)
+            for registration in Registration.query.filter(Registration.id.in_(changed)).all():
+                queue_approval_email(registration)
+            db.session.commit()
+            assert OutboxMessage.query.filter_by(status='queued').count() == 5
+            assert server.connections == 0, "Nothing may be sent inside the request"
+            print("   ✅ Five notifications queued, none sent inline")
+
+            worker = OutboxWorker(app)
+            assert worker.drain()['sent'] == 5
+            worker.connection.close()
+            assert server.connections == 1
+            assert sorted(server.messages) == sorted(f'bulk_admin{i}@example.com' for i in range(5))
+            print("   ✅ Worker delivered all five over one connection")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    test_bulk_status_update()
+    test_bulk_update_ignores_foreign_ids()
+    test_bulk_notifications_share_connection()
+    print("\n✅ All bulk registration tests passed!")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for the incremental changes feed (/api/v2/changes)
+"""
+
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import LoginManager
+from sqlalchemy import event
+
+from test_config import TestConfig
+from database import db, User, Trip, Registration, Guest, Invoice
+from blueprints.api import api
+from changes_feed import format_cursor, get_changes_page
+from test_export_streaming import seed
+
+def create_feed_app(**config):
+    app = TestConfig.create_test_app(**config)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(api)
+    return app
+
+def create_admins():
+    admin = User(username='feed_admin', email='feed_admin@example.com', password_hash='x', role='admin')
+    other = User(username='feed_other', email='feed_other@example.com', password_hash='x', role='admin')
+    db.session.add_all([admin, other])
+    db.session.commit()
+    return admin.id, other.id
+
+def read_feed(admin_id, since=None, limit=7, now=None):
+    """Every change after ``since``, page by page, checking the statements per page; returns the changes and last cursor"""
+    changes, statements = [], []
+    listener = lambda *args: statements.append(args[2])
+    while True:
+        statements.clear()
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            page, since, has_more = get_changes_page(admin_id, since, limit=limit, now=now)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert len(statements) == 4 and len(page) <= limit
+        changes.extend(page)
+        if not has_more:
+            return changes, since
+
+def test_feed_pages_through_every_change_once():
+    """Keyset pages cover each changed row once, in (updated_at, type, id) order"""
+    print("🧪 Testing changes feed paging")
+    app = create_feed_app()
+    with app.app_context():
+        admin_id, other_id = create_admins()
+        seed(admin_id, trips=3, registrations_per_trip=2, guests_per_registration=2)
+        seed(other_id, trips=1)
+        later = datetime.utcnow() + timedelta(minutes=1)
+
+        changes, cursor = read_feed(admin_id, now=later)
+        keys = [format_cursor(row.updated_at, change_type, row.id) for change_type, row in changes]
+        assert len(changes) == len(set(keys)) == 3 + 6 + 12 + 6
+        ordered = [(row.updated_at, change_type, row.id) for change_type, row in changes]
+        assert ordered == sorted(ordered)
+        assert {change_type for change_type, _ in changes} == {'trip', 'registration', 'guest', 'invoice'}
+        assert cursor == keys[-1]
+        print("   ✅ 27 changes in pages of 7, four statements per page, other admin excluded")
+
+        assert get_changes_page(admin_id, cursor, now=later) == ([], cursor, False)
+        guest = Guest.query.join(Registration).join(Trip).filter(Trip.admin_id == admin_id).first()
+        guest.first_name = 'Renamed'
+        invoice = Invoice.query.filter_by(admin_id=admin_id).first()
+        invoice.status = 'paid'
+        db.session.commit()
+        changes, _ = read_feed(admin_id, cursor, now=datetime.utcnow() + timedelta(minutes=1))
+        assert [(change_type, row.id) for change_type, row in changes] == [('guest', guest.id), ('invoice', invoice.id)]
+        assert changes[0][1].first_name == 'Renamed' and changes[1][1].status == 'paid'
+        print("   ✅ Only rows updated after the cursor are returned")
+
+        assert get_changes_page(admin_id, now=datetime.utcnow() - timedelta(days=1)) == ([], None, False)
+        print("   ✅ Changes inside the settle window are held back")
+
+def test_changes_endpoint_streams_ndjson():
+    """The endpoint streams NDJSON with the next cursor in the headers"""
+    print("🧪 Testing /api/v2/changes")
+    app = create_feed_app(CHANGES_FEED_SETTLE_SECONDS=0)
+    with app.app_context():
+        admin_id, _ = create_admins()
+        seed(admin_id, trips=2)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+
+    response = client.get('/api/v2/changes?types=guest,invoice&limit=5')
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 5 and {line['type'] for line in lines} <= {'guest', 'invoice'}
+    assert response.headers['X-Has-More'] == 'true' and response.headers['X-Next-Cursor'] == lines[-1]['cursor']
+    assert 'rel="next"' in response.headers['Link'] and 'types=guest' in response.headers['Link']
+    assert all('document_image' not in line['data'] for line in lines)
+    print("   ✅ First page of guests and invoices with the next cursor")
+
+    response = client.get('/api/v2/changes', query_string={'since': lines[-1]['cursor'], 'types': 'guest,invoice'})
+    rest = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) + len(rest) == 8 + 4 and response.headers['X-Has-More'] == 'false'
+    assert 'Link' not in response.headers
+    print("   ✅ Next page continues after the cursor")
+
+    assert client.get('/api/v2/changes?since=yesterday').status_code == 400
+    assert client.get('/api/v2/changes?types=users').status_code == 400
+    print("   ✅ Malformed cursors and unknown types are rejected")
+
+if __name__ == "__main__":
+    test_feed_pages_through_every_change_once()
+    test_changes_endpoint_streams_ndjson()
+    print("\n✅ All changes feed tests passed!")
@@ -96,4 +96,36 @@ class TestConfig:
             'WTF_CSRF_ENABLED': False,
             'SERVER_NAME': f'localhost:{cls.TEST_PORT}',
             'PREFERRED_URL_SCHEME': 'http'
-        } 
\ No newline at end of file
+        }
+    
+    @classmethod
+    def create_test_app(cls, **config):
+        """Create a minimal Flask app bound to an in-memory SQLite database.
+        
+        Service-level tests use this instead of importing app.py, so they run
+        without a test server or the WeasyPrint system libraries.
+        """
+        from flask import Flask
+        from flask_babel import Babel
+        from flask_mail import Mail
+        from database import db
+        
+        project_root = os.path.dirname(os.path.abspath(__file__))
+        app = Flask('test_app', template_folder=os.path.join(project_root, 'templates'))
+        app.config.update(
+            TESTING=True,
+            SECRET_KEY='test-secret-key',
+            SQLALCHEMY_DATABASE_URI='sqlite://',
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+            UPLOAD_FOLDER=tempfile.mkdtemp(prefix='test_uploads_'),
+            MAIL_USERNAME='test@example.com'
+        )
+        app.config.update(config)
+        db.init_app(app)
+        Babel(app)
+        Mail(app)
+        
+        with app.app_context():
+            db.create_all()
+        
+        return app
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-locale email rendering layer
+"""
+
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+import email_templates
+from email_templates import compiled_template, normalize_locale, preload_catalogs, render_email, translate
+from email_utils import build_approval_email
+
+def test_render_for_explicit_locale():
+    """Each supported locale renders from its own catalog without any app or request"""
+    print("🧪 Testing email rendering per locale")
+    catalogs = preload_catalogs()
+    assert set(catalogs) == {'en', 'cs', 'sk'}
+    assert preload_catalogs() is catalogs, "Catalogs are loaded once"
+
+    subject_en, body_en = render_email('approval', 'en', trip_title='Summer Trip')
+    subject_cs, body_cs = render_email('approval', 'cs', trip_title='Summer Trip')
+    assert subject_en == 'Your registration has been approved!'
+    assert subject_cs == 'Vaše registrace byla schválena!'
+    assert 'Summer Trip' in body_en and 'Summer Trip' in body_cs
+    assert body_cs != body_en
+    print("   ✅ English and Czech render from preloaded catalogs")
+
+    subject, _ = render_email('invoice', 'sk', company='ACME', client_name='Jan', invoice_number='1')
+    assert 'ACME' in subject and subject != 'Your Invoice from ACME'
+    print("   ✅ Slovak invoice subject is translated")
+
+def test_locale_normalisation_and_cache():
+    """Unknown locales fall back to English and compiled templates are reused"""
+    print("🧪 Testing locale normalisation and template cache")
+    assert normalize_locale('cs_CZ') == 'cs'
+    assert normalize_locale('SK') == 'sk'
+    assert normalize_locale('de') == 'en'
+    assert normalize_locale(None) == 'en'
+
+    first = compiled_template('rejection', 'cs')
+    assert compiled_template('rejection', 'cs-CZ') is first
+    assert ('rejection', 'cs') in email_templates._compiled
+    print("   ✅ Locales normalised and compiled templates cached")
+
+def test_mixed_language_batch_without_request():
+    """A batch for guests in different languages needs only an app context"""
+    print("🧪 Testing mixed-language batch build without a request context")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        trip = SimpleNamespace(title='Ski Week')
+        registrations = [
+            SimpleNamespace(language=language, email=f'{language}@example.com', trip=trip)
+            for language in ('en', 'cs', 'sk', None)
+        ]
+        subjects = [build_approval_email(registration).subject for registration in registrations]
+        assert subjects[0] == subjects[3] == 'Your registration has been approved!'
+        assert subjects[1] == 'Vaše registrace byla schválena!'
+        assert len(set(subjects)) == 3
+        print("   ✅ Four messages in three languages built in one pass")
+
+def test_translate_while_catalogs_load():
+    """A thread translating while another is halfway through loading the catalogs waits instead of failing"""
+    print("🧪 Testing translation during catalog loading")
+    loaded = dict(preload_catalogs())
+    catalogs = email_templates._catalogs
+    results, errors = [], []
+    def worker():
+        try:
+            results.append(translate('Your registration has been approved!', 'cs'))
+        except Exception as e:
+            errors.append(e)
+    try:
+        with email_templates._lock:
+            # Another thread has loaded English but not Czech yet
+            catalogs.clear()
+            catalogs['en'] = loaded['en']
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join(0.2)
+            assert thread.is_alive(), "Translation must wait for the loading thread"
+        thread.join(5)
+        assert not errors, errors
+        assert results == ['Vaše registrace byla schválena!'] and set(catalogs) == {'en', 'cs', 'sk'}
+        print("   ✅ Czech translation waited for its catalog")
+    finally:
+        catalogs.update(loaded)
+
+if __name__ == "__main__":
+    test_render_for_explicit_locale()
+    test_locale_normalisation_and_cache()
+    test_mixed_language_batch_without_request()
+    test_translate_while_catalogs_load()
+    print("\n✅ All email template tests passed!")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test script for the background export jobs: worker, file formats, progress,
+token downloads and expiry cleanup
+"""
+
+import csv
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import LoginManager
+
+from test_config import TestConfig
+from database import db, User, ExportJob
+from blueprints.export import export
+from export_jobs import (
+    ExportWorker, cleanup_expired_exports, create_export_job, export_file_path, export_job_progress
+)
+from exports import export_pages
+from test_export_streaming import seed
+
+def create_export_app(export_folder):
+    app = TestConfig.create_test_app(EXPORT_FOLDER=export_folder)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(export)
+    return app
+
+def create_admins():
+    admin = User(username='jobs_admin', email='jobs_admin@example.com', password_hash='x', role='admin')
+    other = User(username='jobs_other', email='jobs_other@example.com', password_hash='x', role='admin')
+    db.session.add_all([admin, other])
+    db.session.commit()
+    return admin.id, other.id
+
+def test_worker_writes_every_format():
+    """Queued jobs are written as CSV, gzip CSV and NDJSON with progress up to 100%"""
+    print("🧪 Testing background export worker")
+    folder = tempfile.mkdtemp(prefix='test_exports_')
+    try:
+        app = create_export_app(folder)
+        with app.app_context():
+            admin_id, other_id = create_admins()
+            seed(admin_id, trips=4, registrations_per_trip=3, guests_per_registration=2)
+            seed(other_id, trips=1)
+
+            csv_job = create_export_job(admin_id, 'guests', 'csv', locale='cs')
+            gz_job = create_export_job(admin_id, 'registrations', 'csv.gz',
+                                       date_from=date(2026, 7, 8), date_to=date(2026, 7, 15))
+            ndjson_job = create_export_job(admin_id, 'invoices', 'ndjson')
+            db.session.commit()
+            assert export_job_progress(csv_job)['percent'] == 0
+
+            stats = ExportWorker(app).drain()
+            assert stats == {'done': 3, 'failed': 0}, stats
+            for job in (csv_job, gz_job, ndjson_job):
+                db.session.refresh(job)
+                assert job.status == 'done' and job.rows_written == job.total_rows, (job.kind, job.error)
+                assert export_job_progress(job)['percent'] == 100
+                assert job.expires_at > job.finished_at and job.file_size > 0
+            assert (csv_job.total_rows, gz_job.total_rows, ndjson_job.total_rows) == (24, 6, 12)
+            print("   ✅ Three jobs done, rows written equal the counted rows")
+
+            with open(export_file_path(csv_job), encoding='utf-8', newline='') as export_file:
+                rows = list(csv.reader(export_file))
+            assert rows[0][3] == 'Jméno' and len(rows) == 1 + 24, rows[0]
+            print("   ✅ CSV header translated to the requester's locale")
+
+            with gzip.open(export_file_path(gz_job), 'rt', encoding='utf-8', newline='') as export_file:
+                rows = list(csv.reader(export_file))
+            assert rows[0][0] == 'Registration ID' and {row[1] for row in rows[1:]} == {'Trip 1', 'Trip 2'}
+            print("   ✅ gzip CSV limited to trips starting in the date range")
+
+            with open(export_file_path(ndjson_job), encoding='utf-8') as export_file:
+                lines = [json.loads(line) for line in export_file]
+            assert len(lines) == 12 and lines[0]['invoice_number'].startswith('EXP-')
+            assert lines[0]['total_amount'] == '110.00' and lines[0]['trip_title'] == 'Trip 0'
+            print("   ✅ NDJSON has one object per row keyed by column")
+
+            pages = list(export_pages('guests', admin_id, page_size=5))
+            assert [len(page) for page in pages] == [5, 5, 5, 5, 4]
+            assert [row.id for page in pages for row in page] == sorted(row.id for page in pages for row in page)
+            print("   ✅ Keyset pages cover every row once, in id order")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def test_download_by_token_and_cleanup():
+    """Only the requesting admin downloads the file, and expiry deletes it"""
+    print("🧪 Testing export downloads and expiry")
+    folder = tempfile.mkdtemp(prefix='test_exports_')
+    try:
+        app = create_export_app(folder)
+        with app.app_context():
+            admin_id, other_id = create_admins()
+            seed(admin_id, trips=2)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+
+        response = client.post('/admin/exports', data={'kind': 'trips', 'format': 'csv.gz', 'date_from': '2026-07-01'})
+        assert response.status_code == 302
+        response = client.post('/admin/exports', data={'kind': 'passwords', 'format': 'csv'})
+        assert response.status_code == 302
+
+        with app.app_context():
+            job = ExportJob.query.one()
+            assert job.admin_id == admin_id and job.date_from == date(2026, 7, 1) and job.date_to is None
+            job_id, token = job.id, job.token
+            assert client.get(f'/admin/exports/{job_id}/progress').get_json()['status'] == 'queued'
+            assert client.get(f'/admin/exports/download/{token}').status_code == 302
+            ExportWorker(app).drain()
+        print("   ✅ Export queued from the form, unknown kinds rejected")
+
+        progress = client.get(f'/admin/exports/{job_id}/progress').get_json()
+        assert progress['status'] == 'done' and progress['percent'] == 100 and progress['total_rows'] == 2
+        response = client.get(f'/admin/exports/download/{token}')
+        assert response.status_code == 200 and response.mimetype == 'application/gzip'
+        assert 'trips_2026-07-01_all.csv.gz' in response.headers['Content-Disposition']
+        rows = list(csv.reader(StringIO(gzip.decompress(response.get_data()).decode('utf-8'))))
+        response.close()
+        assert len(rows) == 1 + 2
+        print("   ✅ Finished file downloaded by token")
+
+        with client.session_transaction() as session:
+            session['_user_id'] = str(other_id)
+        assert client.get(f'/admin/exports/download/{token}').status_code == 404
+        assert client.get(f'/admin/exports/{job_id}/progress').status_code == 404
+        print("   ✅ Other admins cannot see or download the export")
+
+        with app.app_context():
+            job = db.session.get(ExportJob, job_id)
+            path = export_file_path(job)
+            assert cleanup_expired_exports() == 0 and os.path.exists(path)
+            assert cleanup_expired_exports(now=datetime.utcnow() + timedelta(days=2)) == 1
+            assert not os.path.exists(path)
+            db.session.refresh(job)
+            assert job.status == 'expired' and job.file_name is None
+        print("   ✅ Expired export file deleted by the cleanup sweep")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_worker_writes_every_format()
+    test_download_by_token_and_cleanup()
+    print("\n✅ All export job tests passed!")
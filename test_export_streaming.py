@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test script for the streamed CSV exports and their query counts
+"""
+
+import csv
+import os
+import sys
+from datetime import date, timedelta
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import LoginManager
+from sqlalchemy import event
+
+from test_config import TestConfig
+from database import db, User, Amenity, Calendar, Trip, Registration, Guest, Invoice
+from blueprints.export import export, guest_rows, invoice_rows, iter_csv, registration_rows, trip_rows
+
+def create_export_app():
+    app = TestConfig.create_test_app()
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(export)
+    return app
+
+def seed(admin_id, trips=3, registrations_per_trip=2, guests_per_registration=2):
+    amenity = Amenity(name='Export Cabin', admin_id=admin_id)
+    db.session.add(amenity)
+    db.session.flush()
+    for t in range(trips):
+        trip = Trip(title=f'Trip {t}', start_date=date(2026, 7, 1) + timedelta(days=7 * t),
+                    end_date=date(2026, 7, 4) + timedelta(days=7 * t), max_guests=4,
+                    admin_id=admin_id, amenity_id=amenity.id)
+        db.session.add(trip)
+        db.session.flush()
+        for r in range(registrations_per_trip):
+            registration = Registration(trip_id=trip.id, email=f'guest{t}{r}@example.com', status='approved')
+            db.session.add(registration)
+            db.session.flush()
+            for g in range(guests_per_registration):
+                db.session.add(Guest(registration_id=registration.id, first_name=f'First{g}', last_name=f'Last{t}{r}',
+                                     document_type='passport', document_number=f'P{t}{r}{g}'))
+            db.session.add(Invoice(invoice_number=f'EXP-{admin_id}-{t}-{r}', admin_id=admin_id,
+                                   registration_id=registration.id, client_name=f'Client {t}{r}',
+                                   issue_date=date(2026, 7, 1),
+                                   subtotal=100, vat_total=10, total_amount=110))
+    db.session.commit()
+
+def download(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.status_code
+    assert response.is_streamed and response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename=')
+    return list(csv.reader(StringIO(response.get_data(as_text=True))))
+
+def test_exports_are_streamed():
+    """Every export is a streamed CSV with one row per record of the current admin"""
+    print("🧪 Testing streamed CSV exports")
+    app = create_export_app()
+
+    with app.app_context():
+        admin = User(username='export_admin', email='export_admin@example.com', password_hash='x', role='admin')
+        other = User(username='export_other', email='export_other@example.com', password_hash='x', role='admin')
+        db.session.add_all([admin, other])
+        db.session.commit()
+        admin_id, other_id = admin.id, other.id
+        seed(admin_id)
+        seed(other_id, trips=1)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+
+    rows = download(client, '/admin/export/registrations')
+    assert rows[0][0] == 'Registration ID' and len(rows) == 1 + 6
+    assert rows[1][1] == 'Trip 0' and rows[1][7] == '2'
+    print("   ✅ Registrations with trip title and guest count")
+
+    rows = download(client, '/admin/export/guests')
+    assert len(rows) == 1 + 12 and rows[1][2] == 'Trip 0'
+    print("   ✅ Guests with trip title")
+
+    rows = download(client, '/admin/export/trips')
+    assert len(rows) == 1 + 3 and rows[1][6] == 'Export Cabin' and rows[1][7] == ''
+    print("   ✅ Trips with amenity and calendar names")
+
+    rows = download(client, '/admin/export/invoices')
+    assert len(rows) == 1 + 6 and rows[1][9] == '110.0' and rows[1][15] == 'Trip 0'
+    print("   ✅ Invoices with amounts and trip title, other admins excluded")
+
+def count_export_queries(admin_id):
+    """Statements issued while producing each export, keyed by export"""
+    counts = {}
+    for name, rows in (('registrations', registration_rows), ('guests', guest_rows),
+                       ('trips', trip_rows), ('invoices', invoice_rows)):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            produced = sum(1 for _ in rows(admin_id))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        counts[name] = (len(statements), produced)
+    return counts
+
+def test_export_query_count_is_constant():
+    """Each export is one SELECT, whatever the number of rows"""
+    print("🧪 Testing export query counts")
+    app = create_export_app()
+
+    with app.app_context():
+        small = User(username='small_admin', email='small_admin@example.com', password_hash='x', role='admin')
+        large = User(username='large_admin', email='large_admin@example.com', password_hash='x', role='admin')
+        db.session.add_all([small, large])
+        db.session.commit()
+        small_id, large_id = small.id, large.id
+        seed(small_id, trips=1, registrations_per_trip=1, guests_per_registration=1)
+        seed(large_id, trips=15, registrations_per_trip=4, guests_per_registration=3)
+        calendar = Calendar(name='Export Calendar', amenity_id=Amenity.query.filter_by(admin_id=large_id).first().id,
+                            calendar_url='https://example.com/calendar.ics')
+        db.session.add(calendar)
+        db.session.flush()
+        Trip.query.filter_by(admin_id=large_id).update({'calendar_id': calendar.id})
+        db.session.commit()
+        db.session.expunge_all()
+
+        small_counts = count_export_queries(small_id)
+        db.session.expunge_all()
+        large_counts = count_export_queries(large_id)
+
+        assert {name: rows for name, (_, rows) in large_counts.items()} == {
+            'registrations': 60, 'guests': 180, 'trips': 15, 'invoices': 60}
+        for name in small_counts:
+            assert small_counts[name][0] == large_counts[name][0] == 1, (name, small_counts, large_counts)
+        print("   ✅ One statement per export for 1 and for 180 rows")
+
+        trip = next(trip_rows(large_id))
+        assert trip[6] == 'Export Cabin' and trip[7] == 'Export Calendar'
+        print("   ✅ Amenity and calendar names come from the same query")
+
+def test_iter_csv_chunks():
+    """CSV text is produced in bounded chunks, never as one document"""
+    print("🧪 Testing CSV chunking")
+    chunks = list(iter_csv(['a', 'b'], ([i, f'x,{i}'] for i in range(1200)), chunk_rows=500))
+    assert len(chunks) == 3
+    assert chunks[0].startswith('a,b\r\n0,"x,0"\r\n') and chunks[0].count('\r\n') == 500
+    rows = list(csv.reader(StringIO(''.join(chunks))))
+    assert len(rows) == 1201 and rows[-1] == ['1199', 'x,1199']
+    assert list(iter_csv(['a'], [])) == ['a\r\n']
+    print("   ✅ 1200 rows in three chunks of at most 500 lines")
+
+if __name__ == "__main__":
+    test_exports_are_streamed()
+    test_export_query_count_is_constant()
+    test_iter_csv_chunks()
+    print("\n✅ All export streaming tests passed!")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test script for the GDPR document purge queue and retention sweeper
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+from database import db, User, Amenity, Trip, Registration, Guest, DocumentPurge
+from gdpr import (
+    GDPRWorker, enqueue_registration_documents, enqueue_expired_documents, find_orphaned_uploads,
+    enqueue_orphaned_uploads, sweep_document_purges
+)
+
+def write_upload(folder, name, age_hours=0):
+    """Create an upload file, optionally back-dating its mtime"""
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b'document')
+    if age_hours:
+        mtime = time.time() - age_hours * 3600
+        os.utime(path, (mtime, mtime))
+    return path
+
+def create_registration(folder, status='pending', guests=2, updated_at=None):
+    """Create a registration whose guests each have an uploaded document"""
+    admin = User.query.filter_by(username='gdpr_admin').first()
+    if not admin:
+        admin = User(username='gdpr_admin', email='gdpr_admin@example.com', password_hash='x', role='admin')
+        db.session.add(admin)
+        db.session.flush()
+        amenity = Amenity(name='GDPR Flat', max_guests=4, admin_id=admin.id)
+        db.session.add(amenity)
+        db.session.flush()
+        db.session.add(Trip(title='GDPR Trip', start_date=date(2026, 7, 1), end_date=date(2026, 7, 5),
+                            max_guests=4, admin_id=admin.id, amenity_id=amenity.id))
+        db.session.flush()
+    trip = Trip.query.filter_by(admin_id=admin.id).first()
+
+    registration = Registration(trip_id=trip.id, email=f'{uuid.uuid4().hex}@example.com', status=status)
+    db.session.add(registration)
+    db.session.flush()
+    for i in range(guests):
+        name = f"{uuid.uuid4()}_passport{i}.jpg"
+        write_upload(folder, name, age_hours=48)
+        db.session.add(Guest(registration_id=registration.id, first_name=f'Guest{i}', last_name='Purge',
+                             document_type='passport', document_number=f'P{i}', document_image=name))
+    db.session.flush()
+    if updated_at:
+        # Bypass onupdate so the registration looks old
+        db.session.execute(db.update(Registration).where(Registration.id == registration.id)
+                           .values(updated_at=updated_at))
+    db.session.commit()
+    return registration
+
+def test_approval_queue_and_sweep():
+    """Approved documents are queued once and removed by a batched sweep"""
+    print("🧪 Testing approval purge queue and sweeper")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        folder = app.config['UPLOAD_FOLDER']
+        registration = create_registration(folder, guests=3)
+        files = [g.document_image for g in registration.guests]
+
+        assert enqueue_registration_documents([registration.id]) == 3
+        assert enqueue_registration_documents([registration.id]) == 0, "Files must not be queued twice"
+        assert enqueue_registration_documents([]) == 0
+        db.session.commit()
+        print("   ✅ Approval queues each document exactly once")
+
+        os.remove(os.path.join(folder, files[0]))  # Already gone on disk
+        stats = sweep_document_purges(batch_size=2)
+        assert stats['purged'] == 2 and stats['missing'] == 1 and stats['failed'] == 0, stats
+        assert stats['batches'] == 2, stats
+        assert not any(os.path.exists(os.path.join(folder, name)) for name in files)
+        assert Guest.query.filter(Guest.document_image.isnot(None)).count() == 0
+        assert DocumentPurge.query.filter(DocumentPurge.purged_at.is_(None)).count() == 0
+        print("   ✅ Sweeper deleted files, cleared guest references and closed the queue")
+
+def test_retention_and_orphans():
+    """Retention applies to every status and orphans are found via the database"""
+    print("🧪 Testing retention period and orphaned upload detection")
+    app = TestConfig.create_test_app(DOCUMENT_RETENTION_DAYS=30, ORPHAN_UPLOAD_GRACE_HOURS=24)
+
+    with app.app_context():
+        folder = app.config['UPLOAD_FOLDER']
+        old = datetime.utcnow() - timedelta(days=45)
+        rejected = create_registration(folder, status='rejected', guests=1, updated_at=old)
+        pending = create_registration(folder, status='pending', guests=1, updated_at=old)
+        recent = create_registration(folder, status='rejected', guests=1)
+
+        assert enqueue_expired_documents() == 2
+        db.session.commit()
+        queued = {p.guest_id for p in DocumentPurge.query.all()}
+        assert queued == {rejected.guests[0].id, pending.guests[0].id}
+        print("   ✅ Expired rejected and pending registrations were queued, recent one kept")
+
+        orphan = f"{uuid.uuid4()}_lost.jpg"
+        fresh = f"{uuid.uuid4()}_uploading.jpg"
+        write_upload(folder, orphan, age_hours=48)
+        write_upload(folder, fresh)
+        write_upload(folder, 'amenity_1_photo.jpg', age_hours=48)
+
+        assert find_orphaned_uploads() == [orphan]
+        print("   ✅ Only old, unreferenced guest documents are orphans")
+
+        assert enqueue_orphaned_uploads() == 1
+        assert enqueue_orphaned_uploads() == 0
+        db.session.commit()
+        sweep_document_purges()
+        assert not os.path.exists(os.path.join(folder, orphan))
+        assert os.path.exists(os.path.join(folder, fresh))
+        assert os.path.exists(os.path.join(folder, 'amenity_1_photo.jpg'))
+        assert os.path.exists(os.path.join(folder, recent.guests[0].document_image))
+        print("   ✅ Orphan purged without touching other uploads")
+
+def test_worker_loop():
+    """The worker deletes queued documents on every poll and runs retention on its own interval"""
+    print("🧪 Testing GDPR worker loop")
+    app = TestConfig.create_test_app(DOCUMENT_PURGE_POLL_SECONDS=0, DOCUMENT_RETENTION_INTERVAL_SECONDS=3600)
+
+    with app.app_context():
+        folder = app.config['UPLOAD_FOLDER']
+        now = [1000.0]
+        worker = GDPRWorker(app, clock=lambda: now[0])
+        orphan = f"{uuid.uuid4()}_lost.jpg"
+        write_upload(folder, orphan, age_hours=48)
+        stats = worker.run_once()
+        assert 'orphans_queued' in stats and stats['purged'] == 1
+        assert not os.path.exists(os.path.join(folder, orphan))
+        print("   ✅ First poll runs the retention sweep")
+
+        registration = create_registration(folder, status='approved', guests=2)
+        files = [os.path.join(folder, g.document_image) for g in registration.guests]
+        enqueue_registration_documents([registration.id])
+        db.session.commit()
+        later = f"{uuid.uuid4()}_later.jpg"
+        write_upload(folder, later, age_hours=48)
+        now[0] += 60
+        stats = worker.run_once()
+        assert 'orphans_queued' not in stats and stats['purged'] == 2
+        assert not any(os.path.exists(path) for path in files) and os.path.exists(os.path.join(folder, later))
+        print("   ✅ Later polls only delete queued documents")
+
+        now[0] += 3600
+        assert worker.run_once()['orphans_queued'] == 1
+        assert not os.path.exists(os.path.join(folder, later))
+        print("   ✅ Retention sweep runs again once its interval has passed")
+
+        polls = []
+        original = worker.run_once
+        worker.run_once = lambda: polls.append(1) or original()
+        handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+        timer = threading.Timer(0.3, worker.stop)
+        timer.start()
+        started = time.monotonic()
+        try:
+            worker.run_forever()
+        finally:
+            timer.join()
+            signal.signal(signal.SIGTERM, handlers[0])
+            signal.signal(signal.SIGINT, handlers[1])
+        assert len(polls) > 1 and time.monotonic() - started < 5
+        print(f"   ✅ run_forever polled {len(polls)} times and stopped on request")
+
+if __name__ == "__main__":
+    test_approval_queue_and_sweep()
+    test_retention_and_orphans()
+    test_worker_loop()
+    print("\n✅ All GDPR purge tests passed!")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test script for the monthly guest backup API (/api/backup/guests)
+"""
+
+import csv
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import LoginManager
+from sqlalchemy import event
+
+from test_config import TestConfig
+from database import db, User, Registration, Guest, Trip
+from blueprints.api import api
+from guest_backup import BACKUP_FIELDS
+from test_export_streaming import seed
+
+CLOSED_MONTH = datetime(2025, 1, 15, 12, 0)
+
+def create_backup_app(snapshot_folder):
+    app = TestConfig.create_test_app(BACKUP_SNAPSHOT_FOLDER=snapshot_folder)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(api)
+    return app
+
+def seed_months():
+    """Admin with 8 guests registered in January 2025 and 4 this month; another admin in January 2025"""
+    admin = User(username='backup_admin', email='backup_admin@example.com', password_hash='x', role='admin')
+    other = User(username='backup_other', email='backup_other@example.com', password_hash='x', role='admin')
+    db.session.add_all([admin, other])
+    db.session.commit()
+    admin_id, other_id = admin.id, other.id
+    seed(admin_id, trips=3)
+    seed(other_id, trips=1)
+    admin_trips = [trip.id for trip in Trip.query.filter_by(admin_id=admin_id).order_by(Trip.id)]
+    Registration.query.filter(Registration.trip_id.in_(admin_trips[:2])).update(
+        {'created_at': CLOSED_MONTH}, synchronize_session=False)
+    other_trips = [trip.id for trip in Trip.query.filter_by(admin_id=other_id)]
+    Registration.query.filter(Registration.trip_id.in_(other_trips)).update(
+        {'created_at': CLOSED_MONTH}, synchronize_session=False)
+    db.session.commit()
+    return admin_id
+
+def login(app, admin_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+    return client
+
+def test_closed_month_snapshot_and_etag():
+    """A closed month is written once as a snapshot and revalidated by its strong ETag"""
+    print("🧪 Testing closed month backup snapshots")
+    folder = tempfile.mkdtemp(prefix='test_backup_snapshots_')
+    try:
+        app = create_backup_app(folder)
+        with app.app_context():
+            admin_id = seed_months()
+        client = login(app, admin_id)
+
+        response = client.get('/api/backup/guests?year=2025&month=1')
+        assert response.status_code == 200 and response.mimetype == 'text/csv'
+        etag, weak = response.get_etag()
+        assert etag and not weak
+        rows = list(csv.DictReader(StringIO(response.get_data(as_text=True))))
+        response.close()
+        assert list(rows[0].keys()) == list(BACKUP_FIELDS) and len(rows) == 8
+        assert {row['trip_title'] for row in rows} == {'Trip 0', 'Trip 1'}
+        assert rows[0]['created_at'].count(':') == 2 and rows[0]['gdpr_consent'] == 'False'
+        assert len(glob.glob(os.path.join(folder, '*.csv'))) == 1
+        print("   ✅ Snapshot of the admin's 8 January guests, strong ETag")
+
+        with app.app_context():
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                response = client.get('/api/backup/guests?year=2025&month=1', headers={'If-None-Match': f'"{etag}"'})
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', listener)
+        assert response.status_code == 304
+        # The session's user, then the month's fingerprint
+        assert len(statements) == 2 and 'count(' in statements[1].lower(), statements
+        print("   ✅ Repeat pull answered 304 after one aggregate query")
+
+        response = client.get('/api/backup/guests?year=2025&month=1&format=json')
+        records = json.loads(response.get_data(as_text=True))
+        response.close()
+        assert response.mimetype == 'application/json' and len(records) == 8
+        assert response.get_etag()[0] != etag and records[0]['gdpr_consent'] is False
+        print("   ✅ JSON snapshot has its own ETag")
+
+        with app.app_context():
+            guest = Guest.query.join(Registration).filter(Registration.created_at == CLOSED_MONTH).first()
+            guest.last_name = 'Corrected'
+            db.session.commit()
+        response = client.get('/api/backup/guests?year=2025&month=1', headers={'If-None-Match': f'"{etag}"'})
+        assert response.status_code == 200 and response.get_etag()[0] != etag
+        assert 'Corrected' in response.get_data(as_text=True)
+        response.close()
+        assert len(glob.glob(os.path.join(folder, '*.csv'))) == 1
+        print("   ✅ A late edit produces a new snapshot and removes the old one")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def test_open_month_streams_and_pages():
+    """The current month is streamed live and can be paged by guest id"""
+    print("🧪 Testing open month backup streaming and paging")
+    folder = tempfile.mkdtemp(prefix='test_backup_snapshots_')
+    try:
+        app = create_backup_app(folder)
+        with app.app_context():
+            admin_id = seed_months()
+        client = login(app, admin_id)
+        today = datetime.utcnow()
+        url = f'/api/backup/guests?year={today.year}&month={today.month}'
+
+        response = client.get(url + '&format=json')
+        assert response.status_code == 200 and response.is_streamed and response.get_etag() == (None, None)
+        records = json.loads(response.get_data(as_text=True))
+        assert len(records) == 4 and {record['trip_title'] for record in records} == {'Trip 2'}
+        assert os.listdir(folder) == []
+        print("   ✅ Open month streamed as a JSON array without a snapshot")
+
+        ids, after = [], None
+        while True:
+            page_url = url + '&limit=3' + (f'&after={after}' if after else '')
+            response = client.get(page_url)
+            ids += [int(row['id']) for row in csv.DictReader(StringIO(response.get_data(as_text=True)))]
+            after = response.headers.get('X-Next-Cursor')
+            if not after:
+                break
+            assert 'rel="next"' in response.headers['Link']
+        assert ids == sorted(record['id'] for record in records)
+        print("   ✅ Keyset pages of 3 return every guest once")
+
+        assert client.get('/api/backup/guests?year=2025&month=13').status_code == 400
+        assert client.get('/api/backup/guests?year=2025').status_code == 400
+        print("   ✅ Invalid or missing month rejected")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_closed_month_snapshot_and_etag()
+    test_open_month_streams_and_pages()
+    print("\n✅ All guest backup tests passed!")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for the streamed bulk invoice PDF export
+"""
+
+import csv
+import io
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+from test_pdf_render_pool import start_render_service
+from database import db, User, Invoice, InvoiceItem
+import pdf_service
+from pdf_cache import invoice_pdf_cache_path, store_invoice_pdf, template_hash
+from pdf_service import INVOICE_PDF_TEMPLATE
+from invoice_archive import stream_invoice_archive
+
+def create_invoices(count):
+    admin = User(username='zip_admin', email='zip_admin@example.com', password_hash='x', role='admin')
+    db.session.add(admin)
+    db.session.flush()
+    invoices = []
+    for i in range(count):
+        invoice = Invoice(invoice_number=f'ZIP-{i:03d}', admin_id=admin.id, client_name=f'Client {i}',
+                          issue_date=date(2026, 9, i + 1), subtotal=100, vat_total=0, total_amount=100)
+        db.session.add(invoice)
+        db.session.flush()
+        db.session.add(InvoiceItem(invoice_id=invoice.id, description='Night', unit_price=100,
+                                   line_total=100, vat_amount=0, total_with_vat=100))
+        invoices.append(invoice)
+    db.session.commit()
+    return invoices
+
+def test_streamed_archive_with_cache_and_service():
+    """Cached PDFs are reused, the rest render in the render service, and the ZIP arrives in chunks"""
+    print("🧪 Testing streamed invoice PDF archive")
+    folder = tempfile.mkdtemp(prefix='test_pdf_cache_')
+    app = TestConfig.create_test_app(INVOICE_PDF_CACHE_FOLDER=folder,
+                                     PDF_RENDER_SERVICE_ADDRESS=os.path.join(folder, 'render.sock'))
+    # Render service whose processes stand in for WeasyPrint
+    with app.app_context():
+        service = start_render_service(folder, size=2, queue_depth=2, authkey=pdf_service.service_authkey())
+    try:
+        with app.test_request_context():
+            invoices = create_invoices(5)
+            digest = template_hash(INVOICE_PDF_TEMPLATE, 'test')
+            for invoice in invoices[:2]:
+                store_invoice_pdf(invoice.id, invoice_pdf_cache_path(invoice, 'en', digest),
+                                  f'%PDF cached {invoice.invoice_number}'.encode())
+
+            chunks = list(stream_invoice_archive(invoices, 'en', digest))
+            assert len(chunks) == 6, f"One chunk per PDF plus the index, got {len(chunks)}"
+            print("   ✅ Archive streamed in six chunks")
+
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+            assert archive.testzip() is None
+            names = sorted(archive.namelist())
+            assert names == ['index.csv'] + [f'invoice_ZIP-{i:03d}.pdf' for i in range(5)], names
+            assert archive.read('invoice_ZIP-000.pdf') == b'%PDF cached ZIP-000'
+            assert archive.read('invoice_ZIP-004.pdf').startswith(b'%PDF <')
+            print("   ✅ Two PDFs from the cache, three rendered in the service")
+
+            rows = list(csv.reader(io.StringIO(archive.read('index.csv').decode('utf-8'))))
+            assert len(rows) == 6 and rows[1][:2] == ['invoice_ZIP-000.pdf', 'ZIP-000']
+            print("   ✅ CSV index lists every PDF")
+
+            for invoice in invoices[2:]:
+                assert os.path.exists(invoice_pdf_cache_path(invoice, 'en', digest))
+            print("   ✅ Rendered PDFs stored in the cache")
+    finally:
+        pdf_service.reset_render_client()
+        service.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_streamed_archive_with_cache_and_service()
+    print("\n✅ All invoice archive tests passed!")
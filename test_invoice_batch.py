@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script for batch invoicing of approved stays
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+
+from test_config import TestConfig
+from database import (
+    db, User, Amenity, Trip, Registration, Guest, Invoice, InvoiceItem, allocate_invoice_numbers
+)
+from invoice_batch import create_batch_invoices, plan_batch_invoices, plan_totals
+
+def create_stay(admin, amenity, title, start, nights, guests, status='approved'):
+    trip = Trip(title=title, start_date=start, end_date=start + timedelta(days=nights), max_guests=4,
+                admin_id=admin.id, amenity_id=amenity.id)
+    db.session.add(trip)
+    db.session.flush()
+    registration = Registration(trip_id=trip.id, email=f'{title.lower()}@example.com', status=status)
+    db.session.add(registration)
+    db.session.flush()
+    for i in range(guests):
+        db.session.add(Guest(registration_id=registration.id, first_name=f'{title}{i}', last_name='Guest',
+                             document_type='passport', document_number=f'{title}-{i}'))
+    return registration
+
+def count_queries(engine, statements):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    return count
+
+def test_batch_invoices():
+    """Approved stays without a finalised invoice are priced, previewed and created in bulk"""
+    print("🧪 Testing batch invoice generation")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        admin = User(username='batch_admin', email='batch_admin@example.com', password_hash='x', role='admin')
+        db.session.add(admin)
+        db.session.flush()
+        priced = Amenity(name='Cabin', admin_id=admin.id, nightly_rate=Decimal('50.00'), vat_rate=Decimal('10'),
+                         currency='CZK')
+        unpriced = Amenity(name='Tent', admin_id=admin.id)
+        db.session.add_all([priced, unpriced])
+        db.session.flush()
+        db.session.add(Invoice(invoice_number='OLD-1', admin_id=admin.id, client_name='Old', issue_date=date(2026, 1, 1)))
+
+        march = date(2026, 3, 1)
+        new_stay = create_stay(admin, priced, 'Alpha', march + timedelta(days=1), nights=3, guests=2)
+        drafted = create_stay(admin, priced, 'Bravo', march + timedelta(days=9), nights=1, guests=1)
+        db.session.add(Invoice(invoice_number='DRAFT-1', admin_id=admin.id, registration_id=drafted.id,
+                               client_name='Bravo Client', issue_date=date(2026, 2, 1), status='draft',
+                               items=[InvoiceItem(description='Placeholder', unit_price=0)]))
+        create_stay(admin, unpriced, 'Charlie', march + timedelta(days=2), nights=2, guests=2)
+        create_stay(admin, priced, 'Delta', march + timedelta(days=3), nights=2, guests=2, status='pending')
+        sent = create_stay(admin, priced, 'Echo', march + timedelta(days=4), nights=2, guests=2)
+        db.session.add(Invoice(invoice_number='SENT-1', admin_id=admin.id, registration_id=sent.id,
+                               client_name='Echo', issue_date=date(2026, 2, 1), status='sent'))
+        create_stay(admin, priced, 'Foxtrot', date(2026, 4, 2), nights=2, guests=2)
+        db.session.commit()
+
+        plan = plan_batch_invoices(admin.id, march, date(2026, 3, 31))
+        assert [entry['trip'].title for entry in plan] == ['Alpha', 'Charlie', 'Bravo']
+        alpha, charlie, bravo = plan
+        assert (alpha['nights'], alpha['guests'], alpha['quantity']) == (3, 2, 6)
+        assert alpha['total_amount'] == Decimal('330.00') and alpha['client_name'] == 'Alpha0 Guest'
+        assert charlie['skip_reason'] == 'no_rate'
+        assert bravo['draft_id'] is not None and bravo['client_name'] == 'Bravo Client'
+        assert plan_totals(plan) == {'CZK': Decimal('385.00')}
+        assert Invoice.query.count() == 3
+        print("   ✅ Preview prices approved stays and leaves the database untouched")
+
+        summary = create_batch_invoices(plan, admin.id, issue_date=date(2026, 4, 1))
+        db.session.commit()
+        assert len(summary['created']) == 1 and summary['repriced'] == [bravo['draft_id']] and summary['skipped'] == 1
+
+        invoice = db.session.get(Invoice, summary['created'][0])
+        assert invoice.registration_id == new_stay.id and invoice.status == 'draft' and invoice.currency == 'CZK'
+        assert invoice.invoice_number == 'INV-20260401-004'
+        assert invoice.total_amount == Decimal('330.00') and invoice.due_date == date(2026, 4, 15)
+        assert [(item.quantity, item.unit_price, item.vat_amount) for item in invoice.items] == [
+            (Decimal('6'), Decimal('50.00'), Decimal('30.00'))]
+
+        draft = db.session.get(Invoice, bravo['draft_id'])
+        assert draft.invoice_number == 'DRAFT-1' and draft.total_amount == Decimal('55.00')
+        assert [item.description for item in draft.items] != ['Placeholder'] and len(draft.items) == 1
+        print("   ✅ New invoices take sequence numbers; zero-priced drafts are repriced in place")
+
+        assert [entry['trip'].title for entry in plan_batch_invoices(admin.id, march, date(2026, 3, 31))] == ['Charlie']
+        print("   ✅ Invoiced stays drop out of the next run")
+
+def test_batch_invoices_bulk_statements():
+    """Hundreds of stays take a constant number of statements"""
+    print("🧪 Testing batch invoice statement count")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        admin = User(username='bulk_admin', email='bulk_admin@example.com', password_hash='x', role='admin')
+        db.session.add(admin)
+        db.session.flush()
+        amenity = Amenity(name='Lodge', admin_id=admin.id, nightly_rate=Decimal('20'))
+        db.session.add(amenity)
+        db.session.flush()
+        for i in range(200):
+            create_stay(admin, amenity, f'Stay{i}', date(2026, 5, 1) + timedelta(days=i % 30), nights=2, guests=1)
+        admin_id = admin.id
+        db.session.commit()
+
+        statements = []
+        listener = count_queries(db.engine, statements)
+        plan = plan_batch_invoices(admin_id, date(2026, 5, 1), date(2026, 5, 31))
+        planned = len(statements)
+        create_batch_invoices(plan, admin_id, issue_date=date(2026, 6, 1))
+        db.session.commit()
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert len(plan) == 200 and planned <= 3, planned
+        assert len(statements) - planned <= 8, statements[planned:]
+        assert Invoice.query.count() == 200 and InvoiceItem.query.count() == 200
+        numbers = sorted(invoice.invoice_number for invoice in Invoice.query)
+        assert numbers[0] == 'INV-20260601-001' and numbers[-1] == 'INV-20260601-200'
+        print(f"   ✅ 200 invoices planned in {planned} and created in {len(statements) - planned} statements")
+
+        assert allocate_invoice_numbers(2, date(2026, 6, 2)) == ['INV-20260602-201', 'INV-20260602-202']
+        assert allocate_invoice_numbers(0) == []
+        print("   ✅ Invoice numbers continue from the shared sequence")
+
+if __name__ == "__main__":
+    test_batch_invoices()
+    test_batch_invoices_bulk_statements()
+    print("\n✅ All batch invoice tests passed!")
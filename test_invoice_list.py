@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script for the keyset-paginated, filterable invoice list
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+from database import db, User, Invoice, get_invoice_totals, get_invoices_page
+
+def create_invoices(admin_id, count):
+    created = datetime(2026, 1, 1)
+    for i in range(count):
+        db.session.add(Invoice(
+            invoice_number=f'L-{i:03d}', admin_id=admin_id,
+            client_name=('Acme ' if i % 2 else 'Beta_') + str(i),
+            issue_date=date(2026, 1, 1) + timedelta(days=i % 10),
+            status='paid' if i % 3 == 0 else 'draft',
+            currency='CZK' if i % 4 == 0 else 'EUR',
+            subtotal=10 * i, vat_total=0, total_amount=10 * i,
+            created_at=created + timedelta(hours=i)
+        ))
+    db.session.commit()
+
+def all_pages(admin_id, **filters):
+    """Walk every page; return invoice numbers in order and the page count"""
+    numbers, after, pages = [], None, 0
+    while True:
+        rows, after = get_invoices_page(admin_id, after=after, page_size=7, **filters)
+        numbers += [row.invoice_number for row in rows]
+        pages += 1
+        if not after:
+            return numbers, pages
+
+def test_keyset_pages_filters_and_sorting():
+    """Pages cover every matching invoice exactly once in the requested order"""
+    print("🧪 Testing invoice list pagination, filters and sorting")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        admin = User(username='list_admin', email='list_admin@example.com', password_hash='x', role='admin')
+        other = User(username='other_admin', email='other_admin@example.com', password_hash='x', role='admin')
+        db.session.add_all([admin, other])
+        db.session.flush()
+        create_invoices(admin.id, 30)
+        db.session.add(Invoice(invoice_number='OTHER', admin_id=other.id, client_name='Acme', issue_date=date(2026, 1, 1)))
+        db.session.commit()
+
+        numbers, pages = all_pages(admin.id)
+        assert numbers == [f'L-{i:03d}' for i in reversed(range(30))] and pages == 5
+        print("   ✅ Newest first across five pages, other admins excluded")
+
+        numbers, _ = all_pages(admin.id, sort='issue_date', direction='asc')
+        expected = sorted((f'L-{i:03d}' for i in range(30)), key=lambda n: (int(n[2:]) % 10, int(n[2:])))
+        assert numbers == expected
+        numbers, _ = all_pages(admin.id, sort='total', direction='desc')
+        assert numbers[0] == 'L-029' and len(numbers) == 30
+        print("   ✅ Issue date and total sorting page through every row")
+
+        numbers, _ = all_pages(admin.id, status='paid', date_from=date(2026, 1, 3), date_to=date(2026, 1, 7))
+        assert sorted(numbers) == sorted(f'L-{i:03d}' for i in range(30) if i % 3 == 0 and 2 <= i % 10 <= 6)
+        numbers, _ = all_pages(admin.id, currency='CZK', client='acme')
+        assert numbers == []  # CZK invoices have even numbers, Acme odd ones
+        numbers, _ = all_pages(admin.id, client='Beta_1')
+        assert sorted(numbers) == ['L-010', 'L-012', 'L-014', 'L-016', 'L-018']
+        numbers, _ = all_pages(admin.id, client='Beta%')
+        assert numbers == [], "LIKE wildcards in the prefix are escaped"
+        print("   ✅ Status, date range, currency and client prefix filters")
+
+        rows, _ = get_invoices_page(admin.id, after='garbage', page_size=3)
+        assert [row.invoice_number for row in rows] == ['L-029', 'L-028', 'L-027']
+        print("   ✅ Bad cursor restarts from the first page")
+
+        rows, _ = get_invoices_page(admin.id, page_size=8)
+        totals = {row.currency: row for row in get_invoice_totals(row.id for row in rows)}
+        # Page holds L-029..L-022; CZK ones are L-028 and L-024
+        assert totals['CZK'].count == 2 and Decimal(totals['CZK'].total_amount) == Decimal(520)
+        assert totals['EUR'].count == 6 and Decimal(totals['EUR'].total_amount) == Decimal(1520)
+        assert get_invoice_totals([]) == []
+        print("   ✅ Per-page totals per currency from one aggregate")
+
+if __name__ == "__main__":
+    test_keyset_pages_filters_and_sorting()
+    print("\n✅ All invoice list tests passed!")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the invoice PDF render cache
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+from database import db, User, Invoice, InvoiceItem
+from pdf_cache import cached_invoice_pdf, invalidate_invoice_pdf, template_hash
+
+TEMPLATE = 'admin/invoice_pdf.html'
+
+def create_invoice():
+    admin = User(username='pdf_admin', email='pdf_admin@example.com', password_hash='x',
+                 role='admin', company_name='PDF Lodge')
+    db.session.add(admin)
+    db.session.flush()
+    invoice = Invoice(invoice_number='INV-PDF-1', admin_id=admin.id, client_name='Client',
+                      issue_date=date(2026, 10, 1))
+    db.session.add(invoice)
+    db.session.flush()
+    db.session.add(InvoiceItem(invoice_id=invoice.id, description='Night', quantity=2, unit_price=50,
+                               line_total=100, vat_amount=0, total_with_vat=100))
+    db.session.commit()
+    return invoice
+
+class CountingRenderer:
+    """Stands in for WeasyPrint and counts how often it is asked to render"""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f'%PDF-1.4 render {self.calls}'.encode()
+
+def test_cache_hits_and_invalidation():
+    """Repeat downloads reuse the file; content changes and invalidation render again"""
+    print("🧪 Testing invoice PDF cache hits and invalidation")
+    app = TestConfig.create_test_app(INVOICE_PDF_CACHE_FOLDER=tempfile.mkdtemp(prefix='test_pdf_cache_'))
+
+    with app.app_context():
+        invoice = create_invoice()
+        render = CountingRenderer()
+        digest = template_hash(TEMPLATE, 'body {}')
+        assert digest == template_hash(TEMPLATE, 'body {}')
+        assert digest != template_hash(TEMPLATE, 'body { color: red }')
+
+        first = cached_invoice_pdf(invoice, render, 'en', digest)
+        for _ in range(5):
+            assert cached_invoice_pdf(invoice, render, 'en', digest) == first
+        assert render.calls == 1
+        with open(first, 'rb') as f:
+            assert f.read() == b'%PDF-1.4 render 1'
+        print("   ✅ Six downloads, one render")
+
+        czech = cached_invoice_pdf(invoice, render, 'cs', digest)
+        assert czech != first and render.calls == 2
+        assert cached_invoice_pdf(invoice, render, 'en', digest) == first and os.path.exists(czech)
+        assert render.calls == 2
+        print("   ✅ Each locale keeps its own file; switching back is a hit")
+
+        invoice.items[0].description = 'Two nights'
+        db.session.commit()
+        assert cached_invoice_pdf(invoice, render, 'en', digest) != first
+        assert render.calls == 3
+        assert not os.path.exists(first), "Older version in the same locale is replaced"
+
+        invoice.admin.contact_phone = '+420 123 456 789'
+        db.session.commit()
+        cached_invoice_pdf(invoice, render, 'en', digest)
+        assert render.calls == 4
+        print("   ✅ Item and issuer changes produce a new key")
+
+        invoice.status = 'paid'
+        invoice.updated_at = datetime.utcnow() + timedelta(seconds=1)
+        db.session.commit()
+        assert invalidate_invoice_pdf(invoice.id) == 2
+        assert invalidate_invoice_pdf(invoice.id) == 0
+        cached_invoice_pdf(invoice, render, 'en', digest)
+        assert render.calls == 5
+        assert len(os.listdir(app.config['INVOICE_PDF_CACHE_FOLDER'])) == 1
+        print("   ✅ Invalidation removes the cached files of every locale")
+
+if __name__ == "__main__":
+    test_cache_hits_and_invalidation()
+    print("\n✅ All invoice PDF cache tests passed!")
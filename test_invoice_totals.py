@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for SQL-side invoice total recomputation
+"""
+
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import LoginManager
+from sqlalchemy import event
+from test_config import TestConfig
+from database import (
+    db, User, Invoice, InvoiceItem,
+    calculate_invoice_item_amounts, find_invoice_total_mismatches, recalculate_invoice_totals
+)
+
+def create_invoice(admin, number, items, subtotal=0, vat_total=0, total_amount=0):
+    invoice = Invoice(invoice_number=number, admin_id=admin.id, client_name='Client', issue_date=date(2026, 10, 1),
+                      subtotal=subtotal, vat_total=vat_total, total_amount=total_amount)
+    db.session.add(invoice)
+    db.session.flush()
+    for quantity, unit_price, vat_rate in items:
+        line_total, vat_amount, total_with_vat = calculate_invoice_item_amounts(quantity, unit_price, vat_rate)
+        db.session.add(InvoiceItem(invoice_id=invoice.id, description='Item', quantity=quantity,
+                                   unit_price=unit_price, vat_rate=vat_rate, line_total=line_total,
+                                   vat_amount=vat_amount, total_with_vat=total_with_vat))
+    return invoice
+
+def test_item_amounts_in_decimal():
+    """Item amounts are computed in Decimal and rounded half up to cents"""
+    print("🧪 Testing Decimal item amounts")
+    assert calculate_invoice_item_amounts('3', '0.10', '0') == (Decimal('0.30'), Decimal('0.00'), Decimal('0.30'))
+    assert calculate_invoice_item_amounts('1', '10.05', '21') == (Decimal('10.05'), Decimal('2.11'), Decimal('12.16'))
+    assert calculate_invoice_item_amounts('', '99.99', None) == (Decimal('99.99'), Decimal('0.00'), Decimal('99.99'))
+    print("   ✅ 3 × 0.10 is exactly 0.30 and VAT rounds half up")
+
+def test_bulk_recalculation():
+    """Drifted invoices are repaired set-based and reported; correct ones are untouched"""
+    print("🧪 Testing set-based invoice total repair")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        admin = User(username='totals_admin', email='totals_admin@example.com', password_hash='x', role='admin')
+        db.session.add(admin)
+        db.session.flush()
+        correct = create_invoice(admin, 'T-1', [(2, '50.00', '10')], '100.00', '10.00', '110.00')
+        drifted = create_invoice(admin, 'T-2', [(3, '0.10', '0'), (1, '10.05', '21')], '10.349999', '2', '12.35')
+        empty = create_invoice(admin, 'T-3', [], '5.00', '0', '5.00')
+        db.session.commit()
+        correct_id, drifted_id, empty_id = correct.id, drifted.id, empty.id
+        correct_updated = correct.updated_at
+
+        mismatches = find_invoice_total_mismatches()
+        assert [row.id for row in mismatches] == [drifted_id, empty_id]
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            changed = recalculate_invoice_totals()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        db.session.commit()
+
+        assert len(statements) == 3, f"One SELECT and two UPDATEs expected, got {len(statements)}"
+        assert [row.invoice_number for row in changed] == ['T-2', 'T-3']
+        print("   ✅ Two drifted invoices repaired with one SELECT and two UPDATEs")
+
+        drifted = db.session.get(Invoice, drifted_id)
+        assert drifted.subtotal == Decimal('10.35') and drifted.vat_total == Decimal('2.11')
+        assert drifted.total_amount == Decimal('12.46')
+        empty = db.session.get(Invoice, empty_id)
+        assert (empty.subtotal, empty.vat_total, empty.total_amount) == (0, 0, 0)
+        assert db.session.get(Invoice, correct_id).updated_at == correct_updated
+        print("   ✅ Totals match the items; untouched invoice keeps its updated_at")
+
+        assert recalculate_invoice_totals() == []
+        assert recalculate_invoice_totals([]) == []
+        print("   ✅ Second run finds nothing to repair")
+
+def invoice_form(client_name, items):
+    form = {'client_name': client_name, 'issue_date': '2026-10-01', 'currency': 'EUR', 'item_count': str(len(items))}
+    for i, (description, quantity, unit_price, vat_rate) in enumerate(items):
+        form.update({f'item_description_{i}': description, f'item_quantity_{i}': quantity,
+                     f'item_unit_price_{i}': unit_price, f'item_vat_rate_{i}': vat_rate})
+    return form
+
+def test_invoice_routes():
+    """Creating, editing and recalculating through the routes keeps the totals in line with the items"""
+    print("🧪 Testing invoice create, edit and recalculate routes")
+    from blueprints.invoices import invoices
+    app = TestConfig.create_test_app()
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(invoices)
+
+    with app.app_context():
+        admin = User(username='routes_admin', email='routes_admin@example.com', password_hash='x', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+
+    response = client.post('/admin/invoices/new', data=invoice_form('Route Client', [('Night', '3', '0.10', '0'), ('Fee', '1', '10.05', '21')]))
+    assert response.status_code == 302
+    with app.app_context():
+        invoice = Invoice.query.filter_by(admin_id=admin_id).one()
+        invoice_id = invoice.id
+        assert response.headers['Location'].endswith(f'/admin/invoices/{invoice_id}')
+        assert (invoice.subtotal, invoice.vat_total, invoice.total_amount) == (Decimal('10.35'), Decimal('2.11'), Decimal('12.46'))
+    print("   ✅ New invoice stored with totals of its items")
+
+    response = client.post(f'/admin/invoices/{invoice_id}/edit', data=invoice_form('Edited Client', [('Night', '2', '50.00', '10')]))
+    assert response.status_code == 302
+    with app.app_context():
+        invoice = db.session.get(Invoice, invoice_id)
+        assert invoice.client_name == 'Edited Client' and len(invoice.items) == 1
+        assert (invoice.subtotal, invoice.vat_total, invoice.total_amount) == (Decimal('100.00'), Decimal('10.00'), Decimal('110.00'))
+        invoice.total_amount = Decimal('1.00')
+        db.session.commit()
+    print("   ✅ Edited items replace the old ones and the totals follow")
+
+    response = client.post(f'/admin/invoices/{invoice_id}/recalculate')
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Invoice, invoice_id).total_amount == Decimal('110.00')
+    assert client.post('/admin/invoices/999/recalculate').status_code == 404
+    print("   ✅ Recalculate repairs drifted totals; unknown invoices are 404")
+
+if __name__ == "__main__":
+    test_item_amounts_in_decimal()
+    test_bulk_recalculation()
+    test_invoice_routes()
+    print("\n✅ All invoice total tests passed!")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test script for the occupancy and turnover analytics
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import LoginManager
+from sqlalchemy import event, insert
+
+from test_config import TestConfig
+from database import db, User, Amenity, Trip
+from blueprints.api import api
+from occupancy import occupancy_report
+
+def create_occupancy_app(**config):
+    app = TestConfig.create_test_app(**config)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(api)
+    return app
+
+def add_trip(admin_id, amenity_id, start, nights):
+    trip = Trip(title=f'Stay {start}', start_date=start, end_date=start + timedelta(days=nights), max_guests=2,
+                admin_id=admin_id, amenity_id=amenity_id)
+    db.session.add(trip)
+    db.session.flush()
+    return trip.id
+
+def seed_bookings():
+    admin = User(username='occupancy_admin', email='occupancy_admin@example.com', password_hash='x', role='admin')
+    other = User(username='occupancy_other', email='occupancy_other@example.com', password_hash='x', role='admin')
+    db.session.add_all([admin, other])
+    db.session.flush()
+    lake = Amenity(name='Lake House', admin_id=admin.id)
+    hill = Amenity(name='Hill Cabin', admin_id=admin.id)
+    foreign = Amenity(name='Other Cabin', admin_id=other.id)
+    db.session.add_all([lake, hill, foreign])
+    db.session.flush()
+    add_trip(admin.id, lake.id, date(2026, 6, 28), 5)           # 2 nights in July
+    add_trip(admin.id, lake.id, date(2026, 7, 3), 4)            # arrives as the first one leaves
+    first = add_trip(admin.id, lake.id, date(2026, 7, 20), 5)
+    second = add_trip(admin.id, lake.id, date(2026, 7, 22), 2)  # double-books 22-23 July
+    add_trip(admin.id, hill.id, date(2026, 7, 30), 7)           # 2 nights in July, 5 in August
+    add_trip(other.id, foreign.id, date(2026, 7, 5), 20)
+    db.session.commit()
+    return admin.id, lake.id, hill.id, (first, second)
+
+def reference_month(trips, month_start, month_end):
+    """Per-night figures computed one night at a time"""
+    nights = (month_end - month_start).days + 1
+    booked = double = turnover = 0
+    for offset in range(nights):
+        day = month_start + timedelta(days=offset)
+        stays = sum(1 for start, end in trips if start <= day < end)
+        booked += stays > 0
+        double += stays > 1
+        turnover += any(start == day for start, _ in trips) and any(end == day for _, end in trips)
+    arriving = [(end - start).days for start, end in trips if month_start <= start <= month_end]
+    return {
+        'nights': nights,
+        'booked_nights': booked,
+        'occupancy': round(100.0 * booked / nights, 1),
+        'arrivals': len(arriving),
+        'average_stay': round(sum(arriving) / len(arriving), 1) if arriving else 0,
+        'turnover_days': turnover,
+        'double_booked_nights': double,
+    }
+
+def test_occupancy_figures():
+    """Monthly figures equal a night-by-night count, from two statements"""
+    print("🧪 Testing occupancy figures")
+    app = create_occupancy_app()
+    with app.app_context():
+        admin_id, lake_id, hill_id, conflict = seed_bookings()
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            report = occupancy_report(admin_id, date(2026, 7, 1), date(2026, 8, 31))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert len(statements) == 2
+        assert report['months'] == ['2026-07', '2026-08']
+        assert [amenity['name'] for amenity in report['amenities']] == ['Hill Cabin', 'Lake House']
+        for amenity in report['amenities']:
+            trips = [(t.start_date, t.end_date) for t in Trip.query.filter_by(amenity_id=amenity['id'])]
+            for cell, (start, end) in zip(amenity['months'], ((date(2026, 7, 1), date(2026, 7, 31)),
+                                                              (date(2026, 8, 1), date(2026, 8, 31)))):
+                assert {k: v for k, v in cell.items() if k != 'month'} == reference_month(trips, start, end), cell
+        lake = report['amenities'][1]['months'][0]
+        assert lake['booked_nights'] == 2 + 4 + 5 and lake['turnover_days'] == 1 and lake['double_booked_nights'] == 2
+        assert report['totals']['booked_nights'] == 11 + 2 + 5
+        print("   ✅ Occupancy, stays, turnover and double-booked nights match the night-by-night count")
+
+        assert report['double_bookings'] == [{
+            'amenity_id': lake_id, 'amenity_name': 'Lake House', 'first_night': '2026-07-22',
+            'last_night': '2026-07-23', 'nights': 2, 'max_stays': 2, 'trip_ids': list(conflict),
+        }]
+        print("   ✅ Double booking listed with both trips")
+
+        hill_only = occupancy_report(admin_id, date(2026, 7, 1), date(2026, 7, 31), hill_id)
+        assert [amenity['id'] for amenity in hill_only['amenities']] == [hill_id]
+        assert hill_only['double_bookings'] == [] and hill_only['totals']['booked_nights'] == 2
+        print("   ✅ Amenity filter")
+
+def test_many_amenities_over_years():
+    """Hundreds of amenities over three years stay quick"""
+    print("🧪 Testing occupancy over many amenities")
+    app = create_occupancy_app()
+    with app.app_context():
+        admin = User(username='busy_admin', email='busy_admin@example.com', password_hash='x', role='admin')
+        db.session.add(admin)
+        db.session.flush()
+        db.session.execute(insert(Amenity), [{'name': f'Unit {n:03d}', 'admin_id': admin.id} for n in range(300)])
+        amenity_ids = [amenity.id for amenity in Amenity.query.filter_by(admin_id=admin.id)]
+        generator = random.Random(7)
+        trips = []
+        for amenity_id in amenity_ids:
+            day = date(2024, 1, 1)
+            while day < date(2026, 12, 31):
+                nights = generator.randint(1, 10)
+                trips.append({'title': 'Stay', 'start_date': day, 'end_date': day + timedelta(days=nights),
+                              'max_guests': 2, 'admin_id': admin.id, 'amenity_id': amenity_id})
+                day += timedelta(days=nights + generator.randint(0, 4))
+        db.session.execute(insert(Trip), trips)
+        db.session.commit()
+
+        started = time.perf_counter()
+        report = occupancy_report(admin.id, date(2024, 1, 1), date(2026, 12, 31))
+        elapsed = time.perf_counter() - started
+        assert len(report['amenities']) == 300 and len(report['months']) == 36
+        assert report['double_bookings'] == [] and 0 < report['totals']['occupancy'] < 100
+        assert report['totals']['arrivals'] == sum(1 for trip in trips if trip['start_date'] <= date(2026, 12, 31))
+        print(f"   ✅ {len(trips)} trips, 300 amenities × 36 months in {elapsed:.2f}s")
+
+def test_occupancy_api():
+    """JSON figures for the admin's amenities, errors for bad periods"""
+    print("🧪 Testing occupancy API")
+    app = create_occupancy_app()
+    with app.app_context():
+        admin_id, lake_id, _, _ = seed_bookings()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+
+    response = client.get(f'/api/v2/occupancy?date_from=2026-07-01&date_to=2026-07-31&amenity_id={lake_id}')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['months'] == ['2026-07'] and data['amenities'][0]['totals']['double_booked_nights'] == 2
+    assert client.get('/api/v2/occupancy?date_from=2026-07-31&date_to=2026-07-01').status_code == 400
+    assert client.get('/api/v2/occupancy?date_from=2000-01-01&date_to=2026-07-01').status_code == 400
+    assert client.get('/api/v2/occupancy?date_from=July').status_code == 400
+    assert len(client.get('/api/v2/occupancy').get_json()['months']) == 12
+    print("   ✅ JSON report, 400 for reversed, too long or malformed periods, twelve months by default")
+
+if __name__ == "__main__":
+    test_occupancy_figures()
+    test_many_amenities_over_years()
+    test_occupancy_api()
+    print("\n✅ All occupancy tests passed!")
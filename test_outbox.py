@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent outbound email queue and its worker
+"""
+
+import os
+import sys
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_mail import Message
+from test_config import TestConfig
+from database import db, OutboxMessage
+from outbox import OutboxWorker, enqueue_message, outbox_status, requeue_failed
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Minimal local SMTP server that counts connections and accepted recipients.
+
+    Recipients listed in ``reject`` get a permanent 550, those in ``defer``
+    a transient 451. With ``refuse_login`` every AUTH gets a 535.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, reject=(), defer=(), refuse_login=False):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.open_sessions = 0
+        self.refuse_login = refuse_login
+        self.messages = []
+        self.reject = set(reject)
+        self.defer = set(defer)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.server.open_sessions += 1
+        try:
+            self.session()
+        finally:
+            self.server.open_sessions -= 1
+
+    def session(self):
+        self.reply('220 localhost SMTP stand-in')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                if self.server.refuse_login:
+                    self.reply('250-localhost')
+                    self.reply('250 AUTH PLAIN LOGIN')
+                else:
+                    self.reply('250 localhost')
+            elif command == 'AUTH':
+                self.reply('535 Authentication credentials invalid')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                address = line.split(':', 1)[1].strip(' <>')
+                if address in self.server.reject:
+                    self.reply('550 No such user')
+                elif address in self.server.defer:
+                    self.reply('451 Try again later')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline().rstrip(b'\r\n') != b'.':
+                    pass
+                self.server.messages.extend(recipients)
+                self.reply('250 OK')
+            elif command == 'RSET':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+def create_outbox_app(server, **config):
+    config.setdefault('MAIL_PASSWORD', '')
+    return TestConfig.create_test_app(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.server_address[1],
+                                      MAIL_USE_TLS=False, **config)
+
+def queue(recipient, attachment=False):
+    msg = Message('Outbox test', sender='admin@example.com', recipients=[recipient], body='Hello')
+    if attachment:
+        msg.attach(filename='invoice.pdf', content_type='application/pdf', data=b'%PDF-1.4 test')
+    return enqueue_message(msg, kind='test')
+
+def test_worker_reuses_connection():
+    """Queued messages are sent in batches over one long-lived connection"""
+    print("🧪 Testing outbox delivery over a reused connection")
+    server = SMTPStandIn().start()
+    try:
+        app = create_outbox_app(server, OUTBOX_BATCH_SIZE=3)
+        with app.app_context():
+            for i in range(7):
+                queue(f'guest{i}@example.com', attachment=(i == 0))
+            db.session.commit()
+            assert outbox_status() == {'queued': 7}
+
+            worker = OutboxWorker(app)
+            stats = worker.drain()
+            worker.connection.close()
+            assert stats == {'sent': 7, 'retry': 0, 'failed': 0}, stats
+            assert server.connections == 1, f"Expected one SMTP connection, got {server.connections}"
+            assert len(server.messages) == 7
+            assert outbox_status() == {'sent': 7}
+            assert all(m.sent_at for m in OutboxMessage.query.all())
+            print("   ✅ Seven messages in three batches over one connection")
+    finally:
+        server.stop()
+
+def test_retry_backoff_and_permanent_failure():
+    """Transient failures back off and retry; permanent ones fail immediately"""
+    print("🧪 Testing outbox retry/backoff and delivery status")
+    server = SMTPStandIn(reject={'gone@example.com'}, defer={'busy@example.com'}).start()
+    try:
+        app = create_outbox_app(server, OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BASE_SECONDS=60)
+        with app.app_context():
+            ok = queue('ok@example.com')
+            gone = queue('gone@example.com')
+            busy = queue('busy@example.com')
+            db.session.commit()
+            ok_id, gone_id, busy_id = ok.id, gone.id, busy.id
+
+            worker = OutboxWorker(app)
+            stats = worker.drain()
+            assert stats == {'sent': 1, 'retry': 1, 'failed': 1}, stats
+
+            gone, busy = db.session.get(OutboxMessage, gone_id), db.session.get(OutboxMessage, busy_id)
+            assert gone.status == 'failed' and gone.attempts == 1 and '550' in gone.last_error
+            assert busy.status == 'queued' and busy.attempts == 1
+            assert busy.next_attempt_at > datetime.utcnow() + timedelta(seconds=50)
+            print("   ✅ 550 failed at once, 451 rescheduled with backoff")
+
+            # Not due yet: nothing happens
+            assert worker.drain() == {'sent': 0, 'retry': 0, 'failed': 0}
+
+            # Make it due again; second transient failure exhausts the budget
+            busy.next_attempt_at = datetime.utcnow()
+            db.session.commit()
+            assert worker.drain()['failed'] == 1
+            assert db.session.get(OutboxMessage, busy_id).status == 'failed'
+            print("   ✅ Attempts are capped by OUTBOX_MAX_ATTEMPTS")
+
+            server.defer.clear()
+            assert requeue_failed([busy_id]) == 1
+            db.session.commit()
+            assert worker.drain()['sent'] == 1
+            worker.connection.close()
+            assert db.session.get(OutboxMessage, ok_id).status == 'sent'
+            assert db.session.get(OutboxMessage, busy_id).status == 'sent'
+            print("   ✅ Requeued message delivered")
+    finally:
+        server.stop()
+
+def test_unreachable_server_defers_batch():
+    """An unreachable server defers the whole batch without burning attempts"""
+    print("🧪 Testing outbox with an unreachable mail server")
+    server = SMTPStandIn()
+    port = server.server_address[1]
+    server.server_close()  # Nothing listens on the port any more
+
+    app = TestConfig.create_test_app(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False,
+                                     OUTBOX_SMTP_TIMEOUT_SECONDS=2)
+    with app.app_context():
+        for i in range(3):
+            queue(f'later{i}@example.com')
+        db.session.commit()
+
+        stats = OutboxWorker(app).process_batch()
+        assert stats == {'sent': 0, 'retry': 3, 'failed': 0}, stats
+        attempts = sorted(m.attempts for m in OutboxMessage.query.all())
+        assert attempts == [0, 0, 0], attempts
+        assert outbox_status() == {'queued': 3}
+        print("   ✅ Batch deferred after the first connection failure")
+
+def test_refused_login_defers_batch():
+    """Wrong credentials defer the queue instead of failing every message for good"""
+    print("🧪 Testing outbox with a mail server that refuses the login")
+    server = SMTPStandIn(refuse_login=True).start()
+    try:
+        app = create_outbox_app(server, MAIL_USERNAME='outbox', MAIL_PASSWORD='wrong')
+        with app.app_context():
+            for i in range(3):
+                queue(f'held{i}@example.com')
+            db.session.commit()
+
+            worker = OutboxWorker(app)
+            stats = worker.drain()
+            assert stats == {'sent': 0, 'retry': 3, 'failed': 0}, stats
+            messages = OutboxMessage.query.order_by(OutboxMessage.id).all()
+            assert [m.attempts for m in messages] == [0, 0, 0]
+            assert all(m.status == 'queued' and m.next_attempt_at > datetime.utcnow() for m in messages)
+            assert 'SMTPAuthenticationError' in messages[0].last_error
+            assert server.connections == 1 and server.messages == []
+            print("   ✅ One login attempt, all messages deferred without spending attempts")
+
+            for _ in range(50):
+                if not server.open_sessions:
+                    break
+                time.sleep(0.02)
+            assert server.open_sessions == 0 and worker.connection.host is None
+            print("   ✅ Half-open session closed")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    test_worker_reuses_connection()
+    test_retry_backoff_and_permanent_failure()
+    test_unreachable_server_defers_batch()
+    test_refused_login_defers_batch()
+    print("\n✅ All outbox tests passed!")
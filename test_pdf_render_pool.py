@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test script for the out-of-process PDF render pool, the host's render service and their backpressure
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_login import LoginManager
+from test_config import TestConfig
+from database import db, User, Invoice, InvoiceItem
+import pdf_service
+from pdf_service import PDFRenderBusy, PDFRenderClient, PDFRenderPool, PDFRenderService, PDFRenderUnavailable
+
+def slow_render(html_content):
+    """Stands in for WeasyPrint in the pool processes"""
+    time.sleep(0.5)
+    return f'%PDF {html_content} pid={os.getpid()}'.encode()
+
+def test_pool_renders_out_of_process_with_backpressure():
+    """Renders run in other processes; a full queue is refused instead of growing"""
+    print("🧪 Testing PDF render pool backpressure")
+    pool = PDFRenderPool(size=1, queue_depth=2, timeout=30, task=slow_render, initializer=None)
+    try:
+        first = pool.submit('one')
+        second = pool.submit('two')
+        try:
+            pool.submit('three')
+            assert False, "Third render should be refused while two are in flight"
+        except PDFRenderBusy:
+            pass
+        print("   ✅ Queue depth bounds the renders in flight")
+
+        assert first.result(timeout=30).startswith(b'%PDF one')
+        assert second.result(timeout=30).startswith(b'%PDF two')
+        assert f'pid={os.getpid()}'.encode() not in first.result()
+        print("   ✅ Renders ran in a separate process")
+
+        # Slots are released as renders finish
+        time.sleep(0.1)
+        assert pool.render('four').startswith(b'%PDF four')
+        print("   ✅ Slots freed after completion")
+    finally:
+        pool.shutdown()
+
+def start_render_service(folder, size=1, queue_depth=2, authkey=b'test-key'):
+    """Render service on a Unix socket in ``folder``, served by a background thread"""
+    service = PDFRenderService(os.path.join(folder, 'render.sock'), authkey, size, queue_depth, 30,
+                               task=slow_render, initializer=None)
+    threading.Thread(target=service.serve, daemon=True).start()
+    return service
+
+def test_service_bounds_the_whole_host():
+    """Clients of several web workers share one bounded queue and are refused at once when it is full"""
+    print("🧪 Testing shared PDF render service")
+    folder = tempfile.mkdtemp(prefix='test_pdf_service_')
+    service = start_render_service(folder)
+    try:
+        # One client per web worker, all talking to the same service
+        first, second = (PDFRenderClient(service.address, b'test-key', 30) for _ in range(2))
+        futures = [first.submit('one'), second.submit('two')]
+        started = time.monotonic()
+        try:
+            second.submit('three')
+            assert False, "Third render should be refused while two are in flight on the host"
+        except PDFRenderBusy:
+            pass
+        assert time.monotonic() - started < 0.4
+        print("   ✅ Queue depth bounds the renders of every client together, refusal is immediate")
+
+        assert futures[0].result(timeout=30).startswith(b'%PDF one')
+        assert futures[1].result(timeout=30).startswith(b'%PDF two')
+        assert first.render('four').startswith(b'%PDF four')
+        status = first.status()
+        assert (status['size'], status['queue_depth'], status['in_flight']) == (1, 2, 0)
+        assert (status['rendered'], status['refused']) == (3, 1)
+        print(f"   ✅ Renders completed in the service; counters {status}")
+
+        try:
+            PDFRenderClient(service.address, b'wrong-key', 30).submit('five')
+            assert False, "A client with another key should be turned away"
+        except PDFRenderUnavailable:
+            pass
+        print("   ✅ Clients without the key are refused")
+    finally:
+        service.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+def test_render_many_builds_html_once():
+    """While the service is full, waiting jobs are resubmitted without rendering their HTML again"""
+    print("🧪 Testing render_many against a full render service")
+    folder = tempfile.mkdtemp(prefix='test_pdf_service_')
+    app = TestConfig.create_test_app(PDF_RENDER_SERVICE_ADDRESS=os.path.join(folder, 'render.sock'))
+    try:
+        with app.app_context():
+            service = start_render_service(folder, size=1, queue_depth=1, authkey=pdf_service.service_authkey())
+            # Another web worker holds the only slot
+            blocker = pdf_service.get_render_client().submit('blocker')
+            calls = []
+            def job(key):
+                return key, lambda: calls.append(key) or key
+            results = dict(pdf_service.render_many([job('one'), job('two'), job('three')], busy_wait=0.05))
+            assert blocker.result(timeout=30).startswith(b'%PDF blocker')
+            assert sorted(results) == ['one', 'three', 'two'] and results['two'].startswith(b'%PDF two')
+            assert calls == ['one', 'two', 'three'], calls
+            print(f"   ✅ Three PDFs rendered, each job's HTML built once; refused {service.status()['refused']} times")
+    finally:
+        pdf_service.reset_render_client()
+        service.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+def test_in_process_without_address():
+    """Without PDF_RENDER_SERVICE_ADDRESS the web worker renders itself"""
+    print("🧪 Testing in-process rendering fallback")
+    app = TestConfig.create_test_app(PDF_RENDER_SERVICE_ADDRESS='')
+    with app.app_context():
+        assert pdf_service.get_render_client() is None
+    print("   ✅ No render service is used")
+
+def test_download_answers_503_when_service_unavailable():
+    """A PDF download that cannot be rendered now gets 503 with Retry-After"""
+    print("🧪 Testing PDF download without room in the render service")
+    from blueprints.invoices import invoices
+    folder = tempfile.mkdtemp(prefix='test_pdf_service_')
+    app = TestConfig.create_test_app(PDF_RENDER_SERVICE_ADDRESS=os.path.join(folder, 'missing.sock'),
+                                     PDF_RENDER_RETRY_AFTER_SECONDS=7, INVOICE_PDF_CACHE_FOLDER=folder)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(invoices)
+    try:
+        with app.app_context():
+            admin = User(username='pdf_admin', email='pdf_admin@example.com', password_hash='x', role='admin')
+            db.session.add(admin)
+            db.session.flush()
+            invoice = Invoice(invoice_number='PDF-001', admin_id=admin.id, client_name='Client',
+                              issue_date=date(2026, 9, 1), subtotal=100, vat_total=0, total_amount=100)
+            db.session.add(invoice)
+            db.session.flush()
+            db.session.add(InvoiceItem(invoice_id=invoice.id, description='Night', unit_price=100,
+                                       line_total=100, vat_amount=0, total_with_vat=100))
+            db.session.commit()
+            admin_id, invoice_id = admin.id, invoice.id
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+
+        response = client.get(f'/admin/invoices/{invoice_id}/pdf')
+        assert response.status_code == 503 and response.headers['Retry-After'] == '7'
+        print("   ✅ Download answered 503 with Retry-After")
+    finally:
+        pdf_service.reset_render_client()
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_pool_renders_out_of_process_with_backpressure()
+    test_service_bounds_the_whole_host()
+    test_render_many_builds_html_once()
+    test_in_process_without_address()
+    test_download_answers_503_when_service_unavailable()
+    print("\n✅ All PDF render pool tests passed!")
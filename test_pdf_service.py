@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared PDF rendering service (needs WeasyPrint)
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+import pdf_service
+from benchmark_invoice_pdf import create_invoice
+
+def test_renderer_is_warm_and_shared():
+    """Fonts and stylesheets are built once per thread and reused for every PDF"""
+    print("🧪 Testing warm PDF renderer reuse")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        invoice = create_invoice(item_count=3)
+        renderer = pdf_service.warm_up()
+        font_config, stylesheets = renderer.font_config, renderer.stylesheets
+
+        first = pdf_service.render_invoice_pdf(invoice)
+        second = pdf_service.render_invoice_pdf(invoice)
+        assert first.startswith(b'%PDF') and second.startswith(b'%PDF')
+        assert pdf_service.get_renderer() is renderer
+        assert renderer.font_config is font_config and renderer.stylesheets is stylesheets
+        print("   ✅ Two invoices rendered to bytes with one font configuration")
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pdf_service.get_renderer()))
+        thread.start()
+        thread.join()
+        assert other[0] is not renderer
+        print("   ✅ Each thread gets its own renderer")
+
+if __name__ == "__main__":
+    test_renderer_is_warm_and_shared()
+    print("\n✅ All PDF service tests passed!")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test script for the police report / accommodation book generator
+"""
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Blueprint
+from flask_login import LoginManager
+from sqlalchemy import event, insert
+
+from test_config import TestConfig
+from database import db, User, Amenity, Trip, Registration, Guest
+from blueprints.export import export
+from police_report import FIXED_WIDTH_LAYOUT, fixed_width_line, police_report_rows, write_police_reports
+
+PERIOD = (date(2026, 7, 1), date(2026, 7, 31))
+
+def create_report_app(**config):
+    app = TestConfig.create_test_app(**config)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(export)
+    breakdowns = Blueprint('breakdowns', __name__)
+    breakdowns.add_url_rule('/admin/breakdowns', 'admin_breakdowns', lambda: '')
+    app.register_blueprint(breakdowns)
+    return app
+
+def add_stay(admin_id, amenity_id, start, nights, guests, status='approved'):
+    trip = Trip(title=f'Stay {start}', start_date=start, end_date=start + timedelta(days=nights), max_guests=guests,
+                admin_id=admin_id, amenity_id=amenity_id)
+    db.session.add(trip)
+    db.session.flush()
+    registration = Registration(trip_id=trip.id, email=f'stay{trip.id}@example.com', status=status)
+    db.session.add(registration)
+    db.session.flush()
+    db.session.execute(insert(Guest), [
+        {'registration_id': registration.id, 'first_name': f'Guest{g}', 'last_name': f'Stay{trip.id}',
+         'age_category': 'child' if g else 'adult', 'document_type': 'passport', 'document_number': f'P{trip.id}{g}'}
+        for g in range(guests)
+    ])
+
+def seed_report():
+    admin = User(username='police_admin', email='police_admin@example.com', password_hash='x', role='admin')
+    other = User(username='police_other', email='police_other@example.com', password_hash='x', role='admin')
+    db.session.add_all([admin, other])
+    db.session.flush()
+    lake = Amenity(name='Lake House', admin_id=admin.id)
+    hill = Amenity(name='Hill Cabin', admin_id=admin.id)
+    foreign = Amenity(name='Other Cabin', admin_id=other.id)
+    db.session.add_all([lake, hill, foreign])
+    db.session.flush()
+    add_stay(admin.id, lake.id, date(2026, 6, 28), 5, 2)      # 2 nights in July
+    add_stay(admin.id, lake.id, date(2026, 7, 10), 4, 3)      # 4 nights
+    add_stay(admin.id, hill.id, date(2026, 7, 29), 7, 1)      # 3 nights in July
+    add_stay(admin.id, hill.id, date(2026, 6, 20), 11, 2)     # leaves on 1 July: no July night
+    add_stay(admin.id, hill.id, date(2026, 7, 5), 2, 4, status='pending')
+    add_stay(other.id, foreign.id, date(2026, 7, 5), 2, 2)
+    db.session.commit()
+    return admin.id, lake.id, hill.id
+
+def test_report_rows_from_one_query():
+    """Approved stays overlapping the period, nights counted within it, in one statement"""
+    print("🧪 Testing police report rows")
+    app = create_report_app()
+    with app.app_context():
+        admin_id, lake_id, hill_id = seed_report()
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            rows = list(police_report_rows(admin_id, *PERIOD))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert len(statements) == 1
+        assert [amenity_id for amenity_id, _ in rows] == [lake_id] * 5 + [hill_id]
+        assert [row[3] for _, row in rows] == [2, 2, 4, 4, 4, 3]
+        assert rows[0][1][:3] == ['Lake House', '28.06.2026', '03.07.2026']
+        print("   ✅ 6 guests, 19 guest-nights, pending and departed stays left out")
+
+        line = fixed_width_line(rows[2][1])
+        assert len(line) == sum(width for _, width, _ in FIXED_WIDTH_LAYOUT) + 2
+        assert line.startswith('10.07.202614.07.2026  4Stay') and line.endswith('Lake House' + ' ' * 20 + '\r\n')
+        assert line[77:80] == 'AP ', line
+        print("   ✅ Fixed-width lines have the layout's length and codes")
+
+def test_per_amenity_files_in_parallel():
+    """Each amenity gets its own file, written by parallel workers"""
+    print("🧪 Testing per-amenity police report files")
+    folder = tempfile.mkdtemp(prefix='test_police_reports_')
+    try:
+        app = create_report_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(folder, 'report.db')}")
+        with app.app_context():
+            admin_id, lake_id, hill_id = seed_report()
+            for amenity_id in (lake_id, hill_id):
+                for week in range(20):
+                    add_stay(admin_id, amenity_id, date(2026, 5, 1) + timedelta(days=7 * week), 7, 30)
+            db.session.commit()
+
+            summaries = write_police_reports(admin_id, date(2026, 5, 1), date(2026, 9, 30),
+                                             os.path.join(folder, 'out'), workers=2, locale='cs')
+            assert [s['amenity_id'] for s in summaries] == [lake_id, hill_id]
+            assert sum(s['guest_nights'] for s in summaries) == 2 * 20 * 30 * 7 + 2 * 5 + 3 * 4 + 7 + 2 * 11
+            with open(summaries[1]['path'], encoding='utf-8', newline='') as report_file:
+                rows = list(csv.reader(report_file))
+            assert rows[0][1] == 'Příjezd' and len(rows) == 1 + summaries[1]['guests']
+            assert {row[0] for row in rows[1:]} == {'Hill Cabin'}
+            print(f"   ✅ Two files, {sum(s['guest_nights'] for s in summaries)} guest-nights, localized header")
+
+            fixed = write_police_reports(admin_id, *PERIOD, os.path.join(folder, 'fixed'), 'fixed', workers=2)
+            with open(fixed[0]['path'], encoding='utf-8', newline='') as report_file:
+                lines = report_file.read().split('\r\n')[:-1]
+            assert len(lines) == fixed[0]['guests']
+            assert {len(line) for line in lines} == {sum(width for _, width, _ in FIXED_WIDTH_LAYOUT)}
+            print("   ✅ Fixed-width files without a header")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def test_police_report_download():
+    """The admin downloads a streamed report for a period"""
+    print("🧪 Testing police report download")
+    app = create_report_app()
+    with app.app_context():
+        admin_id, lake_id, _ = seed_report()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+
+    response = client.get('/admin/export/police-report?date_from=2026-07-01&date_to=2026-07-31')
+    assert response.status_code == 200 and response.is_streamed and response.mimetype == 'text/csv'
+    assert 'police_report_2026-07-01_2026-07-31.csv' in response.headers['Content-Disposition']
+    rows = list(csv.reader(StringIO(response.get_data(as_text=True))))
+    assert rows[0][:3] == ['Amenity', 'Arrival', 'Departure'] and len(rows) == 1 + 6
+
+    response = client.get(f'/admin/export/police-report?date_from=2026-07-01&date_to=2026-07-31&format=fixed&amenity_id={lake_id}')
+    assert response.mimetype == 'text/plain' and response.get_data(as_text=True).count('\r\n') == 5
+
+    assert client.get('/admin/export/police-report?date_from=2026-07-31&date_to=2026-07-01').status_code == 302
+    assert client.get('/admin/export/police-report?date_from=2026-07-01&date_to=2026-07-31&format=pdf').status_code == 302
+    print("   ✅ CSV and fixed-width downloads, reversed period rejected")
+
+if __name__ == "__main__":
+    test_report_rows_from_one_query()
+    test_per_amenity_files_in_parallel()
+    test_police_report_download()
+    print("\n✅ All police report tests passed!")
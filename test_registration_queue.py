@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for the scoped, keyset-paginated pending registrations queue
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+from test_config import TestConfig
+from database import db, User, Amenity, Trip, Registration, Guest, get_pending_registrations_page
+
+def create_admin_with_trip(username):
+    admin = User(username=username, email=f'{username}@example.com', password_hash='x', role='admin')
+    db.session.add(admin)
+    db.session.flush()
+    amenity = Amenity(name=f'{username} Flat', max_guests=4, admin_id=admin.id)
+    db.session.add(amenity)
+    db.session.flush()
+    trip = Trip(title=f'{username} Trip', start_date=date(2026, 9, 1), end_date=date(2026, 9, 4),
+                max_guests=4, admin_id=admin.id, amenity_id=amenity.id)
+    db.session.add(trip)
+    db.session.flush()
+    return admin, trip
+
+def add_registrations(trip, count, start, status='pending'):
+    """Add registrations submitted one hour apart, two guests each"""
+    for i in range(count):
+        registration = Registration(trip_id=trip.id, email=f'{trip.id}-{i}@example.com', status=status,
+                                    created_at=start + timedelta(hours=i))
+        db.session.add(registration)
+        db.session.flush()
+        for j in range(2):
+            db.session.add(Guest(registration_id=registration.id, first_name=f'G{i}', last_name=f'L{j}',
+                                 document_type='passport', document_number=f'{i}{j}'))
+
+def count_queries():
+    """Attach a statement counter to the engine; returns the mutable counter list"""
+    counter = [0]
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        counter[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    return counter, lambda: event.remove(db.engine, 'before_cursor_execute', before_execute)
+
+def test_queue_scope_and_pagination():
+    """Only the admin's pending registrations are paged, oldest first, without gaps"""
+    print("🧪 Testing pending queue scope and keyset pagination")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        admin, trip = create_admin_with_trip('queue_admin')
+        _, other_trip = create_admin_with_trip('other_admin')
+        start = datetime(2026, 8, 1, 9, 0)
+        add_registrations(trip, 7, start)
+        add_registrations(trip, 2, start, status='approved')
+        add_registrations(other_trip, 3, start)
+        db.session.commit()
+
+        seen, after = [], None
+        while True:
+            page, after = get_pending_registrations_page(admin.id, after=after, page_size=3)
+            seen.extend(page)
+            if not after:
+                break
+        assert len(seen) == 7
+        assert all(r.trip.admin_id == admin.id and r.status == 'pending' for r in seen)
+        assert [r.created_at for r in seen] == sorted(r.created_at for r in seen)
+        assert len({r.id for r in seen}) == 7
+        print("   ✅ Three pages cover the admin's seven pending registrations exactly once")
+
+        page, _ = get_pending_registrations_page(admin.id, date_from=date(2026, 8, 1),
+                                                 date_to=date(2026, 8, 1), page_size=50)
+        assert len(page) == 7
+        page, _ = get_pending_registrations_page(admin.id, trip_id=other_trip.id)
+        assert page == []
+        page, _ = get_pending_registrations_page(admin.id, after='not-a-cursor', page_size=50)
+        assert len(page) == 7
+        print("   ✅ Trip/date filters and invalid cursors behave")
+
+def test_queue_query_count_is_constant():
+    """Trips and guests are eager-loaded: rendering a page does not add queries"""
+    print("🧪 Testing pending queue query count")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        admin, trip = create_admin_with_trip('eager_admin')
+        add_registrations(trip, 12, datetime(2026, 8, 1, 9, 0))
+        db.session.commit()
+        admin_id = admin.id
+
+        counts = []
+        for page_size in (2, 10):
+            db.session.expunge_all()
+            counter, stop = count_queries()
+            page, _ = get_pending_registrations_page(admin_id, page_size=page_size)
+            for registration in page:
+                registration.trip.title
+                [guest.first_name for guest in registration.guests]
+            stop()
+            counts.append(counter[0])
+        assert counts[0] == counts[1] == 2, f"Expected 2 queries per page, got {counts}"
+        print("   ✅ Two queries per page regardless of page size")
+
+if __name__ == "__main__":
+    test_queue_scope_and_pagination()
+    test_queue_query_count_is_constant()
+    print("\n✅ All registration queue tests passed!")
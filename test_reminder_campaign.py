@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for the pre-arrival reminder campaign
+"""
+
+import os
+import sys
+import time
+from datetime import date, timedelta
+from email import message_from_bytes
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+from test_outbox import SMTPStandIn, create_outbox_app
+from database import db, User, Amenity, Trip, Registration, ReminderSend, OutboxMessage
+from campaigns import run_reminder_campaign, select_reminder_targets
+from outbox import OutboxWorker
+from blueprints.registration import registration as registration_bp
+
+TODAY = date(2026, 10, 19)
+
+def create_trips(count, company_name='Mountain Huts'):
+    """``count`` upcoming trips with guest emails, plus trips that must be skipped"""
+    admin = User(username='reminder_admin', email='reminder_admin@example.com', password_hash='x',
+                 role='admin', company_name=company_name)
+    db.session.add(admin)
+    db.session.flush()
+    amenity = Amenity(name='Reminder Flat', max_guests=4, admin_id=admin.id)
+    db.session.add(amenity)
+    db.session.flush()
+
+    def trip(title, start, email):
+        t = Trip(title=title, start_date=start, end_date=start + timedelta(days=2), max_guests=4,
+                 admin_id=admin.id, amenity_id=amenity.id, external_guest_name='Jana Nováková',
+                 external_guest_email=email)
+        db.session.add(t)
+        return t
+
+    targets = [trip(f'Stay {i}', TODAY + timedelta(days=i % 7), f'guest{i}@example.com') for i in range(count)]
+    trip('Too far ahead', TODAY + timedelta(days=30), 'far@example.com')
+    trip('Already started', TODAY - timedelta(days=1), 'past@example.com')
+    trip('No email', TODAY + timedelta(days=2), '')
+    registered = trip('Registered', TODAY + timedelta(days=2), 'registered@example.com')
+    db.session.flush()
+    db.session.add(Registration(trip_id=registered.id, email='registered@example.com'))
+    db.session.commit()
+    return [t.id for t in targets]
+
+def create_campaign_app(server=None, **config):
+    app = create_outbox_app(server, **config) if server else TestConfig.create_test_app(**config)
+    app.register_blueprint(registration_bp)
+    return app
+
+def test_target_selection_and_idempotent_rerun():
+    """One query picks the targets; batches are recorded so reruns queue nothing"""
+    print("🧪 Testing reminder target selection and idempotent reruns")
+    app = create_campaign_app(REMINDER_BATCH_SIZE=4)
+
+    with app.app_context():
+        trip_ids = create_trips(10)
+        targets = select_reminder_targets(7, today=TODAY)
+        assert sorted(t.id for t in targets) == sorted(trip_ids)
+        print("   ✅ Only upcoming, unregistered trips with an email are selected")
+
+        assert run_reminder_campaign(dry_run=True, today=TODAY)['queued'] == 0
+        assert OutboxMessage.query.count() == 0
+
+        summary = run_reminder_campaign(locale='cs', today=TODAY)
+        assert summary == {'targets': 10, 'queued': 10, 'failed': 0, 'batches': 3}, summary
+        assert ReminderSend.query.count() == 10
+        assert OutboxMessage.query.filter_by(kind='reminder').count() == 10
+        print("   ✅ Ten reminders queued in three batches")
+
+        message = message_from_bytes(OutboxMessage.query.first().raw_message)
+        body = message.get_payload(decode=True).decode('utf-8')
+        assert message['To'] == 'guest0@example.com'
+        assert f'/register/id/{trip_ids[0]}' in body
+        assert 'Mountain Huts' in body and 'Jana Nováková' in body
+        assert 'Dear' not in body, "Reminder is rendered in Czech"
+        print("   ✅ Localized reminder contains the registration link")
+
+        assert run_reminder_campaign(today=TODAY) == {'targets': 0, 'queued': 0, 'failed': 0, 'batches': 0}
+        assert OutboxMessage.query.count() == 10
+        print("   ✅ Rerun queues nothing")
+
+def test_delivery_over_one_rate_limited_connection():
+    """Reminders are delivered over a single SMTP connection at the configured rate"""
+    print("🧪 Testing reminder delivery with rate limiting")
+    server = SMTPStandIn().start()
+    try:
+        app = create_campaign_app(server, OUTBOX_BATCH_SIZE=2, OUTBOX_RATE_LIMIT_PER_MINUTE=600)
+        with app.app_context():
+            create_trips(5)
+            assert run_reminder_campaign(today=TODAY)['queued'] == 5
+
+            worker = OutboxWorker(app)
+            started = time.monotonic()
+            stats = worker.drain()
+            elapsed = time.monotonic() - started
+            worker.connection.close()
+
+            assert stats == {'sent': 5, 'retry': 0, 'failed': 0}, stats
+            assert server.connections == 1
+            assert len(server.messages) == 5
+            # 600/min is one send every 0.1s: four gaps between five sends
+            assert elapsed >= 0.35, elapsed
+            print(f"   ✅ Five reminders over one connection in {elapsed:.2f}s")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    test_target_selection_and_idempotent_rerun()
+    test_delivery_over_one_rate_limited_connection()
+    print("\n✅ All reminder campaign tests passed!")
@@ -31,7 +31,7 @@ def seed_test_data():
         
         # Import after environment setup
         from app import app
-        from database import db, User, Trip, Registration, Guest, Invoice, InvoiceItem
+        from database import db, User, Trip, Registration, Guest, Invoice, InvoiceItem, rebuild_trip_counters
         from werkzeug.security import generate_password_hash
         
         with app.app_context():
@@ -177,6 +177,7 @@ def seed_test_data():
                 db.session.add(item)
             
             # Commit all changes
+            rebuild_trip_counters()
             db.session.commit()
             
             # Print summary
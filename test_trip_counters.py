@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test script for the denormalised per-trip registration and guest counters
+"""
+
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_config import TestConfig
+from database import (
+    db, User, Amenity, Trip, Registration, Guest,
+    adjust_trip_counters, record_registration_status_change, rebuild_trip_counters
+)
+
+def create_trip_with_registrations():
+    """Create an admin, an amenity and a trip with a mix of registrations"""
+    admin = User(username='counter_admin', email='counter_admin@example.com', password_hash='x', role='admin')
+    db.session.add(admin)
+    db.session.flush()
+
+    amenity = Amenity(name='Counter Flat', max_guests=4, admin_id=admin.id)
+    db.session.add(amenity)
+    db.session.flush()
+
+    trip = Trip(
+        title='Counter Trip',
+        start_date=date(2026, 7, 1),
+        end_date=date(2026, 7, 5),
+        max_guests=4,
+        admin_id=admin.id,
+        amenity_id=amenity.id
+    )
+    db.session.add(trip)
+    db.session.flush()
+
+    for status, guest_total in [('pending', 2), ('approved', 3), ('rejected', 1), ('approved', 1)]:
+        registration = Registration(trip_id=trip.id, email=f'{status}@example.com', status=status)
+        db.session.add(registration)
+        db.session.flush()
+        for i in range(guest_total):
+            db.session.add(Guest(
+                registration_id=registration.id,
+                first_name=f'Guest{i}',
+                last_name=status.title(),
+                document_type='passport',
+                document_number=f'P{registration.id}{i}'
+            ))
+    db.session.commit()
+    return trip
+
+def test_rebuild_trip_counters():
+    """Bulk rebuild recomputes every counter from the underlying rows"""
+    print("🧪 Testing bulk rebuild of trip counters")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        trip = create_trip_with_registrations()
+        assert trip.registration_count == 0, "Counters start at zero when rows are inserted directly"
+
+        updated = rebuild_trip_counters()
+        db.session.commit()
+        db.session.refresh(trip)
+
+        assert updated == 1
+        assert trip.registration_count == 4
+        assert trip.pending_count == 1
+        assert trip.approved_count == 2
+        assert trip.rejected_count == 1
+        assert trip.guest_count == 7
+        print("   ✅ Rebuild produced correct counters")
+
+        assert rebuild_trip_counters([]) == 0, "Empty id list should be a no-op"
+        print("   ✅ Empty trip id list is a no-op")
+
+def test_incremental_counter_updates():
+    """Submit/approve/reject deltas keep counters equal to a full rebuild"""
+    print("🧪 Testing incremental trip counter updates")
+    app = TestConfig.create_test_app()
+
+    with app.app_context():
+        trip = create_trip_with_registrations()
+        rebuild_trip_counters([trip.id])
+        db.session.commit()
+
+        # Submit: one new pending registration with two guests
+        registration = Registration(trip_id=trip.id, email='new@example.com')
+        db.session.add(registration)
+        db.session.flush()
+        for i in range(2):
+            db.session.add(Guest(
+                registration_id=registration.id,
+                first_name=f'New{i}',
+                last_name='Guest',
+                document_type='passport',
+                document_number=f'N{i}'
+            ))
+        adjust_trip_counters(trip.id, registration_count=1, pending_count=1, guest_count=2)
+
+        # Approve it, then reject the originally pending one
+        record_registration_status_change(trip.id, 'pending', 'approved')
+        registration.status = 'approved'
+        pending = Registration.query.filter_by(trip_id=trip.id, status='pending').first()
+        record_registration_status_change(trip.id, pending.status, 'rejected')
+        pending.status = 'rejected'
+
+        # Same-status transitions must not move anything
+        record_registration_status_change(trip.id, 'approved', 'approved')
+        db.session.commit()
+        db.session.refresh(trip)
+
+        incremental = (trip.registration_count, trip.pending_count, trip.approved_count,
+                       trip.rejected_count, trip.guest_count)
+        assert incremental == (5, 0, 3, 2, 9), f"Unexpected counters: {incremental}"
+
+        rebuild_trip_counters([trip.id])
+        db.session.commit()
+        db.session.refresh(trip)
+        rebuilt = (trip.registration_count, trip.pending_count, trip.approved_count,
+                   trip.rejected_count, trip.guest_count)
+        assert incremental == rebuilt, f"Incremental {incremental} != rebuilt {rebuilt}"
+        print("   ✅ Incremental updates match a full rebuild")
+
+if __name__ == "__main__":
+    test_rebuild_trip_counters()
+    test_incremental_counter_updates()
+    print("\n✅ All trip counter tests passed!")